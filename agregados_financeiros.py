@@ -0,0 +1,316 @@
+"""
+Agregados Financeiros Mensais (rollup de PrestacaoContas)
+================================================================
+
+Dashboard e relatórios mensais somavam PrestacaoContas inteira a cada
+consulta (ou usavam valores fixos, como crescimento_percentual = 12.5).
+A tabela AgregadosFinanceirosMensais guarda, por mês x locador x imóvel:
+
+    qtd_prestacoes    prestações ativas (não canceladas) do grupo
+    valor_faturado    valor_boleto (ou total_bruto nas prestações antigas)
+    valor_recebido    valor_pago das prestações pagas/lançadas (com
+                      data_pagamento, mesma regra de STATUS_FATURA_SQL)
+    valor_acrescimos  multa + juros calculados (valor_acrescimos)
+    valor_retido      total_retido (taxas e valores retidos pela imobiliária)
+    valor_repasse     DistribuicaoRepasseLocadores.valor_repasse do locador
+                      (ou valor_repasse da prestação, se não houver distribuição)
+
+Com vários locadores, os valores da prestação são rateados pelo
+percentual_participacao da distribuição ativa; a soma dos locadores fecha
+com o total da prestação.
+
+Atualização incremental: cada escrita em prestação (salvar, pagar, mudar
+status, acréscimos do job) chama atualizar_agregados_prestacoes(cursor, ids),
+que recalcula só os grupos (mês, imóvel) dessas prestações, na mesma
+transação. Escritas que mudam o grupo de prestações existentes (ex.: imóvel
+do contrato) leem grupos_das_prestacoes antes e passam esses grupos também,
+para o grupo antigo não ficar com os totais velhos. Consultas de série
+mensal e crescimento leem só o rollup, então custam O(meses) e não
+O(prestações).
+
+O recálculo trava os grupos (UPDLOCK, SERIALIZABLE) até o fim da transação,
+então duas escritas no mesmo grupo não duplicam linhas, e roda sob um
+savepoint: se falhar, só o recálculo é desfeito e ErroAgregados avisa o
+chamador de que a escrita pode seguir. Qualquer outra exceção significa que
+a transação inteira foi perdida (ex.: deadlock) e precisa propagar.
+
+Prestações sem contrato_id (legado, anteriores ao vínculo com contrato)
+ficam fora do rollup.
+"""
+
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pool_conexoes import obter_conexao
+
+# Grupos (ano, mes, imovel_id) por comando: 3 parâmetros cada, limite de 2100 do SQL Server
+GRUPOS_POR_COMANDO = 500
+
+SQL_RECALCULAR = """
+    WITH base AS (
+        SELECT
+            p.id,
+            TRY_CAST(p.ano AS int) AS ano,
+            TRY_CAST(p.mes AS int) AS mes,
+            c.id_imovel AS imovel_id,
+            p.locador_id,
+            ISNULL(p.valor_boleto, ISNULL(p.total_bruto, 0)) AS faturado,
+            CASE WHEN p.data_pagamento IS NOT NULL THEN ISNULL(p.valor_pago, 0) ELSE 0 END AS recebido,
+            ISNULL(p.valor_acrescimos, 0) AS acrescimos,
+            ISNULL(p.total_retido, 0) AS retido,
+            ISNULL(p.valor_repasse, 0) AS repasse
+        FROM PrestacaoContas p
+        JOIN Contratos c ON c.id = p.contrato_id
+        {juncao_grupos}
+        WHERE p.ativo = 1 AND ISNULL(p.status, '') <> 'cancelada'
+    ),
+    participacao AS (
+        SELECT
+            b.id,
+            ISNULL(d.locador_id, b.locador_id) AS locador_id,
+            ISNULL(
+                d.percentual_participacao / NULLIF(SUM(d.percentual_participacao) OVER (PARTITION BY b.id), 0),
+                1.0 / COUNT(*) OVER (PARTITION BY b.id)
+            ) AS fator,
+            d.valor_repasse AS repasse_locador
+        FROM base b
+        LEFT JOIN DistribuicaoRepasseLocadores d ON d.prestacao_id = b.id AND d.ativo = 1
+    )
+    INSERT INTO AgregadosFinanceirosMensais (
+        ano, mes, locador_id, imovel_id, qtd_prestacoes, valor_faturado, valor_recebido,
+        valor_acrescimos, valor_retido, valor_repasse, data_atualizacao
+    )
+    SELECT
+        b.ano, b.mes, pa.locador_id, b.imovel_id,
+        COUNT(DISTINCT b.id),
+        SUM(b.faturado * pa.fator),
+        SUM(b.recebido * pa.fator),
+        SUM(b.acrescimos * pa.fator),
+        SUM(b.retido * pa.fator),
+        SUM(ISNULL(pa.repasse_locador, b.repasse * pa.fator)),
+        GETDATE()
+    FROM base b
+    JOIN participacao pa ON pa.id = b.id
+    WHERE b.ano IS NOT NULL AND b.mes BETWEEN 1 AND 12
+      AND pa.locador_id IS NOT NULL AND b.imovel_id IS NOT NULL
+    GROUP BY b.ano, b.mes, pa.locador_id, b.imovel_id
+"""
+
+
+def garantir_tabela_agregados(cursor):
+    """
+    Cria AgregadosFinanceirosMensais (e faz a carga inicial) se a migração
+    003_agregados_financeiros.sql ainda não foi aplicada. Não faz commit.
+    """
+    cursor.execute("SELECT OBJECT_ID('AgregadosFinanceirosMensais', 'U')")
+    if cursor.fetchone()[0] is not None:
+        return
+
+    cursor.execute("""
+        CREATE TABLE AgregadosFinanceirosMensais (
+            ano int NOT NULL,
+            mes int NOT NULL,
+            locador_id int NOT NULL,
+            imovel_id int NOT NULL,
+            qtd_prestacoes int NOT NULL,
+            valor_faturado decimal(14,2) NOT NULL,
+            valor_recebido decimal(14,2) NOT NULL,
+            valor_acrescimos decimal(14,2) NOT NULL,
+            valor_retido decimal(14,2) NOT NULL,
+            valor_repasse decimal(14,2) NOT NULL,
+            data_atualizacao datetime NOT NULL,
+            CONSTRAINT PK_AgregadosFinanceirosMensais PRIMARY KEY (ano, mes, locador_id, imovel_id)
+        )
+    """)
+    cursor.execute("""
+        CREATE NONCLUSTERED INDEX IX_AgregadosFinanceirosMensais_Locador
+        ON AgregadosFinanceirosMensais (locador_id, ano, mes)
+    """)
+    cursor.execute("""
+        CREATE NONCLUSTERED INDEX IX_AgregadosFinanceirosMensais_Imovel
+        ON AgregadosFinanceirosMensais (imovel_id, ano, mes)
+    """)
+    reconstruir_agregados(cursor)
+
+
+def reconstruir_agregados(cursor) -> int:
+    """Recalcula o rollup inteiro a partir de PrestacaoContas. Não faz commit."""
+    cursor.execute("DELETE FROM AgregadosFinanceirosMensais")
+    cursor.execute(SQL_RECALCULAR.format(juncao_grupos=""))
+    return cursor.rowcount
+
+
+class ErroAgregados(Exception):
+    """Recálculo falhou e foi desfeito pelo savepoint; a escrita da transação continua válida"""
+
+
+def grupos_das_prestacoes(cursor, prestacao_ids: Iterable[Any]) -> List[Tuple[int, int, int]]:
+    """Grupos (ano, mes, imovel_id) atuais das prestações; leia antes de escritas que os mudam"""
+    prestacao_ids = sorted({int(prestacao_id) for prestacao_id in prestacao_ids if prestacao_id is not None})
+    grupos = set()
+    for posicao in range(0, len(prestacao_ids), 2000):
+        ids = prestacao_ids[posicao:posicao + 2000]
+        cursor.execute(f"""
+            SELECT DISTINCT TRY_CAST(p.ano AS int), TRY_CAST(p.mes AS int), c.id_imovel
+            FROM PrestacaoContas p
+            JOIN Contratos c ON c.id = p.contrato_id
+            WHERE p.id IN ({','.join('?' for _ in ids)})
+        """, ids)
+        grupos.update(
+            (ano, mes, imovel_id) for ano, mes, imovel_id in cursor.fetchall()
+            if ano is not None and mes is not None and imovel_id is not None
+        )
+    return sorted(grupos)
+
+
+def _recalcular_grupos(cursor, grupos: List[Tuple[int, int, int]]):
+    for posicao in range(0, len(grupos), GRUPOS_POR_COMANDO):
+        lote = grupos[posicao:posicao + GRUPOS_POR_COMANDO]
+        valores = ', '.join('(?, ?, ?)' for _ in lote)
+        params = [valor for grupo in lote for valor in grupo]
+
+        # UPDLOCK + SERIALIZABLE: trava as linhas e o intervalo dos grupos até
+        # o commit, inclusive grupos ainda vazios (outra escrita espera aqui)
+        cursor.execute(f"""
+            DELETE a
+            FROM AgregadosFinanceirosMensais a WITH (UPDLOCK, SERIALIZABLE)
+            JOIN (VALUES {valores}) g (ano, mes, imovel_id)
+              ON a.ano = g.ano AND a.mes = g.mes AND a.imovel_id = g.imovel_id
+        """, params)
+        cursor.execute(SQL_RECALCULAR.format(juncao_grupos=f"""
+            JOIN (VALUES {valores}) g (ano, mes, imovel_id)
+              ON g.ano = TRY_CAST(p.ano AS int) AND g.mes = TRY_CAST(p.mes AS int) AND g.imovel_id = c.id_imovel
+        """), params)
+
+
+def atualizar_agregados_prestacoes(cursor, prestacao_ids: Iterable[Any],
+                                   grupos_anteriores: Iterable[Tuple[int, int, int]] = ()) -> int:
+    """
+    Recalcula os grupos (mês, imóvel) das prestações informadas, inclusive
+    as que foram desativadas, mais grupos_anteriores (grupos_das_prestacoes
+    lido antes de uma escrita que move prestações de grupo). Não faz commit:
+    roda na transação da escrita.
+
+    Raises:
+        ErroAgregados: o recálculo falhou e foi desfeito; a escrita pode seguir
+
+    Returns:
+        Quantidade de grupos recalculados
+    """
+    grupos = sorted(set(grupos_das_prestacoes(cursor, prestacao_ids)) | set(grupos_anteriores))
+    if not grupos:
+        return 0
+
+    cursor.execute("IF @@TRANCOUNT > 0 SAVE TRANSACTION agregados")
+    try:
+        _recalcular_grupos(cursor, grupos)
+    except Exception as erro:
+        try:
+            cursor.execute("ROLLBACK TRANSACTION agregados")
+        except Exception:
+            # Sem savepoint (a transação já foi desfeita, ex.: deadlock): a escrita se perdeu
+            raise erro
+        raise ErroAgregados(str(erro)) from erro
+    return len(grupos)
+
+
+def atualizar_agregados_apos_escrita(prestacao_ids: Iterable[Any]):
+    """
+    Versão com conexão própria, para escritas que já fizeram commit.
+    Falhas não interrompem a escrita (o rollup pode ser reconstruído).
+    """
+    try:
+        with obter_conexao() as conn:
+            atualizar_agregados_prestacoes(conn.cursor(), prestacao_ids)
+    except Exception as e:
+        print(f"AVISO: Não foi possível atualizar agregados financeiros ({list(prestacao_ids)}): {e}")
+
+
+# ==================== CONSULTAS ====================
+
+def _mes_anterior(ano: int, mes: int, meses: int = 1) -> Tuple[int, int]:
+    indice = ano * 12 + (mes - 1) - meses
+    return indice // 12, indice % 12 + 1
+
+
+def consultar_serie_mensal(cursor, meses: int = 12, locador_id: Optional[int] = None,
+                           imovel_id: Optional[int] = None, hoje: Optional[date] = None) -> List[Dict[str, Any]]:
+    """
+    Totais por mês dos últimos `meses` meses (inclui o atual), do mais antigo
+    para o mais recente. Meses sem prestação voltam zerados.
+    """
+    hoje = hoje or date.today()
+    ano_inicio, mes_inicio = _mes_anterior(hoje.year, hoje.month, meses - 1)
+
+    filtros = ["(ano * 100 + mes) BETWEEN ? AND ?"]
+    params: List[Any] = [ano_inicio * 100 + mes_inicio, hoje.year * 100 + hoje.month]
+    if locador_id is not None:
+        filtros.append("locador_id = ?")
+        params.append(locador_id)
+    if imovel_id is not None:
+        filtros.append("imovel_id = ?")
+        params.append(imovel_id)
+
+    cursor.execute(f"""
+        SELECT ano, mes, SUM(qtd_prestacoes), SUM(valor_faturado), SUM(valor_recebido),
+               SUM(valor_acrescimos), SUM(valor_retido), SUM(valor_repasse)
+        FROM AgregadosFinanceirosMensais
+        WHERE {' AND '.join(filtros)}
+        GROUP BY ano, mes
+    """, params)
+    por_mes = {(row[0], row[1]): row[2:] for row in cursor.fetchall()}
+
+    serie = []
+    for deslocamento in range(meses - 1, -1, -1):
+        ano, mes = _mes_anterior(hoje.year, hoje.month, deslocamento)
+        qtd, faturado, recebido, acrescimos, retido, repasse = por_mes.get((ano, mes), (0, 0, 0, 0, 0, 0))
+        serie.append({
+            "ano": ano,
+            "mes": mes,
+            "referencia": f"{mes:02d}/{ano}",
+            "qtd_prestacoes": int(qtd or 0),
+            "valor_faturado": float(faturado or 0),
+            "valor_recebido": float(recebido or 0),
+            "valor_acrescimos": float(acrescimos or 0),
+            "valor_retido": float(retido or 0),
+            "valor_repasse": float(repasse or 0),
+        })
+    return serie
+
+
+def consultar_crescimento(cursor, hoje: Optional[date] = None) -> Dict[str, Any]:
+    """
+    Crescimento do faturamento (mês atual x anterior) e locadores com a
+    primeira prestação no mês atual
+    """
+    hoje = hoje or date.today()
+    anterior, atual = consultar_serie_mensal(cursor, meses=2, hoje=hoje)
+    if anterior["valor_faturado"]:
+        crescimento = (atual["valor_faturado"] - anterior["valor_faturado"]) / anterior["valor_faturado"] * 100
+    else:
+        crescimento = 0.0
+
+    cursor.execute("""
+        SELECT COUNT(*)
+        FROM (
+            SELECT locador_id
+            FROM AgregadosFinanceirosMensais
+            GROUP BY locador_id
+            HAVING MIN(ano * 100 + mes) = ?
+        ) novos
+    """, (hoje.year * 100 + hoje.month,))
+    novos_locadores = cursor.fetchone()[0] or 0
+
+    return {
+        "crescimento_percentual": round(crescimento, 1),
+        "novos_clientes_mes": novos_locadores,
+        "faturado_mes_atual": atual["valor_faturado"],
+        "faturado_mes_anterior": anterior["valor_faturado"],
+    }
+
+
+def obter_serie_mensal(meses: int = 12, locador_id: Optional[int] = None,
+                       imovel_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Série mensal do rollup (relatórios)"""
+    with obter_conexao() as conn:
+        return consultar_serie_mensal(conn.cursor(), meses, locador_id, imovel_id)
@@ -21,6 +21,9 @@ from locacao.repositories.search_repository import (
     buscar_imoveis_avancado,
     buscar_contratos_avancado
 )
+from executor_bd import executar_bd
+from servico_busca_global import buscar_global_resumida
+from autocompletar import autocompletar_carregado, sugerir
 
 # ============================
 # MODELOS PYDANTIC PARA API
@@ -115,27 +118,20 @@ async def busca_global_endpoint(
             'ordenacao': ordenacao
         }
         
-        # Fazer requisição para a API básica que já funciona corretamente
-        import requests
+        # Serviço em processo compartilhado com /api/search/global (mesmo cache)
         try:
-            api_response = requests.get(
-                f"http://{os.getenv('API_HOST', 'localhost')}:{os.getenv('API_PORT', '8001')}/api/search/global",
-                params={'q': termo_busca, 'limit': limite, 'offset': offset}
-            )
-            if api_response.ok:
-                api_data = api_response.json()
-                if api_data.get('success'):
-                    resultado_busca = api_data['data']
-                else:
-                    raise Exception("API básica retornou erro")
-            else:
-                raise Exception(f"API básica falhou: {api_response.status_code}")
+            if len(termo_busca) < 2:
+                raise ValueError("Busca resumida exige pelo menos 2 caracteres")
+            resultado_busca = await executar_bd(buscar_global_resumida, termo_busca, limite, grupo='busca')
         except Exception as e:
-            # Fallback para busca local se API falhar
-            resultado_busca = busca_global_unificada(
+            # Fallback para a busca unificada do repository
+            print(f"AVISO: Busca resumida indisponível, usando busca unificada: {e}")
+            resultado_busca = await executar_bd(
+                busca_global_unificada,
                 termo_busca=termo_busca,
                 limit=limite,
-                offset=offset
+                offset=offset,
+                grupo='busca'
             )
         
         # Converter formato direto
@@ -704,22 +700,20 @@ async def obter_sugestoes(
     limite: int = Query(10, ge=1, le=20)
 ):
     """
-    Endpoint dedicado para sugestões de autocompletar
+    Endpoint dedicado para sugestões de autocompletar (índice de prefixos em memória)
     """
     try:
-        # Mock sugestões
-        sugestoes_mock = [
-            termo + ' exemplo',
-            termo + ' sugestão',
-            f'Buscar {termo}',
-            f'{termo} relacionado'
-        ][:limite]
+        if autocompletar_carregado():
+            itens = sugerir(termo, limite)
+        else:
+            itens = await executar_bd(sugerir, termo, limite, grupo='busca')
         
         return {
             'sucesso': True,
             'termo': termo,
-            'sugestoes': sugestoes_mock,
-            'total_sugestoes': len(sugestoes_mock)
+            'sugestoes': [item['texto'] for item in itens],
+            'itens': itens,
+            'total_sugestoes': len(itens)
         }
         
     except Exception as e:
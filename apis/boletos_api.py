@@ -13,6 +13,10 @@ from decimal import Decimal, ROUND_HALF_UP
 import json
 import logging
 from typing import Dict, List, Optional, Any
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from pool_conexoes import obter_conexao
+from motor_acrescimos import calcular_acrescimos, MULTA_PADRAO
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -25,18 +29,9 @@ app = Flask(__name__)
 CORS(app)
 
 def get_db_connection():
-    """Conecta ao banco de dados SQL Server"""
+    """Empresta uma conexão do pool compartilhado (conn.close() devolve ao pool)"""
     try:
-        connection_string = (
-            f"DRIVER={{{os.getenv('DB_DRIVER')}}};"
-            f"SERVER={os.getenv('DB_SERVER')};"
-            f"DATABASE={os.getenv('DB_DATABASE')};"
-            f"UID={os.getenv('DB_USER')};"
-            f"PWD={os.getenv('DB_PASSWORD')};"
-            f"Encrypt={os.getenv('DB_ENCRYPT')};"
-            f"TrustServerCertificate={os.getenv('DB_TRUST_CERT')}"
-        )
-        return pyodbc.connect(connection_string)
+        return obter_conexao()
     except Exception as e:
         logger.error(f"Erro ao conectar ao banco: {e}")
         raise
@@ -45,8 +40,7 @@ def calcular_acrescimos_atraso(valor_original: Decimal, dias_atraso: int,
                               indice_correcao: Decimal = Decimal('0')) -> Dict[str, Decimal]:
     """
     Calcula acréscimos por atraso conforme regras:
-    - Juros de mora: 1% ao mês (proporcional por dia)
-    - Multa: 2% sobre o valor em atraso
+    - Juros de mora e multa de 2%: motor_acrescimos.calcular_acrescimos
     - Correção monetária: IGPM ou IPCA
     """
     if dias_atraso <= 0:
@@ -57,23 +51,17 @@ def calcular_acrescimos_atraso(valor_original: Decimal, dias_atraso: int,
             'total_acrescimo': Decimal('0')
         }
     
-    # Juros de mora: 1% ao mês (0.033% ao dia aproximadamente)
-    juros_diario = Decimal('0.000333')  # 1% / 30 dias
-    juros = valor_original * juros_diario * dias_atraso
-    
-    # Multa: 2% sobre o valor em atraso
-    multa = valor_original * Decimal('0.02')
+    acrescimos = calcular_acrescimos(valor_original, dias_atraso, MULTA_PADRAO)
     
     # Correção monetária (baseada no índice fornecido)
     correcao = valor_original * (indice_correcao / 100) if indice_correcao > 0 else Decimal('0')
-    
-    total_acrescimo = juros + multa + correcao
+    correcao = correcao.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
     
     return {
-        'juros': juros.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
-        'multa': multa.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
-        'correcao': correcao.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
-        'total_acrescimo': total_acrescimo.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        'juros': acrescimos['juros'],
+        'multa': acrescimos['multa'],
+        'correcao': correcao,
+        'total_acrescimo': acrescimos['total_acrescimo'] + correcao
     }
 
 def obter_indice_correcao(nome_indice: str, mes: int, ano: int) -> Decimal:
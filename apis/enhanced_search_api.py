@@ -4,21 +4,17 @@ import pyodbc
 import os
 from dotenv import load_dotenv
 from datetime import datetime
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from pool_conexoes import obter_conexao
 
 load_dotenv()
 
 router = APIRouter()
 
 def get_conexao():
-    """Estabelece conexão com o banco SQL Server"""
-    connection_string = (
-        f"DRIVER={{{os.getenv('DB_DRIVER')}}};"
-        f"SERVER={os.getenv('DB_SERVER')};"
-        f"DATABASE={os.getenv('DB_DATABASE')};"
-        f"UID={os.getenv('DB_USER')};"
-        f"PWD={os.getenv('DB_PASSWORD')}"
-    )
-    return pyodbc.connect(connection_string)
+    """Empresta uma conexão do pool compartilhado (conn.close() devolve ao pool)"""
+    return obter_conexao()
 
 @router.get("/api/search/enhanced/{entity_type}/{entity_id}")
 async def get_complete_entity_data(entity_type: str, entity_id: int) -> Dict[str, Any]:
@@ -5,6 +5,9 @@ import os
 from dotenv import load_dotenv
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from pool_conexoes import obter_conexao
+from executor_bd import executar_bd
+from servico_busca_global import buscar_global_resumida
 from locacao.repositories.locador_repository_v2 import buscar_locador_completo, listar_locadores, inserir_locador_v2, atualizar_locador, desativar_locador
 
 load_dotenv()
@@ -12,14 +15,7 @@ load_dotenv()
 router = APIRouter()
 
 def get_conexao():
-    connection_string = (
-        f"DRIVER={{{os.getenv('DB_DRIVER')}}};"
-        f"SERVER={os.getenv('DB_SERVER')};"
-        f"DATABASE={os.getenv('DB_DATABASE')};"
-        f"UID={os.getenv('DB_USER')};"
-        f"PWD={os.getenv('DB_PASSWORD')}"
-    )
-    return pyodbc.connect(connection_string)
+    return obter_conexao()
 
 @router.get("/api/search/advanced/detalhes/locadores/{locador_id}")
 async def obter_detalhes_locador(locador_id: int) -> Dict[str, Any]:
@@ -226,95 +222,16 @@ async def busca_global(q: str = "", limit: int = 10):
                 "message": "Termo de busca deve ter pelo menos 2 caracteres"
             }
         
-        conn = get_conexao()
-        cursor = conn.cursor()
-        
-        # Buscar locadores
-        cursor.execute("""
-            SELECT TOP (?) id, nome, cpf_cnpj, telefone, email, ativo
-            FROM Clientes 
-            WHERE tipo_cliente = 'Locador' 
-            AND (nome LIKE ? OR cpf_cnpj LIKE ? OR telefone LIKE ? OR email LIKE ?)
-            ORDER BY nome
-        """, (limit, f"%{q}%", f"%{q}%", f"%{q}%", f"%{q}%"))
-        
-        locadores_rows = cursor.fetchall()
-        locadores = []
-        for row in locadores_rows:
-            locadores.append({
-                "id": row[0],
-                "nome": row[1],
-                "cpf_cnpj": row[2],
-                "telefone": row[3],
-                "email": row[4],
-                "ativo": row[5]
-            })
-        
-        # Buscar imóveis
-        cursor.execute("""
-            SELECT TOP (?) i.id, i.endereco, i.tipo, i.valor_aluguel, i.status, c.nome as locador_nome
-            FROM Imoveis i
-            LEFT JOIN Clientes c ON i.id_locador = c.id
-            WHERE i.ativo = 1 
-            AND (i.endereco LIKE ? OR i.tipo LIKE ?)
-            ORDER BY i.endereco
-        """, (limit, f"%{q}%", f"%{q}%"))
-        
-        imoveis_rows = cursor.fetchall()
-        imoveis = []
-        for row in imoveis_rows:
-            imoveis.append({
-                "id": row[0],
-                "endereco": row[1],
-                "endereco_completo": row[1],
-                "tipo": row[2],
-                "valor_aluguel": float(row[3]) if row[3] else 0,
-                "status": row[4] or "DISPONIVEL",
-                "locador": {"nome": row[5]} if row[5] else {"nome": "Não informado"}
-            })
-        
-        # Buscar contratos
-        cursor.execute("""
-            SELECT TOP (?) c.id, c.valor_aluguel, i.endereco, cl.nome as locatario_nome, 
-                   c.data_inicio, c.data_fim
-            FROM Contratos c
-            INNER JOIN Imoveis i ON c.id_imovel = i.id
-            LEFT JOIN Clientes cl ON c.id_locatario = cl.id
-            WHERE c.data_fim >= GETDATE()
-            AND (cl.nome LIKE ? OR i.endereco LIKE ?)
-            ORDER BY c.data_inicio DESC
-        """, (limit, f"%{q}%", f"%{q}%"))
-        
-        contratos_rows = cursor.fetchall()
-        contratos = []
-        for row in contratos_rows:
-            contratos.append({
-                "id": row[0],
-                "valor_aluguel": float(row[1]) if row[1] else 0,
-                "imovel_endereco": row[2],
-                "locatario": row[3] or "Não informado",
-                "data_inicio": row[4].isoformat() if row[4] else None,
-                "data_fim": row[5].isoformat() if row[5] else None,
-                "status": "ATIVO"
-            })
-        
-        conn.close()
-        
-        total_resultados = len(locadores) + len(imoveis) + len(contratos)
+        resultado = await executar_bd(buscar_global_resumida, q, limit, grupo='busca')
         
         return {
             "success": True,
-            "total_resultados": total_resultados,
+            "total_resultados": resultado["total_resultados"],
             "termo_busca": q,
             "data": {
-                "resultados_por_tipo": {
-                    "locadores": {"dados": locadores},
-                    "locatarios": {"dados": []},  # Implementar se necessário
-                    "imoveis": {"dados": imoveis},
-                    "contratos": {"dados": contratos}
-                }
+                "resultados_por_tipo": resultado["resultados_por_tipo"]
             }
         }
         
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro na busca: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Erro na busca: {str(e)}")
@@ -0,0 +1,394 @@
+"""
+Autocompletar da Caixa de Busca (índice de prefixos em memória)
+================================================================
+
+A caixa de busca do frontend chamava /api/busca (buscar_global completo,
+quatro seções com contagens) a cada tecla. Este módulo responde só as
+sugestões de autocompletar, sem ir ao SQL Server:
+
+- Nomes de locadores e locatários
+- Endereços de imóveis
+- Números de contrato (formato CT-0000)
+- CPF/CNPJ (só dígitos: '123.456' encontra '123.456.789-00')
+
+O índice são dois arrays ordenados por tipo de registro, com chaves
+normalizadas (minúsculo, sem acento), consultados com bisect:
+
+- `inicios`: texto completo ('joao da silva', 'ct-0042', '12345678900')
+- `palavras`: texto a partir de cada palavra seguinte ('silva'), para que
+  'silva' também sugira 'João da Silva'
+
+As sugestões que começam pelo termo vêm antes das que só casam no meio do
+texto. Cada consulta faz uma busca binária por array dos tipos pedidos,
+intercala os resultados em ordem alfabética e percorre no máximo alguns
+múltiplos de `limite` entradas, então o custo não cresce com a base. Como
+os arrays são separados por tipo, filtrar por tipo não gasta a varredura
+com registros dos outros tipos.
+
+Atualização:
+- Carga completa no startup (em segundo plano) ou na primeira consulta
+- Hooks em repositories_adapter chamam notificar_alteracao() após
+  insert/update, com as mesmas dependências do índice de busca global
+- Recarga completa em segundo plano a cada AUTOCOMPLETAR_TTL_SEGUNDOS,
+  para refletir escritas feitas por outros processos/workers
+
+Configuração (.env):
+    AUTOCOMPLETAR_TTL_SEGUNDOS   Intervalo da recarga completa (padrão 900)
+"""
+
+import heapq
+import os
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pool_conexoes import obter_conexao
+from indice_busca import COLUNA_ID, DEPENDENCIAS, normalizar_texto
+from colunas_digitos import somente_digitos
+
+# Mesmos aliases do indice_busca, para reaproveitar DEPENDENCIAS e COLUNA_ID
+FONTES = {
+    'locadores': """
+        SELECT l.id, l.nome, l.cpf_cnpj
+        FROM Locadores l
+        WHERE {filtro}
+    """,
+    'locatarios': """
+        SELECT l.id, l.nome, l.cpf_cnpj
+        FROM Locatarios l
+        WHERE {filtro}
+    """,
+    'imoveis': """
+        SELECT i.id, i.endereco, l.nome
+        FROM Imoveis i
+        LEFT JOIN Locadores l ON i.id_locador = l.id
+        WHERE {filtro}
+    """,
+    'contratos': """
+        SELECT c.id, loc.nome, i.endereco
+        FROM Contratos c
+        LEFT JOIN Imoveis i ON c.id_imovel = i.id
+        LEFT JOIN Locatarios loc ON c.id_locatario = loc.id
+        WHERE {filtro}
+    """,
+}
+
+# Palavras que não geram chave própria ('da' não sugere 'João da Silva')
+PALAVRAS_IGNORADAS = {'de', 'da', 'do', 'das', 'dos', 'e'}
+
+# Consulta só com dígitos e formatação de documento/telefone/CEP
+_CONSULTA_NUMERICA = re.compile(r'[\d.\-/() ]+')
+
+# Entrada dos arrays: (chave, tipo, id, índice da sugestão no documento)
+Entrada = Tuple[str, str, int, int]
+
+
+def numero_contrato(contrato_id: int) -> str:
+    return f"CT-{contrato_id:04d}"
+
+
+def _sugestoes_da_linha(tipo: str, linha: tuple) -> List[Dict[str, Any]]:
+    """Sugestões exibidas para um registro: [{'texto', 'campo', 'detalhe'}]"""
+    entidade_id = int(linha[0])
+    if tipo in ('locadores', 'locatarios'):
+        _, nome, cpf_cnpj = linha
+        sugestoes = [{'texto': nome, 'campo': 'nome', 'detalhe': cpf_cnpj}]
+        if somente_digitos(cpf_cnpj):
+            sugestoes.append({'texto': cpf_cnpj, 'campo': 'cpf_cnpj', 'detalhe': nome})
+        return [s for s in sugestoes if s['texto']]
+    if tipo == 'imoveis':
+        _, endereco, locador_nome = linha
+        return [{'texto': endereco, 'campo': 'endereco', 'detalhe': locador_nome}] if endereco else []
+    _, locatario_nome, imovel_endereco = linha
+    detalhe = ' - '.join(valor for valor in (locatario_nome, imovel_endereco) if valor) or None
+    return [{'texto': numero_contrato(entidade_id), 'campo': 'numero_contrato', 'detalhe': detalhe}]
+
+
+def _chaves(campo: str, texto: str) -> Tuple[List[str], List[str]]:
+    """(chaves de início, chaves de palavra) de um texto sugerido"""
+    if campo == 'cpf_cnpj':
+        return [somente_digitos(texto)], []
+    normalizado = normalizar_texto(texto)
+    if not normalizado:
+        return [], []
+    palavras = []
+    for posicao in (m.start() for m in re.finditer(r' (?=\S)', normalizado)):
+        resto = normalizado[posicao + 1:]
+        if resto.split(' ', 1)[0] not in PALAVRAS_IGNORADAS:
+            palavras.append(resto)
+    return [normalizado], palavras
+
+
+def normalizar_consulta(consulta: Optional[str]) -> str:
+    """'123.456' -> '123456'; ' Joã ' -> 'joa'"""
+    normalizado = normalizar_texto(consulta)
+    if normalizado and _CONSULTA_NUMERICA.fullmatch(normalizado) and any(c.isdigit() for c in normalizado):
+        return somente_digitos(normalizado)
+    return normalizado
+
+
+class IndiceAutocompletar:
+    """Arrays ordenados de chaves -> sugestões, com atualização por registro"""
+
+    def __init__(self):
+        self.inicios: Dict[str, List[Entrada]] = {tipo: [] for tipo in FONTES}
+        self.palavras: Dict[str, List[Entrada]] = {tipo: [] for tipo in FONTES}
+        self.documentos: Dict[Tuple[str, int], List[Dict[str, Any]]] = {}
+        self.maior_id: Dict[str, int] = {tipo: 0 for tipo in FONTES}
+        self.carregado_em: Optional[float] = None
+        self.duracao_carga_ms = 0.0
+        self._lock = threading.RLock()
+        self._recarregando = False
+        # Reindexações pedidas durante uma carga completa: a carga lê um
+        # snapshot, então elas são reaplicadas sobre os arrays novos após a troca
+        self._pendentes_carga: Optional[List[Tuple[str, Optional[int]]]] = None
+
+    def __len__(self):
+        return len(self.documentos)
+
+    # ---------- montagem ----------
+
+    @staticmethod
+    def _entradas(tipo: str, entidade_id: int,
+                  sugestoes: List[Dict[str, Any]]) -> Tuple[List[Entrada], List[Entrada]]:
+        inicios, palavras = [], []
+        for ordem, sugestao in enumerate(sugestoes):
+            chaves_inicio, chaves_palavra = _chaves(sugestao['campo'], sugestao['texto'])
+            inicios.extend((chave, tipo, entidade_id, ordem) for chave in chaves_inicio if chave)
+            palavras.extend((chave, tipo, entidade_id, ordem) for chave in chaves_palavra)
+        return inicios, palavras
+
+    @staticmethod
+    def _ler(cursor, tipo: str, filtro: str = "1 = 1", params: Iterable[Any] = ()) -> List[tuple]:
+        cursor.execute(FONTES[tipo].format(filtro=filtro), list(params))
+        return cursor.fetchall()
+
+    def carregar(self):
+        """
+        Recarrega tudo; as consultas usam os arrays antigos até a troca.
+        Reindexações feitas durante a leitura são reaplicadas depois da
+        troca (o snapshot lido pode não conter essas escritas).
+        """
+        inicio = time.perf_counter()
+        documentos = {}
+        inicios = {tipo: [] for tipo in FONTES}
+        palavras = {tipo: [] for tipo in FONTES}
+        maior_id = {tipo: 0 for tipo in FONTES}
+        with self._lock:
+            self._pendentes_carga = []
+        try:
+            with obter_conexao() as conn:
+                cursor = conn.cursor()
+                for tipo in FONTES:
+                    for linha in self._ler(cursor, tipo):
+                        entidade_id = int(linha[0])
+                        sugestoes = _sugestoes_da_linha(tipo, linha)
+                        documentos[(tipo, entidade_id)] = sugestoes
+                        novos_inicios, novas_palavras = self._entradas(tipo, entidade_id, sugestoes)
+                        inicios[tipo].extend(novos_inicios)
+                        palavras[tipo].extend(novas_palavras)
+                        maior_id[tipo] = max(maior_id[tipo], entidade_id)
+            for tipo in FONTES:
+                inicios[tipo].sort()
+                palavras[tipo].sort()
+            with self._lock:
+                self.documentos, self.inicios, self.palavras = documentos, inicios, palavras
+                self.maior_id = maior_id
+                self.carregado_em = time.monotonic()
+                self.duracao_carga_ms = (time.perf_counter() - inicio) * 1000
+                pendentes = self._pendentes_carga
+        finally:
+            with self._lock:
+                self._pendentes_carga = None
+        chaves = sum(len(array) for arrays in (inicios, palavras) for array in arrays.values())
+        print(f"Autocompletar carregado em {self.duracao_carga_ms:.0f} ms: "
+              f"{len(documentos)} registros, {chaves} chaves")
+
+        for tipo, entidade_id in dict.fromkeys(pendentes):
+            try:
+                self.reindexar(tipo, entidade_id)
+            except Exception as e:
+                print(f"AVISO: Não foi possível reaplicar reindexação após a carga ({tipo} {entidade_id}): {e}")
+
+    def recarregar_em_segundo_plano(self):
+        with self._lock:
+            if self._recarregando:
+                return
+            self._recarregando = True
+
+        def _executar():
+            try:
+                self.carregar()
+            except Exception as e:
+                print(f"AVISO: Falha ao recarregar autocompletar: {e}")
+            finally:
+                with self._lock:
+                    self._recarregando = False
+
+        threading.Thread(target=_executar, name='recarga-autocompletar', daemon=True).start()
+
+    def _remover(self, tipo: str, entidade_id: int):
+        sugestoes = self.documentos.pop((tipo, entidade_id), None)
+        if sugestoes is None:
+            return
+        inicios, palavras = self._entradas(tipo, entidade_id, sugestoes)
+        for array, entradas in ((self.inicios[tipo], inicios), (self.palavras[tipo], palavras)):
+            for entrada in entradas:
+                posicao = bisect_left(array, entrada)
+                if posicao < len(array) and array[posicao] == entrada:
+                    del array[posicao]
+
+    def _adicionar(self, tipo: str, linha: tuple):
+        entidade_id = int(linha[0])
+        self._remover(tipo, entidade_id)
+        sugestoes = _sugestoes_da_linha(tipo, linha)
+        self.documentos[(tipo, entidade_id)] = sugestoes
+        inicios, palavras = self._entradas(tipo, entidade_id, sugestoes)
+        for entrada in inicios:
+            insort(self.inicios[tipo], entrada)
+        for entrada in palavras:
+            insort(self.palavras[tipo], entrada)
+        self.maior_id[tipo] = max(self.maior_id[tipo], entidade_id)
+
+    def reindexar(self, tipo: str, entidade_id: Optional[int] = None):
+        """
+        Atualiza `entidade_id` e os registros que exibem seus dados.
+        Sem id (ex.: insert cujo id não é conhecido), inclui os registros novos.
+        """
+        with self._lock:
+            if self._pendentes_carga is not None:
+                self._pendentes_carga.append((tipo, entidade_id))
+        with obter_conexao() as conn:
+            cursor = conn.cursor()
+            if entidade_id is None:
+                with self._lock:
+                    maior_id = self.maior_id[tipo]
+                alvos = [(tipo, self._ler(cursor, tipo, f"{COLUNA_ID[tipo]} > ?", [maior_id]), None)]
+            else:
+                alvos = [(dependente, self._ler(cursor, dependente, filtro, [entidade_id]),
+                          entidade_id if dependente == tipo else None)
+                         for dependente, filtro in DEPENDENCIAS[tipo]]
+
+        with self._lock:
+            for dependente, linhas, removido in alvos:
+                if removido is not None and not linhas:
+                    self._remover(dependente, removido)
+                for linha in linhas:
+                    self._adicionar(dependente, linha)
+
+    # ---------- consulta ----------
+
+    @staticmethod
+    def _casando(array: List[Entrada], prefixo: str) -> Iterable[Entrada]:
+        posicao = bisect_left(array, (prefixo,))
+        while posicao < len(array) and array[posicao][0].startswith(prefixo):
+            yield array[posicao]
+            posicao += 1
+
+    def _percorrer(self, arrays: Iterable[List[Entrada]], prefixo: str, maximo: int) -> Iterable[Entrada]:
+        """Até `maximo` entradas com o prefixo, intercaladas em ordem entre os arrays"""
+        return islice(heapq.merge(*(self._casando(array, prefixo) for array in arrays)), maximo)
+
+    def sugerir(self, consulta: str, limite: int = 10,
+                tipos: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Até `limite` sugestões para o prefixo digitado: primeiro as que começam
+        pelo termo (ordem alfabética), depois as que casam numa palavra do meio.
+        """
+        prefixo = normalizar_consulta(consulta)
+        if not prefixo or limite <= 0:
+            return []
+        # Só os arrays dos tipos pedidos: a varredura não gasta entradas de outros tipos
+        tipos = [tipo for tipo in FONTES if tipo in set(tipos)] if tipos else list(FONTES)
+        # Entradas repetidas (mesmo registro por chaves diferentes) são
+        # descartadas; a varredura é limitada para manter o custo fixo
+        maximo = limite * 8
+
+        resultado, vistos = [], set()
+        with self._lock:
+            for arrays in (self.inicios, self.palavras):
+                for _, tipo, entidade_id, ordem in self._percorrer([arrays[t] for t in tipos], prefixo, maximo):
+                    if (tipo, entidade_id, ordem) in vistos:
+                        continue
+                    vistos.add((tipo, entidade_id, ordem))
+                    sugestao = self.documentos[(tipo, entidade_id)][ordem]
+                    resultado.append({'tipo': tipo, 'id': entidade_id, **sugestao})
+                    if len(resultado) >= limite:
+                        return resultado
+        return resultado
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'carregado': self.carregado_em is not None,
+                'idade_segundos': round(time.monotonic() - self.carregado_em, 1) if self.carregado_em else None,
+                'duracao_carga_ms': round(self.duracao_carga_ms, 1),
+                'registros': len(self.documentos),
+                'chaves': sum(len(array) for arrays in (self.inicios, self.palavras)
+                              for array in arrays.values()),
+            }
+
+
+# ==================== ÍNDICE GLOBAL DO PROCESSO ====================
+
+_indice: Optional[IndiceAutocompletar] = None
+_indice_lock = threading.Lock()
+
+
+def autocompletar_carregado() -> bool:
+    return _indice is not None
+
+
+def obter_autocompletar() -> IndiceAutocompletar:
+    """Índice carregado (carga completa na primeira chamada, recarga periódica em segundo plano)"""
+    global _indice
+    if _indice is None:
+        with _indice_lock:
+            if _indice is None:
+                indice = IndiceAutocompletar()
+                indice.carregar()
+                _indice = indice
+        return _indice
+
+    ttl = float(os.getenv('AUTOCOMPLETAR_TTL_SEGUNDOS', '900'))
+    if time.monotonic() - _indice.carregado_em > ttl:
+        _indice.recarregar_em_segundo_plano()
+    return _indice
+
+
+def carregar_autocompletar_em_segundo_plano():
+    """Startup: carrega o índice sem bloquear a subida da API"""
+    def _executar():
+        try:
+            obter_autocompletar()
+        except Exception as e:
+            print(f"AVISO: Falha ao carregar autocompletar: {e}")
+
+    threading.Thread(target=_executar, name='carga-autocompletar', daemon=True).start()
+
+
+def sugerir(consulta: str, limite: int = 10, tipos: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+    """[{'tipo', 'id', 'texto', 'campo', 'detalhe'}] para o prefixo digitado"""
+    return obter_autocompletar().sugerir(consulta, limite, tipos)
+
+
+def notificar_alteracao(tipo: str, entidade_id: Optional[int] = None):
+    """
+    Hook de insert/update (repositories_adapter). Só atua se o índice já foi
+    carregado neste processo; falhas não interrompem a escrita.
+    """
+    if _indice is None:
+        return
+    try:
+        _indice.reindexar(tipo, int(entidade_id) if entidade_id is not None else None)
+    except Exception as e:
+        print(f"AVISO: Não foi possível atualizar o autocompletar ({tipo} {entidade_id}): {e}")
+
+
+def estatisticas_autocompletar() -> Dict[str, Any]:
+    if _indice is None:
+        return {'carregado': False}
+    return _indice.estatisticas()
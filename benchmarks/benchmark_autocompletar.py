@@ -0,0 +1,121 @@
+"""
+Benchmark: autocompletar por prefixo (sem SQL)
+================================================================
+
+Troca obter_conexao por uma conexão falsa com locadores, locatários,
+imóveis e contratos sintéticos, carrega o índice e mede sugerir() para
+prefixos curtos (muitos candidatos), longos, numéricos (CPF) e CT-0000.
+Também mede a atualização incremental de um registro.
+
+Uso:
+    python benchmarks/benchmark_autocompletar.py
+    python benchmarks/benchmark_autocompletar.py --registros 100000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import autocompletar
+
+NOMES = ['João', 'Maria', 'José', 'Ana', 'Carlos', 'Fernanda', 'Paulo', 'Luíza', 'Pedro', 'Márcia']
+SOBRENOMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Pereira', 'Costa', 'Rodrigues', 'Almeida']
+RUAS = ['Rua XV de Novembro', 'Av. Sete de Setembro', 'Rua das Flores', 'Rua Marechal Deodoro',
+        'Av. Batel', 'Rua Comendador Araújo']
+
+
+def gerar_dados(total):
+    aleatorio = random.Random(42)
+
+    def nome():
+        return f"{aleatorio.choice(NOMES)} {aleatorio.choice(SOBRENOMES)} {aleatorio.choice(SOBRENOMES)}"
+
+    def cpf():
+        d = f"{aleatorio.randrange(10 ** 11):011d}"
+        return f"{d[:3]}.{d[3:6]}.{d[6:9]}-{d[9:]}"
+
+    enderecos = {i: f"{aleatorio.choice(RUAS)}, {aleatorio.randrange(1, 3000)} - Curitiba/PR"
+                 for i in range(1, total + 1)}
+    locatarios = {i: nome() for i in range(1, total + 1)}
+    return {
+        'FROM Locadores l': [(i, nome(), cpf()) for i in range(1, total + 1)],
+        'FROM Locatarios l': [(i, locatarios[i], cpf()) for i in range(1, total + 1)],
+        'FROM Imoveis i': [(i, enderecos[i], nome()) for i in range(1, total + 1)],
+        'FROM Contratos c': [(i, locatarios[i], enderecos[i]) for i in range(1, total + 1)],
+    }
+
+
+class CursorFalso:
+    def __init__(self, dados):
+        self.dados = dados
+        self._linhas = []
+
+    def execute(self, sql, params=()):
+        tabela = next(chave for chave in self.dados if chave in sql)
+        linhas = self.dados[tabela]
+        if '= ?' in sql:
+            linhas = [linha for linha in linhas if linha[0] == params[0]]
+        elif '> ?' in sql:
+            linhas = [linha for linha in linhas if linha[0] > params[0]]
+        self._linhas = linhas
+        return self
+
+    def fetchall(self):
+        return self._linhas
+
+
+class ConexaoFalsa:
+    def __init__(self, dados):
+        self.dados = dados
+
+    def cursor(self):
+        return CursorFalso(self.dados)
+
+
+def medir(funcao, amostras):
+    latencias = []
+    for _ in range(amostras):
+        inicio = time.perf_counter()
+        funcao()
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    ordenadas = sorted(latencias)
+    p99 = ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * 0.99))]
+    return f"p50 {statistics.median(ordenadas):6.3f} ms | p99 {p99:6.3f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--registros', type=int, default=50000, help='registros por entidade')
+    parser.add_argument('--amostras', type=int, default=2000)
+    args = parser.parse_args()
+
+    dados = gerar_dados(args.registros)
+
+    @contextmanager
+    def obter_conexao_falsa():
+        yield ConexaoFalsa(dados)
+
+    autocompletar.obter_conexao = obter_conexao_falsa
+
+    indice = autocompletar.IndiceAutocompletar()
+    indice.carregar()
+
+    consultas = ['s', 'ma', 'silva', 'joao silva', 'rua xv', 'novembro', '123.4', 'CT-004', 'CT-0042']
+    for consulta in consultas:
+        sugestoes = indice.sugerir(consulta, 10)
+        print(f"{consulta!r:14} {medir(lambda: indice.sugerir(consulta, 10), args.amostras)} "
+              f"| {len(sugestoes):2} sugestões, 1ª: {sugestoes[0]['texto'] if sugestoes else '-'}")
+
+    dados['FROM Locadores l'][0] = (1, 'Zuleica Teixeira', '000.000.000-00')
+    print(f"{'reindexar':14} {medir(lambda: indice.reindexar('locadores', 1), 50)}")
+    assert indice.sugerir('zuleica', 1)[0]['id'] == 1
+
+
+if __name__ == "__main__":
+    main()
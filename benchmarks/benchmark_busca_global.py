@@ -0,0 +1,125 @@
+"""
+Benchmark: busca global avançada com auto-chamada HTTP x serviço em processo
+================================================================
+
+Antes, /api/search/advanced/global fazia um requests.get para
+/api/search/global no próprio servidor. Agora as duas rotas chamam
+servico_busca_global.buscar_global_resumida (com cache compartilhado).
+
+Sobe em processo um app com os dois routers e troca a consulta ao banco
+(_consultar_busca_global) por um time.sleep. O fluxo antigo é reproduzido
+numa rota de comparação que faz a auto-chamada HTTP a partir de uma
+thread; é o melhor caso do código antigo, que fazia a chamada síncrona
+dentro do handler async e travava um servidor de worker único.
+
+Uso:
+    python benchmarks/benchmark_busca_global.py
+    python benchmarks/benchmark_busca_global.py --atraso 0.05 --amostras 300
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+def medir(url_por_indice, quantidade):
+    latencias = []
+    for indice in range(quantidade):
+        inicio = time.perf_counter()
+        with urllib.request.urlopen(url_por_indice(indice), timeout=60) as resposta:
+            resposta.read()
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return latencias
+
+
+def resumo(latencias):
+    ordenadas = sorted(latencias)
+    p99 = ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * 0.99))]
+    return f"p50 {statistics.median(ordenadas):7.2f} ms | p99 {p99:7.2f} ms"
+
+
+def subir_api(porta, atraso):
+    import uvicorn
+    from fastapi import FastAPI
+
+    import servico_busca_global
+
+    def consulta_lenta(termo, limite):
+        time.sleep(atraso)  # consulta bloqueante no SQL Server
+        return {
+            'termo_busca': termo,
+            'total_resultados': 1,
+            'resultados_por_tipo': {
+                'locadores': {'dados': [{'id': 1, 'nome': termo}]},
+                'locatarios': {'dados': []},
+                'imoveis': {'dados': []},
+                'contratos': {'dados': []},
+            }
+        }
+
+    servico_busca_global._consultar_busca_global = consulta_lenta
+
+    from apis import advanced_search_api, perfil_locador_api
+
+    app = FastAPI()
+    app.include_router(perfil_locador_api.router)
+    app.include_router(advanced_search_api.router)
+
+    @app.get("/benchmark/basica_sem_cache")
+    def basica_sem_cache(q: str, limit: int = 10):
+        # /api/search/global como era antes: consulta direta, sem cache
+        return {'success': True, 'data': consulta_lenta(q, limit)}
+
+    @app.get("/benchmark/autochamada")
+    def autochamada(termo_busca: str, limite: int = 20):
+        # Fluxo antigo da busca avançada: HTTP para o próprio processo
+        query = urllib.parse.urlencode({'q': termo_busca, 'limit': limite})
+        with urllib.request.urlopen(f"http://127.0.0.1:{porta}/benchmark/basica_sem_cache?{query}",
+                                    timeout=60) as resposta:
+            return json.loads(resposta.read())['data']
+
+    config = uvicorn.Config(app, host='127.0.0.1', port=porta, log_level='warning', lifespan='off')
+    servidor = uvicorn.Server(config)
+    threading.Thread(target=servidor.run, daemon=True).start()
+    while not servidor.started:
+        time.sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--amostras', type=int, default=200)
+    parser.add_argument('--atraso', type=float, default=0.02, help='segundos por consulta ao banco')
+    args = parser.parse_args()
+
+    porta = 8766
+    subir_api(porta, args.atraso)
+    base = f"http://127.0.0.1:{porta}"
+
+    def antigo(i):
+        return f"{base}/benchmark/autochamada?termo_busca=termo{i}"
+
+    def novo_sem_cache(i):
+        return f"{base}/api/search/advanced/global?termo_busca=novo{i}"
+
+    def novo_com_cache(i):
+        return f"{base}/api/search/advanced/global?termo_busca=silva"
+
+    medir(antigo, 5)
+    medir(novo_com_cache, 5)  # aquecimento
+
+    print(f"Consulta simulada: {args.atraso * 1000:.0f} ms | {args.amostras} amostras sequenciais")
+    print(f"Auto-chamada HTTP (antes)            {resumo(medir(antigo, args.amostras))}")
+    print(f"Serviço em processo, termos novos    {resumo(medir(novo_sem_cache, args.amostras))}")
+    print(f"Serviço em processo, termo repetido  {resumo(medir(novo_com_cache, args.amostras))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark: consultas por chamada de buscar_imoveis
+================================================================
+
+Substitui get_conexao por uma conexão falsa que conta os cursor.execute()
+e gera imóveis sintéticos (metade antigos, sem endereco_id). O número de
+round trips deve ficar constante conforme a carteira cresce.
+
+Uso:
+    python benchmarks/benchmark_buscar_imoveis.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import repositories_adapter
+
+
+class CursorContador:
+    def __init__(self, conexao):
+        self.conexao = conexao
+        self.description = None
+        self._linhas = []
+
+    def execute(self, sql, *params):
+        self.conexao.execucoes += 1
+        total = self.conexao.total_imoveis
+        if 'FROM Imoveis i' in sql:
+            self.description = [('id',), ('endereco',), ('endereco_id',), ('id_locador',),
+                                ('endereco_rua',), ('endereco_numero',), ('endereco_complemento',),
+                                ('endereco_bairro',), ('endereco_cidade',), ('endereco_estado',),
+                                ('endereco_cep',)]
+            self._linhas = []
+            for i in range(1, total + 1):
+                if i % 2:
+                    self._linhas.append((i, None, i, 1, f'Rua {i}', str(i), '', 'Centro',
+                                         'Curitiba', 'PR', '80000-000'))
+                else:
+                    self._linhas.append((i, f'Rua {i}, {i} - Centro - Curitiba/PR', None, 1,
+                                         None, None, None, None, None, None, None))
+        elif 'FROM ImovelLocadores il' in sql:
+            self._linhas = [(i, 1, 100.0, 1, 'Locador', '000.000.000-00', 'PF', '', '')
+                            for i in range(1, total + 1)]
+        elif 'FROM EnderecoImovel' in sql:
+            self._linhas = [(i, f'Rua {i}', str(i), '', 'Centro', 'Curitiba', 'PR', '80000-000')
+                            for i in range(1, total + 1, 2)]
+        else:
+            self._linhas = []
+        return self
+
+    def fetchall(self):
+        return self._linhas
+
+    def fetchone(self):
+        return self._linhas[0] if self._linhas else None
+
+
+class ConexaoContadora:
+    def __init__(self, total_imoveis):
+        self.total_imoveis = total_imoveis
+        self.execucoes = 0
+
+    def cursor(self):
+        return CursorContador(self)
+
+    def close(self):
+        pass
+
+
+def main():
+    print(f"{'imóveis':>8} | {'consultas':>9} | {'tempo (ms)':>10}")
+    for total in (10, 100, 1000, 3000):
+        conexao = ConexaoContadora(total)
+        repositories_adapter.get_conexao = lambda: conexao
+        inicio = time.perf_counter()
+        imoveis = repositories_adapter.buscar_imoveis()
+        duracao = (time.perf_counter() - inicio) * 1000
+        assert len(imoveis) == total
+        print(f"{total:>8} | {conexao.execucoes:>9} | {duracao:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
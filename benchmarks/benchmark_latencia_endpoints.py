@@ -0,0 +1,123 @@
+"""
+Benchmark: latência de /api/health com /api/faturas sob carga
+================================================================
+
+Mede p50/p99 de um endpoint barato (/api/health) sozinho e enquanto várias
+threads chamam /api/faturas sem parar. Com o acesso a banco fora do event
+loop (executor_bd), a latência do health deve ficar praticamente igual.
+
+Modo simulado (padrão): sobe a API em processo com uvicorn e troca
+repositories_adapter.buscar_faturas por uma versão que bloqueia a thread
+(time.sleep), simulando uma consulta lenta no SQL Server.
+
+Uso:
+    python benchmarks/benchmark_latencia_endpoints.py
+    python benchmarks/benchmark_latencia_endpoints.py --url http://localhost:8000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+def medir(url, quantidade):
+    latencias = []
+    for _ in range(quantidade):
+        inicio = time.perf_counter()
+        with urllib.request.urlopen(url, timeout=60) as resposta:
+            resposta.read()
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return latencias
+
+
+def resumo(latencias):
+    ordenadas = sorted(latencias)
+    p99 = ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * 0.99))]
+    return f"p50 {statistics.median(ordenadas):7.2f} ms | p99 {p99:7.2f} ms | max {ordenadas[-1]:7.2f} ms"
+
+
+def gerar_carga(url, parar, contador):
+    while not parar.is_set():
+        try:
+            with urllib.request.urlopen(url, timeout=60) as resposta:
+                resposta.read()
+            contador.append(1)
+        except Exception:
+            pass
+
+
+def subir_api_simulada(porta, atraso):
+    import uvicorn
+    import repositories_adapter
+
+    def buscar_faturas_lenta(*args, **kwargs):
+        time.sleep(atraso)  # consulta bloqueante
+        return {'success': True, 'data': [], 'total': 0, 'page': 1, 'limit': 20, 'pages': 0, 'next_cursor': None}
+
+    repositories_adapter.buscar_faturas = buscar_faturas_lenta
+    repositories_adapter.contar_faturas = lambda filtros=None: 0
+
+    import main
+    config = uvicorn.Config(main.app, host='127.0.0.1', port=porta, log_level='warning', lifespan='off')
+    servidor = uvicorn.Server(config)
+    threading.Thread(target=servidor.run, daemon=True).start()
+    while not servidor.started:
+        time.sleep(0.05)
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', help='API já rodando (ex.: http://localhost:8000)')
+    parser.add_argument('--clientes', type=int, default=16, help='threads chamando /api/faturas')
+    parser.add_argument('--amostras', type=int, default=200, help='chamadas a /api/health por medição')
+    parser.add_argument('--atraso', type=float, default=0.2, help='segundos por consulta (modo simulado)')
+    args = parser.parse_args()
+
+    base = args.url
+    if not base:
+        porta = 8765
+        subir_api_simulada(porta, args.atraso)
+        base = f"http://127.0.0.1:{porta}"
+
+    health = f"{base}/api/health"
+    faturas = f"{base}/api/faturas"
+
+    medir(health, 10)  # aquecimento
+    print(f"/api/health sem carga              {resumo(medir(health, args.amostras))}")
+
+    parar = threading.Event()
+    concluidas = []
+    threads = [threading.Thread(target=gerar_carga, args=(faturas, parar, concluidas), daemon=True)
+               for _ in range(args.clientes)]
+    for thread in threads:
+        thread.start()
+    time.sleep(1)
+
+    antes = len(concluidas)
+    inicio = time.perf_counter()
+    latencias = medir(health, args.amostras)
+    duracao = time.perf_counter() - inicio
+    feitas = len(concluidas) - antes
+    parar.set()
+    for thread in threads:
+        thread.join()
+
+    print(f"/api/health com {args.clientes:2d} clientes em faturas {resumo(latencias)}")
+    print(f"/api/faturas concluídas durante a medição: {feitas} ({feitas / duracao:.1f} req/s)")
+
+    try:
+        with urllib.request.urlopen(f"{base}/api/health/pool", timeout=10) as resposta:
+            print(f"Métricas: {resposta.read().decode('utf-8')}")
+    except Exception:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark: PDF da prestação (ReportLab platypus, sem SQL)
+================================================================
+
+Monta uma prestação sintética no formato de buscar_prestacao_detalhada com
+N lançamentos (termos, descontos, acréscimos, taxas e retenções), vários
+locadores e distribuição de repasse, e mede gerar_pdf_em_arquivo. Também
+mede o PDF único de várias prestações (exportação em lote, formato 'pdf').
+
+Uso:
+    python benchmarks/benchmark_pdf_prestacao.py
+    python benchmarks/benchmark_pdf_prestacao.py --lancamentos 1000 --salvar /tmp/prestacao.pdf
+"""
+
+import argparse
+import io
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from gerar_pdf_html import gerar_pdf_em_arquivo, gerar_pdf_prestacoes
+
+CATEGORIAS = ['termo', 'termo', 'desconto', 'acrescimo', 'taxa', 'retido', 'retido']
+DESCRICOES = ['Aluguel', 'Condomínio', 'IPTU', 'Seguro fiança', 'Fundo de reserva', 'Água', 'Luz',
+              'Taxa de administração', 'Manutenção hidráulica - troca de registro do banheiro social']
+NOMES = ['Ana Souza', 'Carlos Pereira', 'Fernanda Costa', 'Paulo Almeida', 'Márcia Rodrigues & Filhos']
+
+
+def gerar_prestacao(prestacao_id, lancamentos, locadores, aleatorio):
+    lista_locadores = []
+    distribuicao = []
+    for indice in range(locadores):
+        locador_id = indice + 1
+        ted = indice % 2 == 1
+        lista_locadores.append({
+            'locador_id': locador_id,
+            'locador_nome': aleatorio.choice(NOMES),
+            'cpf_cnpj': f"{aleatorio.randrange(10 ** 11):011d}",
+            'responsabilidade_principal': indice == 0,
+            'conta_bancaria': {
+                'tipo_recebimento': 'TED' if ted else 'PIX',
+                'pix_chave': f"chave-{locador_id}@cobimob.com.br",
+                'banco': '341', 'agencia': '1234', 'conta': f"{locador_id:05d}-0",
+                'titular': aleatorio.choice(NOMES), 'cpf_titular': '000.000.000-00',
+            },
+        })
+        distribuicao.append({'locador_id': locador_id, 'locador_nome': lista_locadores[-1]['locador_nome'],
+                             'valor_repasse': round(aleatorio.uniform(100, 3000), 2)})
+
+    detalhados = []
+    for indice in range(lancamentos):
+        categoria = CATEGORIAS[indice % len(CATEGORIAS)]
+        valor = round(aleatorio.uniform(10, 2500), 2)
+        detalhados.append({
+            # Tipos distintos: cada lançamento vira uma linha da tabela
+            'tipo': f"{categoria}_{indice}",
+            'descricao': f"{aleatorio.choice(DESCRICOES)} #{indice + 1}",
+            'valor': -valor if categoria in ('desconto', 'taxa', 'retido') else valor,
+            'categoria': categoria,
+        })
+
+    return {
+        'id': prestacao_id, 'mes': 3, 'ano': 2025,
+        'valor_boleto': 12345.67, 'total_retido': 1234.56, 'valor_repasse': 11111.11,
+        'valor_acrescimos': 0, 'data_vencimento': '2025-03-10', 'data_pagamento': '2025-03-12T10:00:00',
+        'locadores': lista_locadores,
+        'contrato': {'locatario_nome': 'Beatriz Lima', 'locatario_cpf': '111.222.333-44',
+                     'imovel_endereco': 'Rua XV de Novembro, 1000 - Ap 12 - Centro - Curitiba/PR'},
+        'lancamentos_detalhados': detalhados,
+        'distribuicao_repasse': distribuicao,
+    }
+
+
+def medir(funcao, amostras):
+    latencias = []
+    for _ in range(amostras):
+        inicio = time.perf_counter()
+        funcao()
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    ordenadas = sorted(latencias)
+    p99 = ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * 0.99))]
+    return f"p50 {statistics.median(ordenadas):8.2f} ms | p99 {p99:8.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lancamentos', type=int, default=200, help='lançamentos na prestação grande')
+    parser.add_argument('--locadores', type=int, default=4)
+    parser.add_argument('--lote', type=int, default=50, help='prestações no PDF único')
+    parser.add_argument('--amostras', type=int, default=20)
+    parser.add_argument('--salvar', help='grava o PDF da prestação grande neste caminho')
+    args = parser.parse_args()
+
+    aleatorio = random.Random(42)
+    pequena = gerar_prestacao(1, 8, 1, aleatorio)
+    grande = gerar_prestacao(2, args.lancamentos, args.locadores, aleatorio)
+    lote = [gerar_prestacao(10 + indice, 8, 2, aleatorio) for indice in range(args.lote)]
+
+    def pdf(dados):
+        destino = io.BytesIO()
+        gerar_pdf_em_arquivo(dados, destino)
+        return destino.getvalue()
+
+    pdf(pequena)  # aquece imports, fontes e logos
+    documento = pdf(grande)
+    paginas = documento.count(b'/Type /Page\n')
+    print(f"{'8 lançamentos':24} {medir(lambda: pdf(pequena), args.amostras)}")
+    print(f"{f'{args.lancamentos} lançamentos':24} {medir(lambda: pdf(grande), args.amostras)} "
+          f"| {paginas} páginas, {len(documento) // 1024} KiB")
+    print(f"{f'PDF único ({args.lote})':24} "
+          f"{medir(lambda: gerar_pdf_prestacoes(lote, io.BytesIO()), max(1, args.amostras // 4))}")
+
+    if args.salvar:
+        with open(args.salvar, 'wb') as arquivo:
+            arquivo.write(documento)
+        print(f"PDF salvo em {args.salvar}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Cache dos Resultados de Busca
+================================================================
+
+Resultados de /api/busca, /api/busca/stats, /api/busca/sugestoes e da busca
+resumida (servico_busca_global) ficam em cache_global, com um namespace por
+seção ('busca:locadores', 'busca:imoveis'...) e chave pela consulta
+normalizada (minúscula, espaços simples). Os acentos ficam na chave: o índice
+ignora acentos, mas o fallback LIKE (BUSCA_INDICE=0 ou índice indisponível)
+não, e 'joão'/'joao' não podem dividir um resultado calculado por ele.
+
+As escritas em repositories_adapter (inserir_*, atualizar_*, alterar_status_*)
+chamam invalidar_cache_busca(entidade), que limpa só os namespaces cujas
+linhas exibem dados daquela entidade. Ex.: alterar um locador invalida as
+seções de locadores, imóveis (locador_nome) e contratos (locador_nome), mas
+não a de locatários.
+
+O cache é por processo: com vários workers, a escrita invalida apenas o
+worker que a executou e os demais enxergam a mudança quando o TTL expira.
+
+Configuração (.env):
+    BUSCA_CACHE_TTL_SEGUNDOS        Validade dos resultados de busca (padrão 30)
+    BUSCA_SUGESTOES_TTL_SEGUNDOS    Validade das contagens de sugestões (padrão 300)
+"""
+
+import os
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from cache_memoria import cache_global
+
+TTL_BUSCA = float(os.getenv('BUSCA_CACHE_TTL_SEGUNDOS', '30'))
+TTL_SUGESTOES = float(os.getenv('BUSCA_SUGESTOES_TTL_SEGUNDOS', '300'))
+
+# Seções do resultado de busca afetadas por escrita em cada entidade
+NAMESPACES_AFETADOS = {
+    # nome/ativo do locador; locador_nome em imóveis e contratos
+    'locadores': ('busca:locadores', 'busca:imoveis', 'busca:contratos'),
+    # locatario_nome em contratos
+    'locatarios': ('busca:locatarios', 'busca:contratos'),
+    # qtd_imoveis do locador, imoveis_alugados do locatário, imovel_endereco
+    'imoveis': ('busca:imoveis', 'busca:locadores', 'busca:locatarios', 'busca:contratos'),
+    # contratos_ativos/receita do locador e do locatário
+    'contratos': ('busca:contratos', 'busca:locadores', 'busca:locatarios'),
+}
+# Contagens de sugestões e busca resumida mudam com qualquer escrita
+NAMESPACES_GERAIS = ('busca:sugestoes', 'busca:resumida')
+
+
+def chave_consulta(consulta: Optional[str]) -> str:
+    """'  João  SILVA' -> 'joão silva'"""
+    return ' '.join(str(consulta or '').lower().split())
+
+
+def em_cache(namespace: str, chave: Hashable, calcular: Callable[[], Any],
+             ttl: Optional[float] = None) -> Any:
+    """Resultado de `calcular` guardado em cache_global sob (namespace, chave)"""
+    return cache_global.obter_ou_calcular(
+        (namespace, chave), calcular, ttl=TTL_BUSCA if ttl is None else ttl
+    )
+
+
+def invalidar_cache_busca(entidade: Optional[str] = None):
+    """Limpa as seções afetadas por uma escrita em `entidade` (None: todas)"""
+    namespaces = NAMESPACES_AFETADOS.get(entidade)
+    if namespaces is None:
+        namespaces = {ns for lista in NAMESPACES_AFETADOS.values() for ns in lista}
+    for namespace in (*namespaces, *NAMESPACES_GERAIS):
+        cache_global.invalidar(namespace)
+
+
+def metricas_cache_busca() -> Dict[str, Any]:
+    """Hits, misses, invalidações e itens dos namespaces de busca"""
+    namespaces = cache_global.metricas()['namespaces']
+    return {ns: valores for ns, valores in namespaces.items() if ns.startswith('busca:')}
@@ -0,0 +1,114 @@
+"""
+Cache em Memória com Expiração (TTL)
+================================================================
+
+Cache simples, thread-safe, usado para guardar resultados caros e pouco
+voláteis (contagens de faturas, estatísticas) por alguns segundos.
+
+As chaves são tuplas cujo primeiro elemento é o namespace da entidade
+(ex.: ('faturas', 'count', ...)), o que permite invalidar só o que uma
+escrita afetou com invalidar('faturas'). metricas() traz hits, misses e
+invalidações também por namespace.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+_AUSENTE = object()
+
+
+class CacheTTL:
+    """Cache LRU limitado com expiração por entrada"""
+
+    def __init__(self, ttl: float = 30.0, max_itens: int = 1024):
+        self.ttl = ttl
+        self.max_itens = max_itens
+        self._dados = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._por_namespace: Dict[Any, Dict[str, int]] = {}
+
+    @staticmethod
+    def _namespace(chave: Hashable) -> Any:
+        return chave[0] if isinstance(chave, tuple) and chave else None
+
+    def _contador(self, namespace: Any) -> Dict[str, int]:
+        contador = self._por_namespace.get(namespace)
+        if contador is None:
+            contador = self._por_namespace[namespace] = {'hits': 0, 'misses': 0, 'invalidacoes': 0}
+        return contador
+
+    def obter(self, chave: Hashable, padrao: Any = None) -> Any:
+        agora = time.monotonic()
+        with self._lock:
+            item = self._dados.get(chave, _AUSENTE)
+            if item is _AUSENTE or item[0] < agora:
+                if item is not _AUSENTE:
+                    del self._dados[chave]
+                self._misses += 1
+                self._contador(self._namespace(chave))['misses'] += 1
+                return padrao
+            self._dados.move_to_end(chave)
+            self._hits += 1
+            self._contador(self._namespace(chave))['hits'] += 1
+            return item[1]
+
+    def definir(self, chave: Hashable, valor: Any, ttl: Optional[float] = None):
+        expira = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._dados[chave] = (expira, valor)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.max_itens:
+                self._dados.popitem(last=False)
+
+    def obter_ou_calcular(self, chave: Hashable, calcular: Callable[[], Any],
+                          ttl: Optional[float] = None) -> Any:
+        """Retorna o valor em cache ou calcula, guarda e retorna"""
+        valor = self.obter(chave, _AUSENTE)
+        if valor is _AUSENTE:
+            valor = calcular()
+            self.definir(chave, valor, ttl)
+        return valor
+
+    def invalidar(self, namespace: Optional[str] = None):
+        """Remove tudo (namespace=None) ou apenas as chaves do namespace"""
+        with self._lock:
+            if namespace is None:
+                self._dados.clear()
+                return
+            for chave in [c for c in self._dados
+                          if isinstance(c, tuple) and c and c[0] == namespace]:
+                del self._dados[chave]
+            self._contador(namespace)['invalidacoes'] += 1
+
+    def metricas(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self._hits + self._misses
+            itens_por_namespace: Dict[Any, int] = {}
+            for chave in self._dados:
+                namespace = self._namespace(chave)
+                itens_por_namespace[namespace] = itens_por_namespace.get(namespace, 0) + 1
+
+            namespaces = {}
+            for namespace, contador in self._por_namespace.items():
+                consultas = contador['hits'] + contador['misses']
+                namespaces[str(namespace)] = dict(
+                    contador,
+                    itens=itens_por_namespace.get(namespace, 0),
+                    hit_rate=round(contador['hits'] / consultas, 3) if consultas else 0.0,
+                )
+
+            return {
+                'itens': len(self._dados),
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / total, 3) if total else 0.0,
+                'namespaces': namespaces,
+            }
+
+
+# Cache compartilhado pelo processo
+cache_global = CacheTTL()
@@ -0,0 +1,267 @@
+"""
+Cache de PDFs de Prestação em Disco
+================================================================
+
+Cada PDF gerado fica em disco com o nome "<prestacao_id>-<chave>.pdf", onde
+a chave é o hash de tudo que muda o documento:
+
+- data_atualizacao, data_pagamento, status, acréscimos e totais
+  (valor_boleto, total_retido, valor_repasse, valor_pago) da prestação;
+- um BINARY_CHECKSUM das colunas que o PDF lê de Contratos/Imoveis,
+  locatários, locadores com conta bancária e distribuição de repasse:
+  edições nesses cadastros mudam a chave sem precisar invalidar nada;
+- a data de hoje, enquanto a prestação não está paga (dias de atraso e
+  acréscimos são calculados na leitura);
+- versao_template() de gerar_pdf_html (layout do PDF + template/logos).
+
+A chave também é o ETag da resposta: o endpoint só consulta essa linha
+(versao_pdf_prestacao), responde 304 se o cliente já tem a versão e só
+busca os detalhes e renderiza quando o arquivo não existe. As colunas do
+checksum são as mesmas de prestacoes_detalhadas (SQL_PRESTACOES e
+SQL_LOCADORES); coluna nova no PDF precisa entrar nos dois lugares.
+
+Escritas que alteram a prestação (salvar_prestacao_contas, job de
+acréscimos, registrar_pagamento_fatura) chamam invalidar_pdfs_prestacoes,
+que apaga os arquivos do id. Como o cache é o diretório, isso vale para
+todos os workers e para o job rodando em outro processo.
+
+O tamanho total é limitado: ao passar de PDF_CACHE_MAX_MB, os arquivos
+menos usados (mtime, renovado a cada hit) são apagados.
+
+Configuração (.env):
+    PDF_CACHE_DIR       Diretório dos PDFs (padrão: <temp>/cobimob_pdf_cache)
+    PDF_CACHE_MAX_MB    Tamanho máximo do diretório (padrão 256)
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from datetime import date
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Optional
+
+from gerar_pdf_html import versao_template
+from pool_conexoes import obter_conexao
+
+SQL_VERSAO_PRESTACAO = """
+    SELECT
+        p.data_pagamento, p.data_atualizacao, p.status, p.valor_acrescimos, p.data_calculo_acrescimos,
+        p.valor_boleto, p.total_retido, p.valor_repasse, p.valor_pago,
+        BINARY_CHECKSUM(c.valor_aluguel, c.taxa_administracao, c.vencimento_dia, c.id_imovel,
+                        c.percentual_multa_atraso, i.endereco, i.tipo) AS versao_contrato,
+        (SELECT CHECKSUM_AGG(BINARY_CHECKSUM(cl.locatario_id, cl.responsabilidade_principal,
+                                             l.nome, l.telefone, l.email, l.cpf_cnpj))
+         FROM ContratoLocatarios cl
+         LEFT JOIN Locatarios l ON cl.locatario_id = l.id
+         WHERE cl.contrato_id = p.contrato_id) AS versao_locatarios,
+        (SELECT CHECKSUM_AGG(BINARY_CHECKSUM(cl.locador_id, cl.ativo, cl.porcentagem, cl.responsabilidade_principal,
+                                             cl.conta_bancaria_id, loc.nome, loc.telefone, loc.email, loc.cpf_cnpj,
+                                             cb.tipo_recebimento, cb.chave_pix, cb.banco, cb.agencia, cb.conta,
+                                             cb.titular, cb.cpf_titular))
+         FROM ContratoLocadores cl
+         INNER JOIN Locadores loc ON cl.locador_id = loc.id
+         LEFT JOIN ContasBancariasLocador cb ON cl.conta_bancaria_id = cb.id
+         WHERE cl.contrato_id = p.contrato_id) AS versao_locadores,
+        (SELECT CHECKSUM_AGG(BINARY_CHECKSUM(d.ativo, d.locador_id, d.locador_nome, d.percentual_participacao,
+                                             d.valor_repasse, d.responsabilidade_principal))
+         FROM DistribuicaoRepasseLocadores d
+         WHERE d.prestacao_id = p.id) AS versao_distribuicao
+    FROM PrestacaoContas p
+    LEFT JOIN Contratos c ON c.id = p.contrato_id
+    LEFT JOIN Imoveis i ON c.id_imovel = i.id
+    WHERE p.id = ?
+"""
+
+
+class CachePDF:
+    """Diretório de PDFs prontos com remoção LRU por tamanho"""
+
+    def __init__(self, diretorio: str, max_bytes: int):
+        self.diretorio = diretorio
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._gravacoes = 0
+        self._removidos_lru = 0
+        self._invalidados = 0
+        os.makedirs(diretorio, exist_ok=True)
+        # Estimativa local; recalculada pelo diretório quando passa do limite
+        # (outros workers também gravam nele)
+        self._tamanho = sum(tamanho for _, tamanho, _ in self._arquivos())
+
+    def _caminho(self, prestacao_id: int, chave: str) -> str:
+        return os.path.join(self.diretorio, f"{int(prestacao_id)}-{chave}.pdf")
+
+    def _arquivos(self):
+        with os.scandir(self.diretorio) as entradas:
+            for entrada in entradas:
+                if entrada.name.endswith('.pdf'):
+                    try:
+                        info = entrada.stat()
+                    except OSError:
+                        continue
+                    yield entrada.path, info.st_size, info.st_mtime
+
+    def obter(self, prestacao_id: int, chave: str) -> Optional[str]:
+        """Caminho do PDF em cache (renova o mtime para o LRU) ou None"""
+        caminho = self._caminho(prestacao_id, chave)
+        try:
+            os.utime(caminho)
+        except OSError:
+            with self._lock:
+                self._misses += 1
+            return None
+        with self._lock:
+            self._hits += 1
+        return caminho
+
+    def gravar(self, prestacao_id: int, chave: str, conteudo: bytes) -> str:
+        """Grava o PDF já pronto em memória"""
+        return self.gravar_com(prestacao_id, chave, lambda arquivo: arquivo.write(conteudo))
+
+    def gravar_com(self, prestacao_id: int, chave: str, escrever: Callable[[BinaryIO], Any]) -> str:
+        """
+        Grava o PDF chamando escrever(arquivo) sobre o arquivo do cache: o
+        gerador escreve direto no disco, sem cópia em memória. Arquivo
+        temporário + rename: leitores nunca veem meio arquivo.
+        """
+        caminho = self._caminho(prestacao_id, chave)
+        descritor, temporario = tempfile.mkstemp(dir=self.diretorio, suffix='.tmp')
+        try:
+            with os.fdopen(descritor, 'wb') as arquivo:
+                escrever(arquivo)
+                tamanho = arquivo.tell()
+            os.replace(temporario, caminho)
+        except BaseException:
+            try:
+                os.unlink(temporario)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            self._gravacoes += 1
+            self._tamanho += tamanho
+            excedeu = self._tamanho > self.max_bytes
+        if excedeu:
+            self._remover_excedente()
+        return caminho
+
+    def abrir(self, prestacao_id: int, chave: str) -> Optional[BinaryIO]:
+        """
+        PDF em cache já aberto para leitura ou None. Aberto aqui, o arquivo
+        continua legível mesmo se for invalidado/removido durante o envio.
+        """
+        caminho = self.obter(prestacao_id, chave)
+        if not caminho:
+            return None
+        try:
+            return open(caminho, 'rb')
+        except OSError:
+            return None
+
+    def _remover_excedente(self):
+        """Recalcula o tamanho pelo diretório e apaga os menos usados até caber"""
+        arquivos = sorted(self._arquivos(), key=lambda arquivo: arquivo[2])
+        tamanho = sum(arquivo[1] for arquivo in arquivos)
+        removidos = 0
+        for caminho, tamanho_arquivo, _ in arquivos:
+            if tamanho <= self.max_bytes:
+                break
+            try:
+                os.unlink(caminho)
+                removidos += 1
+            except OSError:
+                pass
+            tamanho -= tamanho_arquivo
+        with self._lock:
+            self._tamanho = tamanho
+            self._removidos_lru += removidos
+
+    def invalidar(self, prestacao_ids: Iterable[int]) -> int:
+        """Apaga todas as versões dos PDFs das prestações"""
+        ids = {str(int(prestacao_id)) for prestacao_id in prestacao_ids if prestacao_id is not None}
+        if not ids:
+            return 0
+        removidos = 0
+        liberados = 0
+        for caminho, tamanho_arquivo, _ in list(self._arquivos()):
+            if os.path.basename(caminho).split('-', 1)[0] not in ids:
+                continue
+            try:
+                os.unlink(caminho)
+                removidos += 1
+                liberados += tamanho_arquivo
+            except OSError:
+                pass
+        with self._lock:
+            self._invalidados += removidos
+            self._tamanho = max(0, self._tamanho - liberados)
+        return removidos
+
+    def metricas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'diretorio': self.diretorio,
+                'max_bytes': self.max_bytes,
+                'tamanho_bytes': self._tamanho,
+                'hits': self._hits,
+                'misses': self._misses,
+                'gravacoes': self._gravacoes,
+                'removidos_lru': self._removidos_lru,
+                'invalidados': self._invalidados,
+            }
+
+
+_cache: Optional[CachePDF] = None
+_cache_lock = threading.Lock()
+
+
+def obter_cache_pdf() -> CachePDF:
+    """Cache compartilhado, criado na primeira chamada a partir do .env"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                diretorio = os.getenv('PDF_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'cobimob_pdf_cache')
+                try:
+                    max_mb = max(1, int(os.getenv('PDF_CACHE_MAX_MB', '256')))
+                except ValueError:
+                    max_mb = 256
+                _cache = CachePDF(diretorio, max_mb * 1024 * 1024)
+    return _cache
+
+
+def calcular_chave_pdf(linha, versao_template: str, hoje: Optional[date] = None) -> str:
+    """Chave/ETag do PDF a partir da linha de SQL_VERSAO_PRESTACAO (data_pagamento primeiro)"""
+    data_pagamento = linha[0]
+    partes = [str(valor) for valor in linha] + [versao_template]
+    if data_pagamento is None:
+        # Sem pagamento, dias de atraso/acréscimos do PDF mudam com a data
+        partes.append((hoje or date.today()).isoformat())
+    return hashlib.sha256('|'.join(partes).encode('utf-8')).hexdigest()[:32]
+
+
+def versao_pdf_prestacao(prestacao_id: int) -> Optional[str]:
+    """Chave/ETag atual do PDF da prestação (None se ela não existe)"""
+    with obter_conexao() as conn:
+        cursor = conn.cursor()
+        cursor.execute(SQL_VERSAO_PRESTACAO, (prestacao_id,))
+        linha = cursor.fetchone()
+    if not linha:
+        return None
+    return calcular_chave_pdf(tuple(linha), versao_template())
+
+
+def invalidar_pdfs_prestacoes(prestacao_ids: Iterable[int]) -> None:
+    """Descarta os PDFs em cache após uma escrita (nunca propaga erro)"""
+    try:
+        obter_cache_pdf().invalidar(prestacao_ids)
+    except Exception as e:
+        print(f"AVISO: Não foi possível invalidar o cache de PDFs: {e}")
+
+
+def metricas_cache_pdf() -> Dict[str, Any]:
+    """Hits, misses, gravações e remoções do cache de PDFs"""
+    return obter_cache_pdf().metricas()
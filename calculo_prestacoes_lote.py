@@ -0,0 +1,266 @@
+"""
+Cálculo de Prestações em Lote (fechamento do mês)
+================================================================
+
+No fechamento, a equipe chamava POST /api/contratos/calcular-prestacao
+contrato a contrato: cada chamada abria uma conexão e fazia o join de
+Contratos/Imóveis/Locadores/Locatários mais duas consultas auxiliares
+(retenções e quantidade de locadores).
+
+Aqui uma única consulta traz todos os contratos vigentes no mês com tudo o
+que o cálculo mensal usa (retenções, locador/locatário principal,
+quantidade de locadores e se já existe prestação no mês). O cálculo é feito
+em memória, com a mesma regra do tipo 'Mensal' de
+repositories_adapter.calcular_prestacao_mensal.
+
+Erros de um contrato (dados inválidos, prestação já existente, falha ao
+gravar) entram em `erros`/`ignorados` e não interrompem o lote.
+
+Gravação (dry_run=False): gravacao_prestacoes.gravar_prestacoes grava o
+lote em uma transação (data_vencimento e agregados financeiros incluídos). Se o
+lote falhar, faz rollback e grava contrato a contrato.
+"""
+
+from calendar import monthrange
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from pool_conexoes import obter_conexao
+from gravacao_prestacoes import gravar_prestacoes
+
+# Mesmo critério de buscar_contratos_ativos
+STATUS_CONTRATO_VALIDOS = ('ativo', 'reajuste', 'vencendo', 'vencido')
+
+SQL_CONTRATOS_MES = """
+    SELECT
+        c.id,
+        c.valor_aluguel, c.taxa_administracao, c.data_inicio, c.data_fim,
+        c.valor_iptu, c.valor_condominio, c.valor_seguro_fianca, c.valor_seguro_incendio,
+        c.valor_fci, c.bonificacao, c.status,
+        c.retido_fci, c.retido_condominio, c.retido_seguro_fianca, c.retido_seguro_incendio, c.retido_iptu,
+        i.endereco AS imovel_endereco,
+        ldr.nome AS locador_nome,
+        loc.nome AS locatario_nome,
+        (SELECT COUNT(*) FROM ContratoLocadores clc WHERE clc.contrato_id = c.id) AS num_locadores,
+        (SELECT COUNT(*) FROM PrestacaoContas p
+         WHERE p.contrato_id = c.id AND p.mes = ? AND p.ano = ? AND p.ativo = 1) AS prestacoes_mes
+    FROM Contratos c
+    LEFT JOIN Imoveis i ON c.id_imovel = i.id
+    OUTER APPLY (
+        SELECT TOP 1 l.nome
+        FROM ContratoLocadores cl
+        JOIN Locadores l ON cl.locador_id = l.id
+        WHERE cl.contrato_id = c.id
+        ORDER BY cl.responsabilidade_principal DESC, cl.locador_id
+    ) ldr
+    OUTER APPLY (
+        SELECT TOP 1 lt.nome
+        FROM ContratoLocatarios clt
+        JOIN Locatarios lt ON clt.locatario_id = lt.id
+        WHERE clt.contrato_id = c.id AND clt.responsabilidade_principal = 1
+    ) loc
+    WHERE (c.status IN ({status}) OR c.status IS NULL)
+      AND (c.data_inicio IS NULL OR c.data_inicio <= ?)
+      AND (c.data_fim IS NULL OR c.data_fim >= ?)
+      {filtro_ids}
+    ORDER BY c.id
+"""
+
+def _placeholders(valores: List[Any]) -> str:
+    return ','.join('?' for _ in valores)
+
+
+def carregar_contratos_mes(cursor, mes: int, ano: int,
+                           contrato_ids: Optional[Iterable[int]] = None) -> List[Dict[str, Any]]:
+    """Contratos vigentes no mês com os dados do cálculo (uma consulta)"""
+    inicio_mes = date(ano, mes, 1)
+    fim_mes = date(ano, mes, monthrange(ano, mes)[1])
+    params: List[Any] = [f"{mes:02d}", str(ano), *STATUS_CONTRATO_VALIDOS, fim_mes, inicio_mes]
+
+    filtro_ids = ""
+    if contrato_ids is not None:
+        ids = sorted({int(contrato_id) for contrato_id in contrato_ids})
+        if not ids:
+            return []
+        filtro_ids = f"AND c.id IN ({_placeholders(ids)})"
+        params.extend(ids)
+
+    cursor.execute(SQL_CONTRATOS_MES.format(status=_placeholders(STATUS_CONTRATO_VALIDOS),
+                                            filtro_ids=filtro_ids), params)
+    colunas = [coluna[0] for coluna in cursor.description]
+    return [dict(zip(colunas, row)) for row in cursor.fetchall()]
+
+
+def calcular_prestacao_mensal_contrato(contrato: Dict[str, Any], mes: int, ano: int) -> Dict[str, Any]:
+    """
+    Prestação 'Mensal' de um contrato já carregado (sem acesso ao banco).
+    Mesma regra e mesmo formato de calcular_prestacao_mensal(tipo_calculo='Mensal').
+    """
+    contrato_id = contrato['id']
+    dias_no_mes = monthrange(ano, mes)[1]
+
+    valor_aluguel = float(contrato['valor_aluguel'] or 0)
+    valor_iptu = float(contrato['valor_iptu'] or 0)
+    valor_condominio = float(contrato['valor_condominio'] or 0)
+    valor_seguro_fianca = float(contrato['valor_seguro_fianca'] or 0)
+    valor_seguro_incendio = float(contrato['valor_seguro_incendio'] or 0)
+    valor_fci = float(contrato['valor_fci'] or 0)
+    bonificacao = float(contrato['bonificacao'] or 0)
+    taxa_admin = float(contrato['taxa_administracao'] or 10)
+
+    valores_proporcionais = valor_aluguel + valor_iptu + valor_condominio + valor_fci
+    valores_fixos = valor_seguro_fianca + valor_seguro_incendio
+    valor_bruto = valores_proporcionais + valores_fixos - bonificacao
+
+    # Encargos retidos pela imobiliária
+    valor_retencoes_adicionais = sum(
+        valor for retido, valor in (
+            (contrato['retido_seguro_incendio'], valor_seguro_incendio),
+            (contrato['retido_fci'], valor_fci),
+            (contrato['retido_condominio'], valor_condominio),
+            (contrato['retido_seguro_fianca'], valor_seguro_fianca),
+            (contrato['retido_iptu'], valor_iptu),
+        ) if retido and valor > 0
+    )
+
+    # Taxa admin sobre (aluguel - bonificação); TED: (locadores - 1) x R$ 10,00
+    taxa_admin_completa = (valor_aluguel - bonificacao) * (taxa_admin / 100)
+    taxa_ted = max(0, (contrato['num_locadores'] or 0) - 1) * 10.00
+    valor_total_retido = taxa_admin_completa + valor_retencoes_adicionais + taxa_ted
+
+    return {
+        'contrato_id': contrato_id,
+        'contrato_dados': {
+            'numero': f"CONTRATO-{contrato_id:03d}",
+            'locador_nome': contrato['locador_nome'] or "Locador",
+            'locatario_nome': contrato['locatario_nome'] or "Locatário",
+            'imovel_endereco': contrato['imovel_endereco'] or "Endereço do Imóvel",
+            'valor_aluguel': valor_aluguel
+        },
+        'configuracao': {
+            'mes': mes,
+            'ano': ano,
+            'tipo_calculo': 'Mensal',
+            'metodo_calculo': 'dias-completo',
+            'data_entrada': None,
+            'data_saida': None
+        },
+        'valor_calculado': valor_bruto,
+        'dias_utilizados': dias_no_mes,
+        'total_dias_mes': dias_no_mes,
+        'valor_boleto': valor_bruto,
+        'valor_repassado_locadores': valor_bruto - valor_total_retido,
+        'valor_retido': valor_total_retido,
+        'breakdown_retencao': {
+            'taxa_admin': taxa_admin_completa,
+            'seguro': valor_retencoes_adicionais,
+            'outros': taxa_ted
+        },
+        'percentual_admin': taxa_admin,
+        'data_calculo': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+
+def _prestacao_para_gravar(resultado: Dict[str, Any], mes: int, ano: int) -> Dict[str, Any]:
+    """Parâmetros de gravar_prestacoes para a prestação calculada"""
+    return {
+        'contrato_id': resultado['contrato_id'],
+        'tipo_prestacao': 'mensal',
+        'status': 'pendente',
+        'observacoes': 'Gerada pelo cálculo em lote',
+        'configuracao_fatura': {'mes_referencia': f"{ano}-{mes:02d}"},
+        'dados_financeiros': {
+            'deducoes': resultado['valor_retido'],
+            'total_bruto': resultado['valor_boleto'],
+            'total_liquido': resultado['valor_repassado_locadores']
+        },
+        'valor_boleto': resultado['valor_boleto'],
+        'total_retido': resultado['valor_retido'],
+        'valor_repasse': resultado['valor_repassado_locadores'],
+        'tipo_calculo': 'Mensal'
+    }
+
+
+def _gravar(prestacoes: List[Dict[str, Any]], erros: List[Dict[str, Any]]) -> Dict[int, int]:
+    """Grava o lote; se a transação falhar, grava contrato a contrato. Devolve {contrato_id: prestacao_id}"""
+    try:
+        lotes = [gravar_prestacoes(prestacoes)]
+    except Exception as e:
+        print(f"AVISO: Falha ao gravar lote de {len(prestacoes)} prestações, gravando individualmente: {e}")
+        lotes = []
+        for prestacao in prestacoes:
+            try:
+                lotes.append(gravar_prestacoes([prestacao]))
+            except Exception as e:
+                erros.append({'contrato_id': prestacao['contrato_id'], 'erro': f"Falha ao gravar: {e}"})
+
+    gravadas = {}
+    for lote in lotes:
+        gravadas.update({gravada['contrato_id']: gravada['prestacao_id'] for gravada in lote['gravadas']})
+        erros.extend({'contrato_id': erro['contrato_id'], 'erro': erro['erro']} for erro in lote['erros'])
+    return gravadas
+
+
+def calcular_prestacoes_lote(mes: int, ano: int, contrato_ids: Optional[Iterable[int]] = None,
+                             dry_run: bool = True) -> Dict[str, Any]:
+    """
+    Calcula a prestação mensal de todos os contratos vigentes no mês
+    (ou só de `contrato_ids`) e, se dry_run=False, grava as que ainda não
+    existem como 'pendente'.
+
+    Returns:
+        {'mes', 'ano', 'dry_run', 'resultados': [...], 'erros': [{'contrato_id', 'erro'}],
+         'ignorados': [{'contrato_id', 'motivo'}], 'totais': {...}, 'duracao_ms'}
+    """
+    inicio = datetime.now()
+    if not 1 <= int(mes) <= 12:
+        raise ValueError(f"Mês inválido: {mes}")
+    mes, ano = int(mes), int(ano)
+
+    with obter_conexao() as conn:
+        contratos = carregar_contratos_mes(conn.cursor(), mes, ano, contrato_ids)
+
+    resultados, erros, ignorados, para_gravar = [], [], [], []
+    for contrato in contratos:
+        try:
+            resultado = calcular_prestacao_mensal_contrato(contrato, mes, ano)
+        except Exception as e:
+            erros.append({'contrato_id': contrato['id'], 'erro': str(e)})
+            continue
+
+        resultado['prestacao_existente'] = bool(contrato['prestacoes_mes'])
+        resultados.append(resultado)
+        if dry_run:
+            continue
+        if contrato['prestacoes_mes']:
+            ignorados.append({'contrato_id': contrato['id'], 'motivo': f"Já existe prestação em {mes:02d}/{ano}"})
+        else:
+            para_gravar.append(_prestacao_para_gravar(resultado, mes, ano))
+
+    if contrato_ids is not None:
+        encontrados = {contrato['id'] for contrato in contratos}
+        for contrato_id in sorted({int(c) for c in contrato_ids} - encontrados):
+            erros.append({'contrato_id': contrato_id, 'erro': f"Contrato não encontrado ou não vigente em {mes:02d}/{ano}"})
+
+    prestacoes_gravadas = _gravar(para_gravar, erros) if para_gravar else {}
+
+    for resultado in resultados:
+        resultado['prestacao_id'] = prestacoes_gravadas.get(resultado['contrato_id'])
+
+    return {
+        'mes': mes,
+        'ano': ano,
+        'dry_run': dry_run,
+        'resultados': resultados,
+        'erros': erros,
+        'ignorados': ignorados,
+        'totais': {
+            'contratos': len(contratos),
+            'calculados': len(resultados),
+            'gravados': len(prestacoes_gravadas),
+            'valor_boleto': round(sum(r['valor_boleto'] for r in resultados), 2),
+            'valor_retido': round(sum(r['valor_retido'] for r in resultados), 2),
+            'valor_repassado_locadores': round(sum(r['valor_repassado_locadores'] for r in resultados), 2),
+        },
+        'duracao_ms': round((datetime.now() - inicio).total_seconds() * 1000, 1)
+    }
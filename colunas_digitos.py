@@ -0,0 +1,65 @@
+"""
+Colunas Só-Dígitos para Busca por CPF/CNPJ, Telefone e CEP
+================================================================
+
+CPF/CNPJ, telefone e CEP são gravados formatados ('123.456.789-00',
+'(41) 99999-0000', '80000-000'), então a busca por documento fazia
+`cpf_cnpj LIKE '%termo%'` (varredura) e só achava o registro se o termo
+viesse com a mesma formatação.
+
+Cada tabela ganha uma coluna calculada PERSISTED só com os dígitos e um
+índice sobre ela (migração 002_colunas_digitos.sql). O próprio SQL Server
+mantém a coluna em todo INSERT/UPDATE, inclusive nos repositories do pacote
+locacao, e a busca vira `cpf_cnpj_digits = ?` (seek no índice):
+
+    cursor.execute("SELECT id FROM Locadores WHERE cpf_cnpj_digits = ?",
+                   somente_digitos('123.456.789-00'))
+"""
+
+from typing import Any
+
+# (tabela, coluna só-dígitos, coluna de origem, tamanho)
+COLUNAS_DIGITOS = (
+    ('Locadores', 'cpf_cnpj_digits', 'cpf_cnpj', 20),
+    ('Locadores', 'telefone_digits', 'telefone', 20),
+    ('Locatarios', 'cpf_cnpj_digits', 'cpf_cnpj', 20),
+    ('Locatarios', 'telefone_digits', 'telefone', 20),
+    ('Locatarios', 'telefone_alternativo_digits', 'telefone_alternativo', 20),
+    ('EnderecoImovel', 'cep_digits', 'cep', 10),
+    ('EnderecoLocador', 'cep_digits', 'cep', 10),
+)
+
+# Formatação removida pela coluna calculada (REPLACE é determinístico, TRANSLATE exige 2017+)
+CARACTERES_FORMATACAO = ('.', '-', '/', '(', ')', ' ', '+')
+
+
+def somente_digitos(texto: Any) -> str:
+    """'123.456.789-00' -> '12345678900'"""
+    return ''.join(filter(str.isdigit, str(texto or '')))
+
+
+def expressao_digitos(coluna: str) -> str:
+    """REPLACE(REPLACE(...(coluna, '.', ''), ...) com os CARACTERES_FORMATACAO"""
+    expressao = coluna
+    for caractere in CARACTERES_FORMATACAO:
+        expressao = f"REPLACE({expressao}, '{caractere}', '')"
+    return expressao
+
+
+def garantir_colunas_digitos(cursor):
+    """
+    Cria as colunas só-dígitos e seus índices se a migração
+    002_colunas_digitos.sql ainda não foi aplicada. Não faz commit.
+    """
+    for tabela, coluna, origem, tamanho in COLUNAS_DIGITOS:
+        cursor.execute("SELECT COL_LENGTH(?, ?)", (tabela, coluna))
+        if cursor.fetchone()[0] is None:
+            cursor.execute(
+                f"ALTER TABLE {tabela} ADD {coluna} AS "
+                f"CAST({expressao_digitos(origem)} AS varchar({tamanho})) PERSISTED"
+            )
+        indice = f"IX_{tabela}_{coluna}"
+        cursor.execute(f"""
+            IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = '{indice}')
+                CREATE NONCLUSTERED INDEX {indice} ON {tabela} ({coluna})
+        """)
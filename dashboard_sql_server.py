@@ -1,68 +1,142 @@
 """
 Funções do Dashboard adaptadas para o SQL Server real
+
+As quatro seções (métricas, ocupação, vencimentos, alertas) saem de um único
+snapshot: um lote SQL numa só conexão (contagens de contratos em uma passada,
+ocupação por tipo e vencimentos da janela de 60 dias), guardado em
+cache_global no namespace 'dashboard'.
+
+O snapshot é reconstruído quando o TTL expira (DASHBOARD_CACHE_TTL_SEGUNDOS,
+padrão 60) ou logo após escritas em contratos, imóveis, locadores e
+locatários (repositories_adapter chama invalidar_snapshot_dashboard()).
 """
 import pyodbc
 import os
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from pool_conexoes import obter_conexao
+from cache_memoria import cache_global
+from agregados_financeiros import consultar_crescimento
 
 load_dotenv()
 
+TTL_SNAPSHOT = float(os.getenv('DASHBOARD_CACHE_TTL_SEGUNDOS', '60'))
+
+# Maior janela de vencimentos pedida pelo frontend (/api/dashboard/completo usa 60)
+JANELA_VENCIMENTOS_DIAS = 60
+
+SQL_SNAPSHOT = """
+    SET NOCOUNT ON;
+
+    -- Contratos: total, ativos, vencidos, vencendo em 30 dias e receita numa passada
+    SELECT
+        COUNT(*),
+        SUM(CASE WHEN c.data_fim >= GETDATE() THEN 1 ELSE 0 END),
+        SUM(CASE WHEN c.data_fim < GETDATE() THEN 1 ELSE 0 END),
+        SUM(CASE WHEN c.data_fim BETWEEN GETDATE() AND DATEADD(day, 30, GETDATE()) THEN 1 ELSE 0 END),
+        SUM(CASE WHEN c.data_fim >= GETDATE() THEN i.valor_aluguel END),
+        (SELECT COUNT(*) FROM Locadores),
+        (SELECT COUNT(*) FROM Locatarios)
+    FROM Contratos c
+    LEFT JOIN Imoveis i ON c.id_imovel = i.id;
+
+    -- Ocupação por tipo (unidade ocupada = tem ao menos um contrato ativo)
+    SELECT
+        i.tipo,
+        COUNT(*),
+        SUM(CASE WHEN a.id_imovel IS NOT NULL THEN 1 ELSE 0 END)
+    FROM Imoveis i
+    LEFT JOIN (
+        SELECT DISTINCT id_imovel FROM Contratos WHERE data_fim >= GETDATE()
+    ) a ON a.id_imovel = i.id
+    GROUP BY i.tipo;
+
+    -- Vencimentos da janela
+    SELECT
+        c.id,
+        l.nome,
+        c.data_fim,
+        i.valor_aluguel,
+        DATEDIFF(day, GETDATE(), c.data_fim)
+    FROM Contratos c
+    JOIN Locatarios l ON c.id_locatario = l.id
+    JOIN Imoveis i ON c.id_imovel = i.id
+    WHERE c.data_fim BETWEEN GETDATE() AND DATEADD(day, ?, GETDATE())
+    ORDER BY c.data_fim ASC;
+"""
+
 def conectar_db():
-    """Conecta ao SQL Server usando as configurações do .env"""
-    connection_string = (
-        f"DRIVER={{{os.getenv('DB_DRIVER')}}};"
-        f"SERVER={os.getenv('DB_SERVER')};"
-        f"DATABASE={os.getenv('DB_DATABASE')};"
-        f"UID={os.getenv('DB_USER')};"
-        f"PWD={os.getenv('DB_PASSWORD')}"
-    )
-    return pyodbc.connect(connection_string)
+    """Empresta uma conexão do pool compartilhado (conn.close() devolve ao pool)"""
+    return obter_conexao()
+
+def _consultar_snapshot():
+    """Executa o lote do dashboard (uma conexão, um round trip)"""
+    with obter_conexao() as conn:
+        cursor = conn.cursor()
+        cursor.execute(SQL_SNAPSHOT, (JANELA_VENCIMENTOS_DIAS,))
+
+        (total_contratos, contratos_ativos, contratos_vencidos, contratos_vencendo_30,
+         receita, total_locadores, total_locatarios) = cursor.fetchone()
+
+        cursor.nextset()
+        ocupacao_por_tipo = [(tipo, total, ocupadas or 0) for tipo, total, ocupadas in cursor.fetchall()]
+
+        cursor.nextset()
+        vencimentos = []
+        for id_contrato, cliente_nome, data_vencimento, valor, dias_para_vencer in cursor.fetchall():
+            dias_para_vencer = int(dias_para_vencer) if dias_para_vencer else 0
+            vencimentos.append({
+                "id": id_contrato,
+                "cliente_nome": cliente_nome,
+                "contrato_numero": f"CT-{id_contrato:04d}",
+                "data_vencimento": data_vencimento.strftime('%Y-%m-%d') if data_vencimento else "",
+                "valor": float(valor) if valor else 0.0,
+                "dias_para_vencer": dias_para_vencer,
+                "status": "proximo" if dias_para_vencer <= 30 else "normal"
+            })
+
+        # Crescimento e novos clientes: lidos do rollup mensal (O(meses))
+        try:
+            crescimento = consultar_crescimento(cursor)
+        except Exception as e:
+            print(f"Erro ao consultar agregados financeiros: {e}")
+            crescimento = {"crescimento_percentual": 0, "novos_clientes_mes": 0}
+
+    return {
+        "gerado_em": datetime.now(),
+        "total_contratos": total_contratos or 0,
+        "contratos_ativos": contratos_ativos or 0,
+        "contratos_vencidos": contratos_vencidos or 0,
+        "contratos_vencendo_30": contratos_vencendo_30 or 0,
+        "receita_mensal": float(receita) if receita else 0.0,
+        "total_locadores": total_locadores or 0,
+        "total_locatarios": total_locatarios or 0,
+        "ocupacao_por_tipo": ocupacao_por_tipo,
+        "vencimentos": vencimentos,
+        "crescimento": crescimento
+    }
+
+def obter_snapshot_dashboard():
+    """Snapshot em cache (reconstruído quando expira ou após escritas)"""
+    return cache_global.obter_ou_calcular(('dashboard', 'snapshot'), _consultar_snapshot, ttl=TTL_SNAPSHOT)
+
+def invalidar_snapshot_dashboard():
+    """Hook de escrita: a próxima leitura do dashboard reconstrói o snapshot"""
+    cache_global.invalidar('dashboard')
 
-def obter_metricas_dashboard():
+def obter_metricas_dashboard(snapshot=None):
     """Obter métricas principais do dashboard"""
-    conn = conectar_db()
-    cursor = conn.cursor()
-    
     try:
-        # Total de contratos
-        cursor.execute("SELECT COUNT(*) FROM Contratos")
-        total_contratos = cursor.fetchone()[0] or 0
-        
-        # Contratos ativos (data_fim >= hoje)
-        cursor.execute("SELECT COUNT(*) FROM Contratos WHERE data_fim >= GETDATE()")
-        contratos_ativos = cursor.fetchone()[0] or 0
-        
-        # Total de clientes (locadores + locatários)
-        cursor.execute("SELECT COUNT(*) FROM Locadores")
-        total_locadores = cursor.fetchone()[0] or 0
-        cursor.execute("SELECT COUNT(*) FROM Locatarios")
-        total_locatarios = cursor.fetchone()[0] or 0
-        total_clientes = total_locadores + total_locatarios
-        
-        # Receita mensal (soma dos valores de aluguel dos contratos ativos)
-        cursor.execute("""
-            SELECT SUM(i.valor_aluguel) 
-            FROM Contratos c
-            JOIN Imoveis i ON c.id_imovel = i.id
-            WHERE c.data_fim >= GETDATE()
-        """)
-        result = cursor.fetchone()[0]
-        receita_mensal = float(result) if result else 0.0
-        
-        # Calcular crescimento (placeholder por enquanto)
-        crescimento_percentual = 12.5
-        
-        # Novos clientes este mês (simplificado)
-        novos_clientes_mes = 2
-        
+        snapshot = snapshot or obter_snapshot_dashboard()
         return {
-            "total_contratos": total_contratos,
-            "contratos_ativos": contratos_ativos,
-            "receita_mensal": receita_mensal,
-            "crescimento_percentual": crescimento_percentual,
-            "total_clientes": total_clientes,
-            "novos_clientes_mes": novos_clientes_mes
+            "total_contratos": snapshot["total_contratos"],
+            "contratos_ativos": snapshot["contratos_ativos"],
+            "receita_mensal": snapshot["receita_mensal"],
+            # Faturamento do mês x mês anterior (AgregadosFinanceirosMensais)
+            "crescimento_percentual": snapshot["crescimento"]["crescimento_percentual"],
+            "total_clientes": snapshot["total_locadores"] + snapshot["total_locatarios"],
+            # Locadores com a primeira prestação no mês
+            "novos_clientes_mes": snapshot["crescimento"]["novos_clientes_mes"]
         }
     except Exception as e:
         print(f"Erro em métricas: {e}")
@@ -75,45 +149,18 @@ def obter_metricas_dashboard():
             "total_clientes": 0,
             "novos_clientes_mes": 0
         }
-    finally:
-        conn.close()
 
-def obter_ocupacao_dashboard():
+def obter_ocupacao_dashboard(snapshot=None):
     """Obter dados de ocupação dos imóveis"""
-    conn = conectar_db()
-    cursor = conn.cursor()
-    
     try:
-        # Total de imóveis
-        cursor.execute("SELECT COUNT(*) FROM Imoveis")
-        unidades_totais = cursor.fetchone()[0] or 0
-        
-        # Imóveis ocupados (com contratos ativos)
-        cursor.execute("""
-            SELECT COUNT(DISTINCT i.id) 
-            FROM Imoveis i 
-            JOIN Contratos c ON i.id = c.id_imovel 
-            WHERE c.data_fim >= GETDATE()
-        """)
-        unidades_ocupadas = cursor.fetchone()[0] or 0
-        
+        snapshot = snapshot or obter_snapshot_dashboard()
+        unidades_totais = sum(total for _, total, _ in snapshot["ocupacao_por_tipo"])
+        unidades_ocupadas = sum(ocupadas for _, _, ocupadas in snapshot["ocupacao_por_tipo"])
         unidades_disponiveis = unidades_totais - unidades_ocupadas
         taxa_ocupacao = (unidades_ocupadas / unidades_totais * 100) if unidades_totais > 0 else 0
-        
-        # Ocupação por tipo de imóvel
-        cursor.execute("""
-            SELECT 
-                i.tipo,
-                COUNT(*) as total,
-                SUM(CASE WHEN c.data_fim >= GETDATE() THEN 1 ELSE 0 END) as ocupadas
-            FROM Imoveis i
-            LEFT JOIN Contratos c ON i.id = c.id_imovel
-            GROUP BY i.tipo
-        """)
+
         ocupacao_por_tipo = []
-        for row in cursor.fetchall():
-            tipo, total, ocupadas = row
-            ocupadas = ocupadas or 0
+        for tipo, total, ocupadas in snapshot["ocupacao_por_tipo"]:
             percentual = (ocupadas / total * 100) if total > 0 else 0
             ocupacao_por_tipo.append({
                 "tipo": tipo or "Outros",
@@ -138,11 +185,20 @@ def obter_ocupacao_dashboard():
             "unidades_disponiveis": 0,
             "ocupacao_por_tipo": []
         }
-    finally:
-        conn.close()
 
-def obter_vencimentos_dashboard(dias=30):
+def obter_vencimentos_dashboard(dias=30, snapshot=None):
     """Obter contratos próximos ao vencimento"""
+    if dias > JANELA_VENCIMENTOS_DIAS:
+        return _consultar_vencimentos(dias)
+    try:
+        snapshot = snapshot or obter_snapshot_dashboard()
+        return [dict(v) for v in snapshot["vencimentos"] if v["dias_para_vencer"] <= dias]
+    except Exception as e:
+        print(f"Erro em vencimentos: {e}")
+        return []
+
+def _consultar_vencimentos(dias):
+    """Vencimentos além da janela do snapshot (consulta direta)"""
     conn = conectar_db()
     cursor = conn.cursor()
     
@@ -184,23 +240,16 @@ def obter_vencimentos_dashboard(dias=30):
     finally:
         conn.close()
 
-def obter_alertas_dashboard():
+def obter_alertas_dashboard(snapshot=None):
     """Obter alertas do sistema"""
-    conn = conectar_db()
-    cursor = conn.cursor()
-    
     alertas = []
     
     try:
-        # Verificar imóveis disponíveis
-        cursor.execute("""
-            SELECT COUNT(*) FROM Imoveis i
-            WHERE NOT EXISTS (
-                SELECT 1 FROM Contratos c 
-                WHERE c.id_imovel = i.id AND c.data_fim >= GETDATE()
-            )
-        """)
-        imoveis_disponiveis = cursor.fetchone()[0] or 0
+        snapshot = snapshot or obter_snapshot_dashboard()
+        data_criacao = snapshot["gerado_em"].isoformat()
+
+        # Imóveis disponíveis (sem contrato ativo)
+        imoveis_disponiveis = sum(total - ocupadas for _, total, ocupadas in snapshot["ocupacao_por_tipo"])
         
         if imoveis_disponiveis > 0:
             alertas.append({
@@ -209,16 +258,12 @@ def obter_alertas_dashboard():
                 "titulo": "Imóveis disponíveis",
                 "descricao": f"{imoveis_disponiveis} imóvel(is) disponível(is) para locação",
                 "severidade": "BAIXO",
-                "data_criacao": datetime.now().isoformat(),
+                "data_criacao": data_criacao,
                 "ativo": True
             })
         
-        # Verificar contratos vencendo em 30 dias
-        cursor.execute("""
-            SELECT COUNT(*) FROM Contratos c
-            WHERE c.data_fim BETWEEN GETDATE() AND DATEADD(day, 30, GETDATE())
-        """)
-        contratos_vencendo = cursor.fetchone()[0] or 0
+        # Contratos vencendo em 30 dias
+        contratos_vencendo = snapshot["contratos_vencendo_30"]
         
         if contratos_vencendo > 0:
             alertas.append({
@@ -227,16 +272,12 @@ def obter_alertas_dashboard():
                 "titulo": "Contratos próximos ao vencimento",
                 "descricao": f"{contratos_vencendo} contrato(s) vencem nos próximos 30 dias",
                 "severidade": "MEDIO",
-                "data_criacao": datetime.now().isoformat(),
+                "data_criacao": data_criacao,
                 "ativo": True
             })
         
-        # Verificar contratos vencidos
-        cursor.execute("""
-            SELECT COUNT(*) FROM Contratos c
-            WHERE c.data_fim < GETDATE()
-        """)
-        contratos_vencidos = cursor.fetchone()[0] or 0
+        # Contratos vencidos
+        contratos_vencidos = snapshot["contratos_vencidos"]
         
         if contratos_vencidos > 0:
             alertas.append({
@@ -245,7 +286,7 @@ def obter_alertas_dashboard():
                 "titulo": "Contratos vencidos",
                 "descricao": f"{contratos_vencidos} contrato(s) já venceram",
                 "severidade": "ALTO",
-                "data_criacao": datetime.now().isoformat(),
+                "data_criacao": data_criacao,
                 "ativo": True
             })
         
@@ -253,8 +294,6 @@ def obter_alertas_dashboard():
     except Exception as e:
         print(f"Erro em alertas: {e}")
         return []
-    finally:
-        conn.close()
 
 # Testar conexão
 if __name__ == "__main__":
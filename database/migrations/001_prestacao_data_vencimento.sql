@@ -0,0 +1,46 @@
+-- =====================================================
+-- 001 - PrestacaoContas.data_vencimento persistida
+-- =====================================================
+-- Antes a data de vencimento era remontada em cada consulta a partir de
+-- p.ano + p.mes + Contratos.vencimento_dia (concatenação + TRY_CAST), o que
+-- impede o uso de índices. A coluna passa a ser gravada por
+-- salvar_prestacao_contas e atualizar_contrato (vencimento_dia) e o job de
+-- acréscimos filtra/ordena direto por ela.
+--
+-- Regra (igual a motor_acrescimos.calcular_data_vencimento): dia de vencimento
+-- do contrato no mês/ano da prestação, limitado ao último dia do mês.
+--
+-- Idempotente: pode ser executada mais de uma vez.
+
+IF COL_LENGTH('PrestacaoContas', 'data_vencimento') IS NULL
+    ALTER TABLE PrestacaoContas ADD data_vencimento date NULL
+GO
+
+-- Backfill
+UPDATE p
+SET data_vencimento =
+    CASE
+        WHEN TRY_CAST(p.ano AS int) > 1900 AND TRY_CAST(p.ano AS int) < 2100
+             AND TRY_CAST(p.mes AS int) BETWEEN 1 AND 12
+             AND c.vencimento_dia BETWEEN 1 AND 31
+        THEN DATEFROMPARTS(
+            TRY_CAST(p.ano AS int),
+            TRY_CAST(p.mes AS int),
+            CASE
+                WHEN c.vencimento_dia > DAY(EOMONTH(DATEFROMPARTS(TRY_CAST(p.ano AS int), TRY_CAST(p.mes AS int), 1)))
+                THEN DAY(EOMONTH(DATEFROMPARTS(TRY_CAST(p.ano AS int), TRY_CAST(p.mes AS int), 1)))
+                ELSE c.vencimento_dia
+            END
+        )
+        ELSE NULL
+    END
+FROM PrestacaoContas p
+LEFT JOIN Contratos c ON c.id = p.contrato_id
+GO
+
+-- Job de acréscimos: status IN (...) AND data_pagamento IS NULL AND data_vencimento < hoje
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_PrestacaoContas_Status_Pagamento_Vencimento')
+    CREATE NONCLUSTERED INDEX IX_PrestacaoContas_Status_Pagamento_Vencimento
+    ON PrestacaoContas (status, data_pagamento, data_vencimento)
+    INCLUDE (contrato_id, ativo)
+GO
@@ -0,0 +1,77 @@
+-- =====================================================
+-- 002 - Colunas só-dígitos para CPF/CNPJ, telefone e CEP
+-- =====================================================
+-- Documentos, telefones e CEPs são gravados formatados, então as buscas
+-- por esses termos faziam LIKE '%123.456.789-00%' (varredura completa) e
+-- dependiam da formatação digitada. Cada tabela ganha uma coluna calculada
+-- PERSISTED só com os dígitos e um índice sobre ela; a busca passa a ser
+-- cpf_cnpj_digits = '12345678900' (seek).
+--
+-- Por serem colunas calculadas, o SQL Server preenche as linhas existentes
+-- ao criar a coluna e mantém o valor em todo INSERT/UPDATE.
+-- Mesma definição de colunas_digitos.garantir_colunas_digitos.
+--
+-- Idempotente: pode ser executada mais de uma vez.
+
+IF COL_LENGTH('Locadores', 'cpf_cnpj_digits') IS NULL
+    ALTER TABLE Locadores ADD cpf_cnpj_digits AS
+        CAST(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(cpf_cnpj, '.', ''), '-', ''), '/', ''), '(', ''), ')', ''), ' ', ''), '+', '') AS varchar(20)) PERSISTED
+GO
+
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_Locadores_cpf_cnpj_digits')
+    CREATE NONCLUSTERED INDEX IX_Locadores_cpf_cnpj_digits ON Locadores (cpf_cnpj_digits)
+GO
+
+IF COL_LENGTH('Locadores', 'telefone_digits') IS NULL
+    ALTER TABLE Locadores ADD telefone_digits AS
+        CAST(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(telefone, '.', ''), '-', ''), '/', ''), '(', ''), ')', ''), ' ', ''), '+', '') AS varchar(20)) PERSISTED
+GO
+
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_Locadores_telefone_digits')
+    CREATE NONCLUSTERED INDEX IX_Locadores_telefone_digits ON Locadores (telefone_digits)
+GO
+
+IF COL_LENGTH('Locatarios', 'cpf_cnpj_digits') IS NULL
+    ALTER TABLE Locatarios ADD cpf_cnpj_digits AS
+        CAST(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(cpf_cnpj, '.', ''), '-', ''), '/', ''), '(', ''), ')', ''), ' ', ''), '+', '') AS varchar(20)) PERSISTED
+GO
+
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_Locatarios_cpf_cnpj_digits')
+    CREATE NONCLUSTERED INDEX IX_Locatarios_cpf_cnpj_digits ON Locatarios (cpf_cnpj_digits)
+GO
+
+IF COL_LENGTH('Locatarios', 'telefone_digits') IS NULL
+    ALTER TABLE Locatarios ADD telefone_digits AS
+        CAST(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(telefone, '.', ''), '-', ''), '/', ''), '(', ''), ')', ''), ' ', ''), '+', '') AS varchar(20)) PERSISTED
+GO
+
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_Locatarios_telefone_digits')
+    CREATE NONCLUSTERED INDEX IX_Locatarios_telefone_digits ON Locatarios (telefone_digits)
+GO
+
+IF COL_LENGTH('Locatarios', 'telefone_alternativo_digits') IS NULL
+    ALTER TABLE Locatarios ADD telefone_alternativo_digits AS
+        CAST(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(telefone_alternativo, '.', ''), '-', ''), '/', ''), '(', ''), ')', ''), ' ', ''), '+', '') AS varchar(20)) PERSISTED
+GO
+
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_Locatarios_telefone_alternativo_digits')
+    CREATE NONCLUSTERED INDEX IX_Locatarios_telefone_alternativo_digits ON Locatarios (telefone_alternativo_digits)
+GO
+
+IF COL_LENGTH('EnderecoImovel', 'cep_digits') IS NULL
+    ALTER TABLE EnderecoImovel ADD cep_digits AS
+        CAST(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(cep, '.', ''), '-', ''), '/', ''), '(', ''), ')', ''), ' ', ''), '+', '') AS varchar(10)) PERSISTED
+GO
+
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_EnderecoImovel_cep_digits')
+    CREATE NONCLUSTERED INDEX IX_EnderecoImovel_cep_digits ON EnderecoImovel (cep_digits)
+GO
+
+IF COL_LENGTH('EnderecoLocador', 'cep_digits') IS NULL
+    ALTER TABLE EnderecoLocador ADD cep_digits AS
+        CAST(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(cep, '.', ''), '-', ''), '/', ''), '(', ''), ')', ''), ' ', ''), '+', '') AS varchar(10)) PERSISTED
+GO
+
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_EnderecoLocador_cep_digits')
+    CREATE NONCLUSTERED INDEX IX_EnderecoLocador_cep_digits ON EnderecoLocador (cep_digits)
+GO
@@ -0,0 +1,92 @@
+-- =====================================================
+-- 003 - Agregados financeiros mensais (rollup de PrestacaoContas)
+-- =====================================================
+-- Dashboard (crescimento, novos clientes) e relatórios mensais somavam
+-- PrestacaoContas inteira a cada consulta. AgregadosFinanceirosMensais guarda
+-- faturado, recebido, acréscimos, retido e repasse por mês x locador x imóvel;
+-- as escritas em prestações recalculam só o grupo (mês, imóvel) afetado.
+--
+-- Com vários locadores, os valores são rateados pelo percentual_participacao
+-- de DistribuicaoRepasseLocadores (repasse = valor_repasse da distribuição).
+-- Mesma definição de agregados_financeiros.garantir_tabela_agregados.
+--
+-- Idempotente: pode ser executada mais de uma vez (a carga é refeita).
+
+IF OBJECT_ID('AgregadosFinanceirosMensais', 'U') IS NULL
+    CREATE TABLE AgregadosFinanceirosMensais (
+        ano int NOT NULL,
+        mes int NOT NULL,
+        locador_id int NOT NULL,
+        imovel_id int NOT NULL,
+        qtd_prestacoes int NOT NULL,
+        valor_faturado decimal(14,2) NOT NULL,
+        valor_recebido decimal(14,2) NOT NULL,
+        valor_acrescimos decimal(14,2) NOT NULL,
+        valor_retido decimal(14,2) NOT NULL,
+        valor_repasse decimal(14,2) NOT NULL,
+        data_atualizacao datetime NOT NULL,
+        CONSTRAINT PK_AgregadosFinanceirosMensais PRIMARY KEY (ano, mes, locador_id, imovel_id)
+    )
+GO
+
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_AgregadosFinanceirosMensais_Locador')
+    CREATE NONCLUSTERED INDEX IX_AgregadosFinanceirosMensais_Locador
+    ON AgregadosFinanceirosMensais (locador_id, ano, mes)
+GO
+
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_AgregadosFinanceirosMensais_Imovel')
+    CREATE NONCLUSTERED INDEX IX_AgregadosFinanceirosMensais_Imovel
+    ON AgregadosFinanceirosMensais (imovel_id, ano, mes)
+GO
+
+-- Carga completa
+DELETE FROM AgregadosFinanceirosMensais
+GO
+
+WITH base AS (
+    SELECT
+        p.id,
+        TRY_CAST(p.ano AS int) AS ano,
+        TRY_CAST(p.mes AS int) AS mes,
+        c.id_imovel AS imovel_id,
+        p.locador_id,
+        ISNULL(p.valor_boleto, ISNULL(p.total_bruto, 0)) AS faturado,
+        CASE WHEN p.data_pagamento IS NOT NULL THEN ISNULL(p.valor_pago, 0) ELSE 0 END AS recebido,
+        ISNULL(p.valor_acrescimos, 0) AS acrescimos,
+        ISNULL(p.total_retido, 0) AS retido,
+        ISNULL(p.valor_repasse, 0) AS repasse
+    FROM PrestacaoContas p
+    JOIN Contratos c ON c.id = p.contrato_id
+    WHERE p.ativo = 1 AND ISNULL(p.status, '') <> 'cancelada'
+),
+participacao AS (
+    SELECT
+        b.id,
+        ISNULL(d.locador_id, b.locador_id) AS locador_id,
+        ISNULL(
+            d.percentual_participacao / NULLIF(SUM(d.percentual_participacao) OVER (PARTITION BY b.id), 0),
+            1.0 / COUNT(*) OVER (PARTITION BY b.id)
+        ) AS fator,
+        d.valor_repasse AS repasse_locador
+    FROM base b
+    LEFT JOIN DistribuicaoRepasseLocadores d ON d.prestacao_id = b.id AND d.ativo = 1
+)
+INSERT INTO AgregadosFinanceirosMensais (
+    ano, mes, locador_id, imovel_id, qtd_prestacoes, valor_faturado, valor_recebido,
+    valor_acrescimos, valor_retido, valor_repasse, data_atualizacao
+)
+SELECT
+    b.ano, b.mes, pa.locador_id, b.imovel_id,
+    COUNT(DISTINCT b.id),
+    SUM(b.faturado * pa.fator),
+    SUM(b.recebido * pa.fator),
+    SUM(b.acrescimos * pa.fator),
+    SUM(b.retido * pa.fator),
+    SUM(ISNULL(pa.repasse_locador, b.repasse * pa.fator)),
+    GETDATE()
+FROM base b
+JOIN participacao pa ON pa.id = b.id
+WHERE b.ano IS NOT NULL AND b.mes BETWEEN 1 AND 12
+  AND pa.locador_id IS NOT NULL AND b.imovel_id IS NOT NULL
+GROUP BY b.ano, b.mes, pa.locador_id, b.imovel_id
+GO
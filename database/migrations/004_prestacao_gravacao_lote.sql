@@ -0,0 +1,29 @@
+-- =====================================================
+-- 004 - Estrutura de PrestacaoContas para gravação em lote
+-- =====================================================
+-- salvar_prestacao_contas verificava/criava as colunas contrato_id e
+-- dados_financeiros_json e tentava remover as UNIQUE por período a CADA
+-- gravação (ALTER TABLE + commit no caminho da requisição). A estrutura
+-- passa a ser garantida uma vez, aqui ou na inicialização da API
+-- (gravacao_prestacoes.garantir_colunas_prestacao).
+--
+-- Sem as UNIQUE o histórico completo é mantido; a regra "uma prestação
+-- ativa por contrato/mês" é validada por gravacao_prestacoes.gravar_prestacoes.
+--
+-- Idempotente: pode ser executada mais de uma vez.
+
+IF COL_LENGTH('PrestacaoContas', 'contrato_id') IS NULL
+    ALTER TABLE PrestacaoContas ADD contrato_id INT
+GO
+
+IF COL_LENGTH('PrestacaoContas', 'dados_financeiros_json') IS NULL
+    ALTER TABLE PrestacaoContas ADD dados_financeiros_json NVARCHAR(MAX)
+GO
+
+IF OBJECT_ID('UK_PrestacaoContas_Cliente_Periodo', 'UQ') IS NOT NULL
+    ALTER TABLE PrestacaoContas DROP CONSTRAINT UK_PrestacaoContas_Cliente_Periodo
+GO
+
+IF OBJECT_ID('UK_PrestacaoContas_Contrato_Periodo', 'UQ') IS NOT NULL
+    ALTER TABLE PrestacaoContas DROP CONSTRAINT UK_PrestacaoContas_Contrato_Periodo
+GO
@@ -0,0 +1,35 @@
+-- =====================================================
+-- 005 - Endereços resolvidos de imóveis legados
+-- =====================================================
+-- buscar_imoveis faz LEFT JOIN em ImovelEnderecoResolvido para mostrar o
+-- endereço estruturado de imóveis antigos (só com o texto livre
+-- Imoveis.endereco). A tabela é preenchida por resolver_enderecos_imovel;
+-- precisa existir antes da primeira listagem, inclusive quando o usuário da
+-- API não tem permissão de DDL.
+-- Linhas com origem 'indice' guardam só endereco_imovel_id (a listagem faz
+-- JOIN no EnderecoImovel atual); rua/cep/bairro só são preenchidos em
+-- 'extracao'.
+-- Mesma definição de resolver_enderecos_imovel.garantir_tabela_enderecos_resolvidos.
+--
+-- Depois de aplicar, rode a carga inicial:
+--     python resolver_enderecos_imovel.py
+--
+-- Idempotente: pode ser executada mais de uma vez.
+
+IF OBJECT_ID('ImovelEnderecoResolvido', 'U') IS NULL
+    CREATE TABLE ImovelEnderecoResolvido (
+        imovel_id int NOT NULL PRIMARY KEY,
+        endereco_origem nvarchar(255) NULL,
+        endereco_imovel_id int NULL,
+        rua nvarchar(200) NULL,
+        numero nvarchar(10) NULL,
+        complemento nvarchar(100) NULL,
+        bairro nvarchar(100) NULL,
+        cidade nvarchar(100) NULL,
+        uf nvarchar(2) NULL,
+        cep nvarchar(10) NULL,
+        origem varchar(20) NOT NULL,
+        indice_versao varchar(40) NULL,
+        data_resolucao datetime DEFAULT GETDATE()
+    )
+GO
@@ -0,0 +1,580 @@
+"""
+Executor Paralelo do Job de Acréscimos
+================================================================
+
+Divide as prestações elegíveis em faixas de contrato_id e processa cada
+faixa (lote) em um pool de threads ou processos, cada lote com sua própria
+conexão e transação (processar_lote_acrescimos do job diário).
+
+- Checkpoint: cada execução diária e seus lotes ficam em
+  JobAcrescimosExecucao / JobAcrescimosLote. Se o processo cair no meio,
+  a próxima chamada do mesmo dia retoma só os lotes não concluídos.
+- Lease: JobLease garante que apenas um worker (ex.: vários workers do
+  uvicorn) execute o job por vez. O lease é renovado enquanto o job roda
+  e expira sozinho se o dono morrer. Se a renovação falha (lease tomado
+  por outro worker ou sem renovar além da validade), os lotes ainda não
+  iniciados são cancelados e a execução é interrompida.
+- Uma vez por dia: cada worker agenda o próprio 00:00, então quem pega o
+  lease depois que a execução do dia já foi concluída não roda de novo
+  (status 'ja_executado'). A execução manual passa forcar=True.
+
+Configuração (.env):
+    ACRESCIMOS_WORKERS          Lotes processados em paralelo (padrão 4;
+                                mantenha abaixo de DB_POOL_SIZE)
+    ACRESCIMOS_EXECUTOR         'thread' (padrão) ou 'processo'
+    ACRESCIMOS_TAMANHO_LOTE     Prestações por lote (padrão 500)
+    ACRESCIMOS_LEASE_SEGUNDOS   Validade do lease sem renovação (padrão 300)
+
+Execução manual:
+    python executor_acrescimos.py
+"""
+
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import pyodbc
+
+from pool_conexoes import obter_conexao
+from job_acrescimos_diario import (
+    buscar_prestacoes_para_atualizar,
+    criar_tabela_log_se_necessario,
+    garantir_colunas_controle_acrescimos,
+    processar_lote_acrescimos,
+)
+
+logger = logging.getLogger('executor_acrescimos')
+
+NOME_JOB = 'acrescimos_diario'
+MAIOR_CONTRATO_ID = 2147483647
+
+
+def _config_int(nome: str, padrao: int) -> int:
+    try:
+        return max(1, int(os.getenv(nome, str(padrao))))
+    except ValueError:
+        return padrao
+
+
+def identificador_worker() -> str:
+    """host:pid:thread - identifica o dono do lease nos logs e na tabela"""
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+# ==================== TABELAS DE CONTROLE ====================
+
+def garantir_tabelas_controle(cursor):
+    """Cria as tabelas de lease e checkpoint se não existirem"""
+    cursor.execute("""
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='JobLease' AND xtype='U')
+        BEGIN
+            CREATE TABLE JobLease (
+                nome varchar(100) NOT NULL PRIMARY KEY,
+                dono varchar(200) NULL,
+                expira_em datetime NOT NULL,
+                data_atualizacao datetime DEFAULT GETDATE()
+            )
+        END
+    """)
+    cursor.execute("""
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='JobAcrescimosExecucao' AND xtype='U')
+        BEGIN
+            CREATE TABLE JobAcrescimosExecucao (
+                id int IDENTITY(1,1) PRIMARY KEY,
+                data_referencia date NOT NULL,
+                status varchar(20) NOT NULL,
+                dono varchar(200) NULL,
+                total_lotes int NOT NULL DEFAULT 0,
+                data_inicio datetime DEFAULT GETDATE(),
+                data_fim datetime NULL
+            )
+        END
+    """)
+    cursor.execute("""
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='JobAcrescimosLote' AND xtype='U')
+        BEGIN
+            CREATE TABLE JobAcrescimosLote (
+                execucao_id int NOT NULL,
+                lote int NOT NULL,
+                contrato_inicio int NOT NULL,
+                contrato_fim int NOT NULL,
+                status varchar(20) NOT NULL,
+                processadas int NULL,
+                atualizadas int NULL,
+                inalteradas int NULL,
+                duracao_segundos decimal(10,3) NULL,
+                erro nvarchar(500) NULL,
+                data_atualizacao datetime DEFAULT GETDATE(),
+                PRIMARY KEY (execucao_id, lote)
+            )
+        END
+    """)
+
+
+# ==================== LEASE ====================
+
+def adquirir_lease(dono: str, duracao_segundos: int, nome: str = NOME_JOB) -> bool:
+    """Tenta tomar o lease; só consegue se estiver livre, expirado ou já for do dono"""
+    with obter_conexao() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE JobLease
+            SET dono = ?, expira_em = DATEADD(second, ?, GETDATE()), data_atualizacao = GETDATE()
+            WHERE nome = ? AND (expira_em < GETDATE() OR dono = ?)
+        """, (dono, duracao_segundos, nome, dono))
+        if cursor.rowcount > 0:
+            return True
+
+        try:
+            cursor.execute("""
+                INSERT INTO JobLease (nome, dono, expira_em, data_atualizacao)
+                VALUES (?, ?, DATEADD(second, ?, GETDATE()), GETDATE())
+            """, (nome, dono, duracao_segundos))
+            return True
+        except pyodbc.IntegrityError:
+            # Outro worker tem o lease (linha já existe e não expirou)
+            return False
+
+
+def renovar_lease(dono: str, duracao_segundos: int, nome: str = NOME_JOB) -> bool:
+    with obter_conexao() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE JobLease
+            SET expira_em = DATEADD(second, ?, GETDATE()), data_atualizacao = GETDATE()
+            WHERE nome = ? AND dono = ?
+        """, (duracao_segundos, nome, dono))
+        return cursor.rowcount > 0
+
+
+def liberar_lease(dono: str, nome: str = NOME_JOB):
+    with obter_conexao() as conn:
+        conn.cursor().execute(
+            "UPDATE JobLease SET dono = NULL, expira_em = GETDATE() WHERE nome = ? AND dono = ?",
+            (nome, dono)
+        )
+
+
+class _RenovadorLease(threading.Thread):
+    """
+    Renova o lease a cada terço da validade enquanto o job roda. Marca
+    lease_perdido quando outro worker tomou o lease ou quando a última
+    renovação bem-sucedida já passou da validade (o lease pode ter expirado).
+    """
+
+    def __init__(self, dono: str, duracao_segundos: int):
+        super().__init__(daemon=True)
+        self.dono = dono
+        self.duracao_segundos = duracao_segundos
+        self.lease_perdido = threading.Event()
+        self._parar = threading.Event()
+
+    def run(self):
+        ultima_renovacao = time.monotonic()
+        while not self._parar.wait(self.duracao_segundos / 3):
+            try:
+                if renovar_lease(self.dono, self.duracao_segundos):
+                    ultima_renovacao = time.monotonic()
+                    continue
+                logger.error("Lease do job de acréscimos perdido para outro worker; interrompendo")
+            except Exception as e:
+                logger.warning(f"Erro ao renovar lease do job de acréscimos: {e}")
+                if time.monotonic() - ultima_renovacao < self.duracao_segundos:
+                    continue
+                logger.error("Lease do job de acréscimos sem renovação além da validade; interrompendo")
+            self.lease_perdido.set()
+            return
+
+    def parar(self):
+        self._parar.set()
+
+
+def executar_sob_lease(funcao, *args, **kwargs) -> Any:
+    """
+    Executa funcao(*args, **kwargs) segurando o lease do job (para execuções
+    fora de executar_job_paralelo, ex.: modo individual pela linha de comando).
+    Devolve {'status': 'lease_ocupado'} se outro worker está executando o job.
+    """
+    duracao_lease = _config_int('ACRESCIMOS_LEASE_SEGUNDOS', 300)
+    dono = identificador_worker()
+
+    with obter_conexao() as conn:
+        garantir_tabelas_controle(conn.cursor())
+
+    if not adquirir_lease(dono, duracao_lease):
+        logger.info("Job de acréscimos já está em execução em outro worker; ignorando")
+        return {'status': 'lease_ocupado'}
+
+    renovador = _RenovadorLease(dono, duracao_lease)
+    renovador.start()
+    try:
+        return funcao(*args, **kwargs)
+    finally:
+        renovador.parar()
+        try:
+            liberar_lease(dono)
+        except Exception as e:
+            logger.warning(f"Erro ao liberar lease do job de acréscimos: {e}")
+
+
+# ==================== DIVISÃO EM LOTES ====================
+
+def dividir_em_faixas(prestacoes: List[Dict[str, Any]], tamanho_lote: int) -> List[Dict[str, int]]:
+    """
+    Faixas contíguas de contrato_id com ~tamanho_lote prestações cada.
+    As faixas cobrem de 0 a MAIOR_CONTRATO_ID, então uma retomada também
+    enquadra contratos que passaram a ter prestações vencidas depois.
+    """
+    por_contrato: Dict[int, int] = {}
+    for prestacao in prestacoes:
+        por_contrato[prestacao['contrato_id']] = por_contrato.get(prestacao['contrato_id'], 0) + 1
+
+    faixas = []
+    inicio = 0
+    acumulado = 0
+    for contrato_id in sorted(por_contrato):
+        acumulado += por_contrato[contrato_id]
+        if acumulado >= tamanho_lote:
+            faixas.append({'contrato_inicio': inicio, 'contrato_fim': contrato_id})
+            inicio = contrato_id + 1
+            acumulado = 0
+    faixas.append({'contrato_inicio': inicio, 'contrato_fim': MAIOR_CONTRATO_ID})
+
+    for numero, faixa in enumerate(faixas, start=1):
+        faixa['lote'] = numero
+    return faixas
+
+
+# ==================== CHECKPOINT ====================
+
+def _carregar_lotes(cursor, execucao_id: int) -> List[Dict[str, Any]]:
+    cursor.execute("""
+        SELECT lote, contrato_inicio, contrato_fim, status, processadas, atualizadas,
+               inalteradas, duracao_segundos
+        FROM JobAcrescimosLote WHERE execucao_id = ? ORDER BY lote
+    """, (execucao_id,))
+    return [
+        {
+            'lote': r[0], 'contrato_inicio': r[1], 'contrato_fim': r[2], 'status': r[3],
+            'processadas': r[4] or 0, 'atualizadas': r[5] or 0, 'inalteradas': r[6] or 0,
+            'duracao_segundos': float(r[7]) if r[7] is not None else None
+        }
+        for r in cursor.fetchall()
+    ]
+
+
+def _carregar_ou_criar_execucao(cursor, dono: str, prestacoes: List[Dict[str, Any]],
+                                tamanho_lote: int) -> Dict[str, Any]:
+    """Retoma a execução do dia se houver uma incompleta; senão cria uma nova"""
+    cursor.execute("""
+        SELECT TOP 1 id, status FROM JobAcrescimosExecucao
+        WHERE data_referencia = CAST(GETDATE() AS DATE)
+        ORDER BY id DESC
+    """)
+    row = cursor.fetchone()
+
+    if row and row[1] in ('executando', 'erro'):
+        execucao_id = row[0]
+        lotes = _carregar_lotes(cursor, execucao_id)
+        cursor.execute(
+            "UPDATE JobAcrescimosExecucao SET status = 'executando', dono = ? WHERE id = ?",
+            (dono, execucao_id)
+        )
+        concluidos = sum(1 for l in lotes if l['status'] == 'concluido')
+        logger.info(f"Retomando execução {execucao_id}: {concluidos}/{len(lotes)} lotes já concluídos")
+        return {'id': execucao_id, 'lotes': lotes, 'retomada': True}
+
+    faixas = dividir_em_faixas(prestacoes, tamanho_lote)
+    cursor.execute("""
+        INSERT INTO JobAcrescimosExecucao (data_referencia, status, dono, total_lotes, data_inicio)
+        OUTPUT INSERTED.id
+        VALUES (CAST(GETDATE() AS DATE), 'executando', ?, ?, GETDATE())
+    """, (dono, len(faixas)))
+    execucao_id = cursor.fetchone()[0]
+
+    cursor.fast_executemany = True
+    cursor.executemany("""
+        INSERT INTO JobAcrescimosLote (execucao_id, lote, contrato_inicio, contrato_fim, status)
+        VALUES (?, ?, ?, ?, 'pendente')
+    """, [(execucao_id, f['lote'], f['contrato_inicio'], f['contrato_fim']) for f in faixas])
+
+    lotes = [dict(f, status='pendente', processadas=0, atualizadas=0, inalteradas=0,
+                  duracao_segundos=None) for f in faixas]
+    return {'id': execucao_id, 'lotes': lotes, 'retomada': False}
+
+
+def _registrar_lote(execucao_id: int, lote: Dict[str, Any]):
+    with obter_conexao() as conn:
+        conn.cursor().execute("""
+            UPDATE JobAcrescimosLote
+            SET status = ?, processadas = ?, atualizadas = ?, inalteradas = ?,
+                duracao_segundos = ?, erro = ?, data_atualizacao = GETDATE()
+            WHERE execucao_id = ? AND lote = ?
+        """, (
+            lote['status'], lote['processadas'], lote['atualizadas'], lote['inalteradas'],
+            lote['duracao_segundos'], (lote.get('erro') or '')[:500] or None,
+            execucao_id, lote['lote']
+        ))
+
+
+def _finalizar_execucao(execucao_id: int, status: str):
+    with obter_conexao() as conn:
+        conn.cursor().execute(
+            "UPDATE JobAcrescimosExecucao SET status = ?, data_fim = GETDATE() WHERE id = ?",
+            (status, execucao_id)
+        )
+
+
+def _execucao_concluida_hoje(cursor) -> Optional[int]:
+    """Id da execução de hoje se a mais recente terminou com sucesso"""
+    cursor.execute("""
+        SELECT TOP 1 id, status FROM JobAcrescimosExecucao
+        WHERE data_referencia = CAST(GETDATE() AS DATE)
+        ORDER BY id DESC
+    """)
+    row = cursor.fetchone()
+    return row[0] if row and row[1] == 'concluido' else None
+
+
+def execucao_do_dia_pendente() -> bool:
+    """True se a execução de hoje começou e não terminou (ex.: processo caiu)"""
+    with obter_conexao() as conn:
+        cursor = conn.cursor()
+        garantir_tabelas_controle(cursor)
+        cursor.execute("""
+            SELECT TOP 1 status FROM JobAcrescimosExecucao
+            WHERE data_referencia = CAST(GETDATE() AS DATE)
+            ORDER BY id DESC
+        """)
+        row = cursor.fetchone()
+        return bool(row and row[0] in ('executando', 'erro'))
+
+
+# ==================== EXECUÇÃO ====================
+
+def _processar_lote_isolado(prestacoes: List[Dict[str, Any]], incremental: bool) -> Dict[str, Any]:
+    """Executado no worker (thread ou processo); usa a própria conexão do pool"""
+    inicio = time.perf_counter()
+    resultado = processar_lote_acrescimos(prestacoes, incremental) if prestacoes else \
+        {'atualizadas': 0, 'inalteradas': 0}
+    resultado['duracao_segundos'] = round(time.perf_counter() - inicio, 3)
+    return resultado
+
+
+_progresso_lock = threading.Lock()
+_progresso: Dict[str, Any] = {'status': 'nunca_executado'}
+
+
+def _ultima_execucao_banco() -> Dict[str, Any]:
+    """Última execução gravada no checkpoint (quando ela rodou em outro worker)"""
+    with obter_conexao() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT TOP 1 id, status, dono, data_inicio, data_fim
+            FROM JobAcrescimosExecucao ORDER BY id DESC
+        """)
+        row = cursor.fetchone()
+        if not row:
+            return {'status': 'nunca_executado'}
+        lotes = _carregar_lotes(cursor, row[0])
+    return {
+        'status': row[1],
+        'execucao_id': row[0],
+        'dono': row[2],
+        'inicio': row[3].timestamp() if row[3] else time.time(),
+        'fim': row[4].timestamp() if row[4] else None,
+        'lotes': lotes,
+    }
+
+
+def status_execucao() -> Dict[str, Any]:
+    """Progresso da execução atual/última (por lote) e throughput em linhas/s"""
+    with _progresso_lock:
+        progresso = dict(_progresso)
+        if 'lotes' in progresso:
+            progresso['lotes'] = [dict(l) for l in progresso['lotes']]
+
+    if progresso['status'] == 'nunca_executado':
+        # O job pode ter rodado em outro worker: consultar o checkpoint
+        try:
+            progresso = _ultima_execucao_banco()
+        except Exception as e:
+            progresso['erro_consulta'] = str(e)
+
+    if 'inicio' in progresso:
+        fim = progresso.get('fim') or time.time()
+        duracao = fim - progresso['inicio']
+        processadas = sum(l['processadas'] for l in progresso.get('lotes', []))
+        progresso['duracao_segundos'] = round(duracao, 3)
+        progresso['processadas'] = processadas
+        progresso['linhas_por_segundo'] = round(processadas / duracao, 1) if duracao > 0 else 0.0
+        progresso['lotes_concluidos'] = sum(1 for l in progresso.get('lotes', []) if l['status'] == 'concluido')
+        progresso['inicio'] = datetime.fromtimestamp(progresso['inicio']).strftime('%Y-%m-%d %H:%M:%S')
+        if progresso.get('fim'):
+            progresso['fim'] = datetime.fromtimestamp(progresso['fim']).strftime('%Y-%m-%d %H:%M:%S')
+    return progresso
+
+
+def executar_job_paralelo(workers: Optional[int] = None, executor: Optional[str] = None,
+                          tamanho_lote: Optional[int] = None, incremental: bool = True,
+                          forcar: bool = False) -> Dict[str, Any]:
+    """
+    Executa (ou retoma) o job de acréscimos do dia em lotes paralelos.
+
+    Returns:
+        status_execucao() ao final, ou {'status': 'lease_ocupado'} se outro
+        worker já está executando o job. Se o lease é perdido no meio, os
+        lotes não iniciados são cancelados (ficam pendentes no checkpoint) e
+        o status é 'lease_perdido'. Se a execução de hoje já foi concluída
+        (por este ou outro worker), devolve {'status': 'ja_executado'} sem
+        processar nada, a menos que forcar=True (execução manual).
+    """
+    global _progresso
+    workers = workers or _config_int('ACRESCIMOS_WORKERS', 4)
+    executor = executor or os.getenv('ACRESCIMOS_EXECUTOR', 'thread')
+    tamanho_lote = tamanho_lote or _config_int('ACRESCIMOS_TAMANHO_LOTE', 500)
+    duracao_lease = _config_int('ACRESCIMOS_LEASE_SEGUNDOS', 300)
+    dono = identificador_worker()
+
+    with obter_conexao() as conn:
+        garantir_tabelas_controle(conn.cursor())
+
+    if not adquirir_lease(dono, duracao_lease):
+        logger.info("Job de acréscimos já está em execução em outro worker; ignorando")
+        return {'status': 'lease_ocupado'}
+
+    renovador = _RenovadorLease(dono, duracao_lease)
+    renovador.start()
+    execucao = None
+    try:
+        if not forcar:
+            # Verificado com o lease: outro worker pode ter concluído e liberado antes
+            with obter_conexao() as conn:
+                concluida = _execucao_concluida_hoje(conn.cursor())
+            if concluida:
+                logger.info(f"Job de acréscimos de hoje já concluído (execução {concluida}); ignorando")
+                return {'status': 'ja_executado', 'execucao_id': concluida}
+
+        criar_tabela_log_se_necessario()
+        garantir_colunas_controle_acrescimos()
+        prestacoes = buscar_prestacoes_para_atualizar()
+
+        if renovador.lease_perdido.is_set():
+            raise RuntimeError("Lease do job de acréscimos perdido antes de iniciar os lotes")
+
+        with obter_conexao() as conn:
+            execucao = _carregar_ou_criar_execucao(conn.cursor(), dono, prestacoes, tamanho_lote)
+
+        with _progresso_lock:
+            _progresso = {
+                'status': 'executando',
+                'execucao_id': execucao['id'],
+                'retomada': execucao['retomada'],
+                'dono': dono,
+                'workers': workers,
+                'executor': executor,
+                'inicio': time.time(),
+                'lotes': execucao['lotes'],
+            }
+
+        pendentes = [l for l in execucao['lotes'] if l['status'] != 'concluido']
+        logger.info(
+            f"Execução {execucao['id']}: {len(prestacoes)} prestações, "
+            f"{len(pendentes)}/{len(execucao['lotes'])} lotes pendentes, "
+            f"{workers} workers ({executor})"
+        )
+
+        if executor == 'processo':
+            # spawn: o processo filho não pode herdar as conexões abertas do pool do pai
+            pool_workers = ProcessPoolExecutor(max_workers=workers,
+                                               mp_context=multiprocessing.get_context('spawn'))
+        else:
+            pool_workers = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='acrescimos')
+        falhas = 0
+        interrompida = False
+        with pool_workers as pool:
+            futuros = {}
+            for lote in pendentes:
+                prestacoes_lote = [
+                    p for p in prestacoes
+                    if lote['contrato_inicio'] <= p['contrato_id'] <= lote['contrato_fim']
+                ]
+                with _progresso_lock:
+                    lote['status'] = 'executando'
+                    lote['processadas'] = 0
+                futuros[pool.submit(_processar_lote_isolado, prestacoes_lote, incremental)] = \
+                    (lote, len(prestacoes_lote))
+
+            for futuro in as_completed(futuros):
+                lote, quantidade = futuros[futuro]
+                if not interrompida and renovador.lease_perdido.is_set():
+                    # Outro worker pode assumir a execução: não iniciar mais lotes
+                    interrompida = True
+                    cancelados = sum(1 for f in futuros if f.cancel())
+                    logger.error(f"Execução {execucao['id']} interrompida: lease perdido, "
+                                 f"{cancelados} lotes não iniciados cancelados")
+                if futuro.cancelled():
+                    with _progresso_lock:
+                        lote['status'] = 'pendente'
+                    continue
+                try:
+                    resultado = futuro.result()
+                    with _progresso_lock:
+                        lote.update(status='concluido', processadas=quantidade,
+                                    atualizadas=resultado['atualizadas'],
+                                    inalteradas=resultado['inalteradas'],
+                                    duracao_segundos=resultado['duracao_segundos'])
+                except Exception as e:
+                    falhas += 1
+                    logger.error(f"Erro no lote {lote['lote']} da execução {execucao['id']}: {e}")
+                    with _progresso_lock:
+                        lote.update(status='erro', erro=str(e))
+                _registrar_lote(execucao['id'], lote)
+
+        if interrompida:
+            # Sem finalizar no checkpoint: a execução pode já ser de outro worker
+            status_final = 'lease_perdido'
+        else:
+            status_final = 'concluido' if falhas == 0 else 'erro'
+            _finalizar_execucao(execucao['id'], status_final)
+        with _progresso_lock:
+            _progresso['status'] = status_final
+            _progresso['fim'] = time.time()
+
+    except Exception as e:
+        logger.error(f"Erro crítico no executor de acréscimos: {e}")
+        if execucao:
+            try:
+                _finalizar_execucao(execucao['id'], 'erro')
+            except Exception:
+                pass
+        with _progresso_lock:
+            _progresso['status'] = 'erro'
+            _progresso['erro'] = str(e)
+            _progresso['fim'] = time.time()
+        raise
+    finally:
+        renovador.parar()
+        try:
+            liberar_lease(dono)
+        except Exception as e:
+            logger.warning(f"Erro ao liberar lease do job de acréscimos: {e}")
+
+    resumo = status_execucao()
+    logger.info(
+        f"Execução {resumo['execucao_id']} {resumo['status']}: "
+        f"{resumo['processadas']} prestações em {resumo['duracao_segundos']:.2f}s "
+        f"({resumo['linhas_por_segundo']:.1f} linhas/s)"
+    )
+    return resumo
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    print(executar_job_paralelo(forcar=True))
@@ -0,0 +1,181 @@
+"""
+Execução de Acesso a Banco Fora do Event Loop
+================================================================
+
+Os endpoints do main.py são `async def`, mas repositories_adapter usa pyodbc
+(bloqueante). Chamado direto no event loop, uma consulta lenta trava todas as
+requisições do worker, inclusive /api/health.
+
+Este módulo roda o código bloqueante em um pool de threads limitado:
+
+    @app.get("/api/faturas")
+    @em_thread_bd('faturas')
+    def listar_faturas(...):          # corpo síncrono, como antes
+        ...
+
+    resultado = await executar_bd(funcao, arg1, grupo='faturas')
+
+Cada grupo (faturas, dashboard, pdf...) tem um limite de requisições
+simultâneas; as excedentes esperam na fila do grupo sem ocupar threads.
+metricas_executor() expõe fila, em execução e tempos de espera/execução.
+
+Configuração (.env):
+    DB_EXECUTOR_WORKERS     Threads do pool (padrão DB_POOL_SIZE ou 10)
+    DB_LIMITES_GRUPOS       Limites por grupo, ex.: "pdf=2,dashboard=4"
+                            (grupos sem limite usam DB_EXECUTOR_WORKERS)
+"""
+
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+LIMITES_PADRAO = {
+    'pdf': 2,
+    'dashboard': 4,
+    'upload': 1,
+    'job': 1,
+}
+
+
+def _ler_limites() -> Dict[str, int]:
+    limites = dict(LIMITES_PADRAO)
+    for parte in os.getenv('DB_LIMITES_GRUPOS', '').split(','):
+        if '=' in parte:
+            grupo, valor = parte.split('=', 1)
+            try:
+                limites[grupo.strip()] = max(1, int(valor))
+            except ValueError:
+                pass
+    return limites
+
+
+class ExecutorBD:
+    """Pool de threads limitado + semáforo por grupo + métricas"""
+
+    def __init__(self, workers: Optional[int] = None, limites: Optional[Dict[str, int]] = None):
+        self.workers = workers or int(os.getenv('DB_EXECUTOR_WORKERS', os.getenv('DB_POOL_SIZE', '10')))
+        self.limites = limites if limites is not None else _ler_limites()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bd')
+        self._semaforos: Dict[str, asyncio.Semaphore] = {}
+        self._lock = threading.Lock()
+        self._metricas: Dict[str, Dict[str, float]] = {}
+
+    def _semaforo(self, grupo: str) -> asyncio.Semaphore:
+        # Criado no event loop da aplicação na primeira requisição do grupo
+        semaforo = self._semaforos.get(grupo)
+        if semaforo is None:
+            semaforo = asyncio.Semaphore(min(self.limites.get(grupo, self.workers), self.workers))
+            self._semaforos[grupo] = semaforo
+        return semaforo
+
+    def _registro(self, grupo: str) -> Dict[str, float]:
+        registro = self._metricas.get(grupo)
+        if registro is None:
+            registro = self._metricas.setdefault(grupo, {
+                'chamadas': 0, 'erros': 0, 'na_fila': 0, 'em_execucao': 0,
+                'fila_max': 0, 'espera_total_ms': 0.0, 'espera_max_ms': 0.0,
+                'execucao_total_ms': 0.0, 'execucao_max_ms': 0.0,
+            })
+        return registro
+
+    async def executar(self, func: Callable, *args, grupo: str = 'padrao', **kwargs) -> Any:
+        """Executa func(*args, **kwargs) no pool respeitando o limite do grupo"""
+        chegada = time.perf_counter()
+        with self._lock:
+            registro = self._registro(grupo)
+            registro['chamadas'] += 1
+            registro['na_fila'] += 1
+            registro['fila_max'] = max(registro['fila_max'], registro['na_fila'])
+
+        async with self._semaforo(grupo):
+            inicio = time.perf_counter()
+            espera_ms = (inicio - chegada) * 1000
+            with self._lock:
+                registro['na_fila'] -= 1
+                registro['em_execucao'] += 1
+                registro['espera_total_ms'] += espera_ms
+                registro['espera_max_ms'] = max(registro['espera_max_ms'], espera_ms)
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._pool, functools.partial(func, *args, **kwargs))
+            except Exception:
+                with self._lock:
+                    registro['erros'] += 1
+                raise
+            finally:
+                execucao_ms = (time.perf_counter() - inicio) * 1000
+                with self._lock:
+                    registro['em_execucao'] -= 1
+                    registro['execucao_total_ms'] += execucao_ms
+                    registro['execucao_max_ms'] = max(registro['execucao_max_ms'], execucao_ms)
+
+    def metricas(self) -> Dict[str, Any]:
+        with self._lock:
+            grupos = {grupo: dict(registro) for grupo, registro in self._metricas.items()}
+        for grupo, registro in grupos.items():
+            chamadas = registro['chamadas'] or 1
+            registro['limite'] = min(self.limites.get(grupo, self.workers), self.workers)
+            registro['espera_media_ms'] = round(registro['espera_total_ms'] / chamadas, 3)
+            registro['execucao_media_ms'] = round(registro['execucao_total_ms'] / chamadas, 3)
+            for chave in ('espera_total_ms', 'espera_max_ms', 'execucao_total_ms', 'execucao_max_ms'):
+                registro[chave] = round(registro[chave], 3)
+        return {
+            'workers': self.workers,
+            'na_fila': sum(r['na_fila'] for r in grupos.values()),
+            'em_execucao': sum(r['em_execucao'] for r in grupos.values()),
+            'grupos': grupos,
+        }
+
+    def fechar(self):
+        self._pool.shutdown(wait=False)
+
+
+# ==================== EXECUTOR GLOBAL DO PROCESSO ====================
+
+_executor: Optional[ExecutorBD] = None
+_executor_lock = threading.Lock()
+
+
+def obter_executor() -> ExecutorBD:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ExecutorBD()
+    return _executor
+
+
+async def executar_bd(func: Callable, *args, grupo: str = 'padrao', **kwargs) -> Any:
+    """Roda código bloqueante (pyodbc, ReportLab...) fora do event loop"""
+    return await obter_executor().executar(func, *args, grupo=grupo, **kwargs)
+
+
+def em_thread_bd(grupo: str = 'padrao'):
+    """
+    Decorator para endpoints síncronos: o FastAPI recebe uma coroutine com a
+    mesma assinatura que executa o corpo no pool, limitado pelo grupo.
+    """
+    def decorador(func: Callable):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await executar_bd(func, *args, grupo=grupo, **kwargs)
+        return wrapper
+    return decorador
+
+
+def metricas_executor() -> Dict[str, Any]:
+    if _executor is None:
+        return {'status': 'nao_inicializado'}
+    return _executor.metricas()
+
+
+def fechar_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.fechar()
+            _executor = None
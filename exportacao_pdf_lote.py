@@ -0,0 +1,252 @@
+"""
+Exportação de PDFs em Lote
+================================================================
+
+Gera os PDFs de todas as prestações de um mês (opcionalmente de um
+locador) em segundo plano:
+
+- Dados: buscar_prestacoes_detalhadas_mes carrega o mês inteiro com quatro
+  consultas (em vez de seis por prestação).
+- ZIP: um PDF por prestação, renderizados em um pool de processos (ou
+  threads) e gravados no ZIP à medida que ficam prontos - o arquivo final
+  fica em disco, nunca inteiro em memória.
+- PDF único: as prestações em sequência no mesmo documento, cada uma a
+  partir de uma página nova.
+
+Cada exportação é um job com progresso consultável (status_exportacao).
+O job roda no worker que recebeu o POST, mas seu estado fica em disco, no
+diretório compartilhado EXPORTACAO_PDF_DIR: "<job_id>/status.json"
+(regravado a cada PDF) e o arquivo pronto ao lado. Assim, com vários
+workers do uvicorn, qualquer um deles responde ao progresso e ao download
+(mesmo esquema do cache_pdf). Jobs sem atualização há mais de
+EXPORTACAO_PDF_TTL são apagados.
+
+Configuração (.env):
+    EXPORTACAO_PDF_WORKERS      Renderizações em paralelo (padrão 4)
+    EXPORTACAO_PDF_EXECUTOR     'processo' (padrão) ou 'thread'
+    EXPORTACAO_PDF_TTL          Segundos que o arquivo pronto fica disponível (padrão 3600)
+    EXPORTACAO_PDF_DIR          Diretório compartilhado pelos workers
+                                (padrão: <temp>/cobimob_exportacao_pdf)
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from gerar_pdf_html import gerar_pdf_bytes, gerar_pdf_prestacoes
+from prestacoes_detalhadas import buscar_prestacoes_detalhadas_mes
+
+logger = logging.getLogger('exportacao_pdf_lote')
+
+FORMATOS = ('zip', 'pdf')
+
+
+def _config_int(nome: str, padrao: int) -> int:
+    try:
+        return max(1, int(os.getenv(nome, str(padrao))))
+    except ValueError:
+        return padrao
+
+
+ARQUIVO_STATUS = 'status.json'
+_JOB_ID = re.compile(r'[0-9a-f]{32}')
+
+# Protege o dict do job entre as threads do próprio worker; entre workers
+# o estado é o status.json (gravado com rename atômico)
+_jobs_lock = threading.Lock()
+
+
+def _diretorio_base() -> str:
+    diretorio = os.getenv('EXPORTACAO_PDF_DIR') or os.path.join(tempfile.gettempdir(), 'cobimob_exportacao_pdf')
+    os.makedirs(diretorio, exist_ok=True)
+    return diretorio
+
+
+def _diretorio_job(job_id: str) -> Optional[str]:
+    """Diretório do job (None se o id não tem o formato gerado: evita path traversal)"""
+    if not _JOB_ID.fullmatch(job_id or ''):
+        return None
+    return os.path.join(_diretorio_base(), job_id)
+
+
+def _gravar_status(job: Dict[str, Any]) -> None:
+    """Grava o status.json do job (chamado com _jobs_lock)"""
+    diretorio = _diretorio_job(job['id'])
+    descritor, temporario = tempfile.mkstemp(dir=diretorio, suffix='.tmp')
+    try:
+        with os.fdopen(descritor, 'w', encoding='utf-8') as arquivo:
+            json.dump(job, arquivo)
+        os.replace(temporario, os.path.join(diretorio, ARQUIVO_STATUS))
+    except BaseException:
+        try:
+            os.unlink(temporario)
+        except OSError:
+            pass
+        raise
+
+
+def _ler_status(job_id: str) -> Optional[Dict[str, Any]]:
+    diretorio = _diretorio_job(job_id)
+    if diretorio is None:
+        return None
+    try:
+        with open(os.path.join(diretorio, ARQUIVO_STATUS), encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+
+
+def _nome_arquivo(mes: int, ano: int, locador_id: Optional[int], formato: str) -> str:
+    sufixo = f"-locador-{locador_id}" if locador_id else ""
+    return f"prestacoes-{ano}-{mes:02d}{sufixo}.{formato}"
+
+
+def _nome_pdf_prestacao(prestacao: Dict[str, Any]) -> str:
+    locatario = (prestacao.get('contrato') or {}).get('locatario_nome') or 'sem-locatario'
+    locatario = ''.join(c if c.isalnum() else '-' for c in locatario).strip('-')[:40]
+    return f"prestacao-{prestacao['id']}-{locatario}.pdf"
+
+
+def _atualizar(job: Dict[str, Any], **campos) -> None:
+    with _jobs_lock:
+        job.update(campos)
+        _gravar_status(job)
+
+
+def _gerar_zip(job: Dict[str, Any], prestacoes, caminho: str) -> None:
+    workers = _config_int('EXPORTACAO_PDF_WORKERS', 4)
+    if os.getenv('EXPORTACAO_PDF_EXECUTOR', 'processo') == 'processo':
+        pool_workers = ProcessPoolExecutor(max_workers=workers,
+                                           mp_context=multiprocessing.get_context('spawn'))
+    else:
+        pool_workers = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='exportacao_pdf')
+
+    # ZIP_STORED: PDF já é comprimido, deflate só gastaria CPU
+    with pool_workers as pool, zipfile.ZipFile(caminho, 'w', zipfile.ZIP_STORED) as arquivo_zip:
+        futuros = {pool.submit(gerar_pdf_bytes, prestacao): prestacao for prestacao in prestacoes}
+        for futuro in as_completed(futuros):
+            prestacao = futuros[futuro]
+            try:
+                arquivo_zip.writestr(_nome_pdf_prestacao(prestacao), futuro.result())
+                _atualizar(job, concluidas=job['concluidas'] + 1)
+            except Exception as e:
+                logger.error(f"Erro ao gerar PDF da prestação {prestacao['id']}: {e}")
+                _atualizar(job, erros=job['erros'] + [{'prestacao_id': prestacao['id'], 'erro': str(e)}])
+
+
+def _gerar_pdf_unico(job: Dict[str, Any], prestacoes, caminho: str) -> None:
+    quantidade = gerar_pdf_prestacoes(prestacoes, caminho)
+    _atualizar(job, concluidas=quantidade)
+
+
+def _executar(job: Dict[str, Any]) -> None:
+    try:
+        prestacoes = buscar_prestacoes_detalhadas_mes(job['mes'], job['ano'], job['locador_id'])
+        _atualizar(job, status='gerando', total=len(prestacoes))
+
+        caminho = os.path.join(_diretorio_job(job['id']), job['nome_arquivo'])
+        if job['formato'] == 'zip':
+            _gerar_zip(job, prestacoes, caminho)
+        else:
+            _gerar_pdf_unico(job, prestacoes, caminho)
+
+        _atualizar(job, status='concluido', tamanho_bytes=os.path.getsize(caminho), fim=time.time())
+        logger.info(f"Exportação {job['id']} concluída: {job['concluidas']}/{job['total']} PDFs")
+    except Exception as e:
+        logger.error(f"Erro na exportação {job['id']}: {e}")
+        _atualizar(job, status='erro', erro=str(e), fim=time.time())
+
+
+def _limpar_expirados() -> None:
+    """
+    Apaga os jobs cujo status.json não muda há mais de EXPORTACAO_PDF_TTL:
+    prontos há mais que isso ou abandonados (worker reiniciado no meio)
+    """
+    ttl = _config_int('EXPORTACAO_PDF_TTL', 3600)
+    agora = time.time()
+    with os.scandir(_diretorio_base()) as entradas:
+        diretorios = [entrada.path for entrada in entradas
+                      if entrada.is_dir() and _JOB_ID.fullmatch(entrada.name)]
+    for diretorio in diretorios:
+        try:
+            atualizado_em = os.path.getmtime(os.path.join(diretorio, ARQUIVO_STATUS))
+        except OSError:
+            continue
+        if agora - atualizado_em > ttl:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+
+def iniciar_exportacao(mes: int, ano: int, locador_id: Optional[int] = None,
+                       formato: str = 'zip') -> Dict[str, Any]:
+    """
+    Dispara a exportação em uma thread de fundo e devolve o status inicial.
+
+    Args:
+        mes, ano: Mês de referência das prestações
+        locador_id: Restringe às prestações do locador (principal ou co-locador)
+        formato: 'zip' (um PDF por prestação) ou 'pdf' (PDF único)
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato inválido: {formato} (use {' ou '.join(FORMATOS)})")
+    if not 1 <= mes <= 12:
+        raise ValueError("Mês deve estar entre 1 e 12")
+
+    _limpar_expirados()
+    job = {
+        'id': uuid.uuid4().hex,
+        'status': 'carregando',
+        'mes': mes,
+        'ano': ano,
+        'locador_id': locador_id,
+        'formato': formato,
+        'nome_arquivo': _nome_arquivo(mes, ano, locador_id, formato),
+        'total': 0,
+        'concluidas': 0,
+        'erros': [],
+        'inicio': time.time(),
+    }
+    os.makedirs(_diretorio_job(job['id']))
+    with _jobs_lock:
+        _gravar_status(job)
+
+    threading.Thread(target=_executar, args=(job,), name=f"exportacao_pdf_{job['id'][:8]}",
+                     daemon=True).start()
+    return status_exportacao(job['id'])
+
+
+def status_exportacao(job_id: str) -> Optional[Dict[str, Any]]:
+    """Progresso do job, lido do diretório compartilhado (None se não existe ou já expirou)"""
+    progresso = _ler_status(job_id)
+    if progresso is None:
+        return None
+
+    fim = progresso.get('fim') or time.time()
+    progresso['duracao_segundos'] = round(fim - progresso['inicio'], 3)
+    progresso['percentual'] = round(100.0 * progresso['concluidas'] / progresso['total'], 1) \
+        if progresso['total'] else 0.0
+    progresso['inicio'] = datetime.fromtimestamp(progresso['inicio']).strftime('%Y-%m-%d %H:%M:%S')
+    if progresso.get('fim'):
+        progresso['fim'] = datetime.fromtimestamp(progresso['fim']).strftime('%Y-%m-%d %H:%M:%S')
+    return progresso
+
+
+def arquivo_exportacao(job_id: str) -> Optional[Dict[str, str]]:
+    """Caminho e nome do arquivo de um job concluído (None se não está pronto)"""
+    job = _ler_status(job_id)
+    if job is None or job['status'] != 'concluido':
+        return None
+    caminho = os.path.join(_diretorio_job(job_id), job['nome_arquivo'])
+    if not os.path.exists(caminho):
+        return None
+    return {'caminho': caminho, 'nome_arquivo': job['nome_arquivo'], 'formato': job['formato']}
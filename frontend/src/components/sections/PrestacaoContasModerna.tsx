@@ -28,11 +28,16 @@ import {
   Calculator,
   X,
   Edit3,
-  Save
+  Save,
+  ChevronLeft,
+  ChevronRight
 } from 'lucide-react';
 import type { Fatura, FaturaStats, FaturaFilters, FaturasResponse } from "@/types";
 import toast from "react-hot-toast";
 
+// Faturas por página (a API pagina com page/limit e devolve total/pages)
+const FATURAS_POR_PAGINA = 20;
+
 // Utilitários
 const formatCurrency = (value: number) => {
   return new Intl.NumberFormat('pt-BR', {
@@ -124,14 +129,18 @@ export const PrestacaoContasModerna: React.FC = () => {
   const [searchTerm, setSearchTerm] = useState('');
   const [sortField, setSortField] = useState('data_vencimento');
   const [sortDirection, setSortDirection] = useState<'ASC' | 'DESC'>('DESC');
+  const [pagina, setPagina] = useState(1);
+  const [totalPaginas, setTotalPaginas] = useState(0);
+  const [totalFaturas, setTotalFaturas] = useState(0);
   
   // Estados removidos - agora usa página separada para edição
 
   // Função para buscar faturas da API (sem useCallback)
-  const buscarFaturas = async () => {
+  // Mudança de aba, ordenação ou filtro volta para a página 1
+  const buscarFaturas = async (paginaDesejada: number = 1) => {
     setLoading(true);
     try {
-      console.log('🔍 Buscando faturas...');
+      console.log('🔍 Buscando faturas... página', paginaDesejada);
       console.log('📊 Aba ativa:', activeTab);
       console.log('🔍 Termo de busca:', searchTerm);
       console.log('📋 Filtros atuais:', filtros);
@@ -177,6 +186,10 @@ export const PrestacaoContasModerna: React.FC = () => {
       params.append('order_by', sortField);
       params.append('order_dir', sortDirection);
 
+      // Paginação
+      params.append('page', paginaDesejada.toString());
+      params.append('limit', FATURAS_POR_PAGINA.toString());
+
       const url = `/api/faturas?${params.toString()}`;
       console.log('🌐 URL completa da API:', url);
       
@@ -202,11 +215,16 @@ export const PrestacaoContasModerna: React.FC = () => {
       
       setFaturas(data.data || []);
       setStats(data.stats || stats);
+      setPagina(data.page || paginaDesejada);
+      setTotalPaginas(data.pages || 0);
+      setTotalFaturas(data.total || 0);
       
     } catch (error) {
       console.error('❌ Erro ao buscar faturas:', error);
       toast.error("Erro ao carregar faturas");
       setFaturas([]);
+      setTotalPaginas(0);
+      setTotalFaturas(0);
     } finally {
       setLoading(false);
     }
@@ -782,6 +800,38 @@ export const PrestacaoContasModerna: React.FC = () => {
                           </tbody>
                         </table>
                       </div>
+                      {totalPaginas > 1 && (
+                        <div className="flex items-center justify-between px-4 py-3 border-t border-border">
+                          <span className="text-sm text-muted-foreground">
+                            {(pagina - 1) * FATURAS_POR_PAGINA + 1}–{(pagina - 1) * FATURAS_POR_PAGINA + faturas.length} de {totalFaturas} faturas
+                          </span>
+                          <div className="flex items-center space-x-2">
+                            <Button
+                              size="sm"
+                              variant="outline"
+                              className="btn-outline"
+                              disabled={pagina <= 1}
+                              onClick={() => buscarFaturas(pagina - 1)}
+                              title="Página anterior"
+                            >
+                              <ChevronLeft className="w-4 h-4" />
+                            </Button>
+                            <span className="text-sm text-foreground">
+                              Página {pagina} de {totalPaginas}
+                            </span>
+                            <Button
+                              size="sm"
+                              variant="outline"
+                              className="btn-outline"
+                              disabled={pagina >= totalPaginas}
+                              onClick={() => buscarFaturas(pagina + 1)}
+                              title="Próxima página"
+                            >
+                              <ChevronRight className="w-4 h-4" />
+                            </Button>
+                          </div>
+                        </div>
+                      )}
                     </div>
                   )}
                 </TabsContent>
@@ -87,7 +87,9 @@ export interface FaturasResponse {
   data: Fatura[];
   total: number;
   page: number;
+  limit: number;
   pages: number;
+  next_cursor?: number | null;
   stats: FaturaStats;
 }
 
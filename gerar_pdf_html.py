@@ -1,127 +1,157 @@
 """
 Gerador de PDF usando templates HTML personalizados da COBIMOB
+
+O template (template_prestacao.html) e os logos ficam carregados em um
+RenderizadorPrestacao: lidos uma vez (caminhos relativos a este módulo, não
+ao diretório de trabalho), logos já em base64 e o template já dividido nos
+placeholders {{NOME}}. Renderizar é uma passada juntando os trechos, em vez
+de um str.replace por placeholder sobre o documento inteiro.
+
+PDF_TEMPLATE_RECARREGAR=1 (desenvolvimento) relê template/logos quando o
+mtime dos arquivos muda.
 """
+import base64
+import hashlib
 import os
+import re
+import threading
 from io import BytesIO
 from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+DIRETORIO_MODULO = os.path.dirname(os.path.abspath(__file__))
+
+PLACEHOLDER = re.compile(r"\{\{([A-Z0-9_]+)\}\}")
+
+# Placeholder -> arquivo (relativo ao módulo) embutido como data URI
+LOGOS = {
+    'LOGO1_BASE64': 'Cobimob logos-01.png',
+    'LOGO2_BASE64': 'Cobimob logos-03.png',
+}
+
+# Versão do layout do PDF (layout_pdf_prestacao): incrementar ao mudar o
+# desenho do PDF para que os PDFs em cache (cache_pdf) sejam regerados
+VERSAO_LAYOUT_PDF = 2
+
+def compilar_template(html_template: str) -> List[str]:
+    """Divide o template em [texto, PLACEHOLDER, texto, PLACEHOLDER, ..., texto]"""
+    return PLACEHOLDER.split(html_template)
+
+def aplicar_template(partes: List[str], valores: Dict[str, Any]) -> str:
+    """Junta o template compilado; placeholders sem valor ficam como estão"""
+    saida = partes[:]
+    for posicao in range(1, len(partes), 2):
+        nome = partes[posicao]
+        saida[posicao] = str(valores[nome]) if nome in valores else f"{{{{{nome}}}}}"
+    return ''.join(saida)
+
+class RenderizadorPrestacao:
+    """Template HTML da prestação + logos em base64, carregados uma vez"""
+
+    def __init__(self, diretorio: str = DIRETORIO_MODULO, arquivo_template: str = 'template_prestacao.html',
+                 recarregar: Optional[bool] = None):
+        self.diretorio = diretorio
+        self.caminho_template = os.path.join(diretorio, arquivo_template)
+        if recarregar is None:
+            recarregar = os.getenv('PDF_TEMPLATE_RECARREGAR', '0') == '1'
+        self.recarregar = recarregar
+        self._lock = threading.Lock()
+        self._mtimes: Dict[str, Optional[float]] = {}
+        self._partes: List[str] = []
+        self._logos: Dict[str, str] = {}
+        self._versao = ''
+        self.carregar()
+
+    def _arquivos(self) -> List[str]:
+        return [self.caminho_template] + [os.path.join(self.diretorio, arquivo) for arquivo in LOGOS.values()]
+
+    @staticmethod
+    def _mtime(caminho: str) -> Optional[float]:
+        try:
+            return os.path.getmtime(caminho)
+        except OSError:
+            return None
+
+    def carregar(self):
+        """(Re)lê template e logos do disco"""
+        with open(self.caminho_template, 'r', encoding='utf-8') as file:
+            conteudo = file.read()
+        partes = compilar_template(conteudo)
+        digest = hashlib.sha1(conteudo.encode('utf-8'))
+
+        logos = {}
+        for placeholder, arquivo in LOGOS.items():
+            try:
+                with open(os.path.join(self.diretorio, arquivo), 'rb') as f:
+                    logos[placeholder] = f"data:image/png;base64,{base64.b64encode(f.read()).decode()}"
+            except OSError:
+                print(f"AVISO: Logo não encontrada: {arquivo}")
+                logos[placeholder] = ""
+            digest.update(logos[placeholder].encode('ascii'))
+
+        with self._lock:
+            self._partes = partes
+            self._logos = logos
+            self._versao = digest.hexdigest()[:12]
+            self._mtimes = {caminho: self._mtime(caminho) for caminho in self._arquivos()}
+
+    def _recarregar_se_alterado(self):
+        if any(self._mtime(caminho) != mtime for caminho, mtime in self._mtimes.items()):
+            print("Template de prestação alterado em disco - recarregando")
+            self.carregar()
+
+    @property
+    def logos(self) -> Dict[str, str]:
+        with self._lock:
+            return self._logos
+
+    @property
+    def versao(self) -> str:
+        """Hash do template + logos carregados"""
+        if self.recarregar:
+            self._recarregar_se_alterado()
+        with self._lock:
+            return self._versao
+
+    def renderizar(self, dados) -> str:
+        """HTML da prestação com os dados de buscar_prestacao_detalhada"""
+        if self.recarregar:
+            self._recarregar_se_alterado()
+        with self._lock:
+            partes, logos = self._partes, self._logos
+        return aplicar_template(partes, {**montar_valores_template(dados), **logos})
+
+_renderizador: Optional[RenderizadorPrestacao] = None
+_renderizador_lock = threading.Lock()
+
+def obter_renderizador() -> RenderizadorPrestacao:
+    """Renderizador compartilhado (carregado na primeira chamada ou em carregar_renderizador)"""
+    global _renderizador
+    if _renderizador is None:
+        with _renderizador_lock:
+            if _renderizador is None:
+                _renderizador = RenderizadorPrestacao()
+    return _renderizador
+
+def carregar_renderizador():
+    """Carrega template e logos na inicialização da API"""
+    obter_renderizador()
+
+def renderizar_html_prestacao(dados) -> str:
+    """HTML personalizado da COBIMOB para a prestação"""
+    return obter_renderizador().renderizar(dados)
+
+def versao_template() -> str:
+    """Versão do layout do PDF + template/logos (parte da chave do cache de PDFs)"""
+    return f"{VERSAO_LAYOUT_PDF}-{obter_renderizador().versao}"
 
 def gerar_pdf_de_html(prestacao_data):
     """Gera PDF usando o template HTML da COBIMOB com dados reais"""
     try:
-        # Carregar template HTML personalizado
-        template_path = os.path.join(os.path.dirname(__file__), 'template_prestacao.html')
-
-        with open(template_path, 'r', encoding='utf-8') as file:
-            html_template = file.read()
-
-        # Substituir dados no template
-        html_content = popular_template_com_dados(html_template, prestacao_data)
-
-        print("🎯 Gerando PDF usando método simples com template personalizado")
-
-        # Salvar HTML temporário
-        import tempfile
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.html', delete=False, encoding='utf-8') as temp_html:
-            temp_html.write(html_content)
-            temp_html_path = temp_html.name
-
-        # Usar reportlab para gerar PDF com os dados do nosso template
-        print("🎯 Gerando PDF usando dados do template HTML personalizado")
-
-        # Criar um buffer temporário
+        # PDF montado com reportlab platypus a partir dos dados (o HTML do
+        # template é servido pelo preview=html; não é preciso renderizá-lo aqui)
         buffer = BytesIO()
-
-        # Criar PDF simples com dados do nosso template
-        from reportlab.lib.pagesizes import A4
-        from reportlab.pdfgen import canvas
-        from reportlab.lib.units import mm
-
-        p = canvas.Canvas(buffer, pagesize=A4)
-        width, height = A4
-
-        # Header COBIMOB
-        p.setFont("Helvetica-Bold", 16)
-        p.drawString(50, height - 50, "PRESTAÇÃO DE CONTAS MENSAL - COBIMOB")
-
-        # Dados básicos extraídos do template
-        y = height - 100
-        p.setFont("Helvetica", 12)
-
-        # Pegar dados do template populado (variável correta é prestacao_data)
-        prestacao_id = prestacao_data.get('id', 'N/A')
-        mes_ano = f"{obter_nome_mes(int(prestacao_data.get('mes', '01')))}/{prestacao_data.get('ano', '2024')}"
-
-        p.drawString(50, y, f"Prestação Nº: PC-{str(prestacao_id).zfill(3)}")
-        y -= 20
-        p.drawString(50, y, f"Período: {mes_ano}")
-        y -= 20
-        p.drawString(50, y, f"Gerado em: {datetime.now().strftime('%d/%m/%Y')}")
-        y -= 40
-
-        # Locador
-        locadores = prestacao_data.get('locadores', [])
-        if locadores:
-            p.setFont("Helvetica-Bold", 12)
-            p.drawString(50, y, "PROPRIETÁRIO(S):")
-            y -= 15
-            p.setFont("Helvetica", 10)
-            for locador in locadores:
-                nome = locador.get('locador_nome', 'Nome não informado')
-                cpf = locador.get('cpf_cnpj', 'CPF não informado')
-                p.drawString(70, y, f"{nome} - CPF: {cpf}")
-                y -= 15
-
-        y -= 20
-
-        # Locatário
-        contrato = prestacao_data.get('contrato', {})
-        locatario_nome = contrato.get('locatario_nome', prestacao_data.get('locatario_nome', 'Nome não informado'))
-        p.setFont("Helvetica-Bold", 12)
-        p.drawString(50, y, "LOCATÁRIO:")
-        y -= 15
-        p.setFont("Helvetica", 10)
-        p.drawString(70, y, locatario_nome)
-        y -= 30
-
-        # Imóvel
-        imovel_endereco = contrato.get('imovel_endereco', prestacao_data.get('imovel_endereco', 'Endereço não informado'))
-        p.setFont("Helvetica-Bold", 12)
-        p.drawString(50, y, "IMÓVEL:")
-        y -= 15
-        p.setFont("Helvetica", 10)
-        # Quebrar endereço longo em múltiplas linhas
-        endereco_lines = [imovel_endereco[i:i+80] for i in range(0, len(imovel_endereco), 80)]
-        for line in endereco_lines:
-            p.drawString(70, y, line)
-            y -= 15
-
-        y -= 20
-
-        # Valores - CONDICIONAL: se há acréscimos, usar total com acréscimos
-        valor_acrescimos = prestacao_data.get('valor_acrescimos', 0) or 0
-        valor_boleto_base = prestacao_data.get('valor_boleto', prestacao_data.get('valor_total', 0))
-
-        # Se há acréscimos, usar valor total com acréscimos
-        if valor_acrescimos > 0:
-            valor_boleto = prestacao_data.get('valor_total_com_acrescimos', valor_boleto_base + valor_acrescimos)
-        else:
-            valor_boleto = valor_boleto_base
-
-        total_retido = prestacao_data.get('total_retido', 0)
-        valor_repasse = prestacao_data.get('valor_repasse', prestacao_data.get('valor_liquido', 0))
-
-        p.setFont("Helvetica-Bold", 12)
-        p.drawString(50, y, "RESUMO FINANCEIRO:")
-        y -= 20
-        p.setFont("Helvetica", 10)
-        p.drawString(70, y, f"Valor do Boleto: {formatar_moeda(valor_boleto)}")
-        y -= 15
-        p.drawString(70, y, f"Total Retido: {formatar_moeda(total_retido)}")
-        y -= 15
-        p.drawString(70, y, f"Valor de Repasse: {formatar_moeda(valor_repasse)}")
-
-        # Finalizar PDF
-        p.save()
+        gerar_pdf_em_arquivo(prestacao_data, buffer)
         buffer.seek(0)
 
         print("PDF gerado com sucesso usando dados do template personalizado")
@@ -133,29 +163,31 @@ def gerar_pdf_de_html(prestacao_data):
         traceback.print_exc()
         return None
 
-def popular_template_com_dados(html_template, dados):
-    """Popula o template HTML com os dados reais da prestação"""
-
-    print(f"DEBUG: Tipo de dados recebido: {type(dados)}")
-    print(f"DEBUG: Primeiras chaves/índices: {list(dados.keys()) if isinstance(dados, dict) else 'É uma lista'}")
-
-    # Converter logos para base64
-    import base64
-    logo1_base64 = ""
-    logo2_base64 = ""
-
-    try:
-        with open('Cobimob logos-01.png', 'rb') as f:
-            logo1_base64 = f"data:image/png;base64,{base64.b64encode(f.read()).decode()}"
-    except:
-        print("AVISO: Logo 1 não encontrada")
-
-    try:
-        with open('Cobimob logos-03.png', 'rb') as f:
-            logo2_base64 = f"data:image/png;base64,{base64.b64encode(f.read()).decode()}"
-    except:
-        print("AVISO: Logo 2 não encontrada")
-
+def gerar_pdf_em_arquivo(prestacao_data, destino):
+    """
+    Gera o PDF direto em `destino` (caminho ou arquivo binário aberto),
+    sem buffer intermediário. Erros são propagados.
+    """
+    from layout_pdf_prestacao import gerar_pdf_prestacao
+    gerar_pdf_prestacao(prestacao_data, destino)
+
+def gerar_pdf_bytes(prestacao_data) -> bytes:
+    """PDF de uma prestação em bytes (função de módulo: usada em pool de processos)"""
+    buffer = BytesIO()
+    gerar_pdf_em_arquivo(prestacao_data, buffer)
+    return buffer.getvalue()
+
+def gerar_pdf_prestacoes(prestacoes, destino) -> int:
+    """
+    Um único PDF com as prestações em sequência (cada uma a partir de uma
+    página nova), gravado em `destino` (caminho ou arquivo binário).
+    Devolve a quantidade de prestações.
+    """
+    from layout_pdf_prestacao import gerar_pdf_varias_prestacoes
+    return gerar_pdf_varias_prestacoes(prestacoes, destino)
+
+def montar_valores_template(dados) -> Dict[str, Any]:
+    """Valores dos placeholders do template (sem os logos) a partir dos dados da prestação"""
     # Se dados for uma lista, pega o primeiro item
     if isinstance(dados, list) and len(dados) > 0:
         dados = dados[0]
@@ -252,78 +284,62 @@ def popular_template_com_dados(html_template, dados):
         except:
             pass
 
-    # Substituições no template
-    replacements = {
+    return {
         # Dados básicos
-        '{{PRESTACAO_ID}}': f'PC-{str(prestacao_id).zfill(3)}',
-        '{{MES_ANO}}': f'{obter_nome_mes(int(mes))}/{ano}',
-        '{{DATA_GERACAO}}': datetime.now().strftime('%d/%m/%Y'),
-        '{{DATA_VENCIMENTO}}': data_vencimento if data_vencimento else 'Não informado',
-        '{{DATA_PAGAMENTO}}': data_pagamento if data_pagamento else 'Não pago',
+        'PRESTACAO_ID': f'PC-{str(prestacao_id).zfill(3)}',
+        'MES_ANO': f'{obter_nome_mes(int(mes))}/{ano}',
+        'DATA_GERACAO': datetime.now().strftime('%d/%m/%Y'),
+        'DATA_VENCIMENTO': data_vencimento if data_vencimento else 'Não informado',
+        'DATA_PAGAMENTO': data_pagamento if data_pagamento else 'Não pago',
 
         # Locador (como proprietário no template)
-        '{{PROPRIETARIO_NOME}}': locador_nome,
-        '{{PROPRIETARIO_CPF}}': locador_cpf,
-        '{{PROPRIETARIO_TELEFONE}}': locador_telefone,
-        '{{PROPRIETARIO_EMAIL}}': locador_email,
+        'PROPRIETARIO_NOME': locador_nome,
+        'PROPRIETARIO_CPF': locador_cpf,
+        'PROPRIETARIO_TELEFONE': locador_telefone,
+        'PROPRIETARIO_EMAIL': locador_email,
 
         # Locatário
-        '{{LOCATARIO_NOME}}': locatario_nome,
-        '{{LOCATARIO_CPF}}': contrato.get('locatario_cpf', 'CPF não informado') if contrato else 'CPF não informado',
-        '{{LOCATARIO_TELEFONE}}': locatario_telefone,
-        '{{LOCATARIO_EMAIL}}': locatario_email,
+        'LOCATARIO_NOME': locatario_nome,
+        'LOCATARIO_CPF': contrato.get('locatario_cpf', 'CPF não informado') if contrato else 'CPF não informado',
+        'LOCATARIO_TELEFONE': locatario_telefone,
+        'LOCATARIO_EMAIL': locatario_email,
 
         # Imóvel
-        '{{IMOVEL_ENDERECO}}': imovel_endereco,
+        'IMOVEL_ENDERECO': imovel_endereco,
 
         # Valores - CONDICIONAL: incluir acréscimos se houver
-        '{{VALOR_BOLETO}}': formatar_moeda(valor_boleto),
-        '{{VALOR_BOLETO_BASE}}': formatar_moeda(valor_boleto_base),
-        '{{VALOR_ACRESCIMOS}}': formatar_moeda(valor_acrescimos),
-        '{{DIAS_ATRASO}}': str(dias_atraso),
-        '{{TOTAL_RETIDO}}': formatar_moeda(total_retido),
-        '{{VALOR_REPASSE}}': formatar_moeda(valor_repasse),
+        'VALOR_BOLETO': formatar_moeda(valor_boleto),
+        'VALOR_BOLETO_BASE': formatar_moeda(valor_boleto_base),
+        'VALOR_ACRESCIMOS': formatar_moeda(valor_acrescimos),
+        'DIAS_ATRASO': str(dias_atraso),
+        'TOTAL_RETIDO': formatar_moeda(total_retido),
+        'VALOR_REPASSE': formatar_moeda(valor_repasse),
 
         # Seção de acréscimos removida - acréscimos aparecem como lançamento normal
 
         # Proprietários
-        '{{PROPRIETARIOS_INFO}}': gerar_html_proprietarios(locadores),
+        'PROPRIETARIOS_INFO': gerar_html_proprietarios(locadores),
 
         # Valores cobrados
-        '{{VALORES_COBRADOS_HTML}}': gerar_html_valores_cobrados(lancamentos),
+        'VALORES_COBRADOS_HTML': gerar_html_valores_cobrados(lancamentos),
 
         # Valores retidos
-        '{{VALORES_RETIDOS_HTML}}': gerar_html_valores_retidos(lancamentos),
+        'VALORES_RETIDOS_HTML': gerar_html_valores_retidos(lancamentos),
 
         # Repasses
-        '{{REPASSES_HTML}}': gerar_html_repasses(dados.get('distribuicao_repasse', []), locadores),
+        'REPASSES_HTML': gerar_html_repasses(dados.get('distribuicao_repasse', []), locadores),
 
         # Data do repasse
-        '{{DATA_REPASSE}}': datetime.now().strftime('%d/%m/%Y'),
+        'DATA_REPASSE': datetime.now().strftime('%d/%m/%Y'),
 
         # Tipo de pagamento (PIX ou TED)
-        '{{TIPO_PAGAMENTO}}': determinar_tipo_pagamento(locadores),
-
-        # Logos em base64
-        '{{LOGO1_BASE64}}': logo1_base64,
-        '{{LOGO2_BASE64}}': logo2_base64
+        'TIPO_PAGAMENTO': determinar_tipo_pagamento(locadores)
     }
 
-    # Aplicar todas as substituições
-    print(f"DEBUG - Substituições que serão aplicadas:")
-    print(f"   - LOCATARIO_NOME: {replacements.get('{{LOCATARIO_NOME}}')}")
-    print(f"   - IMOVEL_ENDERECO: {replacements.get('{{IMOVEL_ENDERECO}}')}")
-    print(f"   - VALOR_BOLETO: {replacements.get('{{VALOR_BOLETO}}')}")
-    print(f"   - TOTAL_RETIDO: {replacements.get('{{TOTAL_RETIDO}}')}")
-    print(f"   - VALOR_REPASSE: {replacements.get('{{VALOR_REPASSE}}')}")
-
-    html_final = html_template
-    for placeholder, value in replacements.items():
-        html_final = html_final.replace(placeholder, str(value))
-        if placeholder in ['{{LOCATARIO_NOME}}', '{{VALOR_BOLETO}}', '{{TOTAL_RETIDO}}']:
-            print(f"   Substituído {placeholder} -> {value}")
-
-    return html_final
+def popular_template_com_dados(html_template, dados):
+    """Popula um template HTML (já lido) com os dados reais da prestação"""
+    valores = {**montar_valores_template(dados), **obter_renderizador().logos}
+    return aplicar_template(compilar_template(html_template), valores)
 
 def gerar_html_proprietarios(locadores):
     """Gera HTML para informações dos proprietários"""
@@ -339,46 +355,45 @@ def gerar_html_proprietarios(locadores):
 
     return html if html else '<div><strong>Proprietário não informado</strong></div>'
 
-def gerar_html_valores_cobrados(lancamentos):
-    """Gera HTML para valores cobrados - incluindo acréscimos como lançamento normal"""
+def linhas_valores_cobrados(lancamentos) -> List[Dict[str, Any]]:
+    """
+    Linhas de "Valores Cobrados" (termo, desconto e acréscimo), uma por tipo
+    de lançamento - mantendo a de maior valor absoluto - na ordem em que o
+    tipo aparece. Cada linha: descricao, valor, categoria.
+    """
     if not lancamentos or not isinstance(lancamentos, list):
-        return '<tr><td>Nenhum lançamento encontrado</td><td class="valor">R$ 0,00</td></tr>'
+        return []
 
-    html = ''
     lancamentos_processados = {}  # Usar dict para evitar duplicação e manter o valor maior
 
-    # Primeira passagem: agrupar lançamentos por tipo, mantendo o de maior valor absoluto
     for lancamento in lancamentos:
         if isinstance(lancamento, dict) and lancamento.get('categoria') in ['termo', 'desconto', 'acrescimo']:
             tipo = lancamento.get('tipo', '')
-            descricao = lancamento.get('descricao', 'N/A')
             valor = lancamento.get('valor', 0)
-            categoria = lancamento.get('categoria', '')
 
             # Se já existe um lançamento desse tipo, manter o de maior valor absoluto
-            if tipo in lancamentos_processados:
-                if abs(valor) > abs(lancamentos_processados[tipo]['valor']):
-                    lancamentos_processados[tipo] = {
-                        'descricao': descricao,
-                        'valor': valor,
-                        'categoria': categoria
-                    }
-            else:
+            if tipo not in lancamentos_processados or abs(valor) > abs(lancamentos_processados[tipo]['valor']):
                 lancamentos_processados[tipo] = {
-                    'descricao': descricao,
+                    'descricao': lancamento.get('descricao', 'N/A'),
                     'valor': valor,
-                    'categoria': categoria
+                    'categoria': lancamento.get('categoria', '')
                 }
 
-    # Segunda passagem: gerar HTML com lançamentos únicos
-    for tipo, dados in lancamentos_processados.items():
-        descricao = dados['descricao']
-        valor = dados['valor']
-        categoria = dados['categoria']
+    return list(lancamentos_processados.values())
+
+def gerar_html_valores_cobrados(lancamentos):
+    """Gera HTML para valores cobrados - incluindo acréscimos como lançamento normal"""
+    if not lancamentos or not isinstance(lancamentos, list):
+        return '<tr><td>Nenhum lançamento encontrado</td><td class="valor">R$ 0,00</td></tr>'
+
+    html = ''
+    for linha in linhas_valores_cobrados(lancamentos):
+        descricao = linha['descricao']
+        valor = linha['valor']
         valor_formatado = formatar_moeda(valor)
 
         # Aplicar estilo específico para cada categoria
-        if categoria == 'desconto':
+        if linha['categoria'] == 'desconto':
             html += f'<tr><td>{descricao}</td><td class="valor valor-desconto">{valor_formatado}</td></tr>'
         elif valor < 0:
             html += f'<tr><td>{descricao}</td><td class="valor valor-negativo">{valor_formatado}</td></tr>'
@@ -387,50 +402,49 @@ def gerar_html_valores_cobrados(lancamentos):
 
     return html if html else '<tr><td>Nenhum valor cobrado</td><td class="valor">R$ 0,00</td></tr>'
 
-def gerar_html_valores_retidos(lancamentos):
-    """Gera HTML para valores retidos - NÃO incluir descontos"""
+def linhas_valores_retidos(lancamentos) -> List[Dict[str, Any]]:
+    """
+    Linhas de "Valores Retidos" (categorias retido e taxa; descontos ficam nos
+    valores cobrados), uma por tipo com o maior valor absoluto, ordenadas por
+    tipo. Cada linha: descricao, valor (positivo, só os maiores que zero).
+    """
     if not lancamentos or not isinstance(lancamentos, list):
-        return '<tr><td>Nenhum valor retido</td><td class="valor">R$ 0,00</td></tr>'
+        return []
 
-    html = ''
     lancamentos_processados = {}  # Dict para evitar duplicação e manter maior valor
 
     for lancamento in lancamentos:
         if isinstance(lancamento, dict):
             categoria = lancamento.get('categoria', '').lower()
             tipo = lancamento.get('tipo', '')
-            descricao = lancamento.get('descricao', 'N/A')
             valor = lancamento.get('valor', 0)
 
-            # EXCLUIR descontos - eles já aparecem nos valores cobrados
-            if categoria == 'desconto':
-                continue
-
             # Incluir apenas lançamentos da categoria 'retido' ou 'taxa'
             if categoria in ['retido', 'taxa']:
                 # Se já existe um lançamento desse tipo, manter o de maior valor absoluto
-                if tipo in lancamentos_processados:
-                    if abs(valor) > abs(lancamentos_processados[tipo]['valor']):
-                        lancamentos_processados[tipo] = {
-                            'descricao': descricao,
-                            'valor': valor
-                        }
-                else:
+                if tipo not in lancamentos_processados or abs(valor) > abs(lancamentos_processados[tipo]['valor']):
                     lancamentos_processados[tipo] = {
-                        'descricao': descricao,
+                        'descricao': lancamento.get('descricao', 'N/A'),
                         'valor': valor
                     }
 
-    # Gerar HTML com lançamentos únicos
-    # Ordenar por tipo para manter consistência
+    # Ordenar por tipo para manter consistência; valores retidos são positivos na tabela
+    linhas = []
     for tipo in sorted(lancamentos_processados.keys()):
         dados = lancamentos_processados[tipo]
-        descricao = dados['descricao']
-        valor = dados['valor']
-        valor_exibir = abs(valor)  # Valores retidos são positivos na tabela
-
+        valor_exibir = abs(dados['valor'])
         if valor_exibir > 0:  # Só exibir valores maiores que zero
-            html += f'<tr><td>{descricao}</td><td class="valor">{formatar_moeda(valor_exibir)}</td></tr>'
+            linhas.append({'descricao': dados['descricao'], 'valor': valor_exibir})
+    return linhas
+
+def gerar_html_valores_retidos(lancamentos):
+    """Gera HTML para valores retidos - NÃO incluir descontos"""
+    if not lancamentos or not isinstance(lancamentos, list):
+        return '<tr><td>Nenhum valor retido</td><td class="valor">R$ 0,00</td></tr>'
+
+    html = ''
+    for linha in linhas_valores_retidos(lancamentos):
+        html += f'<tr><td>{linha["descricao"]}</td><td class="valor">{formatar_moeda(linha["valor"])}</td></tr>'
 
     return html if html else '<tr><td>Nenhum valor retido</td><td class="valor">R$ 0,00</td></tr>'
 
@@ -480,12 +494,16 @@ def gerar_secao_acrescimos(valor_acrescimos, dias_atraso, valor_base):
     </div>
     '''
 
-def gerar_html_repasses(distribuicao, locadores):
-    """Gera HTML para repasses aos proprietários"""
+def linhas_repasses(distribuicao, locadores) -> List[Dict[str, Any]]:
+    """
+    Linhas de repasse por locador com os dados de quem recebe: titular e CPF
+    (titular da conta para TED, o próprio locador para PIX), destino (chave
+    PIX ou banco/agência/conta) e valor.
+    """
     if not distribuicao or not isinstance(distribuicao, list):
-        return '<tr><td colspan="3">Nenhum repasse encontrado</td></tr>'
+        return []
 
-    html = ''
+    linhas = []
     for dist in distribuicao:
         if not isinstance(dist, dict):
             continue
@@ -495,8 +513,6 @@ def gerar_html_repasses(distribuicao, locadores):
         if isinstance(locadores, list):
             locador = next((l for l in locadores if isinstance(l, dict) and l.get('locador_id') == locador_id), None)
 
-        valor = formatar_moeda(dist.get('valor_repasse', 0))
-
         # Usar informações do titular da conta bancária
         nome_titular = 'Nome não informado'
         cpf_titular = 'CPF não informado'
@@ -532,11 +548,24 @@ def gerar_html_repasses(distribuicao, locadores):
             nome_titular = dist.get('locador_nome', 'Nome não informado')
             cpf_titular = locador.get('cpf_cnpj', 'CPF não informado') if locador else 'CPF não informado'
 
+        linhas.append({
+            'titular': nome_titular,
+            'cpf': cpf_titular,
+            'destino': pix_info,
+            'valor': dist.get('valor_repasse', 0)
+        })
+
+    return linhas
+
+def gerar_html_repasses(distribuicao, locadores):
+    """Gera HTML para repasses aos proprietários"""
+    html = ''
+    for linha in linhas_repasses(distribuicao, locadores):
         html += f'''
         <tr>
-            <td><strong>{nome_titular}</strong><br><small>CPF: {cpf_titular}</small></td>
-            <td>{pix_info}</td>
-            <td class="valor valor-positivo">{valor}</td>
+            <td><strong>{linha['titular']}</strong><br><small>CPF: {linha['cpf']}</small></td>
+            <td>{linha['destino']}</td>
+            <td class="valor valor-positivo">{formatar_moeda(linha['valor'])}</td>
         </tr>
         '''
 
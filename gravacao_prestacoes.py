@@ -0,0 +1,443 @@
+"""
+Gravação em Lote de Prestações de Contas
+================================================================
+
+Grava o cabeçalho (PrestacaoContas) e os filhos de uma ou várias
+prestações em UMA transação. Os filhos são lançamentos extras, descontos,
+lançamentos calculados no frontend e distribuição por locador.
+
+Antes, salvar_prestacao_contas, salvar_descontos_ajustes e
+salvar_lancamentos_detalhados_completos abriam uma conexão cada,
+inseriam linha a linha, buscavam o id com SELECT @@IDENTITY e ainda
+rodavam ALTER TABLE a cada chamada.
+
+Aqui:
+- as validações (contrato/locador, prestação já existente no período) são
+  uma consulta para o lote inteiro;
+- os cabeçalhos entram em INSERT multi-linha com OUTPUT INSERTED.id;
+- os filhos entram com executemany + fast_executemany;
+- totais, data_vencimento e agregados são um comando por bloco de ids.
+
+O número de comandos cresce com o número de blocos, não com o de linhas.
+
+Não invalida caches: quem chama faz invalidar_cache_faturas() após o commit.
+A estrutura (colunas contrato_id/dados_financeiros_json, remoção das UNIQUE
+por período) fica em garantir_colunas_prestacao, chamada na inicialização.
+"""
+
+import calendar
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pool_conexoes import obter_conexao
+from motor_acrescimos import sincronizar_data_vencimento
+from agregados_financeiros import ErroAgregados, atualizar_agregados_prestacoes
+
+# Parâmetros por comando (limite do SQL Server: 2100)
+MAX_PARAMETROS = 2000
+
+# Tipos que só podem aparecer uma vez entre os lançamentos calculados
+TIPOS_UNICOS = {
+    'termo_seguro_incendio', 'retido_seguro_incendio',
+    'termo_iptu', 'retido_iptu',
+    'termo_seguro_fianca', 'retido_seguro_fianca',
+    'termo_condominio', 'retido_condominio',
+    'termo_fci', 'retido_fci',
+    'taxa_administracao', 'taxa_transferencia'
+}
+
+COLUNAS_CABECALHO = (
+    'locador_id', 'contrato_id', 'mes', 'ano', 'referencia', 'valor_pago', 'valor_vencido',
+    'encargos', 'deducoes', 'total_bruto', 'total_liquido', 'status',
+    'pagamento_atrasado', 'observacoes_manuais', 'data_criacao'
+)
+
+# Gravadas só quando informadas (senão fica o default da coluna)
+COLUNAS_OPCIONAIS = ('valor_boleto', 'total_retido', 'valor_repasse', 'tipo_calculo', 'multa_rescisoria')
+
+SQL_INSERT_LANCAMENTO = """
+    INSERT INTO LancamentosPrestacaoContas (
+        prestacao_id, tipo, descricao, valor, categoria, origem,
+        ordem_exibicao, data_lancamento, data_criacao, ativo
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, GETDATE(), GETDATE(), 1)
+"""
+
+SQL_INSERT_DISTRIBUICAO = """
+    INSERT INTO DistribuicaoRepasseLocadores (
+        prestacao_id, locador_id, locador_nome, percentual_participacao,
+        valor_repasse, responsabilidade_principal, data_criacao, ativo
+    ) VALUES (?, ?, ?, ?, ?, ?, GETDATE(), 1)
+"""
+
+SQL_VALIDACAO = """
+    SELECT v.contrato_id, v.mes, v.ano, i.id AS imovel_id, i.id_locador,
+           COUNT(p.id) AS existentes,
+           SUM(CASE WHEN p.status = 'lancada' THEN 1 ELSE 0 END) AS lancadas,
+           SUM(CASE WHEN p.status = 'paga' THEN 1 ELSE 0 END) AS pagas,
+           STRING_AGG(CAST(p.id AS VARCHAR), ', ') AS ids
+    FROM (VALUES {valores}) v(contrato_id, mes, ano)
+    LEFT JOIN Contratos c ON c.id = v.contrato_id
+    LEFT JOIN Imoveis i ON c.id_imovel = i.id
+    LEFT JOIN PrestacaoContas p
+        ON p.contrato_id = v.contrato_id AND p.mes = v.mes AND p.ano = v.ano AND p.ativo = 1
+    GROUP BY v.contrato_id, v.mes, v.ano, i.id, i.id_locador
+"""
+
+# Mesma regra de salvar_descontos_ajustes/salvar_lancamentos_detalhados_completos:
+# boleto = positivos - descontos; retidos (categorias retido/taxa) não entram no boleto
+SQL_RECALCULAR_TOTAIS = """
+    UPDATE p
+    SET valor_boleto = t.total_positivo - t.total_descontos,
+        total_retido = t.total_retido,
+        valor_repasse = CASE WHEN v.com_repasse = 1
+                             THEN t.total_positivo - t.total_descontos - t.total_retido
+                             ELSE p.valor_repasse END,
+        data_atualizacao = GETDATE()
+    FROM PrestacaoContas p
+    JOIN (VALUES {valores}) v(prestacao_id, com_repasse) ON v.prestacao_id = p.id
+    CROSS APPLY (
+        SELECT
+            ISNULL(SUM(CASE WHEN l.valor > 0 THEN l.valor ELSE 0 END), 0) AS total_positivo,
+            ISNULL(SUM(CASE WHEN l.valor < 0 AND l.categoria IN ('retido', 'taxa') THEN ABS(l.valor) ELSE 0 END), 0) AS total_retido,
+            ISNULL(SUM(CASE WHEN l.valor < 0 AND l.categoria = 'desconto' THEN ABS(l.valor) ELSE 0 END), 0) AS total_descontos
+        FROM LancamentosPrestacaoContas l
+        WHERE l.prestacao_id = p.id AND l.ativo = 1
+    ) t
+"""
+
+
+def _blocos(itens: List[Any], tamanho: int) -> Iterable[List[Any]]:
+    for posicao in range(0, len(itens), tamanho):
+        yield itens[posicao:posicao + tamanho]
+
+
+def _placeholders(quantidade: int) -> str:
+    return ', '.join('?' for _ in range(quantidade))
+
+
+def garantir_colunas_prestacao(cursor):
+    """
+    Cria PrestacaoContas.contrato_id/dados_financeiros_json e remove as
+    UNIQUE por período (histórico completo) se a migração
+    004_prestacao_gravacao_lote.sql ainda não foi aplicada. Não faz commit.
+    """
+    for coluna, tipo in (('contrato_id', 'INT'), ('dados_financeiros_json', 'NVARCHAR(MAX)')):
+        cursor.execute("SELECT COL_LENGTH('PrestacaoContas', ?)", (coluna,))
+        if cursor.fetchone()[0] is None:
+            cursor.execute(f"ALTER TABLE PrestacaoContas ADD {coluna} {tipo}")
+    for constraint in ('UK_PrestacaoContas_Cliente_Periodo', 'UK_PrestacaoContas_Contrato_Periodo'):
+        cursor.execute(f"""
+            IF OBJECT_ID('{constraint}', 'UQ') IS NOT NULL
+                ALTER TABLE PrestacaoContas DROP CONSTRAINT {constraint}
+        """)
+
+
+def resolver_mes_referencia(configuracao_fatura: Optional[Dict[str, Any]],
+                            agora: datetime) -> Tuple[int, int, datetime]:
+    """
+    (mes, ano, data_criacao) da prestação: mês atual ou
+    configuracao_fatura['mes_referencia'] (YYYY-MM, MM/YYYY ou YYYYMM), com o
+    dia de hoje limitado ao último dia do mês de referência.
+    """
+    mes, ano, data = agora.month, agora.year, agora
+    mes_ref = (configuracao_fatura or {}).get('mes_referencia')
+    if not mes_ref:
+        return mes, ano, data
+
+    try:
+        if '-' in mes_ref:  # YYYY-MM (frontend)
+            ano_ref, mes_ref_num = mes_ref.split('-')
+        elif '/' in mes_ref:  # MM/YYYY (legado)
+            mes_ref_num, ano_ref = mes_ref.split('/')
+        elif len(mes_ref) == 6 and mes_ref.isdigit():
+            ano_ref, mes_ref_num = mes_ref[:4], mes_ref[4:]
+        else:
+            raise ValueError(f"Formato de mês inválido: {mes_ref}")
+        mes, ano = int(mes_ref_num), int(ano_ref)
+        dia = min(agora.day, calendar.monthrange(ano, mes)[1])
+        data = datetime(ano, mes, dia)
+    except Exception as e:
+        print(f"Erro ao processar mes_referencia '{mes_ref}': {e}")
+        mes, ano, data = agora.month, agora.year, agora
+    return mes, ano, data
+
+
+def preparar_filhos(dados: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Converte lancamentos_extras, descontos_ajustes, lancamentos_completos e
+    repasse_por_locador de `dados` nas linhas a gravar (sem prestacao_id).
+    Levanta exceção para valores inválidos, antes de abrir a transação.
+    """
+    lancamentos = []
+
+    for ordem, lancamento in enumerate(dados.get('lancamentos_extras') or [], 1000):
+        lancamentos.append((
+            f"extra_{lancamento.get('tipo', 'indefinido')}",
+            lancamento.get('descricao', 'Lançamento extra'),
+            lancamento.get('valor', 0),
+            'extra', 'usuario', ordem
+        ))
+
+    descontos = dados.get('descontos_ajustes') or []
+    ordem = 1000  # Após os outros lançamentos
+    for desconto in descontos:
+        valor = float(desconto.get('valor', 0))
+        if valor == 0:
+            continue
+        # Descontos são valores negativos
+        lancamentos.append((
+            desconto.get('tipo', 'desconto_generico'),
+            desconto.get('label', desconto.get('descricao', 'Desconto')),
+            -abs(valor),
+            'desconto', 'frontend_desconto', ordem
+        ))
+        ordem += 1
+
+    calculados = dados.get('lancamentos_completos') or []
+    total_positivo = total_negativo = 0.0
+    lancamentos_salvos = 0
+    tipos_processados = set()
+    for lancamento in calculados:
+        tipo = lancamento.get('tipo', 'extra')
+        valor = float(lancamento.get('valor', 0))
+        categoria = lancamento.get('categoria', 'indefinido')
+        if valor == 0:
+            continue
+        if tipo in TIPOS_UNICOS:
+            if tipo in tipos_processados:
+                continue
+            tipos_processados.add(tipo)
+        if categoria == 'indefinido':
+            if tipo.startswith('termo_'):
+                categoria = 'termo'
+            elif tipo.startswith('retido_'):
+                categoria = 'retido'
+            elif tipo.startswith('taxa_'):
+                categoria = 'taxa'
+            else:
+                categoria = 'extra'
+
+        lancamentos_salvos += 1
+        lancamentos.append((tipo, lancamento.get('descricao', 'Sem descrição'), valor,
+                            categoria, 'frontend_calculado', lancamentos_salvos))
+        if valor > 0:
+            total_positivo += valor
+        else:
+            total_negativo += abs(valor)
+
+    repasses = dados.get('repasse_por_locador') or []
+    distribuicoes = [(
+        distribuicao.get('locador_id'),
+        distribuicao.get('locador_nome'),
+        distribuicao.get('porcentagem', 100),
+        distribuicao.get('valor_repasse', 0),
+        distribuicao.get('responsabilidade_principal', False)
+    ) for distribuicao in repasses]
+
+    return {
+        'lancamentos': lancamentos,
+        'distribuicoes': distribuicoes,
+        'substituir_calculados': bool(calculados),
+        'substituir_distribuicao': bool(repasses),
+        # Totais: com lançamentos calculados também o repasse; só com descontos, boleto/retido
+        'recalcular_totais': bool(calculados or descontos),
+        'com_repasse': bool(calculados),
+        'resumo': {
+            'descontos_salvos': len(descontos),
+            'lancamentos_salvos': lancamentos_salvos,
+            'total_boleto': total_positivo,
+            'total_retido': total_negativo,
+            'valor_repasse': total_positivo - total_negativo,
+            'locadores_distribuidos': len(repasses)
+        }
+    }
+
+
+def gravar_filhos(cursor, filhos: List[Tuple[int, Dict[str, Any]]]) -> None:
+    """
+    Grava os filhos preparados por preparar_filhos para cada (prestacao_id, filhos)
+    e recalcula os totais das prestações afetadas. Não faz commit.
+    """
+    filhos = [(int(prestacao_id), preparados) for prestacao_id, preparados in filhos]
+
+    for tabela, condicao, chave in (
+        ('LancamentosPrestacaoContas', "origem = 'frontend_calculado' AND ", 'substituir_calculados'),
+        ('DistribuicaoRepasseLocadores', "", 'substituir_distribuicao'),
+    ):
+        ids = [prestacao_id for prestacao_id, preparados in filhos if preparados[chave]]
+        for bloco in _blocos(ids, MAX_PARAMETROS):
+            cursor.execute(f"UPDATE {tabela} SET ativo = 0 WHERE {condicao}prestacao_id IN ({_placeholders(len(bloco))})",
+                           bloco)
+
+    lancamentos = [(prestacao_id, *linha) for prestacao_id, preparados in filhos for linha in preparados['lancamentos']]
+    distribuicoes = [(prestacao_id, *linha) for prestacao_id, preparados in filhos for linha in preparados['distribuicoes']]
+    cursor.fast_executemany = True
+    if lancamentos:
+        cursor.executemany(SQL_INSERT_LANCAMENTO, lancamentos)
+    if distribuicoes:
+        cursor.executemany(SQL_INSERT_DISTRIBUICAO, distribuicoes)
+    cursor.fast_executemany = False
+
+    totais = [(prestacao_id, int(preparados['com_repasse']))
+              for prestacao_id, preparados in filhos if preparados['recalcular_totais']]
+    for bloco in _blocos(totais, MAX_PARAMETROS // 2):
+        cursor.execute(SQL_RECALCULAR_TOTAIS.format(valores=', '.join('(?, ?)' for _ in bloco)),
+                       [valor for linha in bloco for valor in linha])
+
+
+def _validar(cursor, chaves: List[Tuple[int, str, str]]) -> Dict[Tuple[int, str, str], Any]:
+    """Linha de SQL_VALIDACAO por (contrato_id, mes, ano)"""
+    validacoes = {}
+    for bloco in _blocos(chaves, MAX_PARAMETROS // 3):
+        cursor.execute(SQL_VALIDACAO.format(valores=', '.join('(?, ?, ?)' for _ in bloco)),
+                       [valor for chave in bloco for valor in chave])
+        for row in cursor.fetchall():
+            validacoes[(int(row[0]), row[1], row[2])] = row
+    return validacoes
+
+
+def _inserir_cabecalhos(cursor, colunas: Tuple[str, ...], linhas: List[List[Any]]) -> Dict[Tuple[int, int, int], int]:
+    """INSERT multi-linha com OUTPUT INSERTED.id; devolve {(contrato_id, mes, ano): prestacao_id}"""
+    ids = {}
+    for bloco in _blocos(linhas, max(1, MAX_PARAMETROS // len(colunas))):
+        valores = ', '.join(f"({_placeholders(len(colunas))}, GETDATE(), 1)" for _ in bloco)
+        # OUTPUT ... INTO: funciona mesmo com trigger na tabela
+        cursor.execute(f"""
+            SET NOCOUNT ON;
+            DECLARE @inseridas TABLE (id INT, contrato_id INT, mes VARCHAR(10), ano VARCHAR(10));
+            INSERT INTO PrestacaoContas ({', '.join(colunas)}, data_atualizacao, ativo)
+            OUTPUT INSERTED.id, INSERTED.contrato_id, INSERTED.mes, INSERTED.ano INTO @inseridas
+            VALUES {valores};
+            SELECT id, contrato_id, mes, ano FROM @inseridas;
+        """, [valor for linha in bloco for valor in linha])
+        for prestacao_id, contrato_id, mes, ano in cursor.fetchall():
+            ids[(int(contrato_id), int(mes), int(ano))] = int(prestacao_id)
+    return ids
+
+
+def gravar_prestacoes(prestacoes: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Grava uma ou várias prestações novas com seus filhos em uma transação.
+
+    Cada item usa os parâmetros de salvar_prestacao_contas (contrato_id,
+    tipo_prestacao, dados_financeiros, status, observacoes,
+    configuracao_fatura, detalhamento_completo, valor_boleto, total_retido,
+    valor_repasse, tipo_calculo, multa_rescisoria, lancamentos_extras) e,
+    opcionalmente, descontos_ajustes, lancamentos_completos e
+    repasse_por_locador.
+
+    Itens que não passam na validação vão para `erros` e não impedem os
+    demais; falha de banco desfaz o lote inteiro e levanta a exceção.
+
+    Returns:
+        {'gravadas': [{'indice', 'contrato_id', 'prestacao_id', 'locador_id', 'referencia', ...resumo dos filhos}],
+         'erros': [{'indice', 'contrato_id', 'erro'}]}
+    """
+    agora = datetime.now()
+    erros: List[Dict[str, Any]] = []
+    pendentes = []
+    for indice, dados in enumerate(prestacoes):
+        try:
+            mes, ano, data_criacao = resolver_mes_referencia(dados.get('configuracao_fatura'), agora)
+            pendentes.append((indice, dados, int(dados['contrato_id']), mes, ano, data_criacao, preparar_filhos(dados)))
+        except Exception as e:
+            erros.append({'indice': indice, 'contrato_id': dados.get('contrato_id'), 'erro': str(e)})
+
+    gravadas = []
+    if not pendentes:
+        return {'gravadas': gravadas, 'erros': erros}
+
+    with obter_conexao() as conn:
+        cursor = conn.cursor()
+        validacoes = _validar(cursor, sorted({(contrato_id, f"{mes:02d}", str(ano))
+                                              for _, _, contrato_id, mes, ano, _, _ in pendentes}))
+
+        grupos: Dict[Tuple[str, ...], List[List[Any]]] = {}
+        aceitas = []
+        periodos_no_lote = set()
+        for indice, dados, contrato_id, mes, ano, data_criacao, filhos in pendentes:
+            status = dados.get('status')
+            validacao = validacoes.get((contrato_id, f"{mes:02d}", str(ano)))
+            if validacao is None or validacao.imovel_id is None:
+                erro = f"Contrato {contrato_id} não encontrado ou sem locador"
+            elif validacao.lancadas:
+                erro = (f"Já existe uma prestação LANÇADA para o contrato {contrato_id} no mês {mes:02d}/{ano}. "
+                        "Prestações lançadas são IMUTÁVEIS e não podem ser alteradas.")
+            elif validacao.existentes:
+                erro = f"Já existe prestação de contas para este período. IDs: {validacao.ids}"
+            elif status == 'lancada' and not validacao.pagas:
+                erro = "ERRO: Só é possível LANÇAR prestação que foi PAGA anteriormente. Marque como PAGA primeiro."
+            elif (contrato_id, mes, ano) in periodos_no_lote:
+                erro = f"Prestação duplicada no lote para o contrato {contrato_id} em {mes:02d}/{ano}"
+            else:
+                erro = None
+            if erro:
+                erros.append({'indice': indice, 'contrato_id': contrato_id, 'erro': erro})
+                continue
+            periodos_no_lote.add((contrato_id, mes, ano))
+
+            dados_financeiros = dados.get('dados_financeiros') or {}
+            status_final = 'lancada' if dados.get('tipo_prestacao') == 'fatura_existente' else status
+            colunas = list(COLUNAS_CABECALHO)
+            linha = [
+                validacao.id_locador, contrato_id, f"{mes:02d}", str(ano), f"{mes:02d}/{ano}",
+                dados_financeiros.get('valor_pago', 0),
+                dados_financeiros.get('valor_vencido', 0),
+                dados_financeiros.get('encargos', 0),
+                dados_financeiros.get('deducoes', 0),
+                dados_financeiros.get('total_bruto', 0),
+                dados_financeiros.get('total_liquido', 0),
+                status_final,
+                status == 'atrasado',
+                dados.get('observacoes'),
+                data_criacao
+            ]
+            for coluna in COLUNAS_OPCIONAIS:
+                if dados.get(coluna) is not None:
+                    colunas.append(coluna)
+                    linha.append(dados[coluna])
+            if dados.get('detalhamento_completo') is not None:
+                colunas.append('detalhamento_json')
+                linha.append(json.dumps(dados['detalhamento_completo'], ensure_ascii=False))
+            if dados.get('dados_financeiros') is not None:
+                colunas.append('dados_financeiros_json')
+                linha.append(json.dumps(dados_financeiros, ensure_ascii=False))
+
+            grupos.setdefault(tuple(colunas), []).append(linha)
+            aceitas.append((indice, contrato_id, mes, ano, validacao.id_locador, filhos))
+
+        if not aceitas:
+            return {'gravadas': gravadas, 'erros': erros}
+
+        ids = {}
+        for colunas, linhas in grupos.items():
+            ids.update(_inserir_cabecalhos(cursor, colunas, linhas))
+
+        gravar_filhos(cursor, [(ids[(contrato_id, mes, ano)], filhos)
+                               for _, contrato_id, mes, ano, _, filhos in aceitas])
+
+        prestacao_ids = list(ids.values())
+        # data_vencimento persistida (mês/ano da prestação + vencimento_dia do contrato)
+        try:
+            for bloco in _blocos(prestacao_ids, MAX_PARAMETROS):
+                sincronizar_data_vencimento(cursor, f"p.id IN ({_placeholders(len(bloco))})", bloco)
+        except Exception as e:
+            print(f"AVISO: Não foi possível gravar data_vencimento de {len(prestacao_ids)} prestações: {e}")
+
+        try:
+            atualizar_agregados_prestacoes(cursor, prestacao_ids)
+        except ErroAgregados as e:
+            print(f"AVISO: Não foi possível atualizar agregados financeiros de {len(prestacao_ids)} prestações: {e}")
+
+    for indice, contrato_id, mes, ano, locador_id, filhos in aceitas:
+        gravadas.append({
+            'indice': indice,
+            'contrato_id': contrato_id,
+            'prestacao_id': ids[(contrato_id, mes, ano)],
+            'locador_id': locador_id,
+            'referencia': f"{mes:02d}/{ano}",
+            **filhos['resumo']
+        })
+    erros.sort(key=lambda erro: erro['indice'])
+    return {'gravadas': gravadas, 'erros': erros}
@@ -0,0 +1,363 @@
+"""
+Índice de Busca em Memória (trigramas sem acento)
+================================================================
+
+A busca global (/api/busca) fazia `LOWER(col) LIKE '%termo%'` em Locadores,
+Locatarios, Imoveis e Contratos: o curinga inicial e o LOWER() impedem o uso
+de índices, então cada tecla digitada virava quatro varreduras completas.
+
+Este módulo mantém, por processo, um índice invertido de trigramas sobre os
+campos pesquisáveis de cada entidade, com texto normalizado (minúsculo, sem
+acento). A busca:
+
+1. Normaliza a consulta e separa os termos ("joão silva" -> joao, silva)
+2. Intersecta as listas de trigramas de cada termo (candidatos)
+3. Confirma por substring (mesma semântica do LIKE '%termo%': todos os
+   termos precisam aparecer em algum campo)
+4. Ordena por relevância: campo igual > começa com > início de palavra >
+   contém, ponderado pelo peso do campo (nome pesa mais que endereço)
+
+O índice devolve só ids; search_api busca as linhas completas pela chave
+primária, então valores exibidos (status, contagens) continuam atuais.
+
+Atualização:
+- Carga completa na primeira busca (uma consulta por entidade)
+- Hooks em repositories_adapter chamam notificar_alteracao() após
+  insert/update, reindexando a entidade e os documentos que a exibem
+  (ex.: nome do locador aparece em imóveis e contratos)
+- Recarga completa em segundo plano a cada BUSCA_INDICE_TTL_SEGUNDOS,
+  para refletir escritas feitas por outros processos/workers
+
+Configuração (.env):
+    BUSCA_INDICE                "0" desativa o índice (volta ao LIKE)
+    BUSCA_INDICE_TTL_SEGUNDOS   Intervalo da recarga completa (padrão 900)
+"""
+
+import heapq
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from pool_conexoes import obter_conexao
+
+# Campos pesquisáveis por entidade: SQL (com {filtro}) e peso de cada coluna.
+# A primeira coluna é sempre o id; a ordem dos pesos segue a ordem do SELECT.
+ENTIDADES = {
+    'locadores': {
+        'sql': """
+            SELECT l.id, l.nome, l.cpf_cnpj, l.email, l.telefone, l.endereco
+            FROM Locadores l
+            WHERE {filtro}
+        """,
+        'pesos': (('nome', 3), ('cpf_cnpj', 3), ('email', 2), ('telefone', 2), ('endereco', 1)),
+    },
+    'locatarios': {
+        'sql': """
+            SELECT l.id, l.nome, l.cpf_cnpj, l.email, l.telefone
+            FROM Locatarios l
+            WHERE {filtro}
+        """,
+        'pesos': (('nome', 3), ('cpf_cnpj', 3), ('email', 2), ('telefone', 2)),
+    },
+    'imoveis': {
+        'sql': """
+            SELECT i.id, i.endereco, i.tipo, i.status, l.nome
+            FROM Imoveis i
+            LEFT JOIN Locadores l ON i.id_locador = l.id
+            WHERE {filtro}
+        """,
+        'pesos': (('endereco', 3), ('tipo', 1), ('status', 1), ('locador_nome', 2)),
+    },
+    'contratos': {
+        'sql': """
+            SELECT c.id, CAST(c.id AS VARCHAR(20)), loc.nome, ldr.nome, i.endereco
+            FROM Contratos c
+            LEFT JOIN Imoveis i ON c.id_imovel = i.id
+            LEFT JOIN Locatarios loc ON c.id_locatario = loc.id
+            LEFT JOIN Locadores ldr ON i.id_locador = ldr.id
+            WHERE {filtro}
+        """,
+        'pesos': (('id', 3), ('locatario_nome', 2), ('locador_nome', 2), ('imovel_endereco', 1)),
+    },
+}
+
+# Alterar uma entidade muda o texto indexado destes documentos (tipo, filtro por id)
+DEPENDENCIAS = {
+    'locadores': (('locadores', 'l.id = ?'), ('imoveis', 'i.id_locador = ?'), ('contratos', 'i.id_locador = ?')),
+    'locatarios': (('locatarios', 'l.id = ?'), ('contratos', 'c.id_locatario = ?')),
+    'imoveis': (('imoveis', 'i.id = ?'), ('contratos', 'c.id_imovel = ?')),
+    'contratos': (('contratos', 'c.id = ?'),),
+}
+
+# Colunas de id usadas para indexar registros novos (id > maior id indexado)
+COLUNA_ID = {'locadores': 'l.id', 'locatarios': 'l.id', 'imoveis': 'i.id', 'contratos': 'c.id'}
+
+
+def normalizar_texto(texto: Any) -> str:
+    """'  JOÃO da Silva ' -> 'joao da silva' (sem acento, minúsculo, espaços simples)"""
+    if texto is None:
+        return ''
+    sem_acento = unicodedata.normalize('NFKD', str(texto))
+    sem_acento = ''.join(c for c in sem_acento if not unicodedata.combining(c))
+    return re.sub(r'\s+', ' ', sem_acento.casefold()).strip()
+
+
+def trigramas(texto: str) -> Set[str]:
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+class IndiceEntidade:
+    """Índice invertido trigrama -> ids de uma entidade"""
+
+    def __init__(self, pesos: Tuple[Tuple[str, int], ...]):
+        self.pesos = [peso for _, peso in pesos]
+        self.documentos: Dict[int, Tuple[str, ...]] = {}
+        self.postings: Dict[str, Set[int]] = {}
+        self.maior_id = 0
+
+    def __len__(self):
+        return len(self.documentos)
+
+    def adicionar(self, documento_id: int, valores: Iterable[Any]):
+        self.remover(documento_id)
+        campos = tuple(normalizar_texto(valor) for valor in valores)
+        self.documentos[documento_id] = campos
+        for trigrama in trigramas('\n'.join(campos)):
+            self.postings.setdefault(trigrama, set()).add(documento_id)
+        self.maior_id = max(self.maior_id, documento_id)
+
+    def remover(self, documento_id: int):
+        campos = self.documentos.pop(documento_id, None)
+        if campos is None:
+            return
+        for trigrama in trigramas('\n'.join(campos)):
+            ids = self.postings.get(trigrama)
+            if ids is not None:
+                ids.discard(documento_id)
+                if not ids:
+                    del self.postings[trigrama]
+
+    def _candidatos(self, termos: List[str]) -> Iterable[int]:
+        conjuntos = []
+        for termo in termos:
+            for trigrama in trigramas(termo):
+                ids = self.postings.get(trigrama)
+                if not ids:
+                    return ()
+                conjuntos.append(ids)
+        if not conjuntos:
+            # Só termos com menos de 3 letras: confere todos os documentos
+            return list(self.documentos)
+        conjuntos.sort(key=len)
+        candidatos = set(conjuntos[0])
+        for ids in conjuntos[1:]:
+            candidatos &= ids
+            if not candidatos:
+                break
+        return candidatos
+
+    def _pontuar(self, campos: Tuple[str, ...], frase: str, termos: List[str]) -> float:
+        pontos = 0.0
+        faltando = set(termos) if len(termos) > 1 else None
+        for campo, peso in zip(campos, self.pesos):
+            if frase in campo:
+                if campo == frase:
+                    pontos += peso * 10
+                elif campo.startswith(frase):
+                    pontos += peso * 6
+                elif (' ' + frase) in campo:
+                    pontos += peso * 4
+                else:
+                    pontos += peso * 2
+                if faltando is None:
+                    pontos += peso
+                    continue
+            if faltando is not None:
+                for termo in termos:
+                    if termo in campo:
+                        faltando.discard(termo)
+                        pontos += peso
+        if faltando:
+            return 0.0
+        return pontos
+
+    def buscar(self, consulta: str, limite: int = 50) -> List[Tuple[int, float]]:
+        """[(id, pontuação)] em ordem de relevância (desempate pelo 1º campo)"""
+        frase = normalizar_texto(consulta)
+        termos = list(dict.fromkeys(frase.split()))
+        if not termos:
+            return []
+
+        resultados = []
+        for documento_id in self._candidatos(termos):
+            campos = self.documentos[documento_id]
+            pontos = self._pontuar(campos, frase, termos)
+            if pontos:
+                resultados.append((-pontos, campos[0], documento_id))
+        return [(documento_id, -pontos) for pontos, _, documento_id in heapq.nsmallest(limite, resultados)]
+
+
+class IndiceBusca:
+    """Índices das quatro entidades + carga completa/incremental a partir do banco"""
+
+    def __init__(self):
+        self.entidades: Dict[str, IndiceEntidade] = {}
+        self.carregado_em: Optional[float] = None
+        self.duracao_carga_ms = 0.0
+        self._lock = threading.RLock()
+        self._recarregando = False
+        # Reindexações pedidas durante uma carga completa: a carga lê um
+        # snapshot, então elas são reaplicadas sobre o índice novo após a troca
+        self._pendentes_carga: Optional[List[Tuple[str, Optional[int]]]] = None
+
+    @staticmethod
+    def _ler(cursor, tipo: str, filtro: str = "1 = 1", params: Iterable[Any] = ()) -> List[tuple]:
+        cursor.execute(ENTIDADES[tipo]['sql'].format(filtro=filtro), list(params))
+        return cursor.fetchall()
+
+    def carregar(self):
+        """
+        Recarrega todas as entidades; as buscas usam o índice antigo até a
+        troca. Reindexações feitas durante a leitura são reaplicadas depois
+        da troca (o snapshot lido pode não conter essas escritas).
+        """
+        inicio = time.perf_counter()
+        with self._lock:
+            self._pendentes_carga = []
+        try:
+            novos = {}
+            with obter_conexao() as conn:
+                cursor = conn.cursor()
+                for tipo, definicao in ENTIDADES.items():
+                    indice = IndiceEntidade(definicao['pesos'])
+                    for linha in self._ler(cursor, tipo):
+                        indice.adicionar(int(linha[0]), linha[1:])
+                    novos[tipo] = indice
+            with self._lock:
+                self.entidades = novos
+                self.carregado_em = time.monotonic()
+                self.duracao_carga_ms = (time.perf_counter() - inicio) * 1000
+                pendentes = self._pendentes_carga
+        finally:
+            with self._lock:
+                self._pendentes_carga = None
+        print(f"Índice de busca carregado em {self.duracao_carga_ms:.0f} ms: "
+              f"{ {tipo: len(indice) for tipo, indice in novos.items()} }")
+
+        for tipo, entidade_id in dict.fromkeys(pendentes):
+            try:
+                self.reindexar(tipo, entidade_id)
+            except Exception as e:
+                print(f"AVISO: Não foi possível reaplicar reindexação após a carga ({tipo} {entidade_id}): {e}")
+
+    def recarregar_em_segundo_plano(self):
+        with self._lock:
+            if self._recarregando:
+                return
+            self._recarregando = True
+
+        def _executar():
+            try:
+                self.carregar()
+            except Exception as e:
+                print(f"AVISO: Falha ao recarregar índice de busca: {e}")
+            finally:
+                with self._lock:
+                    self._recarregando = False
+
+        threading.Thread(target=_executar, name='recarga-indice-busca', daemon=True).start()
+
+    def buscar(self, tipo: str, consulta: str, limite: int = 50) -> List[Tuple[int, float]]:
+        with self._lock:
+            return self.entidades[tipo].buscar(consulta, limite)
+
+    def reindexar(self, tipo: str, entidade_id: Optional[int] = None):
+        """
+        Reindexa `entidade_id` e os documentos que exibem seus dados.
+        Sem id (ex.: insert cujo id não é conhecido), indexa os registros novos.
+        """
+        with self._lock:
+            if self._pendentes_carga is not None:
+                self._pendentes_carga.append((tipo, entidade_id))
+        with obter_conexao() as conn:
+            cursor = conn.cursor()
+            if entidade_id is None:
+                with self._lock:
+                    maior_id = self.entidades[tipo].maior_id
+                alvos = [(tipo, self._ler(cursor, tipo, f"{COLUNA_ID[tipo]} > ?", [maior_id]), None)]
+            else:
+                alvos = [(dependente, self._ler(cursor, dependente, filtro, [entidade_id]),
+                          entidade_id if dependente == tipo else None)
+                         for dependente, filtro in DEPENDENCIAS[tipo]]
+
+        with self._lock:
+            for dependente, linhas, removido in alvos:
+                indice = self.entidades[dependente]
+                if removido is not None and not linhas:
+                    indice.remover(removido)
+                for linha in linhas:
+                    indice.adicionar(int(linha[0]), linha[1:])
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'carregado': self.carregado_em is not None,
+                'idade_segundos': round(time.monotonic() - self.carregado_em, 1) if self.carregado_em else None,
+                'duracao_carga_ms': round(self.duracao_carga_ms, 1),
+                'documentos': {tipo: len(indice) for tipo, indice in self.entidades.items()},
+                'trigramas': {tipo: len(indice.postings) for tipo, indice in self.entidades.items()},
+            }
+
+
+# ==================== ÍNDICE GLOBAL DO PROCESSO ====================
+
+_indice: Optional[IndiceBusca] = None
+_indice_lock = threading.Lock()
+
+
+def indice_ativo() -> bool:
+    return os.getenv('BUSCA_INDICE', '1') != '0'
+
+
+def obter_indice_busca() -> IndiceBusca:
+    """Índice carregado (carga completa na primeira chamada, recarga periódica em segundo plano)"""
+    global _indice
+    if _indice is None:
+        with _indice_lock:
+            if _indice is None:
+                indice = IndiceBusca()
+                indice.carregar()
+                _indice = indice
+        return _indice
+
+    ttl = float(os.getenv('BUSCA_INDICE_TTL_SEGUNDOS', '900'))
+    if time.monotonic() - _indice.carregado_em > ttl:
+        _indice.recarregar_em_segundo_plano()
+    return _indice
+
+
+def buscar_ids(tipo: str, consulta: str, limite: int = 50) -> List[int]:
+    """Ids de `tipo` que casam com a consulta, do mais relevante para o menos"""
+    return [documento_id for documento_id, _ in obter_indice_busca().buscar(tipo, consulta, limite)]
+
+
+def notificar_alteracao(tipo: str, entidade_id: Optional[int] = None):
+    """
+    Hook de insert/update (repositories_adapter). Só atua se o índice já foi
+    carregado neste processo; falhas não interrompem a escrita.
+    """
+    if _indice is None or not indice_ativo():
+        return
+    try:
+        _indice.reindexar(tipo, int(entidade_id) if entidade_id is not None else None)
+    except Exception as e:
+        print(f"AVISO: Não foi possível atualizar o índice de busca ({tipo} {entidade_id}): {e}")
+
+
+def estatisticas_indice_busca() -> Dict[str, Any]:
+    if _indice is None:
+        return {'carregado': False}
+    return _indice.estatisticas()
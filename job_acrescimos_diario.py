@@ -13,12 +13,18 @@ Execução recomendada: Diariamente via cron/task scheduler
 
 import os
 import sys
+import hashlib
 import logging
+import time
 from datetime import date, datetime, timedelta
 from decimal import Decimal, ROUND_HALF_UP
 from dotenv import load_dotenv
 import pyodbc
 from typing import List, Dict, Any, Optional
+from pool_conexoes import obter_conexao
+from motor_acrescimos import calcular_acrescimos, garantir_coluna_data_vencimento, sincronizar_data_vencimento
+from agregados_financeiros import ErroAgregados, atualizar_agregados_prestacoes
+from cache_pdf import invalidar_pdfs_prestacoes
 
 # Configurar logging
 logging.basicConfig(
@@ -35,24 +41,23 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 def get_conexao():
-    """Conecta ao banco de dados usando as configurações do .env"""
+    """Empresta uma conexão do pool compartilhado (conn.close() devolve ao pool)"""
     try:
-        connection_string = (
-            f"DRIVER={{{os.getenv('DB_DRIVER')}}};"
-            f"SERVER={os.getenv('DB_SERVER')};"
-            f"DATABASE={os.getenv('DB_DATABASE')};"
-            f"UID={os.getenv('DB_USER')};"
-            f"PWD={os.getenv('DB_PASSWORD')}"
-        )
-        return pyodbc.connect(connection_string)
+        return obter_conexao()
     except Exception as e:
         logger.error(f"Erro ao conectar ao banco: {e}")
         raise
 
+# Incrementar sempre que a fórmula de calcular_acrescimos_prestacao (ou a regra
+# de repasse/distribuição) mudar: força o recálculo de todas as prestações
+# 2: cálculo pelo motor_acrescimos (Decimal, arredondamento ROUND_HALF_UP)
+VERSAO_FORMULA_ACRESCIMOS = 2
+
 def calcular_acrescimos_prestacao(valor_original: float, dias_atraso: int, percentual_multa: float = 2.0) -> dict:
     """
-    Calcula acréscimos por atraso para prestação de contas:
-    - Juros de mora: 1% ao mês (proporcional por dia) = 0.033% ao dia
+    Calcula acréscimos por atraso para prestação de contas
+    (regra única em motor_acrescimos.calcular_acrescimos):
+    - Juros de mora: 1% ao mês (proporcional por dia)
     - Multa: percentual sobre o valor em atraso (padrão 2%)
 
     Args:
@@ -71,22 +76,48 @@ def calcular_acrescimos_prestacao(valor_original: float, dias_atraso: int, perce
             'dias_atraso': 0
         }
 
-    # Juros de mora: 1% ao mês (0.033% ao dia)
-    juros_diario = 0.01 / 30  # 1% / 30 dias = 0.000333
-    juros = valor_original * juros_diario * dias_atraso
-
-    # Multa: percentual sobre o valor em atraso
-    multa = valor_original * (percentual_multa / 100)
-
-    total_acrescimo = juros + multa
+    acrescimos = calcular_acrescimos(valor_original, dias_atraso, percentual_multa)
 
     return {
-        'juros': round(juros, 2),
-        'multa': round(multa, 2),
-        'total_acrescimo': round(total_acrescimo, 2),
+        'juros': float(acrescimos['juros']),
+        'multa': float(acrescimos['multa']),
+        'total_acrescimo': float(acrescimos['total_acrescimo']),
         'dias_atraso': dias_atraso
     }
 
+def calcular_hash_acrescimos(valor_base: float, percentual_multa: float, dias_atraso: int,
+                             total_liquido: float, locadores: List[tuple]) -> str:
+    """
+    Impressão digital das entradas do cálculo de uma prestação.
+    Se não mudar desde a última gravação, o resultado também não muda.
+
+    Args:
+        locadores: [(locador_id, nome, responsabilidade_principal), ...]
+    """
+    partes = [
+        f"{valor_base:.2f}",
+        f"{percentual_multa:.4f}",
+        str(dias_atraso),
+        f"{total_liquido:.2f}",
+    ]
+    partes.extend(
+        f"{locador_id}:{1 if eh_principal else 0}"
+        for locador_id, _, eh_principal in sorted(locadores, key=lambda l: l[0])
+    )
+    return hashlib.sha256('|'.join(partes).encode('utf-8')).hexdigest()
+
+def calcular_hash_prestacao(prestacao: Dict[str, Any], total_liquido: float, locadores: List[tuple]) -> str:
+    """
+    calcular_hash_acrescimos com a base tirada da própria prestação.
+    Usado pelo modo em lote e pelo individual/fallback: os dois gravam o
+    mesmo hash para a mesma linha e a próxima execução incremental a pula.
+    """
+    valor_base = prestacao['valor_boleto'] or prestacao['valor_total']
+    return calcular_hash_acrescimos(
+        valor_base, prestacao['percentual_multa'], prestacao['dias_atraso_atual'],
+        total_liquido, [tuple(l) for l in locadores]
+    )
+
 def buscar_prestacoes_para_atualizar() -> List[Dict[str, Any]]:
     """
     Busca prestações que precisam ter acréscimos recalculados.
@@ -104,6 +135,15 @@ def buscar_prestacoes_para_atualizar() -> List[Dict[str, Any]]:
 
     try:
         # Query para buscar prestações em atraso que ainda podem ter acréscimos
+        # Vencimento ausente (prestação gravada fora de salvar_prestacao_contas)
+        sincronizar_data_vencimento(
+            cursor, "p.data_vencimento IS NULL AND p.status IN ('pendente', 'em_atraso') AND p.data_pagamento IS NULL"
+        )
+        conn.commit()
+
+        # Query para buscar prestações em atraso que ainda podem ter acréscimos
+        # (predicados sargáveis sobre p.data_vencimento persistida, ver
+        # database/migrations/001_prestacao_data_vencimento.sql)
         query = """
             SELECT
                 p.id,
@@ -117,106 +157,21 @@ def buscar_prestacoes_para_atualizar() -> List[Dict[str, Any]]:
                 p.status,
                 c.vencimento_dia,
                 ISNULL(c.percentual_multa_atraso, 2.0) as percentual_multa_atraso,
-                -- Calcular data de vencimento baseada no contrato (com validação)
-                TRY_CAST(
-                    CASE
-                        WHEN p.ano > 1900 AND p.ano < 2100
-                             AND p.mes >= 1 AND p.mes <= 12
-                             AND c.vencimento_dia >= 1 AND c.vencimento_dia <= 31
-                        THEN CAST(p.ano AS VARCHAR(4)) + '-' +
-                             RIGHT('0' + CAST(p.mes AS VARCHAR(2)), 2) + '-' +
-                             RIGHT('0' + CAST(c.vencimento_dia AS VARCHAR(2)), 2)
-                        ELSE NULL
-                    END AS DATE
-                ) as data_vencimento,
-                -- Calcular dias de atraso baseado na data de vencimento do contrato
-                CASE
-                    WHEN TRY_CAST(
-                        CASE
-                            WHEN p.ano > 1900 AND p.ano < 2100
-                                 AND p.mes >= 1 AND p.mes <= 12
-                                 AND c.vencimento_dia >= 1 AND c.vencimento_dia <= 31
-                            THEN CAST(p.ano AS VARCHAR(4)) + '-' +
-                                 RIGHT('0' + CAST(p.mes AS VARCHAR(2)), 2) + '-' +
-                                 RIGHT('0' + CAST(c.vencimento_dia AS VARCHAR(2)), 2)
-                            ELSE NULL
-                        END AS DATE
-                    ) IS NOT NULL
-                    AND TRY_CAST(
-                        CASE
-                            WHEN p.ano > 1900 AND p.ano < 2100
-                                 AND p.mes >= 1 AND p.mes <= 12
-                                 AND c.vencimento_dia >= 1 AND c.vencimento_dia <= 31
-                            THEN CAST(p.ano AS VARCHAR(4)) + '-' +
-                                 RIGHT('0' + CAST(p.mes AS VARCHAR(2)), 2) + '-' +
-                                 RIGHT('0' + CAST(c.vencimento_dia AS VARCHAR(2)), 2)
-                            ELSE NULL
-                        END AS DATE
-                    ) < CAST(GETDATE() AS DATE)
-                    THEN DATEDIFF(day,
-                        TRY_CAST(
-                            CASE
-                                WHEN p.ano > 1900 AND p.ano < 2100
-                                     AND p.mes >= 1 AND p.mes <= 12
-                                     AND c.vencimento_dia >= 1 AND c.vencimento_dia <= 31
-                                THEN CAST(p.ano AS VARCHAR(4)) + '-' +
-                                 RIGHT('0' + CAST(p.mes AS VARCHAR(2)), 2) + '-' +
-                                 RIGHT('0' + CAST(c.vencimento_dia AS VARCHAR(2)), 2)
-                                ELSE NULL
-                            END AS DATE
-                        ),
-                        CAST(GETDATE() AS DATE)
-                    )
-                    ELSE 0
-                END as dias_atraso_atual
+                p.data_vencimento,
+                DATEDIFF(day, p.data_vencimento, CAST(GETDATE() AS DATE)) as dias_atraso_atual,
+                p.total_liquido,
+                p.hash_acrescimos,
+                p.versao_formula_acrescimos
             FROM PrestacaoContas p
             INNER JOIN Contratos c ON p.contrato_id = c.id
             WHERE
                 -- Apenas prestações que podem ter acréscimos calculados
                 p.status IN ('pendente', 'em_atraso')
                 AND p.data_pagamento IS NULL
-                AND c.vencimento_dia IS NOT NULL
-                AND p.ano IS NOT NULL
-                AND p.mes IS NOT NULL
-                AND p.ano > 1900 AND p.ano < 2100
-                AND p.mes >= 1 AND p.mes <= 12
-                AND c.vencimento_dia >= 1 AND c.vencimento_dia <= 31
-                AND p.ativo = 1
                 -- Só prestações que realmente estão vencidas
-                AND TRY_CAST(
-                    CASE
-                        WHEN p.ano > 1900 AND p.ano < 2100
-                             AND p.mes >= 1 AND p.mes <= 12
-                             AND c.vencimento_dia >= 1 AND c.vencimento_dia <= 31
-                        THEN CAST(p.ano AS VARCHAR(4)) + '-' +
-                             RIGHT('0' + CAST(p.mes AS VARCHAR(2)), 2) + '-' +
-                             RIGHT('0' + CAST(c.vencimento_dia AS VARCHAR(2)), 2)
-                        ELSE NULL
-                    END AS DATE
-                ) IS NOT NULL
-                AND TRY_CAST(
-                    CASE
-                        WHEN p.ano > 1900 AND p.ano < 2100
-                             AND p.mes >= 1 AND p.mes <= 12
-                             AND c.vencimento_dia >= 1 AND c.vencimento_dia <= 31
-                        THEN CAST(p.ano AS VARCHAR(4)) + '-' +
-                             RIGHT('0' + CAST(p.mes AS VARCHAR(2)), 2) + '-' +
-                             RIGHT('0' + CAST(c.vencimento_dia AS VARCHAR(2)), 2)
-                        ELSE NULL
-                    END AS DATE
-                ) < CAST(GETDATE() AS DATE)
-            ORDER BY
-                TRY_CAST(
-                    CASE
-                        WHEN p.ano > 1900 AND p.ano < 2100
-                             AND p.mes >= 1 AND p.mes <= 12
-                             AND c.vencimento_dia >= 1 AND c.vencimento_dia <= 31
-                        THEN CAST(p.ano AS VARCHAR(4)) + '-' +
-                             RIGHT('0' + CAST(p.mes AS VARCHAR(2)), 2) + '-' +
-                             RIGHT('0' + CAST(c.vencimento_dia AS VARCHAR(2)), 2)
-                        ELSE NULL
-                    END AS DATE
-                ) ASC
+                AND p.data_vencimento < CAST(GETDATE() AS DATE)
+                AND p.ativo = 1
+            ORDER BY p.data_vencimento ASC
         """
 
         cursor.execute(query)
@@ -236,7 +191,10 @@ def buscar_prestacoes_para_atualizar() -> List[Dict[str, Any]]:
                 'vencimento_dia': row[9],  # vencimento_dia
                 'percentual_multa': float(row[10]) if row[10] else 2.0,  # percentual_multa_atraso
                 'data_vencimento': row[11],  # data_vencimento calculada
-                'dias_atraso_atual': row[12]  # dias_atraso_atual
+                'dias_atraso_atual': row[12],  # dias_atraso_atual
+                'total_liquido': float(row[13]) if row[13] else 0.0,  # total_liquido
+                'hash_acrescimos': row[14],  # hash das entradas da última gravação
+                'versao_formula': row[15]  # versão da fórmula da última gravação
             })
 
         logger.info(f"Encontradas {len(prestacoes)} prestações para verificar acréscimos")
@@ -271,6 +229,7 @@ def atualizar_acrescimos_prestacao(prestacao: Dict[str, Any]) -> bool:
     )
 
     # FORÇAR ATUALIZAÇÃO para garantir consistência entre endpoints
+    # (o modo individual sempre regrava; a detecção de mudanças fica no modo em lote)
     # (remover verificação para que sempre recalcule)
     logger.info(f"Prestação {prestacao['id']}: recalculando R$ {acrescimos_atuais['total_acrescimo']:.2f}, {dias_atraso_atual} dias")
 
@@ -334,14 +293,15 @@ def atualizar_acrescimos_prestacao(prestacao: Dict[str, Any]) -> bool:
 
             if locadores and len(locadores) > 0:
                 # Calcular distribuição igual (dividir por 3)
-                valor_base = novo_valor_repasse / len(locadores)
-                valor_base_arredondado = round(valor_base - 0.005, 2)  # Arredondar para baixo
-                diferenca = novo_valor_repasse - (valor_base_arredondado * len(locadores))
+                # (nome próprio: valor_base continua sendo a base do hash abaixo)
+                valor_por_locador = novo_valor_repasse / len(locadores)
+                valor_por_locador_arredondado = round(valor_por_locador - 0.005, 2)  # Arredondar para baixo
+                diferenca = novo_valor_repasse - (valor_por_locador_arredondado * len(locadores))
 
                 # Atualizar/criar distribuição na tabela
                 for i, (locador_id, nome, eh_principal) in enumerate(locadores):
                     # Responsável principal recebe os centavos extras
-                    valor_final = valor_base_arredondado + (diferenca if eh_principal else 0)
+                    valor_final = valor_por_locador_arredondado + (diferenca if eh_principal else 0)
 
                     # Verificar se já existe distribuição para esta prestação e locador
                     cursor.execute("""
@@ -374,6 +334,17 @@ def atualizar_acrescimos_prestacao(prestacao: Dict[str, Any]) -> bool:
 
         except Exception as e:
             logger.warning(f"Erro ao atualizar distribuição para prestação {prestacao['id']}: {e}")
+            locadores = None
+
+        # Estado gravado para o modo incremental (sem hash se a distribuição falhou)
+        hash_acrescimos = None
+        if locadores is not None:
+            hash_acrescimos = calcular_hash_prestacao(prestacao, total_liquido, locadores)
+        cursor.execute("""
+            UPDATE PrestacaoContas
+            SET hash_acrescimos = ?, versao_formula_acrescimos = ?
+            WHERE id = ?
+        """, (hash_acrescimos, VERSAO_FORMULA_ACRESCIMOS, prestacao['id']))
 
         # Registrar log de alteração
         cursor.execute("""
@@ -387,7 +358,10 @@ def atualizar_acrescimos_prestacao(prestacao: Dict[str, Any]) -> bool:
             dias_atraso_atual
         ))
 
+        atualizar_agregados_job(cursor, [prestacao['id']])
+
         conn.commit()
+        invalidar_pdfs_prestacoes([prestacao['id']])
 
         logger.info(
             f"Prestacao {prestacao['id']}: "
@@ -405,6 +379,266 @@ def atualizar_acrescimos_prestacao(prestacao: Dict[str, Any]) -> bool:
     finally:
         conn.close()
 
+# ==================== MODO EM LOTE ====================
+
+TAMANHO_LOTE_PADRAO = 500
+
+def calcular_distribuicao_repasse(valor_repasse: float, locadores: List[tuple]) -> List[Dict[str, Any]]:
+    """
+    Divide o repasse igualmente entre os locadores do contrato.
+    Responsável principal recebe os centavos extras (mesma regra do modo individual).
+
+    Args:
+        valor_repasse: Repasse total da prestação
+        locadores: [(locador_id, nome, responsabilidade_principal), ...]
+    """
+    if not locadores:
+        return []
+
+    quantidade = len(locadores)
+    valor_base_arredondado = round(valor_repasse / quantidade - 0.005, 2)  # Arredondar para baixo
+    diferenca = valor_repasse - (valor_base_arredondado * quantidade)
+    percentual = round(100.0 / quantidade, 2)
+
+    return [
+        {
+            'locador_id': locador_id,
+            'nome': nome,
+            'responsabilidade_principal': eh_principal,
+            'percentual': percentual,
+            'valor_repasse': valor_base_arredondado + (diferenca if eh_principal else 0)
+        }
+        for locador_id, nome, eh_principal in locadores
+    ]
+
+def calcular_atualizacao_prestacao(prestacao: Dict[str, Any], locadores: List[tuple]) -> Optional[Dict[str, Any]]:
+    """
+    Calcula em memória tudo o que o job grava para uma prestação
+    (acréscimos, totais, repasse e distribuição), sem acessar o banco.
+
+    Returns:
+        Dict com os novos valores, ou None se a prestação não está em atraso
+    """
+    dias_atraso_atual = prestacao['dias_atraso_atual']
+    if not dias_atraso_atual or dias_atraso_atual <= 0:
+        return None
+
+    valor_base = prestacao['valor_boleto'] or prestacao['valor_total']
+    acrescimos = calcular_acrescimos_prestacao(valor_base, dias_atraso_atual, prestacao['percentual_multa'])
+
+    # 100% dos acréscimos vão para o repasse (ver atualizar_acrescimos_prestacao)
+    total_liquido = prestacao.get('total_liquido', 0.0)
+    novo_valor_repasse = total_liquido + acrescimos['total_acrescimo']
+
+    return {
+        'prestacao_id': prestacao['id'],
+        'hash': calcular_hash_prestacao(prestacao, total_liquido, locadores),
+        'dias_atraso': dias_atraso_atual,
+        'valor_acrescimos_anterior': prestacao['valor_acrescimos_atual'],
+        'valor_acrescimos': acrescimos['total_acrescimo'],
+        'valor_total_com_acrescimos': valor_base + acrescimos['total_acrescimo'],
+        'valor_repasse': novo_valor_repasse,
+        'distribuicao': calcular_distribuicao_repasse(novo_valor_repasse, locadores)
+    }
+
+def prestacao_inalterada(prestacao: Dict[str, Any], atualizacao: Dict[str, Any]) -> bool:
+    """
+    True se a última gravação foi feita com as mesmas entradas e a mesma
+    versão da fórmula, e os valores salvos ainda são os calculados
+    (pega alterações manuais feitas por outros endpoints)
+    """
+    return (
+        prestacao.get('versao_formula') == VERSAO_FORMULA_ACRESCIMOS
+        and prestacao.get('hash_acrescimos') == atualizacao['hash']
+        and prestacao['dias_atraso_salvo'] == atualizacao['dias_atraso']
+        and round(prestacao['valor_acrescimos_atual'], 2) == round(atualizacao['valor_acrescimos'], 2)
+    )
+
+def _placeholders(valores: List[Any]) -> str:
+    return ','.join('?' for _ in valores)
+
+def buscar_locadores_por_contrato(cursor, contrato_ids: List[int]) -> Dict[int, List[tuple]]:
+    """Locadores ativos de vários contratos em uma consulta"""
+    locadores_por_contrato: Dict[int, List[tuple]] = {}
+    if not contrato_ids:
+        return locadores_por_contrato
+
+    cursor.execute(f"""
+        SELECT cl.contrato_id, cl.locador_id, l.nome, cl.responsabilidade_principal
+        FROM ContratoLocadores cl
+        JOIN Locadores l ON cl.locador_id = l.id
+        WHERE cl.contrato_id IN ({_placeholders(contrato_ids)})
+        AND cl.ativo = 1
+        ORDER BY cl.contrato_id, cl.responsabilidade_principal DESC, cl.locador_id
+    """, contrato_ids)
+
+    for contrato_id, locador_id, nome, eh_principal in cursor.fetchall():
+        locadores_por_contrato.setdefault(contrato_id, []).append((locador_id, nome, eh_principal))
+    return locadores_por_contrato
+
+def gravar_lote_acrescimos(cursor, atualizacoes: List[Dict[str, Any]]):
+    """
+    Grava um lote de atualizações já calculadas com executemany
+    (sem commit: o chamador controla a transação do lote)
+    """
+    if not atualizacoes:
+        return
+
+    cursor.fast_executemany = True
+
+    # PASSO 1 + 2: acréscimos, totais e repasse em um único UPDATE por linha
+    cursor.executemany("""
+        UPDATE PrestacaoContas
+        SET
+            valor_acrescimos = ?,
+            dias_atraso = ?,
+            valor_total_com_acrescimos = ?,
+            valor_repasse = ?,
+            hash_acrescimos = ?,
+            versao_formula_acrescimos = ?,
+            data_calculo_acrescimos = GETDATE(),
+            data_atualizacao = GETDATE()
+        WHERE id = ?
+    """, [
+        (a['valor_acrescimos'], a['dias_atraso'], a['valor_total_com_acrescimos'],
+         a['valor_repasse'], a['hash'], VERSAO_FORMULA_ACRESCIMOS, a['prestacao_id'])
+        for a in atualizacoes
+    ])
+
+    # PASSO 3: distribuição - descobrir de uma vez quais (prestação, locador) já existem
+    prestacao_ids = [a['prestacao_id'] for a in atualizacoes if a['distribuicao']]
+    existentes = set()
+    if prestacao_ids:
+        cursor.execute(f"""
+            SELECT prestacao_id, locador_id FROM DistribuicaoRepasseLocadores
+            WHERE prestacao_id IN ({_placeholders(prestacao_ids)})
+        """, prestacao_ids)
+        existentes = {(row[0], row[1]) for row in cursor.fetchall()}
+
+    updates_distribuicao = []
+    inserts_distribuicao = []
+    for a in atualizacoes:
+        for d in a['distribuicao']:
+            if (a['prestacao_id'], d['locador_id']) in existentes:
+                updates_distribuicao.append(
+                    (d['valor_repasse'], d['percentual'], a['prestacao_id'], d['locador_id'])
+                )
+            else:
+                inserts_distribuicao.append(
+                    (a['prestacao_id'], d['locador_id'], d['nome'], d['percentual'],
+                     d['valor_repasse'], d['responsabilidade_principal'])
+                )
+
+    if updates_distribuicao:
+        cursor.executemany("""
+            UPDATE DistribuicaoRepasseLocadores
+            SET valor_repasse = ?,
+                percentual_participacao = ?,
+                data_atualizacao = GETDATE()
+            WHERE prestacao_id = ? AND locador_id = ?
+        """, updates_distribuicao)
+
+    if inserts_distribuicao:
+        cursor.executemany("""
+            INSERT INTO DistribuicaoRepasseLocadores
+            (prestacao_id, locador_id, locador_nome, percentual_participacao,
+             valor_repasse, responsabilidade_principal, data_criacao, ativo)
+            VALUES (?, ?, ?, ?, ?, ?, GETDATE(), 1)
+        """, inserts_distribuicao)
+
+    # Registrar log de alteração
+    cursor.executemany("""
+        INSERT INTO LogAtualizacaoAcrescimos
+        (prestacao_id, valor_anterior, valor_novo, dias_atraso, data_atualizacao, origem)
+        VALUES (?, ?, ?, ?, GETDATE(), 'JOB_AUTOMATICO')
+    """, [
+        (a['prestacao_id'], a['valor_acrescimos_anterior'], a['valor_acrescimos'], a['dias_atraso'])
+        for a in atualizacoes
+    ])
+
+    atualizar_agregados_job(cursor, [a['prestacao_id'] for a in atualizacoes])
+
+def atualizar_agregados_job(cursor, prestacao_ids: List[int]):
+    """Recalcula os agregados financeiros das prestações gravadas (falha não derruba o lote)"""
+    try:
+        atualizar_agregados_prestacoes(cursor, prestacao_ids)
+    except ErroAgregados as e:
+        logger.warning(f"Aviso ao atualizar agregados financeiros de {len(prestacao_ids)} prestações: {e}")
+
+def processar_lote_acrescimos(lote: List[Dict[str, Any]], incremental: bool = True) -> Dict[str, int]:
+    """
+    Calcula e grava um lote de prestações em uma única transação.
+    Se o lote falhar, faz rollback e reprocessa as prestações uma a uma.
+
+    Args:
+        incremental: Pular prestações cujas entradas não mudaram desde a última gravação
+
+    Returns:
+        Dict com quantidade de prestações atualizadas e inalteradas
+    """
+    conn = get_conexao()
+    cursor = conn.cursor()
+
+    try:
+        contrato_ids = sorted({p['contrato_id'] for p in lote if p['contrato_id']})
+        locadores_por_contrato = buscar_locadores_por_contrato(cursor, contrato_ids)
+
+        atualizacoes = []
+        inalteradas = 0
+        for prestacao in lote:
+            atualizacao = calcular_atualizacao_prestacao(
+                prestacao, locadores_por_contrato.get(prestacao['contrato_id'], [])
+            )
+            if not atualizacao:
+                continue
+            if incremental and prestacao_inalterada(prestacao, atualizacao):
+                inalteradas += 1
+                continue
+            atualizacoes.append(atualizacao)
+
+        gravar_lote_acrescimos(cursor, atualizacoes)
+        conn.commit()
+        invalidar_pdfs_prestacoes(atualizacao['prestacao_id'] for atualizacao in atualizacoes)
+        return {'atualizadas': len(atualizacoes), 'inalteradas': inalteradas}
+
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erro no lote de {len(lote)} prestações, reprocessando individualmente: {e}")
+        # Devolver a conexão antes: o modo individual empresta uma por prestação
+        conn.close()
+        atualizadas = sum(1 for prestacao in lote if atualizar_acrescimos_prestacao(prestacao))
+        return {'atualizadas': atualizadas, 'inalteradas': 0}
+    finally:
+        conn.close()
+
+def executar_acrescimos_em_lote(prestacoes: List[Dict[str, Any]], tamanho_lote: int = TAMANHO_LOTE_PADRAO,
+                                incremental: bool = True) -> Dict[str, Any]:
+    """
+    Processa as prestações em lotes de `tamanho_lote`, uma transação por lote.
+
+    Returns:
+        Dict com processadas, atualizadas, inalteradas, duração e throughput (linhas/s)
+    """
+    inicio = time.perf_counter()
+    atualizadas = 0
+    inalteradas = 0
+
+    for posicao in range(0, len(prestacoes), tamanho_lote):
+        lote = prestacoes[posicao:posicao + tamanho_lote]
+        resultado_lote = processar_lote_acrescimos(lote, incremental)
+        atualizadas += resultado_lote['atualizadas']
+        inalteradas += resultado_lote['inalteradas']
+        logger.info(f"Lote {posicao // tamanho_lote + 1}: {posicao + len(lote)}/{len(prestacoes)} prestações processadas")
+
+    duracao = time.perf_counter() - inicio
+    return {
+        'processadas': len(prestacoes),
+        'atualizadas': atualizadas,
+        'inalteradas': inalteradas,
+        'duracao_segundos': round(duracao, 3),
+        'linhas_por_segundo': round(len(prestacoes) / duracao, 1) if duracao > 0 else 0.0
+    }
+
 def criar_tabela_log_se_necessario():
     """Cria a tabela de log de atualizações se não existir"""
     conn = get_conexao()
@@ -431,14 +665,47 @@ def criar_tabela_log_se_necessario():
     finally:
         conn.close()
 
-def executar_job_acrescimos():
-    """Função principal que executa o job de atualização de acréscimos"""
+def garantir_colunas_controle_acrescimos():
+    """Cria em PrestacaoContas as colunas usadas pelo job (vencimento persistido e recálculo incremental)"""
+    conn = get_conexao()
+    cursor = conn.cursor()
+
+    try:
+        garantir_coluna_data_vencimento(cursor)
+        cursor.execute("""
+            IF COL_LENGTH('PrestacaoContas', 'hash_acrescimos') IS NULL
+                ALTER TABLE PrestacaoContas ADD hash_acrescimos varchar(64) NULL
+        """)
+        cursor.execute("""
+            IF COL_LENGTH('PrestacaoContas', 'versao_formula_acrescimos') IS NULL
+                ALTER TABLE PrestacaoContas ADD versao_formula_acrescimos int NULL
+        """)
+        conn.commit()
+    except Exception as e:
+        logger.warning(f"Aviso ao criar colunas de controle de acréscimos: {e}")
+    finally:
+        conn.close()
+
+def executar_job_acrescimos(modo: str = 'lote', tamanho_lote: int = TAMANHO_LOTE_PADRAO,
+                            incremental: bool = True):
+    """
+    Função principal que executa o job de atualização de acréscimos
+
+    Args:
+        modo: 'lote' (padrão, transação por lote com executemany) ou
+              'individual' (uma conexão e transação por prestação)
+        tamanho_lote: Prestações por transação no modo 'lote'
+        incremental: No modo 'lote', só grava prestações cujas entradas
+                     (valor base, multa, dias de atraso, locadores) ou a
+                     versão da fórmula mudaram desde a última gravação
+    """
     inicio = datetime.now()
-    logger.info("Iniciando job de cálculo automático de acréscimos")
+    logger.info(f"Iniciando job de cálculo automático de acréscimos (modo {modo})")
 
     try:
         # Garantir que a tabela de log existe
         criar_tabela_log_se_necessario()
+        garantir_colunas_controle_acrescimos()
 
         # Buscar prestações para atualizar
         prestacoes = buscar_prestacoes_para_atualizar()
@@ -447,25 +714,34 @@ def executar_job_acrescimos():
             logger.info("Nenhuma prestação necessita atualização de acréscimos")
             return
 
-        # Contador de atualizações
-        atualizadas = 0
-
-        # Processar cada prestação
-        for prestacao in prestacoes:
-            try:
-                if atualizar_acrescimos_prestacao(prestacao):
-                    atualizadas += 1
-            except Exception as e:
-                logger.error(f"Erro ao processar prestação {prestacao['id']}: {e}")
-                continue
+        inalteradas = 0
+        if modo == 'lote':
+            resultado = executar_acrescimos_em_lote(prestacoes, tamanho_lote, incremental)
+            atualizadas = resultado['atualizadas']
+            inalteradas = resultado['inalteradas']
+        else:
+            # Contador de atualizações
+            atualizadas = 0
+
+            # Processar cada prestação
+            for prestacao in prestacoes:
+                try:
+                    if atualizar_acrescimos_prestacao(prestacao):
+                        atualizadas += 1
+                except Exception as e:
+                    logger.error(f"Erro ao processar prestação {prestacao['id']}: {e}")
+                    continue
 
         # Relatório final
         duracao = datetime.now() - inicio
+        segundos = duracao.total_seconds()
         logger.info(
             f"Job concluído! "
             f"Processadas: {len(prestacoes)}, "
             f"Atualizadas: {atualizadas}, "
-            f"Duração: {duracao.total_seconds():.2f}s"
+            f"Inalteradas: {inalteradas}, "
+            f"Duração: {segundos:.2f}s, "
+            f"Throughput: {len(prestacoes) / segundos if segundos > 0 else 0:.1f} linhas/s"
         )
 
     except Exception as e:
@@ -473,4 +749,18 @@ def executar_job_acrescimos():
         sys.exit(1)
 
 if __name__ == "__main__":
-    executar_job_acrescimos()
\ No newline at end of file
+    # Sempre com o lease do executor_acrescimos (import tardio: ele importa
+    # este módulo), para não rodar junto com o job agendado da API
+    # --individual: processa prestação a prestação (modo antigo)
+    # --completo: ignora a detecção de mudanças e regrava todas as prestações
+    from executor_acrescimos import executar_job_paralelo, executar_sob_lease
+
+    incremental = '--completo' not in sys.argv
+    if '--individual' in sys.argv:
+        resultado = executar_sob_lease(executar_job_acrescimos, modo='individual', incremental=incremental)
+    else:
+        resultado = executar_job_paralelo(incremental=incremental, forcar=True)
+    if isinstance(resultado, dict) and resultado.get('status') != 'concluido':
+        if resultado.get('status') == 'lease_ocupado':
+            logger.warning("Job de acréscimos já está em execução em outro worker; nada a fazer")
+        sys.exit(1)
@@ -0,0 +1,359 @@
+"""
+Layout do PDF da Prestação (ReportLab platypus)
+================================================================
+
+Monta o PDF com as mesmas seções da página HTML do template (cabeçalho com
+logo, proprietários, locatário, imóvel, valores cobrados, valores retidos,
+repasses e rodapé), mas com flowables e tabelas: listas longas de
+lançamentos, vários locadores e repasses quebram em páginas sozinhos, com o
+cabeçalho das tabelas repetido e "continuação" no topo das páginas seguintes.
+
+As linhas vêm das mesmas funções que alimentam o HTML (linhas_valores_cobrados,
+linhas_valores_retidos e linhas_repasses, usadas por gerar_html_*) e os
+valores simples de montar_valores_template: PDF e pré-visualização mostram
+os mesmos números.
+
+Estilos e logos são preparados uma vez por processo. As logos (PNG com
+transparência) são achatadas sobre branco e guardadas como JPEG, que o
+reportlab embute sem recodificar; e os streams do PDF são binários, sem
+ASCII85 - o codificador em Python puro dominava o tempo de geração.
+"""
+
+import io
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+from xml.sax.saxutils import escape
+
+from reportlab import rl_config
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_RIGHT
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import mm
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import (
+    BaseDocTemplate, Flowable, Frame, PageBreak, PageTemplate, Paragraph, Spacer, Table, TableStyle
+)
+
+from gerar_pdf_html import (
+    DIRETORIO_MODULO,
+    LOGOS,
+    formatar_moeda,
+    linhas_repasses,
+    linhas_valores_cobrados,
+    linhas_valores_retidos,
+    montar_valores_template,
+)
+
+# Cores do template_prestacao.html
+VERDE = colors.HexColor('#137D76')
+TEXTO = colors.HexColor('#2d3748')
+VERMELHO = colors.HexColor('#e53e3e')
+FUNDO_LINHA = colors.HexColor('#f8fafc')
+FUNDO_TOTAL = colors.HexColor('#edf2f7')
+BORDA = colors.HexColor('#e2e8f0')
+
+MARGEM_LATERAL = 18 * mm
+MARGEM_TOPO = 16 * mm
+MARGEM_RODAPE = 30 * mm
+LARGURA_UTIL = A4[0] - 2 * MARGEM_LATERAL
+LARGURA_VALOR = 32 * mm
+
+RODAPE_ENDERECO = ("R. Presidente Faria, 431 | cj 42 | 4° andar | Centro | Curitiba | PR",
+                   "www.cobimob.com.br")
+RODAPE_CONTATO = ("(41) 3995-8200", "atendimento@cobimob.com.br")
+
+# Streams binários (sem ASCII85): válido em qualquer leitor de PDF e ~25% menor
+rl_config.useA85 = 0
+
+
+def _estilo(nome: str, **kwargs) -> ParagraphStyle:
+    base = {'fontName': 'Helvetica', 'fontSize': 9, 'leading': 11.5, 'textColor': TEXTO}
+    base.update(kwargs)
+    return ParagraphStyle(nome, **base)
+
+
+ESTILOS = {
+    'titulo': _estilo('titulo', fontName='Helvetica-Bold', fontSize=16, leading=19, alignment=TA_RIGHT),
+    'subtitulo': _estilo('subtitulo', fontSize=11, leading=14, textColor=VERDE, alignment=TA_RIGHT),
+    'secao': _estilo('secao', fontName='Helvetica-Bold', fontSize=10.5, leading=13, textColor=VERDE,
+                     spaceBefore=5 * mm, spaceAfter=1.5 * mm, keepWithNext=1),
+    'rotulo': _estilo('rotulo', fontName='Helvetica-Bold', fontSize=8.5, textColor=VERDE),
+    'celula': _estilo('celula'),
+    'total': _estilo('total', fontName='Helvetica-Bold'),
+}
+
+_logos_lock = threading.Lock()
+_logos_jpeg: Dict[str, Optional[bytes]] = {}
+
+
+def _logo(placeholder: str) -> Optional[ImageReader]:
+    """
+    Logo de LOGOS pronta para desenhar (None se o arquivo não existe). O JPEG
+    fica em cache; cada chamada devolve um leitor próprio (seguro entre threads).
+    """
+    if placeholder not in _logos_jpeg:
+        with _logos_lock:
+            if placeholder not in _logos_jpeg:
+                try:
+                    from PIL import Image as ImagemPIL
+                    with ImagemPIL.open(os.path.join(DIRETORIO_MODULO, LOGOS[placeholder])) as imagem:
+                        imagem = imagem.convert('RGBA')
+                        fundo = ImagemPIL.new('RGB', imagem.size, 'white')
+                        fundo.paste(imagem, mask=imagem.getchannel('A'))
+                    saida = io.BytesIO()
+                    fundo.save(saida, 'JPEG', quality=95)
+                    _logos_jpeg[placeholder] = saida.getvalue()
+                except Exception as e:
+                    print(f"AVISO: Logo não encontrada para o PDF: {LOGOS[placeholder]} ({e})")
+                    _logos_jpeg[placeholder] = None
+    jpeg = _logos_jpeg[placeholder]
+    return ImageReader(io.BytesIO(jpeg)) if jpeg else None
+
+
+class _Logo(Flowable):
+    """Desenha uma logo já carregada na altura pedida (mantém a proporção)"""
+
+    def __init__(self, imagem: ImageReader, altura: float):
+        super().__init__()
+        largura_original, altura_original = imagem.getSize()
+        self.imagem = imagem
+        self.altura = altura
+        self.largura = altura * largura_original / altura_original
+
+    def wrap(self, largura_disponivel, altura_disponivel):
+        return self.largura, self.altura
+
+    def draw(self):
+        self.canv.drawImage(self.imagem, 0, 0, self.largura, self.altura)
+
+
+class _InicioPrestacao(Flowable):
+    """
+    Marca onde começa cada prestação no documento: o rodapé numera as páginas
+    e o topo das páginas seguintes mostra "continuação" por prestação.
+    """
+
+    def __init__(self, identificacao: str):
+        super().__init__()
+        self.identificacao = identificacao
+
+    def wrap(self, largura_disponivel, altura_disponivel):
+        return 0, 0
+
+    def draw(self):
+        self.canv._prestacao_atual = (self.identificacao, self.canv.getPageNumber())
+
+
+def _texto(valor: Any) -> str:
+    return escape(str(valor)) if valor is not None else ''
+
+
+def _celula(valor: Any, largura: float):
+    """
+    Texto simples quando cabe em uma linha da coluna (bem mais barato de
+    desenhar); Paragraph com quebra de linha só quando não cabe.
+    """
+    texto = str(valor) if valor is not None else ''
+    if stringWidth(texto, 'Helvetica', 9) <= largura - 12:  # 6pt de padding de cada lado
+        return texto
+    return Paragraph(escape(texto), ESTILOS['celula'])
+
+
+def _tabela(linhas: List[list], larguras: List[float], estilos_extra: Iterable[tuple] = (),
+            linhas_total: int = 1) -> Table:
+    """Tabela com cabeçalho verde repetido a cada página e linha(s) de total no fim"""
+    estilo = [
+        ('BACKGROUND', (0, 0), (-1, 0), VERDE),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('ALIGN', (-1, 0), (-1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('TEXTCOLOR', (0, 1), (-1, -1), TEXTO),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('LINEBELOW', (0, 1), (-1, -1), 0.5, BORDA),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1 - linhas_total), [colors.white, FUNDO_LINHA]),
+        ('BACKGROUND', (0, -linhas_total), (-1, -1), FUNDO_TOTAL),
+        ('FONTNAME', (0, -linhas_total), (-1, -1), 'Helvetica-Bold'),
+        ('TOPPADDING', (0, 0), (-1, -1), 3),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+    ]
+    estilo.extend(estilos_extra)
+    return Table(linhas, colWidths=larguras, repeatRows=1, style=TableStyle(estilo))
+
+
+def _cabecalho(valores: Dict[str, Any]) -> List[Flowable]:
+    titulo = [Paragraph('PRESTAÇÃO DE CONTAS', ESTILOS['titulo']),
+              Paragraph(_texto(valores['MES_ANO']), ESTILOS['subtitulo'])]
+    logo = _logo('LOGO1_BASE64')
+    celula_logo = _Logo(logo, 14 * mm) if logo else ''
+    tabela = Table([[celula_logo, titulo]], colWidths=[LARGURA_UTIL / 2, LARGURA_UTIL / 2], style=TableStyle([
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('LEFTPADDING', (0, 0), (-1, -1), 0),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+        ('LINEBELOW', (0, 0), (-1, 0), 1.5, VERDE),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 3 * mm),
+    ]))
+    return [tabela, Spacer(1, 3 * mm)]
+
+
+def _dados_gerais(dados: Dict[str, Any], valores: Dict[str, Any]) -> Table:
+    """Proprietários, locatário, imóvel e datas: uma linha por item (quebra entre páginas)"""
+    locadores = [l for l in (dados.get('locadores') or []) if isinstance(l, dict)]
+    proprietarios = [f"<b>{_texto(l.get('locador_nome', 'Nome não informado'))}</b>"
+                     f" - CPF: {_texto(l.get('cpf_cnpj', 'CPF não informado'))}" for l in locadores]
+    if not proprietarios:
+        proprietarios = [f"<b>{_texto(valores['PROPRIETARIO_NOME'])}</b> - CPF: {_texto(valores['PROPRIETARIO_CPF'])}"]
+
+    itens = [('Proprietários' if indice == 0 else '', texto) for indice, texto in enumerate(proprietarios)]
+    itens += [
+        ('Locatário', f"<b>{_texto(valores['LOCATARIO_NOME'])}</b> - CPF: {_texto(valores['LOCATARIO_CPF'])}"),
+        ('Imóvel', f"<b>{_texto(valores['IMOVEL_ENDERECO'])}</b>"),
+        ('Prestação Nº', f"<b>{_texto(valores['PRESTACAO_ID'])}</b>"),
+        ('Vencimento', _texto(valores['DATA_VENCIMENTO'])),
+        ('Pagamento', _texto(valores['DATA_PAGAMENTO'])),
+    ]
+    linhas = [[Paragraph(rotulo, ESTILOS['rotulo']), Paragraph(texto, ESTILOS['celula'])] for rotulo, texto in itens]
+    return Table(linhas, colWidths=[30 * mm, LARGURA_UTIL - 30 * mm], style=TableStyle([
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('TOPPADDING', (0, 0), (-1, -1), 1.5),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 1.5),
+        ('LINEBELOW', (0, len(proprietarios) - 1), (-1, len(proprietarios) - 1), 0.5, BORDA),
+        ('LINEBELOW', (0, len(proprietarios) + 1), (-1, len(proprietarios) + 1), 0.5, BORDA),
+    ]))
+
+
+def _valores_cobrados(lancamentos, valores: Dict[str, Any]) -> List[Flowable]:
+    linhas = [['Descrição', 'Valor']]
+    estilos = []
+    for linha in linhas_valores_cobrados(lancamentos):
+        if linha['categoria'] == 'desconto' or linha['valor'] < 0:
+            estilos.append(('TEXTCOLOR', (1, len(linhas)), (1, len(linhas)), VERMELHO))
+        linhas.append([_celula(linha['descricao'], LARGURA_UTIL - LARGURA_VALOR), formatar_moeda(linha['valor'])])
+    if len(linhas) == 1:
+        vazio = 'Nenhum lançamento encontrado' if not lancamentos else 'Nenhum valor cobrado'
+        linhas.append([vazio, formatar_moeda(0)])
+    linhas.append(['VALOR TOTAL', valores['VALOR_BOLETO']])
+    return [Paragraph('Valores Cobrados junto ao Aluguel', ESTILOS['secao']),
+            _tabela(linhas, [LARGURA_UTIL - LARGURA_VALOR, LARGURA_VALOR], estilos)]
+
+
+def _valores_retidos(lancamentos, valores: Dict[str, Any]) -> List[Flowable]:
+    linhas = [['Descrição', 'Valor']]
+    for linha in linhas_valores_retidos(lancamentos):
+        linhas.append([_celula(linha['descricao'], LARGURA_UTIL - LARGURA_VALOR), formatar_moeda(linha['valor'])])
+    if len(linhas) == 1:
+        linhas.append(['Nenhum valor retido', formatar_moeda(0)])
+    linhas.append(['VALOR TOTAL RETIDO', valores['TOTAL_RETIDO']])
+    return [Paragraph('Valores Retidos do Total Pago', ESTILOS['secao']),
+            _tabela(linhas, [LARGURA_UTIL - LARGURA_VALOR, LARGURA_VALOR])]
+
+
+def _repasses(dados: Dict[str, Any], valores: Dict[str, Any]) -> List[Flowable]:
+    largura_titular = (LARGURA_UTIL - LARGURA_VALOR) * 0.5
+    linhas = [['Titular', valores['TIPO_PAGAMENTO'], 'Valor']]
+    for linha in linhas_repasses(dados.get('distribuicao_repasse', []), dados.get('locadores', [])):
+        linhas.append([
+            Paragraph(f"<b>{_texto(linha['titular'])}</b><br/><font size=7.5>CPF: {_texto(linha['cpf'])}</font>",
+                      ESTILOS['celula']),
+            _celula(linha['destino'], LARGURA_UTIL - LARGURA_VALOR - largura_titular),
+            formatar_moeda(linha['valor']),
+        ])
+    estilos = []
+    if len(linhas) == 1:
+        linhas.append(['Nenhum repasse encontrado', '', ''])
+        estilos.append(('SPAN', (0, 1), (-1, 1)))
+    linhas.append([
+        Paragraph(f"<b>TOTAL A SER REPASSADO</b><br/><font size=7.5>Repasse realizado em: "
+                  f"{_texto(valores['DATA_REPASSE'])}</font>", ESTILOS['total']),
+        '', valores['VALOR_REPASSE'],
+    ])
+    estilos.append(('SPAN', (0, -1), (1, -1)))
+    return [Paragraph('Valor Total a ser Repassado', ESTILOS['secao']),
+            _tabela(linhas, [largura_titular, LARGURA_UTIL - LARGURA_VALOR - largura_titular, LARGURA_VALOR],
+                    estilos)]
+
+
+def montar_flowables(dados: Dict[str, Any]) -> List[Flowable]:
+    """Flowables de uma prestação (dados de buscar_prestacao_detalhada)"""
+    valores = montar_valores_template(dados)
+    lancamentos = dados.get('lancamentos_detalhados', [])
+    identificacao = f"{valores['PRESTACAO_ID']} · {valores['MES_ANO']}"
+
+    flowables: List[Flowable] = [_InicioPrestacao(identificacao)]
+    flowables += _cabecalho(valores)
+    flowables.append(_dados_gerais(dados, valores))
+    flowables += _valores_cobrados(lancamentos, valores)
+    flowables += _valores_retidos(lancamentos, valores)
+    flowables += _repasses(dados, valores)
+    return flowables
+
+
+def _desenhar_moldura(canvas, doc):
+    """Rodapé (logo, endereço, contato, página) e "continuação" no topo"""
+    largura, altura = A4
+    identificacao, pagina_inicial = getattr(canvas, '_prestacao_atual', ('', canvas.getPageNumber()))
+    pagina = canvas.getPageNumber() - pagina_inicial + 1
+
+    canvas.saveState()
+    if pagina > 1:
+        canvas.setFont('Helvetica', 8)
+        canvas.setFillColor(VERDE)
+        canvas.drawString(MARGEM_LATERAL, altura - 10 * mm, f"PRESTAÇÃO DE CONTAS · {identificacao} (continuação)")
+
+    y_faixa = 22 * mm
+    canvas.setStrokeColor(VERDE)
+    canvas.setLineWidth(1.5)
+    canvas.line(MARGEM_LATERAL, y_faixa, largura - MARGEM_LATERAL, y_faixa)
+
+    canvas.setFillColor(TEXTO)
+    canvas.setFont('Helvetica', 7.5)
+    canvas.drawRightString(largura - MARGEM_LATERAL, y_faixa + 2 * mm, f"{identificacao} · Página {pagina}")
+
+    logo = doc.logo_rodape
+    if logo:
+        largura_logo, altura_logo = logo.getSize()
+        canvas.drawImage(logo, MARGEM_LATERAL, 10 * mm, 6 * mm * largura_logo / altura_logo, 6 * mm)
+    canvas.setFont('Helvetica', 7)
+    canvas.drawCentredString(largura / 2, 15 * mm, RODAPE_ENDERECO[0])
+    canvas.drawCentredString(largura / 2, 11 * mm, RODAPE_ENDERECO[1])
+    canvas.drawRightString(largura - MARGEM_LATERAL, 15 * mm, RODAPE_CONTATO[0])
+    canvas.drawRightString(largura - MARGEM_LATERAL, 11 * mm, RODAPE_CONTATO[1])
+    canvas.restoreState()
+
+
+def _documento(destino, titulo: str) -> BaseDocTemplate:
+    documento = BaseDocTemplate(destino, pagesize=A4, title=titulo, author='COBIMOB',
+                                leftMargin=MARGEM_LATERAL, rightMargin=MARGEM_LATERAL,
+                                topMargin=MARGEM_TOPO, bottomMargin=MARGEM_RODAPE)
+    quadro = Frame(documento.leftMargin, documento.bottomMargin, documento.width, documento.height, id='conteudo')
+    documento.addPageTemplates([PageTemplate(id='prestacao', frames=[quadro], onPageEnd=_desenhar_moldura)])
+    documento.logo_rodape = _logo('LOGO2_BASE64')  # um leitor por documento, reaproveitado em todas as páginas
+    return documento
+
+
+def gerar_pdf_prestacao(dados: Dict[str, Any], destino) -> None:
+    """PDF (uma ou mais páginas) da prestação em `destino` (caminho ou arquivo binário)"""
+    titulo = f"Prestação de Contas {dados.get('id', '')}"
+    _documento(destino, titulo).build(montar_flowables(dados))
+
+
+def gerar_pdf_varias_prestacoes(prestacoes: Iterable[Dict[str, Any]], destino) -> int:
+    """
+    Um único PDF com as prestações em sequência, cada uma começando em página
+    nova e com numeração própria. Devolve a quantidade de prestações.
+    """
+    flowables: List[Flowable] = []
+    quantidade = 0
+    for dados in prestacoes:
+        if quantidade:
+            flowables.append(PageBreak())
+        flowables += montar_flowables(dados)
+        quantidade += 1
+    if not quantidade:
+        flowables.append(Paragraph('Nenhuma prestação encontrada.', ESTILOS['celula']))
+    _documento(destino, 'Prestações de Contas').build(flowables)
+    return quantidade
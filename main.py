@@ -5,9 +5,10 @@ import sys
 if sys.platform == "win32":
     os.environ["PYTHONIOENCODING"] = "utf-8"
 
-from fastapi import FastAPI, HTTPException, Request, UploadFile, File
+from fastapi import FastAPI, HTTPException, Request, UploadFile, File, Header
 from fastapi.responses import Response
 from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional, Union, List
@@ -15,6 +16,7 @@ from datetime import date
 from contextlib import asynccontextmanager
 import json
 import io
+import tempfile
 import subprocess
 import shutil
 from pathlib import Path
@@ -23,6 +25,26 @@ from dotenv import load_dotenv
 # Importar scheduler de acréscimos
 from scheduler_acrescimos import iniciar_scheduler, parar_scheduler, status_scheduler
 
+# Pool de conexões compartilhado com o SQL Server
+from pool_conexoes import metricas_pool, fechar_pool, obter_conexao
+
+# Código bloqueante (pyodbc) dos endpoints roda em pool de threads limitado
+from executor_bd import em_thread_bd, executar_bd, metricas_executor, fechar_executor
+from indice_busca import estatisticas_indice_busca
+from cache_busca import metricas_cache_busca
+from autocompletar import autocompletar_carregado, carregar_autocompletar_em_segundo_plano, estatisticas_autocompletar, sugerir
+from colunas_digitos import garantir_colunas_digitos
+from agregados_financeiros import ErroAgregados, garantir_tabela_agregados, atualizar_agregados_prestacoes, obter_serie_mensal
+from resolver_enderecos_imovel import garantir_tabela_enderecos_resolvidos
+from calculo_prestacoes_lote import calcular_prestacoes_lote
+from gravacao_prestacoes import garantir_colunas_prestacao
+from gerar_pdf_html import carregar_renderizador, renderizar_html_prestacao
+from exportacao_pdf_lote import iniciar_exportacao, status_exportacao, arquivo_exportacao
+from cache_pdf import invalidar_pdfs_prestacoes, metricas_cache_pdf, obter_cache_pdf, versao_pdf_prestacao
+
+# Regra única de multa + juros por atraso
+from motor_acrescimos import calcular_acrescimos, calcular_dias_atraso, garantir_coluna_data_vencimento
+
 # Importar repositórios existentes via adapter
 from repositories_adapter import (
     inserir_locador, buscar_locadores, atualizar_locador,
@@ -30,6 +52,7 @@ from repositories_adapter import (
     inserir_imovel, buscar_imoveis, atualizar_imovel,
     inserir_contrato_completo, buscar_contratos, buscar_contratos_por_locador, buscar_contrato_por_id,
     buscar_faturas, buscar_estatisticas_faturas, buscar_fatura_por_id, gerar_boleto_fatura,
+    invalidar_cache_faturas,
     buscar_historico_contrato, registrar_mudanca_contrato, listar_planos_locacao,
     salvar_dados_bancarios_corretor, buscar_dados_bancarios_corretor,
     buscar_contas_bancarias_locador, inserir_conta_bancaria_locador,
@@ -46,6 +69,7 @@ from repositories_adapter import (
 
 # Importar funções específicas para dashboard
 from dashboard_sql_server import (
+    obter_snapshot_dashboard,
     obter_metricas_dashboard,
     obter_ocupacao_dashboard,
     obter_vencimentos_dashboard,
@@ -184,6 +208,62 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"Erro ao iniciar scheduler: {e}")
 
+    # Coluna PrestacaoContas.data_vencimento (se a migração 001 ainda não rodou)
+    try:
+        with obter_conexao() as conn:
+            garantir_coluna_data_vencimento(conn.cursor())
+    except Exception as e:
+        print(f"Erro ao verificar coluna data_vencimento: {e}")
+
+    # Colunas só-dígitos de CPF/CNPJ, telefone e CEP (se a migração 002 ainda não rodou)
+    try:
+        with obter_conexao() as conn:
+            garantir_colunas_digitos(conn.cursor())
+    except Exception as e:
+        print(f"Erro ao verificar colunas só-dígitos: {e}")
+
+    # Rollup AgregadosFinanceirosMensais (se a migração 003 ainda não rodou)
+    try:
+        with obter_conexao() as conn:
+            garantir_tabela_agregados(conn.cursor())
+    except Exception as e:
+        print(f"Erro ao verificar agregados financeiros: {e}")
+
+    # Colunas/constraints de PrestacaoContas usadas na gravação (se a migração 004 ainda não rodou)
+    try:
+        with obter_conexao() as conn:
+            garantir_colunas_prestacao(conn.cursor())
+    except Exception as e:
+        print(f"Erro ao verificar estrutura de PrestacaoContas: {e}")
+
+    # Tabela lida pela listagem de imóveis (se a migração 005 ainda não rodou);
+    # criada antes de servir, não na thread de resolução abaixo
+    try:
+        with obter_conexao() as conn:
+            garantir_tabela_enderecos_resolvidos(conn.cursor())
+    except Exception as e:
+        print(f"Erro ao verificar tabela ImovelEnderecoResolvido: {e}")
+
+    # Resolver (incrementalmente) endereços texto-livre de imóveis antigos
+    try:
+        import threading
+        from resolver_enderecos_imovel import resolver_enderecos_pendentes
+        threading.Thread(target=resolver_enderecos_pendentes, daemon=True).start()
+    except Exception as e:
+        print(f"Erro ao iniciar resolução de endereços de imóveis: {e}")
+
+    # Template HTML e logos da prestação (lidos uma vez)
+    try:
+        carregar_renderizador()
+    except Exception as e:
+        print(f"Erro ao carregar template de prestação: {e}")
+
+    # Índice de prefixos do autocompletar (em segundo plano)
+    try:
+        carregar_autocompletar_em_segundo_plano()
+    except Exception as e:
+        print(f"Erro ao iniciar carga do autocompletar: {e}")
+
     yield
 
     # Shutdown
@@ -193,6 +273,17 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"Erro ao parar scheduler: {e}")
 
+    try:
+        fechar_executor()
+    except Exception as e:
+        print(f"Erro ao encerrar executor de banco: {e}")
+
+    try:
+        fechar_pool()
+        print("Pool de conexões encerrado")
+    except Exception as e:
+        print(f"Erro ao encerrar pool de conexões: {e}")
+
 app = FastAPI(
     title="Cobimob API",
     version="1.0.0",
@@ -216,9 +307,23 @@ async def add_utf8_header(request: Request, call_next):
 async def health_check():
     return {"status": "ok", "message": "API funcionando"}
 
+# Endpoint com as métricas do pool de conexões
+@app.get("/api/health/pool")
+async def pool_status():
+    """Checkouts, tempo de espera e conexões abertas/livres do pool"""
+    return {
+        "pool_conexoes": metricas_pool(),
+        "executor_bd": metricas_executor(),
+        "indice_busca": estatisticas_indice_busca(),
+        "cache_busca": metricas_cache_busca(),
+        "cache_pdf": metricas_cache_pdf(),
+        "autocompletar": estatisticas_autocompletar()
+    }
+
 # Endpoint para verificar status do scheduler
 @app.get("/api/scheduler/status")
-async def scheduler_status():
+@em_thread_bd('scheduler')
+def scheduler_status():
     """Retorna o status do scheduler de acréscimos"""
     status = status_scheduler()
     return {
@@ -869,7 +974,8 @@ class ContratoUpdate(BaseModel):
 
 # Rotas para Locadores
 @app.post("/api/locadores")
-async def criar_locador(locador: LocadorCreate):
+@em_thread_bd('locadores')
+def criar_locador(locador: LocadorCreate):
     try:
         print(f"Criando novo locador: {locador.nome}")
 
@@ -882,7 +988,8 @@ async def criar_locador(locador: LocadorCreate):
         raise HTTPException(status_code=500, detail=f"Erro ao criar locador: {str(e)}")
 
 @app.put("/api/locadores/{locador_id}")
-async def atualizar_locador_endpoint(locador_id: int, locador: LocadorUpdate):
+@em_thread_bd('locadores')
+def atualizar_locador_endpoint(locador_id: int, locador: LocadorUpdate):
     try:
         print(f"\n=== INICIANDO ATUALIZAÇÃO DO LOCADOR {locador_id} ===")
         dados_recebidos = locador.model_dump(exclude_none=True)
@@ -933,7 +1040,8 @@ async def atualizar_locador_endpoint(locador_id: int, locador: LocadorUpdate):
         raise HTTPException(status_code=500, detail=f"Erro ao atualizar locador: {str(e)}")
 
 @app.get("/api/locadores/{locador_id}")
-async def buscar_locador_por_id_endpoint(locador_id: int):
+@em_thread_bd('locadores')
+def buscar_locador_por_id_endpoint(locador_id: int):
     try:
         print(f"Buscando locador completo ID: {locador_id}")
 
@@ -958,7 +1066,8 @@ async def buscar_locador_por_id_endpoint(locador_id: int):
         raise HTTPException(status_code=500, detail=f"Erro ao buscar locador: {str(e)}")
 
 @app.get("/api/locadores")
-async def listar_locadores():
+@em_thread_bd('locadores')
+def listar_locadores():
     try:
         print("Listando locadores")
         
@@ -973,7 +1082,8 @@ class StatusRequest(BaseModel):
     ativo: bool
 
 @app.put("/api/locadores/{locador_id}/status")
-async def alterar_status_locador(locador_id: int, request: StatusRequest):
+@em_thread_bd('locadores')
+def alterar_status_locador(locador_id: int, request: StatusRequest):
     try:
         from repositories_adapter import alterar_status_locador as alterar_status_db
         resultado = alterar_status_db(locador_id, request.ativo)
@@ -988,7 +1098,8 @@ async def alterar_status_locador(locador_id: int, request: StatusRequest):
 
 # Rotas para Locatarios
 @app.post("/api/locatarios")
-async def criar_locatario(locatario: LocatarioCreate):
+@em_thread_bd('locatarios')
+def criar_locatario(locatario: LocatarioCreate):
     try:
         print(f"Criando novo locatário: {locatario.nome}")
         dados_dict = locatario.model_dump(exclude_none=True)
@@ -1009,7 +1120,8 @@ async def criar_locatario(locatario: LocatarioCreate):
         raise HTTPException(status_code=500, detail=f"Erro ao criar locatário: {str(e)}")
 
 @app.get("/api/locatarios")
-async def listar_locatarios():
+@em_thread_bd('locatarios')
+def listar_locatarios():
     try:
         locatarios = buscar_locatarios()
         return {"data": locatarios, "success": True}
@@ -1017,7 +1129,8 @@ async def listar_locatarios():
         raise HTTPException(status_code=500, detail=f"Erro ao buscar locatários: {str(e)}")
 
 @app.put("/api/locatarios/{locatario_id}")
-async def atualizar_locatario_endpoint(locatario_id: int, locatario: LocatarioUpdate):
+@em_thread_bd('locatarios')
+def atualizar_locatario_endpoint(locatario_id: int, locatario: LocatarioUpdate):
     try:
         print(f"\n=== INICIANDO ATUALIZAÇÃO DO LOCATÁRIO {locatario_id} ===")
         dados_recebidos = locatario.model_dump(exclude_none=True)
@@ -1060,7 +1173,8 @@ async def atualizar_locatario_endpoint(locatario_id: int, locatario: LocatarioUp
         raise HTTPException(status_code=500, detail=f"Erro interno do servidor: {str(e)}")
 
 @app.get("/api/locatarios/{locatario_id}")
-async def buscar_locatario_endpoint(locatario_id: int):
+@em_thread_bd('locatarios')
+def buscar_locatario_endpoint(locatario_id: int):
     try:
         print(f"ENDPOINT: Buscando locatário ID: {locatario_id}")
         
@@ -1079,7 +1193,8 @@ async def buscar_locatario_endpoint(locatario_id: int):
         raise HTTPException(status_code=500, detail=f"Erro ao buscar locatário: {str(e)}")
 
 @app.put("/api/locatarios/{locatario_id}/status")
-async def alterar_status_locatario(locatario_id: int, request: StatusRequest):
+@em_thread_bd('locatarios')
+def alterar_status_locatario(locatario_id: int, request: StatusRequest):
     try:
         from repositories_adapter import alterar_status_locatario as alterar_status_db
         resultado = alterar_status_db(locatario_id, request.ativo)
@@ -1094,7 +1209,8 @@ async def alterar_status_locatario(locatario_id: int, request: StatusRequest):
 
 # Rotas para Imóveis
 @app.post("/api/imoveis")
-async def criar_imovel(imovel: ImovelCreate):
+@em_thread_bd('imoveis')
+def criar_imovel(imovel: ImovelCreate):
     try:
         # Converter para dict
         imovel_data = imovel.model_dump(exclude_none=True)
@@ -1158,7 +1274,8 @@ async def criar_imovel(imovel: ImovelCreate):
         raise HTTPException(status_code=500, detail=f"Erro ao criar imóvel: {str(e)}")
 
 @app.get("/api/imoveis")
-async def listar_imoveis():
+@em_thread_bd('imoveis')
+def listar_imoveis():
     try:
         imoveis = buscar_imoveis()
         return {"data": imoveis, "success": True}
@@ -1166,7 +1283,8 @@ async def listar_imoveis():
         raise HTTPException(status_code=500, detail=f"Erro ao buscar imóveis: {str(e)}")
 
 @app.put("/api/imoveis/{imovel_id}")
-async def atualizar_imovel_endpoint(imovel_id: int, imovel: ImovelUpdate):
+@em_thread_bd('imoveis')
+def atualizar_imovel_endpoint(imovel_id: int, imovel: ImovelUpdate):
     try:
         print(f"\nINICIANDO ATUALIZACAO DO IMOVEL {imovel_id}")
         dados_recebidos = imovel.model_dump(exclude_none=True)
@@ -1289,7 +1407,8 @@ async def atualizar_imovel_endpoint(imovel_id: int, imovel: ImovelUpdate):
         raise HTTPException(status_code=500, detail=f"Erro ao atualizar imovel: {erro_safe}")
 
 @app.get("/api/imoveis/{imovel_id}")
-async def buscar_imovel_por_id(imovel_id: int):
+@em_thread_bd('imoveis')
+def buscar_imovel_por_id(imovel_id: int):
     try:
         print(f"Buscando imóvel ID: {imovel_id} (tipo: {type(imovel_id)})")
 
@@ -1364,7 +1483,8 @@ async def buscar_imovel_por_id(imovel_id: int):
         raise HTTPException(status_code=500, detail=f"Erro ao buscar imóvel: {str(e)}")
 
 @app.put("/api/imoveis/{imovel_id}/status")
-async def alterar_status_imovel(imovel_id: int, request: StatusRequest):
+@em_thread_bd('imoveis')
+def alterar_status_imovel(imovel_id: int, request: StatusRequest):
     try:
         from repositories_adapter import alterar_status_imovel as alterar_status_db
         resultado = alterar_status_db(imovel_id, request.ativo)
@@ -1379,7 +1499,8 @@ async def alterar_status_imovel(imovel_id: int, request: StatusRequest):
 
 # Rotas para Contratos
 @app.post("/api/contratos")
-async def criar_contrato(contrato: ContratoCreate):
+@em_thread_bd('contratos')
+def criar_contrato(contrato: ContratoCreate):
     try:
         print(f"\n=== INICIANDO CRIAÇÃO DE NOVO CONTRATO ===")
         dados_recebidos = contrato.model_dump(exclude_none=True)
@@ -1402,7 +1523,8 @@ async def criar_contrato(contrato: ContratoCreate):
         raise HTTPException(status_code=500, detail=f"Erro ao criar contrato: {str(e)}")
 
 @app.get("/api/contratos")
-async def listar_contratos():
+@em_thread_bd('contratos')
+def listar_contratos():
     try:
         contratos = buscar_contratos()
         return {"data": contratos, "success": True}
@@ -1410,7 +1532,8 @@ async def listar_contratos():
         raise HTTPException(status_code=500, detail=f"Erro ao buscar contratos: {str(e)}")
 
 @app.get("/api/contratos/locador/{locador_id}")
-async def listar_contratos_por_locador(locador_id: int):
+@em_thread_bd('contratos')
+def listar_contratos_por_locador(locador_id: int):
     try:
         contratos = buscar_contratos_por_locador(locador_id)
         return {"data": contratos, "success": True}
@@ -1418,7 +1541,8 @@ async def listar_contratos_por_locador(locador_id: int):
         raise HTTPException(status_code=500, detail=f"Erro ao buscar contratos do locador: {str(e)}")
 
 @app.get("/api/contratos/{contrato_id}")
-async def obter_contrato_por_id(contrato_id: int):
+@em_thread_bd('contratos')
+def obter_contrato_por_id(contrato_id: int):
     try:
         contrato = buscar_contrato_por_id(contrato_id)
         if contrato:
@@ -1431,7 +1555,8 @@ async def obter_contrato_por_id(contrato_id: int):
         raise HTTPException(status_code=500, detail=f"Erro ao buscar contrato: {str(e)}")
 
 @app.get("/api/contratos/{contrato_id}/historico")
-async def obter_historico_contrato(contrato_id: int):
+@em_thread_bd('contratos')
+def obter_historico_contrato(contrato_id: int):
     """Endpoint para buscar histórico completo de mudanças de um contrato"""
     try:
         resultado = buscar_historico_contrato(contrato_id)
@@ -1454,7 +1579,8 @@ async def obter_historico_contrato(contrato_id: int):
         )
 
 @app.put("/api/contratos/{contrato_id}")
-async def atualizar_contrato(contrato_id: int, contrato: ContratoUpdate):
+@em_thread_bd('contratos')
+def atualizar_contrato(contrato_id: int, contrato: ContratoUpdate):
     try:
         print(f"\n=== INICIANDO ATUALIZAÇÃO DO CONTRATO {contrato_id} ===")
         dados_recebidos = contrato.model_dump(exclude_none=True)
@@ -1491,7 +1617,8 @@ async def atualizar_contrato(contrato_id: int, contrato: ContratoUpdate):
 
 # Endpoints para Prestação de Contas
 @app.get("/api/faturas")
-async def listar_faturas(
+@em_thread_bd('faturas')
+def listar_faturas(
     status: Optional[str] = None, 
     mes: Optional[int] = None,
     ano: Optional[int] = None,
@@ -1499,7 +1626,8 @@ async def listar_faturas(
     order_dir: Optional[str] = 'DESC',
     search: Optional[str] = None,
     page: Optional[int] = 1,
-    limit: Optional[int] = 20
+    limit: Optional[int] = 20,
+    after_id: Optional[int] = None
 ):
     try:
         from repositories_adapter import buscar_faturas
@@ -1519,23 +1647,37 @@ async def listar_faturas(
             page=page,
             limit=limit,
             order_by=order_by,
-            order_dir=order_dir
+            order_dir=order_dir,
+            after_id=after_id
         )
         return faturas
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar faturas: {str(e)}")
 
 @app.get("/api/faturas/stats")
-async def obter_estatisticas_faturas():
+@em_thread_bd('faturas')
+def obter_estatisticas_faturas(
+    mes: Optional[int] = None,
+    ano: Optional[int] = None,
+    search: Optional[str] = None
+):
     try:
         from repositories_adapter import buscar_estatisticas_faturas
-        stats = buscar_estatisticas_faturas()
+        filtros = {}
+        if mes:
+            filtros['mes'] = mes
+        if ano:
+            filtros['ano'] = ano
+        if search:
+            filtros['search'] = search
+        stats = buscar_estatisticas_faturas(filtros if filtros else None)
         return stats
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar estatísticas: {str(e)}")
 
 @app.get("/api/faturas/{fatura_id}")
-async def obter_fatura(fatura_id: int):
+@em_thread_bd('faturas')
+def obter_fatura(fatura_id: int):
     try:
         from repositories_adapter import buscar_fatura_por_id
         fatura = buscar_fatura_por_id(fatura_id)
@@ -1546,7 +1688,8 @@ async def obter_fatura(fatura_id: int):
         raise HTTPException(status_code=500, detail=f"Erro ao buscar fatura: {str(e)}")
 
 @app.post("/api/faturas/{fatura_id}/gerar-boleto")
-async def gerar_boleto(fatura_id: int):
+@em_thread_bd('faturas')
+def gerar_boleto(fatura_id: int):
     try:
         from repositories_adapter import gerar_boleto_fatura
         boleto = gerar_boleto_fatura(fatura_id)
@@ -1557,7 +1700,8 @@ async def gerar_boleto(fatura_id: int):
         raise HTTPException(status_code=500, detail=f"Erro ao gerar boleto: {str(e)}")
 
 @app.post("/api/faturas/{fatura_id}/cancelar")
-async def cancelar_fatura(fatura_id: int):
+@em_thread_bd('faturas')
+def cancelar_fatura(fatura_id: int):
     try:
         from repositories_adapter import cancelar_fatura
         resultado = cancelar_fatura(fatura_id)
@@ -1570,7 +1714,8 @@ async def cancelar_fatura(fatura_id: int):
         raise HTTPException(status_code=500, detail=f"Erro ao cancelar fatura: {str(e)}")
 
 @app.get("/api/prestacao-contas/contratos-ativos")
-async def listar_contratos_ativos_prestacao():
+@em_thread_bd('prestacao_contas')
+def listar_contratos_ativos_prestacao():
     """Lista todos os contratos válidos (ativo, reajuste, vencendo) para seleção na prestação de contas"""
     try:
         from repositories_adapter import buscar_contratos_ativos
@@ -1583,7 +1728,8 @@ async def listar_contratos_ativos_prestacao():
 
 # Endpoints do Dashboard
 @app.get("/api/dashboard/metricas")
-async def dashboard_metricas():
+@em_thread_bd('dashboard')
+def dashboard_metricas():
     """Endpoint para obter métricas do dashboard"""
     try:
         metricas = obter_metricas_dashboard()
@@ -1592,7 +1738,8 @@ async def dashboard_metricas():
         raise HTTPException(status_code=500, detail=f"Erro ao buscar métricas: {str(e)}")
 
 @app.get("/api/dashboard/ocupacao")
-async def dashboard_ocupacao():
+@em_thread_bd('dashboard')
+def dashboard_ocupacao():
     """Endpoint para obter dados de ocupação"""
     try:
         ocupacao = obter_ocupacao_dashboard()
@@ -1601,7 +1748,8 @@ async def dashboard_ocupacao():
         raise HTTPException(status_code=500, detail=f"Erro ao buscar ocupação: {str(e)}")
 
 @app.get("/api/dashboard/vencimentos")
-async def dashboard_vencimentos(dias: int = 30):
+@em_thread_bd('dashboard')
+def dashboard_vencimentos(dias: int = 30):
     """Endpoint para obter vencimentos próximos"""
     try:
         vencimentos = obter_vencimentos_dashboard(dias)
@@ -1610,7 +1758,8 @@ async def dashboard_vencimentos(dias: int = 30):
         raise HTTPException(status_code=500, detail=f"Erro ao buscar vencimentos: {str(e)}")
 
 @app.get("/api/dashboard/alertas")
-async def dashboard_alertas():
+@em_thread_bd('dashboard')
+def dashboard_alertas():
     """Endpoint para obter alertas do sistema"""
     try:
         alertas = obter_alertas_dashboard()
@@ -1618,6 +1767,17 @@ async def dashboard_alertas():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar alertas: {str(e)}")
 
+@app.get("/api/relatorios/financeiro-mensal")
+@em_thread_bd('dashboard')
+def relatorio_financeiro_mensal(meses: int = 12, locador_id: Optional[int] = None, imovel_id: Optional[int] = None):
+    """Faturado, recebido, acréscimos, retido e repasse por mês (AgregadosFinanceirosMensais)"""
+    try:
+        meses = max(1, min(meses, 120))
+        serie = obter_serie_mensal(meses, locador_id, imovel_id)
+        return {"data": serie, "success": True}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao buscar relatório financeiro: {str(e)}")
+
 class PrestacaoContasRequest(BaseModel):
     contrato_id: int
     tipo_prestacao: str
@@ -1637,12 +1797,15 @@ class PrestacaoContasRequest(BaseModel):
     descontos_ajustes: Optional[list] = None
 
 @app.post("/api/prestacao-contas/salvar")
-async def salvar_prestacao_contas(request: PrestacaoContasRequest):
+@em_thread_bd('prestacao_contas')
+def salvar_prestacao_contas(request: PrestacaoContasRequest):
     """Endpoint para salvar prestação de contas"""
     try:
         import traceback
         print(f"REQUEST DATA: {request.model_dump()}")
 
+        # Cabeçalho, descontos, lançamentos detalhados e distribuição por locador
+        # gravados juntos: se uma parte falhar, nada fica pela metade
         from repositories_adapter import salvar_prestacao_contas
         resultado = salvar_prestacao_contas(
             contrato_id=request.contrato_id,
@@ -1653,56 +1816,12 @@ async def salvar_prestacao_contas(request: PrestacaoContasRequest):
             lancamentos_extras=request.lancamentos_extras or [],
             contrato_dados=request.contrato_dados,
             configuracao_calculo=request.configuracao_calculo,
-            configuracao_fatura=request.configuracao_fatura
+            configuracao_fatura=request.configuracao_fatura,
+            descontos_ajustes=request.descontos_ajustes,
+            lancamentos_completos=request.lancamentos_completos,
+            repasse_por_locador=request.repasse_por_locador
         )
 
-        # ✅ NOVA FUNCIONALIDADE: Processar descontos_ajustes se fornecidos
-        prestacao_id = resultado.get('prestacao_id') if isinstance(resultado, dict) else resultado
-        print(f"DEBUG - prestacao_id extraído: {prestacao_id}, tipo: {type(prestacao_id)}")
-
-        # Converter Decimal para int
-        if hasattr(prestacao_id, '__int__'):
-            prestacao_id = int(prestacao_id)
-            print(f"DEBUG - prestacao_id convertido para int: {prestacao_id}")
-
-        # Processar descontos_ajustes se fornecidos
-        if hasattr(request, 'descontos_ajustes') and request.descontos_ajustes:
-            try:
-                print(f"PROCESSANDO {len(request.descontos_ajustes)} descontos/ajustes...")
-                from repositories_adapter import salvar_descontos_ajustes
-                salvar_descontos_ajustes(prestacao_id, request.descontos_ajustes)
-                print(f" Descontos/ajustes processados com sucesso")
-            except Exception as e_descontos:
-                print(f"❌ Erro ao processar descontos/ajustes: {str(e_descontos)}")
-
-        # ✅ NOVA FUNCIONALIDADE: Salvar lançamentos detalhados (se fornecidos)
-        # Mantém compatibilidade total - só executa se dados novos estiverem presentes
-        print(f"DEBUG - Verificando se tem lançamentos completos:")
-        print(f"  hasattr(request, 'lancamentos_completos'): {hasattr(request, 'lancamentos_completos')}")
-        print(f"  request.lancamentos_completos: {getattr(request, 'lancamentos_completos', 'NAO_EXISTE')}")
-        print(f"  request.repasse_por_locador: {getattr(request, 'repasse_por_locador', 'NAO_EXISTE')}")
-
-        if hasattr(request, 'lancamentos_completos') and request.lancamentos_completos:
-            try:
-                print(f"EXECUTANDO salvamento de lancamentos detalhados...")
-                from repositories_adapter import salvar_lancamentos_detalhados_completos
-                print(f"DEBUG - resultado: {resultado}, tipo: {type(resultado)}")
-
-                resultado_detalhado = salvar_lancamentos_detalhados_completos(
-                    prestacao_id=prestacao_id,
-                    lancamentos_completos=request.lancamentos_completos,
-                    mes_referencia=getattr(request, 'mes_referencia', None),
-                    repasse_por_locador=getattr(request, 'repasse_por_locador', None)
-                )
-
-                print(f" Lançamentos detalhados salvos: {resultado_detalhado}")
-                print(f"DEBUG - Preparando resposta final...")
-            except Exception as e_detalhado:
-                # Se falhar os lançamentos detalhados, NÃO quebra o sistema principal
-                print(f"AVISO: Erro ao salvar lançamentos detalhados (sistema principal funcionou): {str(e_detalhado)}")
-        else:
-            print(f"❌ NÃO EXECUTANDO - lançamentos completos não encontrados ou vazios")
-
         print(f"Retornando resposta final ao frontend...")
         resposta = {"success": True, "data": resultado, "message": "Prestação de contas salva com sucesso"}
         print(f"Resposta: {resposta}")
@@ -1716,14 +1835,31 @@ async def salvar_prestacao_contas(request: PrestacaoContasRequest):
             print("   Traceback: [erro de encoding - detalhes no stderr]")
         raise HTTPException(status_code=500, detail=f"Erro ao salvar prestação de contas: {str(e)}")
 
+@app.post("/api/prestacao-contas/salvar-lote")
+@em_thread_bd('prestacao_contas')
+def salvar_prestacoes_contas_lote_endpoint(prestacoes: List[PrestacaoContasRequest]):
+    """
+    Salva várias prestações de contas (mesmo corpo de /api/prestacao-contas/salvar)
+    em uma transação. Itens inválidos voltam em "erros" com o índice no lote.
+    """
+    try:
+        from repositories_adapter import salvar_prestacoes_contas_lote
+        resultado = salvar_prestacoes_contas_lote([prestacao.model_dump() for prestacao in prestacoes])
+        return {"success": not resultado['erros'], "data": resultado}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao salvar prestações de contas: {str(e)}")
+
 @app.get("/api/dashboard/completo")
-async def dashboard_completo(mes: Optional[int] = None, ano: Optional[int] = None):
+@em_thread_bd('dashboard')
+def dashboard_completo(mes: Optional[int] = None, ano: Optional[int] = None):
     """Endpoint para obter dashboard completo"""
     try:
-        metricas = obter_metricas_dashboard()
-        ocupacao = obter_ocupacao_dashboard()
-        vencimentos = obter_vencimentos_dashboard(60)
-        alertas = obter_alertas_dashboard()
+        # As quatro seções saem do mesmo snapshot (um lote SQL, em cache)
+        snapshot = obter_snapshot_dashboard()
+        metricas = obter_metricas_dashboard(snapshot)
+        ocupacao = obter_ocupacao_dashboard(snapshot)
+        vencimentos = obter_vencimentos_dashboard(60, snapshot)
+        alertas = obter_alertas_dashboard(snapshot)
         
         return {
             "metricas": metricas,
@@ -1737,7 +1873,8 @@ async def dashboard_completo(mes: Optional[int] = None, ano: Optional[int] = Non
 
 # Endpoints de Prestação Detalhada
 @app.get("/api/prestacao-contas/{prestacao_id}")
-async def buscar_prestacao_detalhada_endpoint(prestacao_id: int):
+@em_thread_bd('prestacao_contas')
+def buscar_prestacao_detalhada_endpoint(prestacao_id: int):
     """Busca prestação de contas com detalhamento completo"""
     try:
         prestacao = buscar_prestacao_detalhada(prestacao_id)
@@ -1749,7 +1886,8 @@ async def buscar_prestacao_detalhada_endpoint(prestacao_id: int):
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
 @app.get("/api/prestacao-contas/contrato/{contrato_id}")
-async def listar_prestacoes_contrato_endpoint(contrato_id: int, limit: int = 50):
+@em_thread_bd('prestacao_contas')
+def listar_prestacoes_contrato_endpoint(contrato_id: int, limit: int = 50):
     """Lista prestações de um contrato específico"""
     try:
         prestacoes = listar_prestacoes_contrato(contrato_id, limit)
@@ -1758,15 +1896,93 @@ async def listar_prestacoes_contrato_endpoint(contrato_id: int, limit: int = 50)
         print(f"Erro ao listar prestações do contrato: {e}")
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
+TAMANHO_BLOCO_ARQUIVO = 64 * 1024
+PDF_SPOOL_MEMORIA_BYTES = 1024 * 1024
+
+def _iterar_arquivo(arquivo):
+    """Lê o arquivo em blocos para a resposta e o fecha ao terminar (ou se o cliente desconectar)"""
+    try:
+        while True:
+            bloco = arquivo.read(TAMANHO_BLOCO_ARQUIVO)
+            if not bloco:
+                break
+            yield bloco
+    finally:
+        arquivo.close()
+
+def _resposta_arquivo(arquivo, media_type: str, cabecalhos: dict):
+    """StreamingResponse de um arquivo aberto, com Content-Length: memória limitada a um bloco"""
+    tamanho = arquivo.seek(0, io.SEEK_END)
+    arquivo.seek(0)
+    return StreamingResponse(
+        _iterar_arquivo(arquivo),
+        media_type=media_type,
+        headers={**cabecalhos, "Content-Length": str(tamanho)}
+    )
+
+def _gerar_arquivo_pdf(cache, prestacao_id: int, versao: str, prestacao_data):
+    """
+    Renderiza o PDF direto no arquivo do cache e o devolve aberto. Se o cache
+    em disco falhar, renderiza em um SpooledTemporaryFile (memória até
+    PDF_SPOOL_MEMORIA_BYTES, disco acima disso).
+    """
+    try:
+        cache.gravar_com(prestacao_id, versao, lambda destino: gerar_relatorio_pdf(prestacao_data, destino))
+        arquivo = cache.abrir(prestacao_id, versao)
+        if arquivo is not None:
+            return arquivo
+    except OSError as e:
+        print(f"AVISO: Cache de PDFs indisponível, gerando PDF {prestacao_id} em arquivo temporário: {e}")
+
+    arquivo = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MEMORIA_BYTES)
+    try:
+        gerar_relatorio_pdf(prestacao_data, arquivo)
+    except Exception:
+        arquivo.close()
+        raise
+    return arquivo
+
 # Endpoint de PDF da Prestação
 @app.get("/api/prestacao-contas/{prestacao_id}/pdf")
-async def gerar_pdf_prestacao(prestacao_id: int, preview: Optional[str] = None):
+@em_thread_bd('pdf')
+def gerar_pdf_prestacao(prestacao_id: int, preview: Optional[str] = None,
+                        if_none_match: Optional[str] = Header(None)):
     """
     Gera PDF da prestação de contas
     - preview=true: retorna dados para visualização no frontend
-    - preview=false: retorna PDF para download
+    - preview=false: retorna PDF para download (em cache por versão da
+      prestação, com ETag: If-None-Match igual responde 304)
     """
     try:
+        if not preview:
+            # Versão atual da prestação (uma linha): ETag e chave do cache de PDFs
+            versao = versao_pdf_prestacao(prestacao_id)
+            if versao is None:
+                raise HTTPException(status_code=404, detail="Prestação não encontrada")
+
+            etag = f'"{versao}"'
+            cabecalhos = {
+                "ETag": etag,
+                "Cache-Control": "private, no-cache",
+                "Content-Disposition": f"attachment; filename=prestacao-{prestacao_id}.pdf"
+            }
+            if if_none_match and (if_none_match.strip() == "*" or
+                                  etag in [valor.strip() for valor in if_none_match.split(",")]):
+                return Response(status_code=304, headers=cabecalhos)
+
+            cache = obter_cache_pdf()
+            arquivo = cache.abrir(prestacao_id, versao)
+            if arquivo is None:
+                prestacao_data = buscar_prestacao_detalhada(prestacao_id)
+                if not prestacao_data:
+                    raise HTTPException(status_code=404, detail="Prestação não encontrada")
+
+                # 🔄 IMPORTANTE: PDF deve usar EXATAMENTE os mesmos dados que o DetalhamentoBoleto
+                # Não transformar os dados - passar dados originais para o PDF também
+                arquivo = _gerar_arquivo_pdf(cache, prestacao_id, versao, prestacao_data)
+
+            return _resposta_arquivo(arquivo, "application/pdf", cabecalhos)
+
         # Buscar dados detalhados da prestação
         prestacao_data = buscar_prestacao_detalhada(prestacao_id)
         print(f"DEBUG PDF - Dados brutos da prestação: {prestacao_data}")
@@ -1774,45 +1990,17 @@ async def gerar_pdf_prestacao(prestacao_id: int, preview: Optional[str] = None):
         if not prestacao_data:
             raise HTTPException(status_code=404, detail="Prestação não encontrada")
 
-        if preview:
-            # Se for preview=html, retornar HTML personalizado da COBIMOB
-            if preview == "html":
-                # 🛑 NÃO transformar os dados! Passar dados originais para o template
-                from gerar_pdf_html import popular_template_com_dados
-
-                # Carregar template HTML personalizado
-                import os
-                template_path = os.path.join(os.path.dirname(__file__), 'template_prestacao.html')
-                with open(template_path, 'r', encoding='utf-8') as file:
-                    html_template = file.read()
+        # Se for preview=html, retornar HTML personalizado da COBIMOB
+        if preview == "html":
+            # 🛑 NÃO transformar os dados! Passar dados originais para o template
+            # (template e logos já carregados em memória pelo renderizador)
+            html_content = renderizar_html_prestacao(prestacao_data)
 
-                # Popular template com dados originais (não transformados)
-                html_content = popular_template_com_dados(html_template, prestacao_data)
-
-                return Response(content=html_content, media_type="text/html")
-            else:
-                # Preview normal (JSON)
-                pdf_data = transformar_dados_para_pdf(prestacao_data)
-                return {"data": pdf_data, "preview": True}
+            return Response(content=html_content, media_type="text/html")
         else:
-            # 🔄 IMPORTANTE: PDF deve usar EXATAMENTE os mesmos dados que o DetalhamentoBoleto
-            # Não transformar os dados - passar dados originais para o PDF também
-            pdf_buffer = gerar_relatorio_pdf(prestacao_data)
-
-            if not pdf_buffer:
-                raise HTTPException(status_code=500, detail="Erro ao gerar PDF")
-
-            # Resetar posição do buffer para o início
-            pdf_buffer.seek(0)
-
-            # Retornar PDF como stream
-            return StreamingResponse(
-                io.BytesIO(pdf_buffer.read()),
-                media_type="application/pdf",
-                headers={
-                    "Content-Disposition": f"attachment; filename=prestacao-{prestacao_id}.pdf"
-                }
-            )
+            # Preview normal (JSON)
+            pdf_data = transformar_dados_para_pdf(prestacao_data)
+            return {"data": pdf_data, "preview": True}
 
     except HTTPException:
         raise
@@ -1820,9 +2008,57 @@ async def gerar_pdf_prestacao(prestacao_id: int, preview: Optional[str] = None):
         print(f"Erro ao gerar PDF da prestação {prestacao_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
+@app.post("/api/prestacao-contas/pdf-lote")
+def iniciar_exportacao_pdf_lote(request: dict):
+    """
+    Gera em segundo plano os PDFs de todas as prestações do mês.
+
+    Espera dados no formato:
+    {
+        "mes": 3,
+        "ano": 2025,
+        "locador_id": 7,     // opcional: só as prestações do locador
+        "formato": "zip"     // "zip" (um PDF por prestação) ou "pdf" (PDF único)
+    }
+
+    Retorna o job; acompanhe em GET /api/prestacao-contas/pdf-lote/{job_id}
+    e baixe em GET /api/prestacao-contas/pdf-lote/{job_id}/arquivo.
+    """
+    try:
+        job = iniciar_exportacao(
+            mes=int(request['mes']),
+            ano=int(request['ano']),
+            locador_id=request.get('locador_id'),
+            formato=request.get('formato', 'zip')
+        )
+        return {"success": True, "data": job}
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Parâmetros inválidos: {str(e)}")
+
+@app.get("/api/prestacao-contas/pdf-lote/{job_id}")
+def status_exportacao_pdf_lote(job_id: str):
+    """Progresso da exportação (total, concluídas, erros por prestação)"""
+    job = status_exportacao(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Exportação não encontrada ou expirada")
+    return {"success": True, "data": job}
+
+@app.get("/api/prestacao-contas/pdf-lote/{job_id}/arquivo")
+def baixar_exportacao_pdf_lote(job_id: str):
+    """Download do ZIP/PDF da exportação (lido do disco em blocos)"""
+    arquivo = arquivo_exportacao(job_id)
+    if not arquivo:
+        job = status_exportacao(job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Exportação não encontrada ou expirada")
+        raise HTTPException(status_code=409, detail=f"Exportação ainda não concluída (status: {job['status']})")
+    media_type = "application/zip" if arquivo['formato'] == 'zip' else "application/pdf"
+    return FileResponse(arquivo['caminho'], media_type=media_type, filename=arquivo['nome_arquivo'])
+
 # Endpoints de Busca
 @app.get("/api/busca")
-async def buscar_dados(
+@em_thread_bd('busca')
+def buscar_dados(
     query: str, 
     tipo: Optional[str] = None,
     locador_id: Optional[int] = None,
@@ -1846,7 +2082,8 @@ async def buscar_dados(
         raise HTTPException(status_code=500, detail=f"Erro na busca: {str(e)}")
 
 @app.get("/api/busca/stats")
-async def estatisticas_busca(query: str):
+@em_thread_bd('busca')
+def estatisticas_busca(query: str):
     """Endpoint para estatísticas de busca"""
     try:
         stats = obter_estatisticas_busca(query)
@@ -1854,8 +2091,24 @@ async def estatisticas_busca(query: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao obter estatísticas: {str(e)}")
 
+@app.get("/api/busca/autocompletar")
+async def autocompletar_busca(q: str, limite: int = 10, tipo: Optional[str] = None):
+    """Sugestões da caixa de busca por prefixo (índice em memória, sem SQL)"""
+    try:
+        limite = max(1, min(limite, 20))
+        tipos = [tipo] if tipo else None
+        if autocompletar_carregado():
+            sugestoes = sugerir(q, limite, tipos)
+        else:
+            # Primeira consulta antes da carga do startup terminar: carrega fora do event loop
+            sugestoes = await executar_bd(sugerir, q, limite, tipos, grupo='busca')
+        return {"data": sugestoes, "success": True}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro no autocompletar: {str(e)}")
+
 @app.get("/api/busca/sugestoes")
-async def sugestoes_busca():
+@em_thread_bd('busca')
+def sugestoes_busca():
     """Endpoint para sugestões de busca"""
     try:
         sugestoes = buscar_sugestoes()
@@ -1868,7 +2121,8 @@ async def sugestoes_busca():
 # ==========================================
 
 @app.get("/api/contratos/{contrato_id}/locadores")
-async def listar_locadores_contrato(contrato_id: int):
+@em_thread_bd('contratos')
+def listar_locadores_contrato(contrato_id: int):
     """Lista todos os locadores de um contrato"""
     try:
         from repositories_adapter import buscar_locadores_contrato
@@ -1878,7 +2132,8 @@ async def listar_locadores_contrato(contrato_id: int):
         raise HTTPException(status_code=500, detail=f"Erro ao buscar locadores: {str(e)}")
 
 @app.get("/api/contratos/{contrato_id}/locatarios")
-async def listar_locatarios_contrato(contrato_id: int):
+@em_thread_bd('contratos')
+def listar_locatarios_contrato(contrato_id: int):
     """Lista todos os locatários de um contrato"""
     try:
         from repositories_adapter import buscar_locatarios_contrato
@@ -1888,7 +2143,8 @@ async def listar_locatarios_contrato(contrato_id: int):
         raise HTTPException(status_code=500, detail=f"Erro ao buscar locatários: {str(e)}")
 
 @app.get("/api/locadores/ativos")
-async def listar_locadores_ativos():
+@em_thread_bd('locadores')
+def listar_locadores_ativos():
     """Lista todos os locadores ativos disponíveis"""
     try:
         from repositories_adapter import buscar_todos_locadores_ativos
@@ -1899,7 +2155,8 @@ async def listar_locadores_ativos():
 
 # Rotas para Contas Bancárias de Locadores
 @app.get("/api/locadores/{locador_id}/contas-bancarias")
-async def listar_contas_bancarias_locador(locador_id: int):
+@em_thread_bd('locadores')
+def listar_contas_bancarias_locador(locador_id: int):
     """Lista todas as contas bancárias de um locador"""
     try:
         from repositories_adapter import buscar_contas_bancarias_locador
@@ -1920,7 +2177,8 @@ class ContaBancariaCreate(BaseModel):
     cpf_titular: Optional[str] = ""
 
 @app.post("/api/locadores/{locador_id}/contas-bancarias")
-async def criar_conta_bancaria_locador(locador_id: int, conta: ContaBancariaCreate):
+@em_thread_bd('locadores')
+def criar_conta_bancaria_locador(locador_id: int, conta: ContaBancariaCreate):
     """Cria uma nova conta bancária para um locador"""
     try:
         from repositories_adapter import inserir_conta_bancaria_locador
@@ -1946,7 +2204,8 @@ class LocadoresContratoRequest(BaseModel):
     locadores: list[dict]
 
 @app.post("/api/contratos/{contrato_id}/locadores")
-async def salvar_locadores_contrato(contrato_id: int, request: LocadoresContratoRequest):
+@em_thread_bd('contratos')
+def salvar_locadores_contrato(contrato_id: int, request: LocadoresContratoRequest):
     """Salva múltiplos locadores para um contrato"""
     try:
         from repositories_adapter import salvar_locadores_contrato, validar_porcentagens_contrato
@@ -1972,7 +2231,8 @@ class LocatariosContratoRequest(BaseModel):
     locatarios: list[dict]
 
 @app.post("/api/contratos/{contrato_id}/locatarios")
-async def salvar_locatarios_contrato(contrato_id: int, request: LocatariosContratoRequest):
+@em_thread_bd('contratos')
+def salvar_locatarios_contrato(contrato_id: int, request: LocatariosContratoRequest):
     """Salva múltiplos locatários para um contrato"""
     try:
         from repositories_adapter import salvar_locatarios_contrato
@@ -2006,7 +2266,8 @@ class GarantiasRequest(BaseModel):
     apolice_valor_cobertura: Optional[float] = None
 
 @app.post("/api/contratos/{contrato_id}/garantias")
-async def salvar_garantias_contrato(contrato_id: int, request: GarantiasRequest):
+@em_thread_bd('contratos')
+def salvar_garantias_contrato(contrato_id: int, request: GarantiasRequest):
     """Salva garantias (fiador, caução, título, apólice) para um contrato"""
     try:
         from repositories_adapter import salvar_garantias_individuais
@@ -2034,7 +2295,8 @@ class PetsRequest(BaseModel):
     pets_tamanhos: Optional[str] = None
 
 @app.post("/api/contratos/{contrato_id}/pets")
-async def salvar_pets_contrato_endpoint(contrato_id: int, request: PetsRequest):
+@em_thread_bd('contratos')
+def salvar_pets_contrato_endpoint(contrato_id: int, request: PetsRequest):
     """Salva informações de pets para um contrato"""
     try:
         from repositories_adapter import salvar_pets_contrato
@@ -2057,7 +2319,8 @@ async def salvar_pets_contrato_endpoint(contrato_id: int, request: PetsRequest):
         raise HTTPException(status_code=500, detail=f"Erro ao salvar pets: {str(e)}")
 
 @app.get("/api/contratos/{contrato_id}/pets")
-async def buscar_pets_contrato(contrato_id: int):
+@em_thread_bd('contratos')
+def buscar_pets_contrato(contrato_id: int):
     """Busca pets de um contrato"""
     try:
         from repositories_adapter import buscar_pets_por_contrato
@@ -2069,7 +2332,8 @@ async def buscar_pets_contrato(contrato_id: int):
         raise HTTPException(status_code=500, detail=f"Erro ao buscar pets: {str(e)}")
 
 @app.get("/api/contratos/{contrato_id}/garantias")
-async def buscar_garantias_contrato(contrato_id: int):
+@em_thread_bd('contratos')
+def buscar_garantias_contrato(contrato_id: int):
     """Busca garantias de um contrato"""
     try:
         from repositories_adapter import buscar_garantias_por_contrato
@@ -2081,7 +2345,8 @@ async def buscar_garantias_contrato(contrato_id: int):
         raise HTTPException(status_code=500, detail=f"Erro ao buscar garantias: {str(e)}")
 
 @app.get("/api/contratos/{contrato_id}/plano")
-async def buscar_plano_contrato(contrato_id: int):
+@em_thread_bd('contratos')
+def buscar_plano_contrato(contrato_id: int):
     """Busca o plano de locação de um contrato"""
     try:
         from repositories_adapter import buscar_plano_por_contrato
@@ -2093,7 +2358,8 @@ async def buscar_plano_contrato(contrato_id: int):
         raise HTTPException(status_code=500, detail=f"Erro ao buscar plano: {str(e)}")
 
 @app.get("/api/planos")
-async def listar_planos():
+@em_thread_bd('planos')
+def listar_planos():
     """Lista todos os planos de locação disponíveis"""
     try:
         resultado = listar_planos_locacao()
@@ -2103,7 +2369,8 @@ async def listar_planos():
         raise HTTPException(status_code=500, detail=f"Erro ao listar planos: {str(e)}")
 
 @app.get("/api/contratos/{contrato_id}/corretor/dados-bancarios")
-async def buscar_dados_bancarios_corretor_contrato(contrato_id: int):
+@em_thread_bd('contratos')
+def buscar_dados_bancarios_corretor_contrato(contrato_id: int):
     """Busca os dados bancários do corretor de um contrato"""
     try:
         resultado = buscar_dados_bancarios_corretor(contrato_id)
@@ -2113,7 +2380,8 @@ async def buscar_dados_bancarios_corretor_contrato(contrato_id: int):
         raise HTTPException(status_code=500, detail=f"Erro ao buscar dados bancários do corretor: {str(e)}")
 
 @app.patch("/api/contratos/{contrato_id}/status")
-async def alterar_status_contrato(contrato_id: int, request: dict):
+@em_thread_bd('contratos')
+def alterar_status_contrato(contrato_id: int, request: dict):
     """Altera o status de um contrato"""
     try:
         from repositories_adapter import alterar_status_contrato_db
@@ -2140,7 +2408,8 @@ async def alterar_status_contrato(contrato_id: int, request: dict):
         raise HTTPException(status_code=500, detail=f"Erro ao alterar status: {str(e)}")
 
 @app.post("/api/contratos/calcular-prestacao")
-async def calcular_prestacao_contrato(request: dict):
+@em_thread_bd('contratos')
+def calcular_prestacao_contrato(request: dict):
     """
     Calcula prestação de contas de um contrato
     
@@ -2297,11 +2566,74 @@ async def calcular_prestacao_contrato(request: dict):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Erro no cálculo: {str(e)}")
 
+@app.post("/api/contratos/calcular-prestacao/lote")
+@em_thread_bd('contratos')
+def calcular_prestacoes_contratos_lote(request: dict):
+    """
+    Calcula a prestação mensal de todos os contratos vigentes no mês
+    (uma consulta, cálculo em memória).
+
+    Espera dados no formato:
+    {
+        "mes": 3,
+        "ano": 2025,
+        "contrato_ids": [1, 2, 3],  // opcional: todos os vigentes se ausente
+        "dry_run": true             // false grava as prestações como 'pendente'
+    }
+
+    Erros por contrato vêm em "erros"/"ignorados" sem abortar o lote.
+    """
+    try:
+        hoje = datetime.now()
+        mes = int(request.get('mes') or hoje.month)
+        ano = int(request.get('ano') or hoje.year)
+        dry_run = bool(request.get('dry_run', True))
+
+        lote = calcular_prestacoes_lote(mes, ano, request.get('contrato_ids'), dry_run=dry_run)
+        if lote['totais']['gravados']:
+            invalidar_cache_faturas()
+
+        # Mesmo formato de /api/contratos/calcular-prestacao (tipo Mensal)
+        data_calculo = hoje.strftime('%Y-%m-%d')
+        lote['resultados'] = [{
+            "contrato_id": resultado['contrato_id'],
+            "prestacao_id": resultado['prestacao_id'],
+            "prestacao_existente": resultado['prestacao_existente'],
+            "proporcional_entrada": 0,
+            "meses_completos": resultado['valor_calculado'],
+            "qtd_meses_completos": 1,
+            "proporcional_saida": 0,
+            "lancamentos_adicionais": [],
+            "desconto": 0,
+            "multa": 0,
+            "percentual_desconto": 0,
+            "total": resultado['valor_boleto'],
+            "valor_boleto": resultado['valor_boleto'],
+            "valor_repassado_locadores": resultado['valor_repassado_locadores'],
+            "valor_retido": resultado['valor_retido'],
+            "breakdown_retencao": resultado['breakdown_retencao'],
+            "percentual_admin": resultado['percentual_admin'],
+            "periodo_dias": resultado['dias_utilizados'],
+            "data_calculo": data_calculo,
+            "contrato_dados": resultado['contrato_dados'],
+            "meses_restantes": 0,
+            "taxa_rescisao": 0
+        } for resultado in lote['resultados']]
+        return {"success": True, **lote}
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Erro no cálculo em lote: {str(e)}")
+
 # === CÁLCULO DE ACRÉSCIMOS PARA PRESTAÇÃO DE CONTAS ===
 
 def calcular_acrescimos_prestacao(valor_original: float, dias_atraso: int, percentual_multa_contrato: float) -> dict:
     """
-    Calcula acréscimos por atraso para prestação de contas:
+    Calcula acréscimos por atraso para prestação de contas
+    (regra única em motor_acrescimos.calcular_acrescimos):
     - Juros de mora: 1% ao mês (proporcional por dia)
     - Multa: percentual definido no contrato sobre o valor em atraso
     """
@@ -2312,27 +2644,20 @@ def calcular_acrescimos_prestacao(valor_original: float, dias_atraso: int, perce
             'total_acrescimo': 0.0,
             'dias_atraso': 0
         }
-    
-    # Juros de mora: 1% ao mês (0.033% ao dia aproximadamente)
-    juros_diario = 0.01 / 30  # 1% / 30 dias = 0.000333
-    juros = valor_original * juros_diario * dias_atraso
-    
-    # Multa: percentual do contrato sobre o valor em atraso
-    multa_decimal = percentual_multa_contrato / 100  # Converte % para decimal
-    multa = valor_original * multa_decimal
-    
-    total_acrescimo = juros + multa
-    
+
+    acrescimos = calcular_acrescimos(valor_original, dias_atraso, percentual_multa_contrato)
+
     return {
-        'juros': round(juros, 2),
-        'multa': round(multa, 2),
-        'total_acrescimo': round(total_acrescimo, 2),
+        'juros': float(acrescimos['juros']),
+        'multa': float(acrescimos['multa']),
+        'total_acrescimo': float(acrescimos['total_acrescimo']),
         'dias_atraso': dias_atraso,
         'percentual_multa_usado': percentual_multa_contrato
     }
 
 @app.put("/api/faturas/{fatura_id}/calcular-acrescimos")
-async def calcular_acrescimos_fatura(fatura_id: int):
+@em_thread_bd('faturas')
+def calcular_acrescimos_fatura(fatura_id: int):
     """
     Calcula e atualiza acréscimos por atraso para uma prestação de contas específica
     """
@@ -2362,7 +2687,7 @@ async def calcular_acrescimos_fatura(fatura_id: int):
             data_vencimento = data_vencimento.date()
         
         hoje = date.today()
-        dias_atraso = (hoje - data_vencimento).days if hoje > data_vencimento else 0
+        dias_atraso = calcular_dias_atraso(data_vencimento, referencia=hoje)
         
         # Pegar percentual de multa do contrato
         percentual_multa = float(contrato.get('percentual_multa_atraso', 2.0))  # Default 2%
@@ -2387,9 +2712,12 @@ async def calcular_acrescimos_fatura(fatura_id: int):
                 data_calculo_acrescimos = GETDATE()
             WHERE id = ?
         """, (acrescimos['total_acrescimo'], dias_atraso, novo_valor_total, fatura_id))
+        _atualizar_agregados_fatura(cursor, fatura_id)
         
         conn.commit()
         conn.close()
+        invalidar_cache_faturas()
+        invalidar_pdfs_prestacoes([fatura_id])
         
         return {
             "success": True,
@@ -2410,6 +2738,38 @@ async def calcular_acrescimos_fatura(fatura_id: int):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Erro ao calcular acréscimos: {str(e)}")
 
+def _atualizar_agregados_fatura(cursor, fatura_id: int):
+    """Recalcula o mês/imóvel da fatura nos agregados financeiros (na mesma transação)"""
+    try:
+        atualizar_agregados_prestacoes(cursor, [fatura_id])
+    except ErroAgregados as e:
+        print(f"AVISO: Não foi possível atualizar agregados financeiros da fatura {fatura_id}: {e}")
+
+def _gravar_status_fatura(fatura_id: int, novo_status: str):
+    from repositories_adapter import get_conexao
+    conn = get_conexao()
+    cursor = conn.cursor()
+    
+    # Se mudando para 'paga', definir data_pagamento
+    if novo_status == 'paga':
+        cursor.execute("""
+            UPDATE PrestacaoContas 
+            SET status = ?, data_pagamento = GETDATE()
+            WHERE id = ?
+        """, (novo_status, fatura_id))
+    else:
+        cursor.execute("""
+            UPDATE PrestacaoContas 
+            SET status = ?
+            WHERE id = ?
+        """, (novo_status, fatura_id))
+    _atualizar_agregados_fatura(cursor, fatura_id)
+    
+    conn.commit()
+    conn.close()
+    invalidar_cache_faturas()
+    invalidar_pdfs_prestacoes([fatura_id])
+
 @app.put("/api/faturas/{fatura_id}/status")
 async def alterar_status_fatura(fatura_id: int, request: Request):
     """
@@ -2423,27 +2783,8 @@ async def alterar_status_fatura(fatura_id: int, request: Request):
         if not novo_status:
             raise HTTPException(status_code=400, detail="Status é obrigatório")
         
-        # Atualizar status na base de dados
-        from repositories_adapter import get_conexao
-        conn = get_conexao()
-        cursor = conn.cursor()
-        
-        # Se mudando para 'paga', definir data_pagamento
-        if novo_status == 'paga':
-            cursor.execute("""
-                UPDATE PrestacaoContas 
-                SET status = ?, data_pagamento = GETDATE()
-                WHERE id = ?
-            """, (novo_status, fatura_id))
-        else:
-            cursor.execute("""
-                UPDATE PrestacaoContas 
-                SET status = ?
-                WHERE id = ?
-            """, (novo_status, fatura_id))
-        
-        conn.commit()
-        conn.close()
+        # Atualizar status na base de dados (fora do event loop)
+        await executar_bd(_gravar_status_fatura, fatura_id, novo_status, grupo='faturas')
         
         # Se status é 'em_atraso', calcular acréscimos automaticamente
         if novo_status == 'em_atraso':
@@ -2473,6 +2814,39 @@ async def alterar_status_fatura(fatura_id: int, request: Request):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Erro ao alterar status: {str(e)}")
 
+def _gravar_pagamento_fatura(fatura_id: int, data_pagamento, valor_pago, forma_pagamento, observacoes):
+    from repositories_adapter import get_conexao
+    conn = get_conexao()
+    cursor = conn.cursor()
+
+    # Atualizar status para 'paga' e definir data e valor de pagamento
+    cursor.execute("""
+        UPDATE PrestacaoContas
+        SET status = 'paga',
+            data_pagamento = CAST(? AS DATE),
+            valor_pago = ?
+        WHERE id = ?
+    """, (data_pagamento, valor_pago, fatura_id))
+
+    # Verificar se a fatura foi encontrada e atualizada
+    if cursor.rowcount == 0:
+        conn.close()
+        raise HTTPException(status_code=404, detail="Fatura não encontrada")
+
+    # Registrar observações se fornecidas
+    if observacoes:
+        cursor.execute("""
+            INSERT INTO LancamentosPrestacaoContas
+            (prestacao_id, tipo, descricao, valor, data_lancamento)
+            VALUES (?, 'PAGAMENTO', ?, ?, GETDATE())
+        """, (fatura_id, f"Pagamento via {forma_pagamento}: {observacoes}", valor_pago))
+
+    _atualizar_agregados_fatura(cursor, fatura_id)
+    conn.commit()
+    conn.close()
+    invalidar_cache_faturas()
+    invalidar_pdfs_prestacoes([fatura_id])
+
 @app.put("/api/faturas/{fatura_id}/pagamento")
 async def registrar_pagamento_fatura(fatura_id: int, request: Request):
     """
@@ -2496,35 +2870,11 @@ async def registrar_pagamento_fatura(fatura_id: int, request: Request):
         if not forma_pagamento:
             raise HTTPException(status_code=400, detail="Forma de pagamento é obrigatória")
 
-        # Atualizar fatura no banco de dados
-        from repositories_adapter import get_conexao
-        conn = get_conexao()
-        cursor = conn.cursor()
-
-        # Atualizar status para 'paga' e definir data e valor de pagamento
-        cursor.execute("""
-            UPDATE PrestacaoContas
-            SET status = 'paga',
-                data_pagamento = CAST(? AS DATE),
-                valor_pago = ?
-            WHERE id = ?
-        """, (data_pagamento, valor_pago, fatura_id))
-
-        # Verificar se a fatura foi encontrada e atualizada
-        if cursor.rowcount == 0:
-            conn.close()
-            raise HTTPException(status_code=404, detail="Fatura não encontrada")
-
-        # Registrar observações se fornecidas
-        if observacoes:
-            cursor.execute("""
-                INSERT INTO LancamentosPrestacaoContas
-                (prestacao_id, tipo, descricao, valor, data_lancamento)
-                VALUES (?, 'PAGAMENTO', ?, ?, GETDATE())
-            """, (fatura_id, f"Pagamento via {forma_pagamento}: {observacoes}", valor_pago))
-
-        conn.commit()
-        conn.close()
+        # Atualizar fatura no banco de dados (fora do event loop)
+        await executar_bd(
+            _gravar_pagamento_fatura, fatura_id, data_pagamento, valor_pago, forma_pagamento, observacoes,
+            grupo='faturas'
+        )
 
         return {
             "success": True,
@@ -2548,45 +2898,39 @@ async def registrar_pagamento_fatura(fatura_id: int, request: Request):
 # === ENDPOINT PARA JOB DE ACRÉSCIMOS AUTOMÁTICO ===
 
 @app.post("/api/job/calcular-acrescimos-automatico")
-async def executar_job_acrescimos_manual():
+@em_thread_bd('job')
+def executar_job_acrescimos_manual():
     """
     Executa manualmente o job de cálculo automático de acréscimos
     Útil para testes e execução sob demanda
+
+    Usa o mesmo executor (lease + checkpoint) do agendamento: se o job já
+    está rodando em outro worker, responde 409 em vez de rodar em paralelo.
+    Roda mesmo que a execução agendada de hoje já tenha sido concluída.
     """
     try:
-        import subprocess
-        import sys
-        from pathlib import Path
+        from executor_acrescimos import executar_job_paralelo
 
-        # Caminho para o script do job
-        job_script = Path(__file__).parent / "job_acrescimos_diario.py"
+        resultado = executar_job_paralelo(forcar=True)
 
-        if not job_script.exists():
-            raise HTTPException(status_code=500, detail="Script de job não encontrado")
+        if resultado.get('status') == 'lease_ocupado':
+            raise HTTPException(status_code=409, detail="Job de acréscimos já está em execução em outro worker")
 
-        # Executar o job
-        result = subprocess.run(
-            [sys.executable, str(job_script)],
-            capture_output=True,
-            text=True,
-            cwd=str(Path(__file__).parent)
-        )
-
-        if result.returncode == 0:
+        if resultado.get('status') == 'concluido':
             return {
                 "success": True,
                 "message": "Job de acréscimos executado com sucesso",
-                "stdout": result.stdout,
-                "stderr": result.stderr if result.stderr else None
+                "resultado": resultado
             }
         else:
             return {
                 "success": False,
-                "message": f"Job falhou com código {result.returncode}",
-                "stdout": result.stdout,
-                "stderr": result.stderr
+                "message": f"Job finalizado com status {resultado.get('status')}",
+                "resultado": resultado
             }
 
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -2596,7 +2940,8 @@ async def executar_job_acrescimos_manual():
 # ==================== ENDPOINTS DE DEPLOY AUTOMÁTICO ====================
 
 @app.post("/upload/backend")
-async def upload_backend(file: UploadFile = File(...)):
+@em_thread_bd('upload')
+def upload_backend(file: UploadFile = File(...)):
     """
     Recebe upload da imagem Docker do backend e faz deploy automático
     """
@@ -2664,7 +3009,8 @@ async def upload_backend(file: UploadFile = File(...)):
 
 
 @app.post("/upload/frontend")
-async def upload_frontend(file: UploadFile = File(...)):
+@em_thread_bd('upload')
+def upload_frontend(file: UploadFile = File(...)):
     """
     Recebe upload da imagem Docker do frontend e faz deploy automático
     """
@@ -0,0 +1,208 @@
+"""
+Motor de Cálculo de Acréscimos por Atraso
+================================================================
+
+Fonte única da regra de multa + juros usada pela listagem de faturas,
+pelo detalhe da prestação, pelo job diário e pelos endpoints:
+
+- Vencimento: dia de vencimento do contrato no mês/ano da prestação
+  (limitado ao último dia do mês: dia 31 em fevereiro vence dia 28/29)
+- Juros de mora: 1% ao mês, proporcional por dia (1% / 30 por dia)
+- Multa: percentual do contrato sobre o valor em atraso (padrão 2%)
+
+As contas são feitas em Decimal e arredondadas para centavos (ROUND_HALF_UP).
+calcular_acrescimos_lote processa uma lista de prestações de uma vez,
+reaproveitando datas de vencimento já calculadas (muitas prestações
+compartilham o mesmo mês/ano/dia).
+"""
+
+import calendar
+from datetime import date, datetime
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Dict, Iterable, List, Optional
+
+JUROS_MENSAL = Decimal('0.01')
+DIAS_MES = 30
+JUROS_DIARIO = JUROS_MENSAL / DIAS_MES
+MULTA_PADRAO = Decimal('2')
+
+CENTAVOS = Decimal('0.01')
+
+
+def _decimal(valor: Any, padrao: Decimal = Decimal('0')) -> Decimal:
+    if valor is None or valor == '':
+        return padrao
+    if isinstance(valor, Decimal):
+        return valor
+    return Decimal(str(valor))
+
+
+def _centavos(valor: Decimal) -> Decimal:
+    return valor.quantize(CENTAVOS, rounding=ROUND_HALF_UP)
+
+
+def calcular_data_vencimento(ano: Any, mes: Any, dia_vencimento: Any) -> Optional[date]:
+    """
+    Data de vencimento da prestação ou None se os dados forem inválidos.
+    mes/ano podem vir como texto (PrestacaoContas guarda varchar).
+    """
+    try:
+        ano, mes, dia = int(ano), int(mes), int(dia_vencimento)
+    except (TypeError, ValueError):
+        return None
+    if not (1900 < ano < 2100 and 1 <= mes <= 12 and 1 <= dia <= 31):
+        return None
+    return date(ano, mes, min(dia, calendar.monthrange(ano, mes)[1]))
+
+
+def calcular_dias_atraso(data_vencimento: Optional[date], data_pagamento: Any = None,
+                         referencia: Optional[date] = None) -> int:
+    """Dias entre o vencimento e hoje (ou `referencia`); 0 se paga ou em dia"""
+    if data_vencimento is None or data_pagamento:
+        return 0
+    if isinstance(data_vencimento, datetime):
+        data_vencimento = data_vencimento.date()
+    referencia = referencia or date.today()
+    return max((referencia - data_vencimento).days, 0)
+
+
+def calcular_acrescimos(valor_base: Any, dias_atraso: int,
+                        percentual_multa: Any = MULTA_PADRAO) -> Dict[str, Decimal]:
+    """
+    Juros, multa e total de acréscimos (Decimal, em centavos).
+
+    Args:
+        valor_base: Valor em atraso (valor do boleto ou total bruto)
+        dias_atraso: Dias em atraso (<= 0 não gera acréscimo)
+        percentual_multa: Percentual de multa do contrato (padrão 2%)
+    """
+    if not dias_atraso or dias_atraso <= 0:
+        return {
+            'juros': Decimal('0.00'),
+            'multa': Decimal('0.00'),
+            'total_acrescimo': Decimal('0.00')
+        }
+
+    valor = _decimal(valor_base)
+    juros = valor * JUROS_DIARIO * dias_atraso
+    multa = valor * _decimal(percentual_multa, MULTA_PADRAO) / 100
+
+    return {
+        'juros': _centavos(juros),
+        'multa': _centavos(multa),
+        'total_acrescimo': _centavos(juros + multa)
+    }
+
+
+def calcular_acrescimos_lote(prestacoes: Iterable[Dict[str, Any]],
+                             referencia: Optional[date] = None) -> List[Dict[str, Any]]:
+    """
+    Calcula vencimento, dias de atraso e acréscimos de várias prestações.
+
+    Cada item aceita as chaves: data_vencimento (persistida) ou ano, mes e
+    vencimento_dia, data_pagamento,
+    valor_boleto, total_bruto, percentual_multa e valor_acrescimos (valor salvo,
+    mantido quando a prestação não está em atraso).
+
+    Returns:
+        Lista na mesma ordem com data_vencimento, dias_atraso, valor_base,
+        juros, multa, valor_acrescimos e valor_total_com_acrescimos (float)
+    """
+    referencia = referencia or date.today()
+    vencimentos: Dict[tuple, Optional[date]] = {}
+    resultados = []
+
+    for prestacao in prestacoes:
+        # Vencimento persistido (PrestacaoContas.data_vencimento) tem preferência
+        data_vencimento = prestacao.get('data_vencimento')
+        if isinstance(data_vencimento, datetime):
+            data_vencimento = data_vencimento.date()
+        if data_vencimento is None:
+            chave = (prestacao.get('ano'), prestacao.get('mes'), prestacao.get('vencimento_dia'))
+            if chave not in vencimentos:
+                vencimentos[chave] = calcular_data_vencimento(*chave)
+            data_vencimento = vencimentos[chave]
+
+        dias_atraso = calcular_dias_atraso(data_vencimento, prestacao.get('data_pagamento'), referencia)
+        valor_base = _decimal(prestacao.get('valor_boleto')) or _decimal(prestacao.get('total_bruto'))
+
+        if dias_atraso > 0:
+            acrescimos = calcular_acrescimos(valor_base, dias_atraso, prestacao.get('percentual_multa'))
+            valor_acrescimos = acrescimos['total_acrescimo']
+        else:
+            acrescimos = {'juros': Decimal('0.00'), 'multa': Decimal('0.00')}
+            valor_acrescimos = _decimal(prestacao.get('valor_acrescimos'))
+
+        resultados.append({
+            'data_vencimento': data_vencimento,
+            'dias_atraso': dias_atraso,
+            'valor_base': float(valor_base),
+            'juros': float(acrescimos['juros']),
+            'multa': float(acrescimos['multa']),
+            'valor_acrescimos': float(valor_acrescimos),
+            'valor_total_com_acrescimos': float(valor_base + valor_acrescimos)
+        })
+
+    return resultados
+
+
+# ==================== VENCIMENTO PERSISTIDO (PrestacaoContas.data_vencimento) ====================
+
+# Mesma regra de calcular_data_vencimento em T-SQL (p = PrestacaoContas, c = Contratos).
+# Usada só para gravar a coluna; consultas filtram/ordenam por p.data_vencimento.
+DATA_VENCIMENTO_SQL = """
+    CASE
+        WHEN TRY_CAST(p.ano AS int) > 1900 AND TRY_CAST(p.ano AS int) < 2100
+             AND TRY_CAST(p.mes AS int) BETWEEN 1 AND 12
+             AND c.vencimento_dia BETWEEN 1 AND 31
+        THEN DATEFROMPARTS(
+            TRY_CAST(p.ano AS int),
+            TRY_CAST(p.mes AS int),
+            CASE
+                WHEN c.vencimento_dia > DAY(EOMONTH(DATEFROMPARTS(TRY_CAST(p.ano AS int), TRY_CAST(p.mes AS int), 1)))
+                THEN DAY(EOMONTH(DATEFROMPARTS(TRY_CAST(p.ano AS int), TRY_CAST(p.mes AS int), 1)))
+                ELSE c.vencimento_dia
+            END
+        )
+        ELSE NULL
+    END
+"""
+
+
+def sincronizar_data_vencimento(cursor, filtro_sql: str = "1 = 1", params: Iterable[Any] = ()) -> int:
+    """
+    Regrava PrestacaoContas.data_vencimento das prestações que casam com
+    `filtro_sql` (condição sobre p/c, ex.: "p.id = ?" ou "c.id = ?").
+    Não faz commit.
+
+    Returns:
+        Quantidade de prestações atualizadas
+    """
+    cursor.execute(f"""
+        UPDATE p
+        SET data_vencimento = {DATA_VENCIMENTO_SQL}
+        FROM PrestacaoContas p
+        LEFT JOIN Contratos c ON c.id = p.contrato_id
+        WHERE {filtro_sql}
+    """, list(params))
+    return cursor.rowcount
+
+
+def garantir_coluna_data_vencimento(cursor):
+    """
+    Cria a coluna data_vencimento e o índice (status, data_pagamento, data_vencimento)
+    se a migração 001_prestacao_data_vencimento.sql ainda não foi aplicada.
+    Não faz commit.
+    """
+    cursor.execute("SELECT COL_LENGTH('PrestacaoContas', 'data_vencimento')")
+    if cursor.fetchone()[0] is not None:
+        return
+
+    cursor.execute("ALTER TABLE PrestacaoContas ADD data_vencimento date NULL")
+    sincronizar_data_vencimento(cursor)
+    cursor.execute("""
+        IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_PrestacaoContas_Status_Pagamento_Vencimento')
+            CREATE NONCLUSTERED INDEX IX_PrestacaoContas_Status_Pagamento_Vencimento
+            ON PrestacaoContas (status, data_pagamento, data_vencimento)
+            INCLUDE (contrato_id, ativo)
+    """)
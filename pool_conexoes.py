@@ -0,0 +1,401 @@
+"""
+Pool de Conexões Compartilhado com o SQL Server
+================================================================
+
+Todos os módulos (repositories_adapter, dashboard, busca, job de acréscimos
+e apis/*) obtêm conexões daqui em vez de abrir um pyodbc.connect por chamada.
+O handshake TLS/login com o SQL Server passa a acontecer apenas quando o pool
+precisa criar uma conexão nova.
+
+Uso:
+    with obter_conexao() as conn:      # commit ao sair, rollback em exceção
+        cursor = conn.cursor()
+        ...
+
+    conn = get_conexao()               # estilo antigo: conn.close() devolve ao pool
+
+Configuração (.env):
+    DB_POOL_SIZE            Máximo de conexões abertas (padrão 10)
+    DB_POOL_TIMEOUT         Segundos aguardando uma conexão livre (padrão 30)
+    DB_POOL_IDLE_SECONDS    Conexões ociosas além disso são fechadas (padrão 300)
+    DB_POOL_PING_SECONDS    Ociosidade a partir da qual a conexão é testada
+                            com SELECT 1 antes de ser entregue (padrão 30)
+"""
+
+import os
+import threading
+import time
+import logging
+from collections import deque
+from typing import Any, Dict, Optional
+
+import pyodbc
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class PoolEsgotadoError(Exception):
+    """Nenhuma conexão ficou livre dentro de DB_POOL_TIMEOUT"""
+
+
+def montar_connection_string() -> str:
+    """Monta a connection string a partir do .env (sem nunca registrá-la em log)"""
+    partes = [
+        f"DRIVER={{{os.getenv('DB_DRIVER')}}};",
+        f"SERVER={os.getenv('DB_SERVER')};",
+        f"DATABASE={os.getenv('DB_DATABASE')};",
+        f"UID={os.getenv('DB_USER')};",
+        f"PWD={os.getenv('DB_PASSWORD')};",
+    ]
+    if os.getenv('DB_ENCRYPT'):
+        partes.append(f"Encrypt={os.getenv('DB_ENCRYPT')};")
+    if os.getenv('DB_TRUST_CERT'):
+        partes.append(f"TrustServerCertificate={os.getenv('DB_TRUST_CERT')};")
+    return "".join(partes)
+
+
+class _ConexaoFisica:
+    """Conexão pyodbc real mantida pelo pool, com seus carimbos de tempo"""
+
+    __slots__ = ('conn', 'criada_em', 'ultimo_uso')
+
+    def __init__(self, conn):
+        agora = time.monotonic()
+        self.conn = conn
+        self.criada_em = agora
+        self.ultimo_uso = agora
+
+
+class ConexaoPooled:
+    """
+    Empréstimo de uma conexão do pool.
+
+    Expõe a mesma interface da conexão pyodbc (cursor, commit, rollback, ...).
+    close() e a saída do bloco `with` devolvem a conexão ao pool em vez de
+    fechá-la; o bloco `with` também faz commit (ou rollback se houver exceção),
+    preservando a semântica que o código já esperava do pyodbc.
+    """
+
+    def __init__(self, pool: 'PoolConexoes', fisica: _ConexaoFisica):
+        self._pool = pool
+        self._fisica = fisica
+        self._thread = threading.current_thread().name
+
+    @property
+    def devolvida(self) -> bool:
+        return self._fisica is None
+
+    def _conn(self):
+        if self._fisica is None:
+            raise pyodbc.ProgrammingError('Conexão já devolvida ao pool')
+        return self._fisica.conn
+
+    def cursor(self):
+        return self._conn().cursor()
+
+    def commit(self):
+        self._conn().commit()
+
+    def rollback(self):
+        self._conn().rollback()
+
+    def execute(self, *args, **kwargs):
+        return self._conn().execute(*args, **kwargs)
+
+    def close(self):
+        """Devolve a conexão ao pool (idempotente)"""
+        fisica, self._fisica = self._fisica, None
+        if fisica is not None:
+            self._pool._devolver(fisica)
+
+    def invalidar(self):
+        """Descarta a conexão física (ex.: após erro de comunicação)"""
+        fisica, self._fisica = self._fisica, None
+        if fisica is not None:
+            self._pool._descartar(fisica)
+
+    def __getattr__(self, nome):
+        # Atributos não mapeados (autocommit, timeout, getinfo...) vão para o pyodbc
+        if nome.startswith('_'):
+            raise AttributeError(nome)
+        return getattr(self._conn(), nome)
+
+    def __setattr__(self, nome, valor):
+        if nome.startswith('_'):
+            object.__setattr__(self, nome, valor)
+        else:
+            setattr(self._conn(), nome, valor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            if self._fisica is not None:
+                if exc_type is None:
+                    self._fisica.conn.commit()
+                else:
+                    self._fisica.conn.rollback()
+        except pyodbc.Error:
+            self.invalidar()
+        finally:
+            self.close()
+        return False
+
+    def __del__(self):
+        # Rede de segurança para quem esqueceu o close(). O finalizador pode
+        # rodar em qualquer ponto da thread, inclusive com o lock do pool já
+        # tomado: sem rollback nem lock aqui, só enfileira para o próximo obter()
+        fisica, self._fisica = self._fisica, None
+        if fisica is not None:
+            try:
+                self._pool._abandonar(fisica, self._thread)
+            except Exception:
+                pass
+
+
+class PoolConexoes:
+    """Pool limitado, thread-safe, com health-check e expiração por ociosidade"""
+
+    def __init__(self, connection_string: Optional[str] = None, tamanho_maximo: int = 10,
+                 timeout: float = 30.0, max_ocioso: float = 300.0, ping_apos: float = 30.0,
+                 fabrica=None):
+        self.connection_string = connection_string or montar_connection_string()
+        self.tamanho_maximo = max(1, tamanho_maximo)
+        self.timeout = timeout
+        self.max_ocioso = max_ocioso
+        self.ping_apos = ping_apos
+        self._fabrica = fabrica or (lambda: pyodbc.connect(self.connection_string))
+
+        self._livres = deque()
+        # Conexões de empréstimos coletados pelo GC sem close(); deque.append
+        # não usa o lock do pool, então é seguro chamar de __del__
+        self._abandonadas = deque()
+        self._abertas = 0
+        self._cond = threading.Condition(threading.Lock())
+        self._fechado = False
+
+        self._metricas = {
+            'checkouts': 0,
+            'criadas': 0,
+            'descartadas': 0,
+            'expiradas_ociosidade': 0,
+            'falhas_health_check': 0,
+            'vazadas': 0,
+            'timeouts': 0,
+            'espera_total_ms': 0.0,
+            'espera_max_ms': 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # Empréstimo / devolução
+    # ------------------------------------------------------------------
+
+    def obter(self) -> ConexaoPooled:
+        """Empresta uma conexão, aguardando até `timeout` se o pool estiver cheio"""
+        inicio = time.monotonic()
+        limite = inicio + self.timeout
+
+        while True:
+            self._recuperar_abandonadas()
+            fisica = None
+            criar = False
+            with self._cond:
+                if self._fechado:
+                    raise PoolEsgotadoError('Pool de conexões encerrado')
+                self._expirar_ociosas()
+                while not self._livres and self._abertas >= self.tamanho_maximo:
+                    if self._abandonadas:
+                        break
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self._metricas['timeouts'] += 1
+                        raise PoolEsgotadoError(
+                            f'Nenhuma conexão livre em {self.timeout:.0f}s '
+                            f'(pool com {self.tamanho_maximo} conexões)'
+                        )
+                    # Acorda de tempos em tempos: __del__ enfileira sem notify
+                    self._cond.wait(min(restante, 1.0))
+                if self._livres:
+                    fisica = self._livres.pop()  # LIFO: reaproveita a mais "quente"
+                elif self._abertas < self.tamanho_maximo:
+                    self._abertas += 1
+                    criar = True
+
+            if fisica is None and not criar:
+                # Só havia conexões abandonadas: devolvê-las (fora do lock) e tentar de novo
+                continue
+            if criar:
+                try:
+                    fisica = _ConexaoFisica(self._fabrica())
+                except Exception:
+                    with self._cond:
+                        self._abertas -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._metricas['criadas'] += 1
+            elif not self._saudavel(fisica):
+                self._descartar(fisica)
+                continue
+
+            espera_ms = (time.monotonic() - inicio) * 1000
+            with self._cond:
+                self._metricas['checkouts'] += 1
+                self._metricas['espera_total_ms'] += espera_ms
+                if espera_ms > self._metricas['espera_max_ms']:
+                    self._metricas['espera_max_ms'] = espera_ms
+            return ConexaoPooled(self, fisica)
+
+    def _saudavel(self, fisica: _ConexaoFisica) -> bool:
+        """SELECT 1 apenas se a conexão ficou ociosa por mais de `ping_apos`"""
+        if time.monotonic() - fisica.ultimo_uso < self.ping_apos:
+            return True
+        try:
+            cursor = fisica.conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except Exception as e:
+            logger.warning(f"Conexão do pool falhou no health-check e será descartada: {e}")
+            with self._cond:
+                self._metricas['falhas_health_check'] += 1
+            return False
+
+    def _devolver(self, fisica: _ConexaoFisica):
+        try:
+            # Nunca devolver uma transação aberta para o próximo usuário
+            fisica.conn.rollback()
+        except Exception:
+            self._descartar(fisica)
+            return
+        fisica.ultimo_uso = time.monotonic()
+        with self._cond:
+            if self._fechado:
+                self._abertas -= 1
+                self._fechar_silencioso(fisica.conn)
+            else:
+                self._livres.append(fisica)
+            self._cond.notify()
+
+    def _abandonar(self, fisica: _ConexaoFisica, thread: str):
+        """Chamado por ConexaoPooled.__del__: só registra e enfileira"""
+        self._abandonadas.append(fisica)
+        logger.warning(f"Conexão do pool emprestada pela thread {thread} não foi devolvida (close() esquecido)")
+
+    def _recuperar_abandonadas(self):
+        """Devolve ao pool (com rollback) as conexões enfileiradas por __del__; fora do lock"""
+        recuperadas = 0
+        while True:
+            try:
+                fisica = self._abandonadas.popleft()
+            except IndexError:
+                break
+            recuperadas += 1
+            self._devolver(fisica)
+        if recuperadas:
+            with self._cond:
+                self._metricas['vazadas'] += recuperadas
+
+    def _descartar(self, fisica: _ConexaoFisica):
+        self._fechar_silencioso(fisica.conn)
+        with self._cond:
+            self._abertas -= 1
+            self._metricas['descartadas'] += 1
+            self._cond.notify()
+
+    def _expirar_ociosas(self):
+        """Fecha conexões ociosas há mais de `max_ocioso` (chamado com o lock)"""
+        if not self._livres:
+            return
+        corte = time.monotonic() - self.max_ocioso
+        # As mais antigas ficam à esquerda (devolução por append, retirada por pop)
+        while self._livres and self._livres[0].ultimo_uso < corte:
+            fisica = self._livres.popleft()
+            self._abertas -= 1
+            self._metricas['expiradas_ociosidade'] += 1
+            self._fechar_silencioso(fisica.conn)
+
+    @staticmethod
+    def _fechar_silencioso(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    # ------------------------------------------------------------------
+    # Administração
+    # ------------------------------------------------------------------
+
+    def fechar(self):
+        """Fecha todas as conexões livres; as emprestadas são fechadas ao voltar"""
+        with self._cond:
+            self._fechado = True
+            while self._livres:
+                fisica = self._livres.pop()
+                self._abertas -= 1
+                self._fechar_silencioso(fisica.conn)
+            while self._abandonadas:
+                fisica = self._abandonadas.popleft()
+                self._abertas -= 1
+                self._fechar_silencioso(fisica.conn)
+            self._cond.notify_all()
+
+    def metricas(self) -> Dict[str, Any]:
+        with self._cond:
+            dados = dict(self._metricas)
+            dados['tamanho_maximo'] = self.tamanho_maximo
+            dados['abertas'] = self._abertas
+            dados['livres'] = len(self._livres)
+            dados['em_uso'] = self._abertas - len(self._livres)
+        checkouts = dados['checkouts']
+        dados['espera_media_ms'] = round(dados['espera_total_ms'] / checkouts, 3) if checkouts else 0.0
+        dados['espera_total_ms'] = round(dados['espera_total_ms'], 3)
+        dados['espera_max_ms'] = round(dados['espera_max_ms'], 3)
+        return dados
+
+
+# ==================== POOL GLOBAL DO PROCESSO ====================
+
+_pool: Optional[PoolConexoes] = None
+_pool_lock = threading.Lock()
+
+
+def obter_pool() -> PoolConexoes:
+    """Retorna o pool do processo, criando-o na primeira chamada"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PoolConexoes(
+                    tamanho_maximo=int(os.getenv('DB_POOL_SIZE', '10')),
+                    timeout=float(os.getenv('DB_POOL_TIMEOUT', '30')),
+                    max_ocioso=float(os.getenv('DB_POOL_IDLE_SECONDS', '300')),
+                    ping_apos=float(os.getenv('DB_POOL_PING_SECONDS', '30')),
+                )
+    return _pool
+
+
+def obter_conexao() -> ConexaoPooled:
+    """Empresta uma conexão do pool global (use com `with` ou chame close())"""
+    return obter_pool().obter()
+
+
+def metricas_pool() -> Dict[str, Any]:
+    """Métricas do pool global (checkouts, espera, conexões abertas/livres)"""
+    if _pool is None:
+        return {'status': 'nao_inicializado'}
+    return _pool.metricas()
+
+
+def fechar_pool():
+    """Encerra o pool global (chamado no shutdown da API)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.fechar()
+            _pool = None
@@ -0,0 +1,254 @@
+"""
+Prestações Detalhadas (consulta por conjunto)
+================================================================
+
+Monta o mesmo dicionário de buscar_prestacao_detalhada (prestação,
+contrato, vencimento/acréscimos, lançamentos, locadores com conta bancária
+e distribuição de repasse) para QUALQUER conjunto de prestações, com
+quatro consultas no total em vez de seis por prestação.
+
+O filtro é uma condição SQL sobre PrestacaoContas p, ex.:
+    "p.id = ?"                          (uma prestação - PDF/preview)
+    "p.mes = ? AND p.ano = ?"           (fechamento do mês - exportação em lote)
+
+Lançamentos, locadores e distribuição usam o mesmo filtro como subconsulta,
+então o número de consultas não cresce com o número de prestações.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Sequence
+
+from pool_conexoes import obter_conexao
+from motor_acrescimos import calcular_acrescimos, calcular_data_vencimento, calcular_dias_atraso
+
+SQL_PRESTACOES = """
+    SELECT
+        p.id, p.contrato_id, p.mes, p.ano, p.status, p.valor_pago, p.valor_vencido,
+        p.encargos, p.deducoes, p.total_bruto, p.total_liquido, p.observacoes_manuais,
+        p.data_criacao, p.data_atualizacao,
+        p.valor_boleto, p.total_retido, p.valor_repasse, p.tipo_calculo,
+        p.multa_rescisoria, p.detalhamento_json,
+        p.valor_acrescimos, p.valor_total_com_acrescimos, p.data_calculo_acrescimos,
+        p.data_pagamento,
+        c.id AS c_id, c.valor_aluguel, c.taxa_administracao, c.vencimento_dia,
+        c.id_imovel, loc.locatario_id,
+        i.endereco AS imovel_endereco, i.tipo AS imovel_tipo,
+        loc.nome AS locatario_nome, loc.telefone AS locatario_telefone,
+        loc.email AS locatario_email, loc.cpf_cnpj AS locatario_cpf,
+        c.percentual_multa_atraso
+    FROM PrestacaoContas p
+    LEFT JOIN Contratos c ON c.id = p.contrato_id
+    LEFT JOIN Imoveis i ON c.id_imovel = i.id
+    OUTER APPLY (
+        SELECT TOP 1 cl.locatario_id, l.nome, l.telefone, l.email, l.cpf_cnpj
+        FROM ContratoLocatarios cl
+        LEFT JOIN Locatarios l ON cl.locatario_id = l.id
+        WHERE cl.contrato_id = c.id AND cl.responsabilidade_principal = 1
+    ) loc
+    WHERE p.ativo = 1 AND ({filtro})
+    ORDER BY p.id
+"""
+
+SQL_LANCAMENTOS = """
+    SELECT l.prestacao_id, l.tipo, l.descricao, l.valor, l.categoria, l.origem, l.ordem_exibicao
+    FROM LancamentosPrestacaoContas l
+    WHERE l.ativo = 1
+      AND l.prestacao_id IN (SELECT p.id FROM PrestacaoContas p WHERE p.ativo = 1 AND ({filtro}))
+    ORDER BY l.prestacao_id, l.ordem_exibicao, l.id
+"""
+
+SQL_LOCADORES = """
+    SELECT cl.contrato_id, loc.id, loc.nome, loc.telefone, loc.email, loc.cpf_cnpj,
+           cl.porcentagem, cl.responsabilidade_principal, cl.conta_bancaria_id,
+           cb.tipo_recebimento, cb.chave_pix, cb.banco, cb.agencia, cb.conta,
+           cb.titular, cb.cpf_titular
+    FROM ContratoLocadores cl
+    INNER JOIN Locadores loc ON cl.locador_id = loc.id
+    LEFT JOIN ContasBancariasLocador cb ON cl.conta_bancaria_id = cb.id
+    WHERE cl.ativo = 1
+      AND cl.contrato_id IN (SELECT p.contrato_id FROM PrestacaoContas p WHERE p.ativo = 1 AND ({filtro}))
+    ORDER BY cl.contrato_id, cl.responsabilidade_principal DESC, loc.nome
+"""
+
+SQL_DISTRIBUICAO = """
+    SELECT d.prestacao_id, d.locador_id, d.locador_nome, d.percentual_participacao,
+           d.valor_repasse, d.responsabilidade_principal
+    FROM DistribuicaoRepasseLocadores d
+    WHERE d.ativo = 1
+      AND d.prestacao_id IN (SELECT p.id FROM PrestacaoContas p WHERE p.ativo = 1 AND ({filtro}))
+    ORDER BY d.prestacao_id, d.responsabilidade_principal DESC, d.locador_nome
+"""
+
+
+def _montar_prestacao(row) -> Dict[str, Any]:
+    prestacao = {
+        'id': row.id,
+        'contrato_id': row.contrato_id,
+        'mes': row.mes,
+        'ano': row.ano,
+        'status': row.status,
+        'valor_pago': row.valor_pago,
+        'valor_vencido': row.valor_vencido,
+        'encargos': row.encargos,
+        'deducoes': row.deducoes,
+        'total_bruto': row.total_bruto,
+        'total_liquido': row.total_liquido,
+        'observacoes_manuais': row.observacoes_manuais,
+        'data_criacao': row.data_criacao.isoformat() if row.data_criacao else None,
+        'data_atualizacao': row.data_atualizacao.isoformat() if row.data_atualizacao else None,
+        'valor_boleto': row.valor_boleto,
+        'total_retido': row.total_retido,
+        'valor_repasse': row.valor_repasse,
+        'tipo_calculo': row.tipo_calculo,
+        'multa_rescisoria': row.multa_rescisoria,
+        'detalhamento_json': row.detalhamento_json,
+        'valor_acrescimos': row.valor_acrescimos,
+        'valor_total_com_acrescimos': row.valor_total_com_acrescimos,
+        'data_calculo_acrescimos': row.data_calculo_acrescimos,
+        'data_pagamento': row.data_pagamento.isoformat() if row.data_pagamento else None
+    }
+
+    if prestacao['detalhamento_json']:
+        try:
+            prestacao['detalhamento_json'] = json.loads(prestacao['detalhamento_json'])
+        except (TypeError, ValueError):
+            prestacao['detalhamento_json'] = None
+
+    # Vencimento: dia do contrato (padrão 10) no mês/ano da prestação
+    data_venc = calcular_data_vencimento(prestacao['ano'], prestacao['mes'], row.vencimento_dia or 10)
+    prestacao['data_vencimento'] = data_venc.strftime('%Y-%m-%d') if data_venc else None
+
+    if row.c_id is None:
+        return prestacao
+
+    prestacao['contrato'] = {
+        'id': row.c_id,
+        'valor_aluguel': row.valor_aluguel,
+        'taxa_administracao': row.taxa_administracao,
+        'vencimento_dia': row.vencimento_dia,
+        'id_imovel': row.id_imovel,
+        'id_locatario': row.locatario_id,
+        'imovel_endereco': row.imovel_endereco,
+        'imovel_tipo': row.imovel_tipo,
+        'locatario_nome': row.locatario_nome,
+        'locatario_telefone': row.locatario_telefone,
+        'locatario_email': row.locatario_email,
+        'locatario_cpf': row.locatario_cpf,
+        'percentual_multa_atraso': row.percentual_multa_atraso
+    }
+
+    # Dias de atraso e acréscimos pelo motor único (motor_acrescimos)
+    if data_venc is None:
+        return prestacao
+    dias_atraso = calcular_dias_atraso(data_venc, prestacao['data_pagamento'])
+    valor_boleto = float(prestacao['valor_boleto'] or prestacao['total_bruto'] or 0)
+    if dias_atraso > 0:
+        if valor_boleto > 0:
+            percentual_multa = row.percentual_multa_atraso or 2.0
+            valor_acrescimos = float(calcular_acrescimos(valor_boleto, dias_atraso, percentual_multa)['total_acrescimo'])
+            prestacao['dias_atraso'] = dias_atraso
+            prestacao['valor_acrescimos'] = valor_acrescimos
+            prestacao['valor_total_com_acrescimos'] = valor_boleto + valor_acrescimos
+    else:
+        prestacao['dias_atraso'] = 0
+        if not prestacao['valor_acrescimos']:
+            prestacao['valor_acrescimos'] = 0
+            prestacao['valor_total_com_acrescimos'] = valor_boleto
+    return prestacao
+
+
+def _montar_locador(row) -> Dict[str, Any]:
+    return {
+        'locador_id': row[1],
+        'locador_nome': row[2],
+        'telefone': row[3],
+        'email': row[4],
+        'cpf_cnpj': row[5],
+        'porcentagem': float(row[6]) if row[6] else 100.0,
+        'responsabilidade_principal': bool(row[7]),
+        'conta_bancaria_id': row[8],
+        # Conta selecionada no termo (se existir)
+        'conta_bancaria': {
+            'tipo_recebimento': row[9],
+            'pix_chave': row[10],
+            'banco': row[11],
+            'agencia': row[12],
+            'conta': row[13],
+            'titular': row[14],
+            'cpf_titular': row[15]
+        } if row[8] else None
+    }
+
+
+def consultar_prestacoes_detalhadas(cursor, filtro_sql: str, params: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+    """Prestações ativas que casam com `filtro_sql` (sobre p), no formato de buscar_prestacao_detalhada"""
+    params = list(params)
+    cursor.execute(SQL_PRESTACOES.format(filtro=filtro_sql), params)
+    prestacoes = [_montar_prestacao(row) for row in cursor.fetchall()]
+    if not prestacoes:
+        return []
+
+    lancamentos: Dict[int, List[Dict[str, Any]]] = {}
+    cursor.execute(SQL_LANCAMENTOS.format(filtro=filtro_sql), params)
+    for row in cursor.fetchall():
+        lancamentos.setdefault(row[0], []).append({
+            'tipo': row[1],
+            'descricao': row[2],
+            'valor': float(row[3]) if row[3] else 0,
+            'categoria': row[4],
+            'origem': row[5],
+            'ordem': row[6]
+        })
+
+    locadores: Dict[int, List[Dict[str, Any]]] = {}
+    cursor.execute(SQL_LOCADORES.format(filtro=filtro_sql), params)
+    for row in cursor.fetchall():
+        locadores.setdefault(row[0], []).append(_montar_locador(row))
+
+    distribuicoes: Dict[int, List[Dict[str, Any]]] = {}
+    cursor.execute(SQL_DISTRIBUICAO.format(filtro=filtro_sql), params)
+    for row in cursor.fetchall():
+        distribuicoes.setdefault(row[0], []).append({
+            'locador_id': row[1],
+            'locador_nome': row[2],
+            'percentual_participacao': float(row[3]) if row[3] else 100.0,
+            'valor_repasse': float(row[4]) if row[4] else 0.0,
+            'responsabilidade_principal': bool(row[5])
+        })
+
+    for prestacao in prestacoes:
+        lancamentos_detalhados = lancamentos.get(prestacao['id'], [])
+        # Acréscimos entram como lançamento
+        if (prestacao.get('valor_acrescimos') or 0) > 0:
+            lancamentos_detalhados.append({
+                'tipo': 'acrescimo_atraso',
+                'descricao': f'Acréscimos por atraso ({prestacao.get("dias_atraso", 0)} dias)',
+                'valor': prestacao['valor_acrescimos'],
+                'categoria': 'acrescimo',
+                'origem': 'sistema_automatico',
+                'ordem': len(lancamentos_detalhados) + 1
+            })
+        prestacao['lancamentos_detalhados'] = lancamentos_detalhados
+        prestacao['total_lancamentos'] = len(lancamentos_detalhados)
+        # Cópia por prestação: duas prestações do mesmo contrato não compartilham a lista
+        prestacao['locadores'] = [dict(locador) for locador in locadores.get(prestacao['contrato_id'], [])]
+        prestacao['distribuicao_repasse'] = distribuicoes.get(prestacao['id'], [])
+    return prestacoes
+
+
+def buscar_prestacoes_detalhadas(filtro_sql: str, params: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+    """consultar_prestacoes_detalhadas com conexão própria"""
+    with obter_conexao() as conn:
+        return consultar_prestacoes_detalhadas(conn.cursor(), filtro_sql, params)
+
+
+def buscar_prestacoes_detalhadas_mes(mes: int, ano: int, locador_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Prestações do mês (opcionalmente só dos contratos de um locador) com todos os detalhes"""
+    filtro = "p.mes = ? AND p.ano = ?"
+    params: List[Any] = [f"{int(mes):02d}", str(ano)]
+    if locador_id is not None:
+        filtro += """ AND (p.locador_id = ? OR EXISTS (
+            SELECT 1 FROM ContratoLocadores clf
+            WHERE clf.contrato_id = p.contrato_id AND clf.locador_id = ? AND clf.ativo = 1))"""
+        params += [locador_id, locador_id]
+    return buscar_prestacoes_detalhadas(filtro, params)
@@ -11,6 +11,10 @@ from dataclasses import dataclass
 from enum import Enum
 import os
 from dotenv import load_dotenv
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from pool_conexoes import obter_conexao
+from colunas_digitos import expressao_digitos, somente_digitos
 
 load_dotenv()
 
@@ -19,18 +23,8 @@ load_dotenv()
 # ============================
 
 def get_conexao():
-    """Conexão otimizada com SQL Server"""
-    connection_string = (
-        f"DRIVER={{{os.getenv('DB_DRIVER')}}};"
-        f"SERVER={os.getenv('DB_SERVER')};"
-        f"DATABASE={os.getenv('DB_DATABASE')};"
-        f"UID={os.getenv('DB_USER')};"
-        f"PWD={os.getenv('DB_PASSWORD')};"
-        "TrustServerCertificate=yes;"
-        "Connection Timeout=30;"
-        "Command Timeout=60;"
-    )
-    return pyodbc.connect(connection_string)
+    """Conexão emprestada do pool compartilhado (close() devolve ao pool)"""
+    return obter_conexao()
 
 # ============================
 # ENUMS E DATACLASSES
@@ -175,18 +169,15 @@ class AdvancedSearchRepository:
     
     def _e_cpf_cnpj(self, termo: str) -> bool:
         """Verifica se o termo é um CPF ou CNPJ"""
-        numeros = ''.join(filter(str.isdigit, termo))
-        return len(numeros) in [11, 14]
+        return len(somente_digitos(termo)) in [11, 14]
     
     def _e_telefone(self, termo: str) -> bool:
         """Verifica se o termo é um telefone"""
-        numeros = ''.join(filter(str.isdigit, termo))
-        return len(numeros) in [10, 11] and termo.count('(') <= 1
+        return len(somente_digitos(termo)) in [10, 11] and termo.count('(') <= 1
     
     def _e_cep(self, termo: str) -> bool:
         """Verifica se o termo é um CEP"""
-        numeros = ''.join(filter(str.isdigit, termo))
-        return len(numeros) == 8
+        return len(somente_digitos(termo)) == 8
     
     # ============================
     # BUSCA POR ENTIDADE ESPECÍFICA
@@ -236,15 +227,19 @@ class AdvancedSearchRepository:
             if filtros.termo_busca:
                 tipo_busca = self._analisar_termo_busca(filtros.termo_busca)
                 
+                # Documento, telefone e CEP: igualdade nas colunas só-dígitos (seek no índice)
                 if tipo_busca == "documento":
-                    conditions.append("l.cpf_cnpj LIKE ?")
-                    params.append(f"%{filtros.termo_busca}%")
+                    conditions.append("l.cpf_cnpj_digits = ?")
+                    params.append(somente_digitos(filtros.termo_busca))
                 elif tipo_busca == "email":
                     conditions.append("l.email LIKE ?")
                     params.append(f"%{filtros.termo_busca}%")
                 elif tipo_busca == "telefone":
-                    conditions.append("l.telefone LIKE ?")
-                    params.append(f"%{filtros.termo_busca}%")
+                    conditions.append("l.telefone_digits = ?")
+                    params.append(somente_digitos(filtros.termo_busca))
+                elif tipo_busca == "endereco":
+                    conditions.append("l.endereco_id IN (SELECT el.id FROM EnderecoLocador el WHERE el.cep_digits = ?)")
+                    params.append(somente_digitos(filtros.termo_busca))
                 else:
                     # Busca textual geral
                     termo_conditions = [
@@ -388,14 +383,14 @@ class AdvancedSearchRepository:
                 tipo_busca = self._analisar_termo_busca(filtros.termo_busca)
                 
                 if tipo_busca == "documento":
-                    conditions.append("l.cpf_cnpj LIKE ?")
-                    params.append(f"%{filtros.termo_busca}%")
+                    conditions.append("l.cpf_cnpj_digits = ?")
+                    params.append(somente_digitos(filtros.termo_busca))
                 elif tipo_busca == "email":
                     conditions.append("l.email LIKE ?")
                     params.append(f"%{filtros.termo_busca}%")
                 elif tipo_busca == "telefone":
-                    conditions.append("(l.telefone LIKE ? OR l.telefone_alternativo LIKE ?)")
-                    params.extend([f"%{filtros.termo_busca}%", f"%{filtros.termo_busca}%"])
+                    conditions.append("(l.telefone_digits = ? OR l.telefone_alternativo_digits = ?)")
+                    params.extend([somente_digitos(filtros.termo_busca)] * 2)
                 else:
                     # Busca textual geral
                     termo_conditions = [
@@ -549,8 +544,21 @@ class AdvancedSearchRepository:
                 tipo_busca = self._analisar_termo_busca(filtros.termo_busca)
                 
                 if tipo_busca == "endereco":
-                    conditions.append("(i.endereco_cep LIKE ? OR i.endereco_rua LIKE ? OR i.endereco_bairro LIKE ?)")
-                    params.extend([f"%{filtros.termo_busca}%" for _ in range(3)])
+                    # Imóveis legados (sem endereco_id): CEP da própria linha ou
+                    # o resolvido por resolver_enderecos_imovel (casado com o
+                    # índice: CEP atual do EnderecoImovel; extraído: cópia)
+                    conditions.append(f"""(
+                        i.endereco_id IN (SELECT ei.id FROM EnderecoImovel ei WHERE ei.cep_digits = ?)
+                        OR (i.endereco_id IS NULL AND (
+                            {expressao_digitos('i.endereco_cep')} = ?
+                            OR i.id IN (SELECT r.imovel_id FROM ImovelEnderecoResolvido r
+                                        JOIN EnderecoImovel er ON er.id = r.endereco_imovel_id
+                                        WHERE r.origem = 'indice' AND er.cep_digits = ?)
+                            OR i.id IN (SELECT r.imovel_id FROM ImovelEnderecoResolvido r
+                                        WHERE r.origem = 'extracao' AND {expressao_digitos('r.cep')} = ?)
+                        ))
+                    )""")
+                    params.extend([somente_digitos(filtros.termo_busca)] * 4)
                 elif tipo_busca == "valor":
                     valor = self._extrair_valor_monetario(filtros.termo_busca)
                     if valor:
@@ -975,8 +983,8 @@ class AdvancedSearchRepository:
                         conditions.append("c.valor_aluguel BETWEEN ? AND ?")
                         params.extend([valor * 0.8, valor * 1.2])
                 elif tipo_busca == "documento":
-                    conditions.append("(l.cpf_cnpj LIKE ? OR lc.cpf_cnpj LIKE ?)")
-                    params.extend([f"%{filtros.termo_busca}%", f"%{filtros.termo_busca}%"])
+                    conditions.append("(l.cpf_cnpj_digits = ? OR lc.cpf_cnpj_digits = ?)")
+                    params.extend([somente_digitos(filtros.termo_busca)] * 2)
                 else:
                     # Busca textual geral
                     termo_conditions = [
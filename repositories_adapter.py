@@ -10,6 +10,18 @@ if sys.platform == "win32":
 import pyodbc
 from dotenv import load_dotenv
 
+from pool_conexoes import obter_conexao
+from cache_memoria import cache_global
+from indice_busca import notificar_alteracao
+from autocompletar import notificar_alteracao as atualizar_autocompletar
+from cache_busca import invalidar_cache_busca
+from dashboard_sql_server import invalidar_snapshot_dashboard
+from agregados_financeiros import ErroAgregados, atualizar_agregados_prestacoes, grupos_das_prestacoes
+from gravacao_prestacoes import gravar_prestacoes, preparar_filhos, gravar_filhos
+from prestacoes_detalhadas import buscar_prestacoes_detalhadas
+from cache_pdf import invalidar_pdfs_prestacoes
+from motor_acrescimos import calcular_acrescimos_lote, sincronizar_data_vencimento
+
 # ==================== FUNÇÕES UNIFICADAS PARA ESTRUTURA HÍBRIDA ====================
 
 def extrair_endereco_estruturado(endereco_string):
@@ -241,23 +253,9 @@ def safe_process_value(value):
     return safe_decode_string(value)
 
 def get_conexao():
-    # Configuração especial para Windows local - sem forçar UTF-8
-    connection_string = (
-        f"DRIVER={{{os.getenv('DB_DRIVER')}}};"
-        f"SERVER={os.getenv('DB_SERVER')};"
-        f"DATABASE={os.getenv('DB_DATABASE')};"
-        f"UID={os.getenv('DB_USER')};"
-        f"PWD={os.getenv('DB_PASSWORD')};"
-        f"Encrypt={os.getenv('DB_ENCRYPT')};"
-        f"TrustServerCertificate={os.getenv('DB_TRUST_CERT')}"
-    )
-
-    print(f"DEBUG: Conectando com: {connection_string}")
-    conn = pyodbc.connect(connection_string)
-
+    """Empresta uma conexão do pool compartilhado (close()/with devolvem ao pool)"""
     # Não forçar encoding específico - deixar o ODBC decidir
-    print("DEBUG: Conexão estabelecida - usando encoding padrão do ODBC")
-    return conn
+    return obter_conexao()
 
 def inserir_endereco_imovel(endereco_data):
     """Insere um endereço na tabela EnderecoImovel e retorna o ID"""
@@ -542,10 +540,41 @@ def buscar_locatarios():
         print(f"Erro ao buscar locatarios: {e}")
         return []
 
+def _carregar_locadores_por_imovel(cursor):
+    """Todos os vínculos ativos ImovelLocadores em uma consulta, agrupados por imóvel"""
+    cursor.execute("""
+        SELECT il.imovel_id, il.locador_id, il.porcentagem, il.responsabilidade_principal,
+               l.nome, l.cpf_cnpj, l.tipo_pessoa, l.email, l.telefone
+        FROM ImovelLocadores il
+        INNER JOIN Locadores l ON il.locador_id = l.id
+        WHERE il.ativo = 1
+        ORDER BY il.imovel_id, il.responsabilidade_principal DESC, il.porcentagem DESC
+    """)
+    locadores_por_imovel = {}
+    for loc in cursor.fetchall():
+        locadores_por_imovel.setdefault(loc[0], []).append({
+            'id': loc[1],
+            'porcentagem': float(loc[2]) if loc[2] else 0.0,
+            'responsabilidade_principal': bool(loc[3]),
+            'nome': loc[4],
+            'cpf_cnpj': loc[5],
+            'tipo_pessoa': loc[6],
+            'email': loc[7],
+            'telefone': loc[8]
+        })
+    return locadores_por_imovel
+
 def buscar_imoveis():
-    """Busca todos os imóveis da tabela Imoveis com seus locadores da tabela N:N"""
+    """
+    Busca todos os imóveis da tabela Imoveis com seus locadores da tabela N:N.
+
+    Duas consultas, independente da quantidade de imóveis: imóveis (com o
+    endereço estruturado ou, nos antigos sem endereco_id, o já resolvido em
+    ImovelEnderecoResolvido) e vínculos ImovelLocadores; tudo é montado em memória.
+    Resolvidos pelo índice leem o EnderecoImovel atual (endereco_imovel_id);
+    só os extraídos do texto usam a cópia gravada na resolução.
+    """
     try:
-        print("DEBUG: Iniciando buscar_imoveis")
         conn = get_conexao()
         cursor = conn.cursor()
         
@@ -558,13 +587,26 @@ def buscar_imoveis():
                    ei.bairro as endereco_bairro,
                    ei.cidade as endereco_cidade,
                    ei.uf as endereco_estado,
-                   ei.cep as endereco_cep
+                   ei.cep as endereco_cep,
+                   CASE WHEN r.origem = 'indice' THEN er.rua ELSE r.rua END as resolvido_rua,
+                   CASE WHEN r.origem = 'indice' THEN er.numero ELSE r.numero END as resolvido_numero,
+                   CASE WHEN r.origem = 'indice' THEN er.complemento ELSE r.complemento END as resolvido_complemento,
+                   CASE WHEN r.origem = 'indice' THEN er.bairro ELSE r.bairro END as resolvido_bairro,
+                   CASE WHEN r.origem = 'indice' THEN er.cidade ELSE r.cidade END as resolvido_cidade,
+                   CASE WHEN r.origem = 'indice' THEN er.uf ELSE r.uf END as resolvido_estado,
+                   CASE WHEN r.origem = 'indice' THEN er.cep ELSE r.cep END as resolvido_cep,
+                   r.origem as resolvido_origem
             FROM Imoveis i
             LEFT JOIN EnderecoImovel ei ON i.endereco_id = ei.id
+            LEFT JOIN ImovelEnderecoResolvido r
+                   ON r.imovel_id = i.id AND i.endereco_id IS NULL AND r.endereco_origem = i.endereco
+            LEFT JOIN EnderecoImovel er ON er.id = r.endereco_imovel_id
         """)
         columns = [column[0] for column in cursor.description]
         rows = cursor.fetchall()
         print(f"DEBUG: Encontrados {len(rows)} imóveis")
+
+        locadores_por_imovel = _carregar_locadores_por_imovel(cursor)
         result = []
 
         for row in rows:
@@ -585,7 +627,6 @@ def buscar_imoveis():
                     'estado': row_dict.get('endereco_estado') or '',
                     'cep': row_dict.get('endereco_cep') or ''
                 }
-                print(f"DEBUG: Endereço estruturado com CEP para imóvel {row_dict['id']}: {row_dict['endereco_estruturado'].get('cep')}")
             elif row_dict.get('endereco'):
                 # ✅ Imóvel antigo sem endereco_id - criar estrutura vazia
                 row_dict['endereco_estruturado'] = {
@@ -597,108 +638,32 @@ def buscar_imoveis():
                     'estado': '',
                     'cep': ''
                 }
-                print(f"DEBUG: Imóvel {row_dict['id']} sem endereço estruturado (antigo)")
-                # ✅ CORREÇÃO: Tentar buscar na EnderecoImovel primeiro, depois fallback para extração
-                endereco_encontrado = False
-
-                # Tentar encontrar endereço estruturado na tabela EnderecoImovel
-                endereco_string = row_dict.get('endereco', '')
-
-                # Extrair rua e número do endereço string para matching mais preciso
-                import re
-                rua_match = re.search(r'^([^,]+)', endereco_string)
-                numero_match = re.search(r',\s*(\d+)', endereco_string)
-
-                rua_busca = rua_match.group(1).strip() if rua_match else endereco_string[:30]
-                numero_busca = numero_match.group(1) if numero_match else ''
-
-                # Buscar por rua similar e número exato (se disponível)
-                if numero_busca:
-                    cursor.execute("""
-                        SELECT rua, numero, complemento, bairro, cidade, uf, cep,
-                               (CASE WHEN rua LIKE ? AND numero = ? THEN 3
-                                     WHEN rua LIKE ? THEN 2
-                                     ELSE 1 END) as prioridade
-                        FROM EnderecoImovel
-                        WHERE (rua LIKE ? OR rua LIKE ?)
-                        AND cep IS NOT NULL AND cep != ''
-                        ORDER BY prioridade DESC, id
-                    """, (f"%{rua_busca}%", numero_busca, f"%{rua_busca}%", f"%{rua_busca}%", f"%{endereco_string[:25]}%"))
-                else:
-                    cursor.execute("""
-                        SELECT rua, numero, complemento, bairro, cidade, uf, cep
-                        FROM EnderecoImovel
-                        WHERE rua LIKE ?
-                        AND cep IS NOT NULL AND cep != ''
-                        ORDER BY LEN(rua) DESC
-                    """, (f"%{rua_busca}%",))
-
-                endereco_match = cursor.fetchone()
-                if endereco_match:
-                    # Pode retornar 7 ou 8 colunas dependendo da consulta
-                    if len(endereco_match) == 8:  # Com prioridade
-                        rua, numero, complemento, bairro, cidade, uf, cep, prioridade = endereco_match
-                    else:  # Sem prioridade
-                        rua, numero, complemento, bairro, cidade, uf, cep = endereco_match
+                # Endereço já resolvido por resolver_enderecos_imovel (sem casamento de texto aqui)
+                if row_dict.get('resolvido_origem') in ('indice', 'extracao'):
                     row_dict['endereco_estruturado'] = {
-                        'rua': rua or '',
-                        'numero': numero or '',
-                        'complemento': complemento or '',
-                        'bairro': bairro or '',
-                        'cidade': cidade or '',
-                        'estado': uf or '',
-                        'cep': cep or ''
+                        'rua': row_dict.get('resolvido_rua') or '',
+                        'numero': row_dict.get('resolvido_numero') or '',
+                        'complemento': row_dict.get('resolvido_complemento') or '',
+                        'bairro': row_dict.get('resolvido_bairro') or '',
+                        'cidade': row_dict.get('resolvido_cidade') or '',
+                        'estado': row_dict.get('resolvido_estado') or '',
+                        'cep': row_dict.get('resolvido_cep') or ''
                     }
-                    endereco_encontrado = True
-                    print(f"DEBUG: Endereço encontrado na EnderecoImovel para imóvel {row_dict['id']}: CEP {cep}")
-
-                # Fallback para extração de string se não encontrou na tabela
-                if not endereco_encontrado:
-                    endereco_estruturado = extrair_endereco_estruturado(endereco_string)
-                    if endereco_estruturado:
-                        row_dict['endereco_estruturado'] = endereco_estruturado
-                        print(f"DEBUG: Endereço extraído de string para imóvel {row_dict['id']}: {endereco_estruturado}")
 
-            # Buscar todos os locadores deste imóvel na tabela N:N com dados completos
-            cursor.execute("""
-                SELECT il.locador_id, il.porcentagem, il.responsabilidade_principal,
-                       l.nome, l.cpf_cnpj, l.tipo_pessoa, l.email, l.telefone
-                FROM ImovelLocadores il
-                INNER JOIN Locadores l ON il.locador_id = l.id
-                WHERE il.imovel_id = ? AND il.ativo = 1
-                ORDER BY il.responsabilidade_principal DESC, il.porcentagem DESC
-            """, (row_dict['id'],))
-
-            locadores_imovel = cursor.fetchall()
-            print(f"DEBUG: Imóvel ID {row_dict['id']} tem {len(locadores_imovel)} locadores")
-
-            # Montar array de locadores com dados completos
-            locadores_completos = []
-            locadores_ids = []
-
-            for loc in locadores_imovel:
-                locador_obj = {
-                    'id': loc[0],
-                    'porcentagem': float(loc[1]) if loc[1] else 0.0,
-                    'responsabilidade_principal': bool(loc[2]),
-                    'nome': loc[3],
-                    'cpf_cnpj': loc[4],
-                    'tipo_pessoa': loc[5],
-                    'email': loc[6],
-                    'telefone': loc[7]
-                }
-                locadores_completos.append(locador_obj)
-                locadores_ids.append(loc[0])
+            for coluna in ('resolvido_rua', 'resolvido_numero', 'resolvido_complemento', 'resolvido_bairro',
+                           'resolvido_cidade', 'resolvido_estado', 'resolvido_cep', 'resolvido_origem'):
+                row_dict.pop(coluna, None)
 
-            # Adicionar arrays de locadores ao imóvel
+            # Locadores deste imóvel (já carregados em lote)
+            locadores_completos = locadores_por_imovel.get(row_dict['id'], [])
             row_dict['locadores'] = locadores_completos
-            row_dict['locadores_ids'] = locadores_ids
+            row_dict['locadores_ids'] = [loc['id'] for loc in locadores_completos]
 
             # Manter compatibilidade: se tem locadores na N:N, usar o principal
             # Se não tem, usar o campo antigo id_locador
-            if locadores_imovel:
+            if locadores_completos:
                 # Pegar o primeiro (principal) da lista N:N
-                row_dict['id_locador'] = locadores_imovel[0][0]
+                row_dict['id_locador'] = locadores_completos[0]['id']
             # Senão, mantém o id_locador original do SELECT *
             
             result.append(row_dict)
@@ -877,6 +842,7 @@ def inserir_cliente(**kwargs):
                     inserir_representante_legal_locador(locador_id, representante_legal)
             
             print(f"SUCESSO: Locador inserido com ID: {locador_id}")
+            _notificar_escrita('locadores', locador_id)
             return int(locador_id)
             
     except Exception as e:
@@ -929,6 +895,40 @@ def inserir_locador(**kwargs):
         traceback.print_exc()
         return None
 
+def _atualizar_enderecos_resolvidos(imovel_ids):
+    """Hook de insert/update: resolve o endereço texto-livre dos imóveis afetados"""
+    try:
+        from resolver_enderecos_imovel import resolver_enderecos_pendentes
+        if imovel_ids:
+            resolver_enderecos_pendentes(imovel_ids)
+        else:
+            # Sem o id não dá para restringir: resolve os pendentes fora da requisição
+            import threading
+            threading.Thread(target=resolver_enderecos_pendentes, daemon=True).start()
+    except Exception as e:
+        print(f"AVISO: Não foi possível resolver endereços de imóveis: {e}")
+
+def _id_imovel_inserido(resultado):
+    """Id do imóvel devolvido por _inserir_imovel_original (int ou dict com 'id')"""
+    if isinstance(resultado, dict):
+        resultado = resultado.get('id') or resultado.get('imovel_id')
+    try:
+        return int(resultado) if resultado is not None and not isinstance(resultado, bool) else None
+    except (TypeError, ValueError):
+        return None
+
+def _notificar_escrita(tipo, entidade_id=None, reindexar=True):
+    """
+    Hook de insert/update/status: limpa os caches de busca afetados e o
+    snapshot do dashboard e, se o texto pesquisável pode ter mudado, reindexa
+    a entidade no índice de busca e no autocompletar
+    """
+    invalidar_cache_busca(tipo)
+    invalidar_snapshot_dashboard()
+    if reindexar:
+        notificar_alteracao(tipo, entidade_id)
+        atualizar_autocompletar(tipo, entidade_id)
+
 def inserir_imovel(**kwargs):
     """Funcao híbrida segura para inserir imóveis - compatível com string e objeto"""
     try:
@@ -951,7 +951,12 @@ def inserir_imovel(**kwargs):
                 kwargs['endereco'] = str(kwargs['endereco'])
         
         # Chamar a funcao original com os dados processados
-        return _inserir_imovel_original(**kwargs)
+        resultado = _inserir_imovel_original(**kwargs)
+        if isinstance(kwargs.get('endereco'), str):
+            imovel_id = _id_imovel_inserido(resultado)
+            _atualizar_enderecos_resolvidos([imovel_id] if imovel_id else None)
+        _notificar_escrita('imoveis')
+        return resultado
         
     except Exception as e:
         print(f"ERRO: Erro na funcao híbrida de inserir imóvel: {e}")
@@ -961,7 +966,9 @@ def inserir_imovel(**kwargs):
             if 'endereco' in kwargs and isinstance(kwargs['endereco'], dict):
                 kwargs['endereco'] = str(kwargs['endereco'])
             print(f"Tentando fallback com dados: {kwargs}")
-            return _inserir_imovel_original(**kwargs)
+            resultado = _inserir_imovel_original(**kwargs)
+            _notificar_escrita('imoveis')
+            return resultado
         except Exception as e2:
             print(f"Erro no fallback de inserir imóvel: {e2}")
             raise e2
@@ -1137,6 +1144,7 @@ def atualizar_locador(locador_id, **kwargs):
             
             if cursor.rowcount > 0:
                 print(f"SUCESSO: Locador {locador_id} atualizado ({cursor.rowcount} linha(s))")
+                _notificar_escrita('locadores', locador_id)
                 return True
             else:
                 print(f"AVISO: Nenhuma linha foi afetada")
@@ -1186,6 +1194,7 @@ def alterar_status_locador(locador_id, ativo):
         if linhas_afetadas > 0:
             status_texto = "ativo" if ativo else "inativo"
             print(f"Locador {locador_id} marcado como {status_texto} ({linhas_afetadas} linha(s))")
+            _notificar_escrita('locadores', locador_id, reindexar=False)
             return True
         else:
             print(f"Nenhuma linha foi atualizada - locador {locador_id} pode nao existir")
@@ -1237,6 +1246,7 @@ def atualizar_cliente(cliente_id, **kwargs):
         
         if linhas_afetadas > 0:
             print(f"SUCESSO: Cliente {cliente_id} atualizado com sucesso! ({linhas_afetadas} linha(s))")
+            _notificar_escrita('locadores', cliente_id, reindexar=False)
             return True
         else:
             print(f"AVISO: Nenhuma linha foi atualizada - cliente {cliente_id} pode nao existir")
@@ -1264,6 +1274,7 @@ def inserir_locatario(dados):
         
         if locatario_id:
             print(f"ADAPTER: Locatário inserido com ID: {locatario_id}")
+            _notificar_escrita('locatarios', locatario_id)
             return {"id": locatario_id, "success": True}
         else:
             print("ADAPTER: Falha na inserção via v4")
@@ -1273,7 +1284,9 @@ def inserir_locatario(dados):
         print(f"ADAPTER: Erro no v4, tentando fallback: {e}")
         # Fallback para repository antigo
         try:
-            return inserir_inquilino(dados_dict if 'dados_dict' in locals() else dados)
+            resultado = inserir_inquilino(dados_dict if 'dados_dict' in locals() else dados)
+            _notificar_escrita('locatarios')
+            return resultado
         except Exception as e2:
             print(f"ADAPTER: Fallback também falhou: {e2}")
             return None
@@ -1340,10 +1353,17 @@ def gerar_relatorio_excel(dados):
     """Gera relatório em Excel da prestacao de contas"""
     return None
 
-def gerar_relatorio_pdf(dados):
-    """Gera relatório em PDF usando APENAS template HTML personalizado da COBIMOB"""
+def gerar_relatorio_pdf(dados, destino=None):
+    """
+    Gera relatório em PDF usando APENAS template HTML personalizado da COBIMOB.
+    Com `destino` (arquivo binário aberto) o PDF é escrito nele e a função
+    devolve o próprio destino; sem ele, devolve um BytesIO.
+    """
     try:
-        from gerar_pdf_html import gerar_pdf_de_html
+        from gerar_pdf_html import gerar_pdf_de_html, gerar_pdf_em_arquivo
+        if destino is not None:
+            gerar_pdf_em_arquivo(dados, destino)
+            return destino
         return gerar_pdf_de_html(dados)
     except Exception as e:
         print(f"ERRO ao gerar PDF personalizado: {e}")
@@ -2115,74 +2135,144 @@ def buscar_fatura_por_id(fatura_id):
 
 # === FUNÇÕES PARA FATURAS ===
 
-def buscar_faturas(filtros=None, page=1, limit=20, order_by='data_vencimento', order_dir='DESC'):
-    """Busca faturas (prestações de contas) - WORKING VERSION"""
+# order_by aceito pela API -> expressões SQL (o valor recebido nunca é interpolado)
+ORDENACAO_FATURAS = {
+    'id': ['p.id'],
+    'numero_fatura': ['p.id'],
+    'data_vencimento': ['p.data_criacao'],
+    'data_criacao': ['p.data_criacao'],
+    'data_pagamento': ['p.data_pagamento'],
+    'mes_referencia': ['p.ano', 'p.mes'],
+    'valor_total': ['p.total_bruto'],
+    'status': ['p.status'],
+}
+
+LIMITE_MAXIMO_FATURAS = 500
+TTL_CONTAGEM_FATURAS = 30  # segundos
+
+def invalidar_cache_faturas():
+    """Descarta contagens/estatísticas de faturas em cache após uma escrita"""
+    cache_global.invalidar('faturas')
+    # Crescimento/novos clientes do dashboard vêm dos agregados das prestações
+    invalidar_snapshot_dashboard()
+
+def _montar_filtros_faturas(filtros):
+    """Converte os filtros da API em (condições WHERE, parâmetros) sobre PrestacaoContas p"""
+    where_conditions = ["p.ativo = 1"]
+    query_params = []
+
+    if not filtros:
+        return where_conditions, query_params
+
+    status_filter = filtros.get('status')
+    # Aplicar filtro baseado na lógica de status calculado
+    if status_filter == 'paga':
+        # Faturas pagas mas não lançadas
+        where_conditions.append("p.data_pagamento IS NOT NULL AND p.status != 'lancada'")
+    elif status_filter == 'em_atraso':
+        # Apenas prestações realmente em atraso (exclui canceladas e lançadas)
+        where_conditions.append("""
+            p.data_pagamento IS NULL
+            AND p.data_criacao < GETDATE()
+            AND p.status NOT IN ('cancelada', 'lancada')
+        """)
+    elif status_filter == 'aberta':
+        where_conditions.append("p.data_pagamento IS NULL AND p.data_criacao >= GETDATE()")
+    elif status_filter == 'pendente':
+        where_conditions.append("(p.status = 'pendente' OR (p.status IS NULL AND p.data_pagamento IS NULL))")
+    elif status_filter == 'lancada':
+        # Faturas marcadas como lançadas pelo sistema
+        where_conditions.append("p.status = 'lancada'")
+    elif status_filter == 'cancelada':
+        where_conditions.append("p.status = 'cancelada'")
+
+    if filtros.get('search'):
+        search_term = f"%{filtros['search']}%"
+        where_conditions.append("""(
+            CAST(p.id AS VARCHAR) LIKE ? OR
+            p.referencia LIKE ? OR
+            p.observacoes_manuais LIKE ?
+        )""")
+        query_params.extend([search_term, search_term, search_term])
+
+    if filtros.get('mes'):
+        where_conditions.append("p.mes = ?")
+        query_params.append(str(filtros['mes']).zfill(2))
+
+    if filtros.get('ano'):
+        where_conditions.append("p.ano = ?")
+        query_params.append(str(filtros['ano']))
+
+    return where_conditions, query_params
+
+def contar_faturas(filtros=None):
+    """COUNT(*) das faturas que atendem aos filtros, em cache por TTL_CONTAGEM_FATURAS"""
+    where_conditions, query_params = _montar_filtros_faturas(filtros)
+    where_clause = " AND ".join(where_conditions)
+
+    def _contar():
+        conn = get_conexao()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT COUNT(*) FROM PrestacaoContas p WHERE {where_clause}", query_params)
+            return cursor.fetchone()[0] or 0
+        finally:
+            conn.close()
+
+    chave = ('faturas', 'count', where_clause, tuple(query_params))
+    return cache_global.obter_ou_calcular(chave, _contar, ttl=TTL_CONTAGEM_FATURAS)
+
+def buscar_faturas(filtros=None, page=1, limit=20, order_by='data_vencimento', order_dir='DESC', after_id=None):
+    """
+    Busca uma página de faturas (prestações de contas).
+
+    Paginação por OFFSET/FETCH (page/limit) ou por keyset quando `after_id`
+    (último id recebido) é informado; no modo keyset a ordenação é sempre por
+    p.id e não há custo de OFFSET. next_cursor só é devolvido quando a página
+    está ordenada por p.id (keyset ou order_by='id'). order_by só aceita as
+    chaves de ORDENACAO_FATURAS. O total vem de contar_faturas (em cache).
+    """
+    page = max(1, int(page or 1))
+    limit = min(max(1, int(limit or 20)), LIMITE_MAXIMO_FATURAS)
+    order_dir = 'ASC' if str(order_dir or '').upper() == 'ASC' else 'DESC'
+
+    where_conditions, query_params = _montar_filtros_faturas(filtros)
+
+    if after_id is not None:
+        # Keyset: id < último visto (DESC) / id > último visto (ASC)
+        where_conditions.append("p.id < ?" if order_dir == 'DESC' else "p.id > ?")
+        query_params.append(int(after_id))
+        colunas_ordem = ['p.id']
+        offset = 0
+    else:
+        colunas_ordem = ORDENACAO_FATURAS.get(order_by, ORDENACAO_FATURAS['data_vencimento'])
+        offset = (page - 1) * limit
+
+    # p.id como desempate garante ordem estável entre páginas
+    ordem = ", ".join(f"{col} {order_dir}" for col in colunas_ordem)
+    if colunas_ordem != ['p.id']:
+        ordem += f", p.id {order_dir}"
+
+    where_clause = " AND ".join(where_conditions)
+    params_pagina = query_params + [offset, limit]
+
+    # A página é escolhida só com PrestacaoContas; JOINs e subqueries
+    # rodam apenas para as linhas da página
+    pagina_cte = f"""
+            WITH pagina AS (
+                SELECT p.id
+                FROM PrestacaoContas p
+                WHERE {where_clause}
+                ORDER BY {ordem}
+                OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
+            )
+    """
+
     try:
         conn = get_conexao()
         cursor = conn.cursor()
-        
-        # Primeiro, vamos testar se traz registros básicos da PrestacaoContas
-        try:
-            query_debug = """
-                SELECT COUNT(*) as total_registros
-                FROM PrestacaoContas 
-                WHERE ativo = 1
-            """
-            cursor.execute(query_debug)
-            total_debug = cursor.fetchone()[0]
-            print(f"DEBUG: Total de registros ativos na PrestacaoContas: {total_debug}")
-        except Exception as e:
-            print(f"DEBUG: Erro ao contar registros na PrestacaoContas: {e}")
-            
-        # Se não há registros ou tabela não existe, criar dados de teste
-        try:
-            query_debug2 = """
-                SELECT COUNT(*) as total_registros
-                FROM PrestacaoContas
-            """
-            cursor.execute(query_debug2)
-            total_debug2 = cursor.fetchone()[0]
-            print(f"DEBUG: Total geral de registros na PrestacaoContas: {total_debug2}")
-            
-            if total_debug2 == 0:
-                print("DEBUG: Tabela PrestacaoContas vazia - vou inserir um registro de teste")
-                # Criar registro de teste
-                cursor.execute("""
-                    INSERT INTO PrestacaoContas (
-                        referencia, mes, ano, status, total_bruto, total_liquido, 
-                        ativo, data_criacao, observacoes_manuais, locador_id
-                    ) VALUES (
-                        '09/2025', '09', '2025', 'pendente', 1966.05, 1800.00,
-                        1, GETDATE(), 'Prestação de teste', 1
-                    )
-                """)
-                conn.commit()
-                print("DEBUG: Registro de teste criado com sucesso!")
-        except Exception as e:
-            print(f"DEBUG: Erro ao verificar/criar dados de teste: {e}")
-        
-        # Primeiro tentar consulta simples sem JOINs de Contratos/Imoveis
-        query_simples = """
-            SELECT COUNT(*) 
-            FROM PrestacaoContas p
-            LEFT JOIN Contratos c ON p.contrato_id = c.id
-            LEFT JOIN Imoveis i ON c.id_imovel = i.id
-            WHERE p.ativo = 1
-        """
-        
-        try:
-            cursor.execute(query_simples)
-            count_com_joins = cursor.fetchone()[0]
-            print(f"DEBUG: Registros com JOINs: {count_com_joins}")
-        except Exception as e:
-            print(f"DEBUG: Erro com JOINs - usando consulta simples: {e}")
-            count_com_joins = 0
-        
-        # Sempre usar consulta com subqueries para garantir dados reais
-        print("DEBUG: Usando consulta principal com subqueries para dados reais")
-        
-        # Consulta principal otimizada com LEFT JOIN
-        query = """
+
+        query = pagina_cte + """
             SELECT
                 p.id,
                 'PC-' + RIGHT('000' + CAST(p.id AS VARCHAR(10)), 3) as numero_fatura,
@@ -2236,193 +2326,33 @@ def buscar_faturas(filtros=None, page=1, limit=20, order_by='data_vencimento', o
                     ISNULL(l.nome, 'Nome não informado') as locador_nome,
                     ISNULL(l.nome, 'Nome não informado') as proprietario_nome,
                     ISNULL(l.cpf_cnpj, 'CPF não informado') as proprietario_cpf,
-                    -- Calcular dias de atraso baseado na data de vencimento do contrato
-                    CASE
-                        WHEN p.data_pagamento IS NULL AND p.contrato_id IS NOT NULL
-                             AND cont.vencimento_dia IS NOT NULL
-                             AND p.ano > 1900 AND p.ano < 2100
-                             AND p.mes >= 1 AND p.mes <= 12
-                        THEN
-                            CASE
-                                WHEN TRY_CAST(
-                                    CAST(p.ano AS VARCHAR(4)) + '-' +
-                                    RIGHT('0' + CAST(p.mes AS VARCHAR(2)), 2) + '-' +
-                                    RIGHT('0' + CAST(cont.vencimento_dia AS VARCHAR(2)), 2)
-                                    AS DATE
-                                ) IS NOT NULL
-                                AND TRY_CAST(
-                                    CAST(p.ano AS VARCHAR(4)) + '-' +
-                                    RIGHT('0' + CAST(p.mes AS VARCHAR(2)), 2) + '-' +
-                                    RIGHT('0' + CAST(cont.vencimento_dia AS VARCHAR(2)), 2)
-                                    AS DATE
-                                ) < CAST(GETDATE() AS DATE)
-                                THEN DATEDIFF(day,
-                                    TRY_CAST(
-                                        CAST(p.ano AS VARCHAR(4)) + '-' +
-                                        RIGHT('0' + CAST(p.mes AS VARCHAR(2)), 2) + '-' +
-                                        RIGHT('0' + CAST(cont.vencimento_dia AS VARCHAR(2)), 2)
-                                        AS DATE
-                                    ),
-                                    CAST(GETDATE() AS DATE)
-                                )
-                                ELSE 0
-                            END
-                        ELSE 0
-                    END as dias_atraso,
                     ISNULL(p.total_liquido, 0) as valor_liquido,
                     ISNULL(p.valor_pago, 0) as valor_pago,
                     ISNULL(p.locador_id, 0) as locador_id,
-                    -- Calcular acréscimos usando mesma lógica do buscar_prestacao_detalhada
-                    CASE
-                        WHEN p.data_pagamento IS NULL AND p.contrato_id IS NOT NULL
-                             AND cont.vencimento_dia IS NOT NULL
-                             AND p.ano > 1900 AND p.ano < 2100
-                             AND p.mes >= 1 AND p.mes <= 12
-                        THEN
-                            CASE
-                                WHEN TRY_CAST(
-                                    CAST(p.ano AS VARCHAR(4)) + '-' +
-                                    RIGHT('0' + CAST(p.mes AS VARCHAR(2)), 2) + '-' +
-                                    RIGHT('0' + CAST(cont.vencimento_dia AS VARCHAR(2)), 2)
-                                    AS DATE
-                                ) IS NOT NULL
-                                AND TRY_CAST(
-                                    CAST(p.ano AS VARCHAR(4)) + '-' +
-                                    RIGHT('0' + CAST(p.mes AS VARCHAR(2)), 2) + '-' +
-                                    RIGHT('0' + CAST(cont.vencimento_dia AS VARCHAR(2)), 2)
-                                    AS DATE
-                                ) < CAST(GETDATE() AS DATE)
-                                THEN
-                                    -- Usar valor_boleto como base ou total_bruto se não houver
-                                    ISNULL(ISNULL(p.valor_boleto, p.total_bruto), 0) * (
-                                        -- Multa: percentual do contrato (padrão 2%)
-                                        ISNULL(cont.percentual_multa_atraso, 2) / 100 +
-                                        -- Juros: 1% ao mês = 0.033% ao dia (dias_atraso * 0.00033)
-                                        (DATEDIFF(day,
-                                            TRY_CAST(
-                                                CAST(p.ano AS VARCHAR(4)) + '-' +
-                                                RIGHT('0' + CAST(p.mes AS VARCHAR(2)), 2) + '-' +
-                                                RIGHT('0' + CAST(cont.vencimento_dia AS VARCHAR(2)), 2)
-                                                AS DATE
-                                            ),
-                                            CAST(GETDATE() AS DATE)
-                                        ) * 0.00033)
-                                    )
-                                ELSE ISNULL(p.valor_acrescimos, 0)
-                            END
-                        ELSE ISNULL(p.valor_acrescimos, 0)
-                    END as valor_acrescimos,
-                    -- Valor total com acréscimos (usar mesma base)
-                    ISNULL(ISNULL(p.valor_boleto, p.total_bruto), 0) +
-                    CASE
-                        WHEN p.data_pagamento IS NULL AND p.contrato_id IS NOT NULL
-                             AND cont.vencimento_dia IS NOT NULL
-                             AND p.ano > 1900 AND p.ano < 2100
-                             AND p.mes >= 1 AND p.mes <= 12
-                        THEN
-                            CASE
-                                WHEN TRY_CAST(
-                                    CAST(p.ano AS VARCHAR(4)) + '-' +
-                                    RIGHT('0' + CAST(p.mes AS VARCHAR(2)), 2) + '-' +
-                                    RIGHT('0' + CAST(cont.vencimento_dia AS VARCHAR(2)), 2)
-                                    AS DATE
-                                ) IS NOT NULL
-                                AND TRY_CAST(
-                                    CAST(p.ano AS VARCHAR(4)) + '-' +
-                                    RIGHT('0' + CAST(p.mes AS VARCHAR(2)), 2) + '-' +
-                                    RIGHT('0' + CAST(cont.vencimento_dia AS VARCHAR(2)), 2)
-                                    AS DATE
-                                ) < CAST(GETDATE() AS DATE)
-                                THEN
-                                    ISNULL(ISNULL(p.valor_boleto, p.total_bruto), 0) * (
-                                        ISNULL(cont.percentual_multa_atraso, 2) / 100 +
-                                        (DATEDIFF(day,
-                                            TRY_CAST(
-                                                CAST(p.ano AS VARCHAR(4)) + '-' +
-                                                RIGHT('0' + CAST(p.mes AS VARCHAR(2)), 2) + '-' +
-                                                RIGHT('0' + CAST(cont.vencimento_dia AS VARCHAR(2)), 2)
-                                                AS DATE
-                                            ),
-                                            CAST(GETDATE() AS DATE)
-                                        ) * 0.00033)
-                                    )
-                                ELSE ISNULL(p.valor_acrescimos, 0)
-                            END
-                        ELSE ISNULL(p.valor_acrescimos, 0)
-                    END as valor_total_com_acrescimos,
+                    -- Entradas do motor_acrescimos (dias de atraso e acréscimos calculados em Python)
+                    p.data_vencimento as calc_data_vencimento,
+                    p.ano as calc_ano,
+                    p.mes as calc_mes,
+                    cont.vencimento_dia as calc_vencimento_dia,
+                    cont.percentual_multa_atraso as calc_percentual_multa,
+                    p.valor_boleto as calc_valor_boleto,
+                    p.total_bruto as calc_total_bruto,
+                    p.valor_acrescimos as calc_valor_acrescimos,
                     p.data_calculo_acrescimos
-                FROM PrestacaoContas p
+                FROM pagina pg
+                INNER JOIN PrestacaoContas p ON p.id = pg.id
                 LEFT JOIN Locadores l ON p.locador_id = l.id
                 LEFT JOIN Contratos cont ON p.contrato_id = cont.id
-                WHERE p.ativo = 1
-                ORDER BY p.id DESC
-        """
-        
-
-        # Aplicar filtros de status ANTES de executar a query
-        where_conditions = ["p.ativo = 1"]
-        query_params = []
-
-        if filtros and filtros.get('status'):
-            status_filter = filtros['status']
-            print(f"DEBUG: Aplicando filtro de status: {status_filter}")
-
-            # Aplicar filtro baseado na lógica de status calculado
-            if status_filter == 'paga':
-                # Faturas pagas mas não lançadas
-                where_conditions.append("p.data_pagamento IS NOT NULL AND p.status != 'lancada'")
-            elif status_filter == 'em_atraso':
-                # Apenas prestações realmente em atraso (exclui canceladas e lançadas)
-                where_conditions.append("""
-                    p.data_pagamento IS NULL
-                    AND p.data_criacao < GETDATE()
-                    AND p.status NOT IN ('cancelada', 'lancada')
-                """)
-            elif status_filter == 'aberta':
-                where_conditions.append("p.data_pagamento IS NULL AND p.data_criacao >= GETDATE()")
-            elif status_filter == 'pendente':
-                where_conditions.append("(p.status = 'pendente' OR (p.status IS NULL AND p.data_pagamento IS NULL))")
-            elif status_filter == 'lancada':
-                # Faturas marcadas como lançadas pelo sistema
-                where_conditions.append("p.status = 'lancada'")
-            elif status_filter == 'cancelada':
-                where_conditions.append("p.status = 'cancelada'")
-
-        # Aplicar outros filtros
-        if filtros:
-            if filtros.get('search'):
-                search_term = f"%{filtros['search']}%"
-                where_conditions.append("""(
-                    CAST(p.id AS VARCHAR) LIKE ? OR
-                    p.referencia LIKE ? OR
-                    p.observacoes_manuais LIKE ?
-                )""")
-                query_params.extend([search_term, search_term, search_term])
-
-            if filtros.get('mes'):
-                where_conditions.append("p.mes = ?")
-                query_params.append(str(filtros['mes']).zfill(2))
-
-            if filtros.get('ano'):
-                where_conditions.append("p.ano = ?")
-                query_params.append(str(filtros['ano']))
-
-        # Montar WHERE clause final
-        where_clause = " AND ".join(where_conditions)
-        query = query.replace("WHERE p.ativo = 1", f"WHERE {where_clause}")
+        """ + f"ORDER BY {ordem}"
 
-
-
-        print(f"DEBUG: Executando consulta principal...")
         try:
-            cursor.execute(query, query_params)
+            cursor.execute(query, params_pagina)
             columns = [column[0] for column in cursor.description]
             rows = cursor.fetchall()
-            print(f"DEBUG: Consulta retornou {len(rows)} registros")
         except Exception as e:
             print(f"DEBUG: Erro na consulta principal: {e}")
             # Fallback para consulta ainda mais simples
-            query_fallback = """
+            query_fallback = pagina_cte + """
                 SELECT 
                     p.id,
                     'PC-' + RIGHT('000' + CAST(p.id AS VARCHAR(10)), 3) as numero_fatura,
@@ -2448,40 +2378,58 @@ def buscar_faturas(filtros=None, page=1, limit=20, order_by='data_vencimento', o
                     ISNULL(p.total_liquido, 0) as valor_liquido,
                     ISNULL(p.valor_pago, 0) as valor_pago,
                     ISNULL(p.locador_id, 0) as locador_id
-                FROM PrestacaoContas p
-                WHERE p.ativo = 1
-                ORDER BY p.id DESC
-            """
+                FROM pagina pg
+                INNER JOIN PrestacaoContas p ON p.id = pg.id
+            """ + f"ORDER BY {ordem}"
             print("DEBUG: Tentando consulta fallback (sem JOINs)")
-            cursor.execute(query_fallback)
+            cursor.execute(query_fallback, params_pagina)
             columns = [column[0] for column in cursor.description]
             rows = cursor.fetchall()
-            print(f"DEBUG: Consulta fallback retornou {len(rows)} registros")
-        
+
         faturas = []
+        entradas_acrescimos = []
         for row in rows:
             fatura_dict = {}
+            entrada = {'data_pagamento': None}
             for i, value in enumerate(row):
+                if columns[i].startswith('calc_'):
+                    entrada[columns[i][5:]] = value
+                    continue
+                if columns[i] == 'data_pagamento':
+                    entrada['data_pagamento'] = value
                 if hasattr(value, 'strftime'):
                     fatura_dict[columns[i]] = value.strftime('%Y-%m-%d')
                 else:
                     fatura_dict[columns[i]] = value
             faturas.append(fatura_dict)
-        
+            entradas_acrescimos.append(entrada)
+
         conn.close()
-        
-        print(f"DEBUG: Processadas {len(faturas)} prestacoes de contas")
-        if len(faturas) > 0:
-            print(f"DEBUG: Primeira fatura processada: {faturas[0]}")
-        print(f"DEBUG: Retornando {len(faturas)} prestacoes de contas do banco")
+
+        # Dias de atraso e acréscimos da página inteira pelo motor único
+        if entradas_acrescimos and 'ano' in entradas_acrescimos[0]:
+            # (sem contrato não há vencimento_dia: mantém o acréscimo salvo)
+            for fatura_dict, calculo in zip(faturas, calcular_acrescimos_lote(entradas_acrescimos)):
+                fatura_dict['dias_atraso'] = calculo['dias_atraso']
+                fatura_dict['valor_acrescimos'] = calculo['valor_acrescimos']
+                fatura_dict['valor_total_com_acrescimos'] = calculo['valor_total_com_acrescimos']
+
+        total = contar_faturas(filtros)
+        # O cursor (after_id) só continua uma sequência ordenada por p.id;
+        # em páginas ordenadas por data/valor/status ele pularia ou repetiria linhas
+        proximo_cursor = faturas[-1]['id'] if colunas_ordem == ['p.id'] and len(faturas) == limit else None
+
+        print(f"DEBUG: Retornando {len(faturas)} de {total} prestacoes de contas (página {page})")
         return {
             'success': True,
             'data': faturas,
-            'total': len(faturas),
+            'total': total,
             'page': page,
-            'limit': limit
+            'limit': limit,
+            'pages': (total + limit - 1) // limit,
+            'next_cursor': proximo_cursor
         }
-        
+
     except Exception as e:
         print(f"Erro ao buscar prestacoes do banco: {e}")
         return {
@@ -2489,186 +2437,98 @@ def buscar_faturas(filtros=None, page=1, limit=20, order_by='data_vencimento', o
             'data': [],
             'total': 0,
             'page': page,
-            'limit': limit
+            'limit': limit,
+            'pages': 0,
+            'next_cursor': None
         }
-    
-    # Código original comentado para futuro uso com dados reais
+
+# Mesma regra de status calculado usada na listagem de buscar_faturas
+STATUS_FATURA_SQL = """
+    CASE
+        WHEN p.status = 'cancelada' THEN 'cancelada'
+        WHEN p.status = 'lancada' AND p.data_pagamento IS NOT NULL THEN 'lancada'
+        WHEN p.data_pagamento IS NOT NULL THEN 'paga'
+        WHEN p.data_pagamento IS NULL AND p.data_criacao < GETDATE() AND p.status NOT IN ('cancelada', 'lancada') THEN 'em_atraso'
+        ELSE ISNULL(p.status, 'pendente')
+    END
+"""
+
+TTL_ESTATISTICAS_FATURAS = 15  # segundos
+
+def _estatisticas_faturas_vazias():
+    return {
+        'todas': 0,
+        'abertas': 0,
+        'pendentes': 0,
+        'pagas': 0,
+        'em_atraso': 0,
+        'canceladas': 0,
+        'valor_total_aberto': 0,
+        'valor_total_recebido': 0,
+        'valor_total_atrasado': 0
+    }
+
+def _calcular_estatisticas_faturas(where_clause, query_params):
+    """Um único GROUP BY pelo status calculado; o resto é soma de poucas linhas"""
+    conn = get_conexao()
     try:
-        conn = get_conexao()
         cursor = conn.cursor()
-        
-        # Query base simulando faturas com dados dos contratos
-        base_query = """
-            SELECT 
-                c.id,
-                CAST(c.id AS VARCHAR) as numero_fatura,
-                i.valor_aluguel as valor_total,
-                c.data_fim as data_vencimento,
-                NULL as data_pagamento,
-                'aberta' as status,
-                FORMAT(c.data_inicio, 'yyyy-MM') as mes_referencia,
-                '' as observacoes,
-                c.data_inicio as data_criacao,
-                c.id as contrato_id,
-                CAST(c.id AS VARCHAR) as contrato_numero,
-                i.endereco as imovel_endereco,
-                i.tipo as imovel_tipo,
-                i.valor_aluguel,
-                loc.nome as locatario_nome,
-                loc.cpf_cnpj as locatario_cpf,
-                l.nome as locador_nome,
-                DATEDIFF(day, c.data_fim, GETDATE()) as dias_atraso
-            FROM Contratos c
-            LEFT JOIN Imoveis i ON c.id_imovel = i.id
-            LEFT JOIN ContratoLocatarios cl ON c.id = cl.contrato_id AND cl.responsabilidade_principal = 1
-            LEFT JOIN Locatarios loc ON cl.locatario_id = loc.id
-            LEFT JOIN Locadores l ON i.id_locador = l.id
-        """
-        
-        # Construir condiçoes WHERE baseadas nos filtros
-        where_conditions = []
-        params = []
-        
-        if filtros:
-            if filtros.get('status'):
-                # Como estamos simulando com contratos, vou mapear os status
-                status_map = {'aberta': 'ativo', 'paga': 'finalizado', 'pendente': 'pendente'}
-                mapped_status = [status_map.get(s, s) for s in filtros['status']]
-                placeholders = ','.join(['?' for _ in mapped_status])
-                where_conditions.append(f"c.status IN ({placeholders})")
-                params.extend(mapped_status)
-            
-            if filtros.get('data_inicio'):
-                where_conditions.append("c.data_fim >= ?")
-                params.append(filtros['data_inicio'])
-            
-            if filtros.get('data_fim'):
-                where_conditions.append("c.data_fim <= ?")
-                params.append(filtros['data_fim'])
-            
-            if filtros.get('search'):
-                search_term = f"%{filtros['search']}%"
-                where_conditions.append("""
-                    (CAST(c.id AS VARCHAR) LIKE ? OR 
-                     loc.nome LIKE ? OR 
-                     i.endereco LIKE ? OR 
-                     CAST(c.id AS VARCHAR) LIKE ?)
-                """)
-                params.extend([search_term, search_term, search_term, search_term])
-            
-            if filtros.get('locador_id'):
-                where_conditions.append("i.id_locador = ?")
-                params.append(filtros['locador_id'])
-            
-            if filtros.get('valor_min'):
-                where_conditions.append("i.valor_aluguel >= ?")
-                params.append(filtros['valor_min'])
-            
-            if filtros.get('valor_max'):
-                where_conditions.append("i.valor_aluguel <= ?")
-                params.append(filtros['valor_max'])
-        
-        # Montar query completa
-        if where_conditions:
-            query = base_query + " WHERE " + " AND ".join(where_conditions)
-        else:
-            query = base_query
-        
-        # Adicionar ordenacao
-        query += f" ORDER BY {order_by} {order_dir}"
-        
-        # Executar query para contagem total
-        count_query = f"SELECT COUNT(*) FROM ({query}) as total_query"
-        cursor.execute(count_query, params)
-        total = cursor.fetchone()[0]
-        
-        # Adicionar paginacao
-        offset = (page - 1) * limit
-        query += f" OFFSET {offset} ROWS FETCH NEXT {limit} ROWS ONLY"
-        
-        # Executar query principal
-        cursor.execute(query, params)
-        columns = [column[0] for column in cursor.description]
-        rows = cursor.fetchall()
-        
-        # Converter resultados
-        result = []
-        for row in rows:
-            row_dict = {}
-            for i, value in enumerate(row):
-                if hasattr(value, 'strftime'):
-                    row_dict[columns[i]] = value.strftime('%Y-%m-%d')
-                else:
-                    row_dict[columns[i]] = value
-            
-            # Adicionar campos calculados
-            row_dict['referencia_display'] = format_mes_referencia(row_dict.get('mes_referencia', ''))
-            row_dict['situacao_pagamento'] = calcular_situacao_pagamento(row_dict)
-            
-            result.append(row_dict)
-        
+        cursor.execute(f"""
+            SELECT s.status_calculado, COUNT(*), SUM(s.valor_total)
+            FROM (
+                SELECT {STATUS_FATURA_SQL} AS status_calculado,
+                       ISNULL(p.total_bruto, 0) AS valor_total
+                FROM PrestacaoContas p
+                WHERE {where_clause}
+            ) s
+            GROUP BY s.status_calculado
+        """, query_params)
+        por_status = {row[0]: (row[1] or 0, float(row[2] or 0)) for row in cursor.fetchall()}
+    finally:
         conn.close()
-        return {
-            'data': result,
-            'total': total,
-            'page': page,
-            'pages': (total + limit - 1) // limit
-        }
-        
-    except Exception as e:
-        print(f"Erro ao buscar faturas: {e}")
-        return {'data': [], 'total': 0, 'page': 1, 'pages': 0}
 
-def buscar_estatisticas_faturas(filtros=None):
-    """Busca estatísticas resumidas das faturas reais do banco para as abas"""
+    def quantidade(*status):
+        return sum(por_status.get(s, (0, 0.0))[0] for s in status)
+
+    def valor(*status):
+        return sum(por_status.get(s, (0, 0.0))[1] for s in status)
+
+    return {
+        'todas': sum(qtd for qtd, _ in por_status.values()),
+        'abertas': quantidade('aberta'),
+        'pendentes': quantidade('pendente'),
+        'pagas': quantidade('paga', 'lancada'),
+        'em_atraso': quantidade('em_atraso'),
+        'canceladas': quantidade('cancelada'),
+        'valor_total_aberto': valor('aberta', 'pendente', 'em_atraso'),
+        'valor_total_recebido': valor('paga', 'lancada'),
+        'valor_total_atrasado': valor('em_atraso')
+    }
+
+def buscar_estatisticas_faturas(filtros=None, usar_cache=True):
+    """
+    Estatísticas das faturas para as abas (contagens e somas por status).
+
+    Agregado direto no SQL Server em uma consulta; com usar_cache o resultado
+    fica TTL_ESTATISTICAS_FATURAS segundos em cache por combinação de filtros.
+    """
     try:
-        # Usar a função buscar_faturas para obter dados reais
-        resultado_faturas = buscar_faturas(filtros)
-        
-        if not resultado_faturas.get('success') or not resultado_faturas.get('data'):
-            return {
-                'todas': 0,
-                'abertas': 0, 
-                'pendentes': 0,
-                'pagas': 0,
-                'em_atraso': 0,
-                'canceladas': 0,
-                'valor_total_aberto': 0,
-                'valor_total_recebido': 0,
-                'valor_total_atrasado': 0
-            }
-        
-        faturas = resultado_faturas['data']
-        
-        # Calcular estatísticas baseadas nos dados reais
-        stats = {
-            'todas': len(faturas),
-            'abertas': len([f for f in faturas if f.get('status') == 'aberta']),
-            'pendentes': len([f for f in faturas if f.get('status') == 'pendente']), 
-            'pagas': len([f for f in faturas if f.get('status') in ['paga', 'lancada']]),
-            'em_atraso': len([f for f in faturas if f.get('status') == 'em_atraso']),
-            'canceladas': len([f for f in faturas if f.get('status') == 'cancelada']),
-            'valor_total_aberto': sum([f.get('valor_total', 0) or 0 for f in faturas if f.get('status') in ['aberta', 'pendente', 'em_atraso']]),
-            'valor_total_recebido': sum([f.get('valor_total', 0) or 0 for f in faturas if f.get('status') in ['paga', 'lancada']]),
-            'valor_total_atrasado': sum([f.get('valor_total', 0) or 0 for f in faturas if f.get('status') == 'em_atraso'])
-        }
-        
-        print(f"Estatísticas calculadas: {len(faturas)} faturas encontradas")
-        return stats
-        
+        where_conditions, query_params = _montar_filtros_faturas(filtros)
+        where_clause = " AND ".join(where_conditions)
+
+        if not usar_cache:
+            return _calcular_estatisticas_faturas(where_clause, query_params)
+
+        chave = ('faturas', 'stats', where_clause, tuple(query_params))
+        return cache_global.obter_ou_calcular(
+            chave,
+            lambda: _calcular_estatisticas_faturas(where_clause, query_params),
+            ttl=TTL_ESTATISTICAS_FATURAS
+        )
+
     except Exception as e:
         print(f"Erro ao calcular estatísticas de faturas: {e}")
-        return {
-            'todas': 0,
-            'abertas': 0,
-            'pendentes': 0, 
-            'pagas': 0,
-            'em_atraso': 0,
-            'canceladas': 0,
-            'valor_total_aberto': 0,
-            'valor_total_recebido': 0,
-            'valor_total_atrasado': 0
-        }
+        return _estatisticas_faturas_vazias()
 
 def buscar_fatura_por_id(fatura_id):
     """Busca uma fatura específica com detalhes completos"""
@@ -2973,6 +2833,7 @@ def atualizar_locatario(locatario_id, **kwargs):
         print(f"Locatario {locatario_id} atualizado com sucesso! {cursor.rowcount} linha(s) afetada(s)")
         
         conn.close()
+        _notificar_escrita('locatarios', locatario_id)
         return True
         
     except Exception as e:
@@ -3013,6 +2874,7 @@ def alterar_status_locatario(locatario_id, ativo):
         print(f"Status do locatario {locatario_id} alterado com sucesso! {cursor.rowcount} linha(s) afetada(s)")
         
         conn.close()
+        _notificar_escrita('locatarios', locatario_id, reindexar=False)
         return True
         
     except Exception as e:
@@ -3049,6 +2911,8 @@ def atualizar_imovel(imovel_id, **kwargs):
 
         if resultado.get('success'):
             print(f"✅ Imóvel {imovel_id} atualizado com sucesso via repository!")
+            _atualizar_enderecos_resolvidos([imovel_id])
+            _notificar_escrita('imoveis', imovel_id)
             return True
         else:
             print(f"❌ Erro ao atualizar via repository: {resultado.get('message')}")
@@ -3092,6 +2956,7 @@ def alterar_status_imovel(imovel_id, ativo):
         print(f"Status do imóvel {imovel_id} alterado com sucesso! {cursor.rowcount} linha(s) afetada(s)")
         
         conn.close()
+        _notificar_escrita('imoveis', imovel_id, reindexar=False)
         return True
         
     except Exception as e:
@@ -3216,6 +3081,14 @@ def atualizar_contrato(contrato_id, **kwargs):
         query = f"UPDATE Contratos SET {set_clause} WHERE id = ?"
         valores = list(campos_para_atualizar.values()) + [contrato_id]
         
+        # Imóvel do contrato mudou: as prestações trocam de grupo nos agregados
+        # financeiros; os grupos antigos são lidos antes do UPDATE
+        prestacoes_do_contrato, grupos_anteriores = [], []
+        if 'id_imovel' in campos_para_atualizar:
+            cursor.execute("SELECT id FROM PrestacaoContas WHERE contrato_id = ?", (contrato_id,))
+            prestacoes_do_contrato = [row[0] for row in cursor.fetchall()]
+            grupos_anteriores = grupos_das_prestacoes(cursor, prestacoes_do_contrato)
+
         # ===== NOVO: CAPTURAR DADOS ANTIGOS ANTES DA ATUALIZAÇÃO =====
         print("Capturando dados antigos para histórico...")
         cursor.execute("SELECT * FROM Contratos WHERE id = ?", (contrato_id,))
@@ -3231,6 +3104,20 @@ def atualizar_contrato(contrato_id, **kwargs):
         
         cursor.execute(query, valores)
         
+        # Dia de vencimento mudou: regravar data_vencimento das prestações do contrato
+        # (cursor separado para não perder o rowcount do UPDATE acima)
+        if 'vencimento_dia' in campos_para_atualizar:
+            try:
+                sincronizar_data_vencimento(conn.cursor(), "p.contrato_id = ?", [contrato_id])
+            except Exception as e:
+                print(f"AVISO: Não foi possível atualizar data_vencimento das prestações: {e}")
+
+        if prestacoes_do_contrato:
+            try:
+                atualizar_agregados_prestacoes(conn.cursor(), prestacoes_do_contrato, grupos_anteriores)
+            except ErroAgregados as e:
+                print(f"AVISO: Não foi possível atualizar agregados financeiros do contrato {contrato_id}: {e}")
+        
         # ===== HISTÓRICO AUTOMÁTICO (VERSÃO SEGURA COM TIMEOUT) =====
         if cursor.rowcount > 0:
             print("Registrando mudanças no histórico (versão com timeout)...")
@@ -3283,6 +3170,7 @@ def atualizar_contrato(contrato_id, **kwargs):
         if cursor.rowcount > 0:
             print(f"SUCESSO: Contrato ID {contrato_id} atualizado! ({cursor.rowcount} linha(s))")
             conn.close()
+            _notificar_escrita('contratos', contrato_id)
             return True
         else:
             print(f"AVISO: Nenhuma linha afetada no contrato {contrato_id}")
@@ -3701,6 +3589,7 @@ def alterar_status_contrato_db(contrato_id, novo_status):
             conn.commit()
             print(f"OK Status do contrato {contrato_id} alterado para {novo_status}")
             conn.close()
+            _notificar_escrita('contratos', contrato_id, reindexar=False)
             return True
         else:
             print(f"Nenhuma linha foi alterada para contrato {contrato_id}")
@@ -4290,886 +4179,66 @@ def buscar_dados_bancarios_corretor(contrato_id):
 def salvar_prestacao_contas(contrato_id, tipo_prestacao, dados_financeiros, status, observacoes=None,
                           lancamentos_extras=None, contrato_dados=None, configuracao_calculo=None,
                           configuracao_fatura=None, detalhamento_completo=None, valor_boleto=None,
-                          total_retido=None, valor_repasse=None, tipo_calculo=None, multa_rescisoria=None):
-    """Salva uma nova prestação de contas no banco de dados"""
-    try:
-        conn = get_conexao()
-        cursor = conn.cursor()
-        
-        # Obter dados do mês atual ou do mês especificado na configuração
-        from datetime import datetime
-        agora = datetime.now()
-        mes = agora.month
-        ano = agora.year
-        referencia = f"{mes:02d}/{ano}"
-
-        # Calcular data de vencimento baseada no mês de referência
-        data_vencimento_calculada = agora  # Por padrão usa data atual
-
-        # Se houver configuração de fatura com mês específico
-        if configuracao_fatura and configuracao_fatura.get('mes_referencia'):
-            try:
-                mes_ref = configuracao_fatura['mes_referencia']
-
-                # Suportar ambos os formatos: YYYY-MM (frontend) e MM/YYYY (legado)
-                if '-' in mes_ref:  # Formato YYYY-MM (novo)
-                    ano, mes = mes_ref.split('-')
-                    mes = int(mes)
-                    ano = int(ano)
-                elif '/' in mes_ref:  # Formato MM/YYYY (legado)
-                    mes, ano = mes_ref.split('/')
-                    mes = int(mes)
-                    ano = int(ano)
-                else:
-                    # Fallback: se não tem separador, tenta interpretar como YYYYMM
-                    if len(mes_ref) == 6 and mes_ref.isdigit():
-                        ano = int(mes_ref[:4])
-                        mes = int(mes_ref[4:])
-                    else:
-                        raise ValueError(f"Formato de mês inválido: {mes_ref}")
-
-                referencia = f"{mes:02d}/{ano}"
-
-                # Calcular data de vencimento para o mês de referência
-                # Usar dia atual, mas mês/ano da referência
-                dia_vencimento = agora.day
-                try:
-                    data_vencimento_calculada = datetime(ano, mes, dia_vencimento)
-                except ValueError:
-                    # Se o dia não existe no mês (ex: 31 fev), usar último dia do mês
-                    import calendar
-                    ultimo_dia = calendar.monthrange(ano, mes)[1]
-                    data_vencimento_calculada = datetime(ano, mes, ultimo_dia)
-            except Exception as e:
-                print(f"Erro ao processar mes_referencia '{mes_ref}': {e}")
-                # Manter valores padrão (mês atual) em caso de erro
-                pass
-        
-        # Obter locador_id do contrato através do imóvel
-        cursor.execute("""
-            SELECT i.id_locador 
-            FROM Contratos c 
-            INNER JOIN Imoveis i ON c.id_imovel = i.id 
-            WHERE c.id = ?
-        """, (contrato_id,))
-        resultado_contrato = cursor.fetchone()
-        if not resultado_contrato:
-            raise Exception(f"Contrato {contrato_id} não encontrado ou sem locador")
-        
-        locador_id = resultado_contrato[0]
-
-        # VALIDACAO 1: Verificar se já existe prestação LANCADA para este contrato no mesmo mês
-        cursor.execute("""
-            SELECT COUNT(*)
-            FROM PrestacaoContas
-            WHERE contrato_id = ? AND mes = ? AND ano = ? AND ativo = 1 AND status = 'lancada'
-        """, (contrato_id, f"{mes:02d}", str(ano)))
-
-        prestacao_lancada_existente = cursor.fetchone()[0]
-        if prestacao_lancada_existente > 0:
-            raise Exception(f"Já existe uma prestação LANÇADA para o contrato {contrato_id} no mês {mes:02d}/{ano}. Prestações lançadas são IMUTÁVEIS e não podem ser alteradas.")
-
-        # VALIDACAO 2: Verificar se já existe prestação para este contrato no mesmo mês
-        cursor.execute("""
-            SELECT COUNT(*), STRING_AGG(CAST(id AS VARCHAR), ', ')
-            FROM PrestacaoContas
-            WHERE contrato_id = ? AND mes = ? AND ano = ? AND ativo = 1
-        """, (contrato_id, f"{mes:02d}", str(ano)))
-
-        resultado = cursor.fetchone()
-        prestacao_existente = resultado[0]
-        ids_existentes = resultado[1]
-
-        if prestacao_existente > 0:
-            print(f"AVISO: Ja existem {prestacao_existente} prestacao(oes) para contrato {contrato_id} em {mes:02d}/{ano}")
-            print(f"   IDs existentes: {ids_existentes}")
-            raise Exception(f"Já existe prestação de contas para este período. IDs: {ids_existentes}")
-
-        # VALIDACAO 3: Se status for 'lancada', verificar se existe prestação PAGA anteriormente
-        if status == 'lancada':
-            cursor.execute("""
-                SELECT COUNT(*)
-                FROM PrestacaoContas
-                WHERE contrato_id = ? AND mes = ? AND ano = ? AND ativo = 1 AND status = 'paga'
-            """, (contrato_id, f"{mes:02d}", str(ano)))
-
-            tem_prestacao_paga = cursor.fetchone()[0]
-            if tem_prestacao_paga == 0:
-                raise Exception("ERRO: Só é possível LANÇAR prestação que foi PAGA anteriormente. Marque como PAGA primeiro.")
-
-        # VALIDACAO 4: Buscar faturas relacionadas ao contrato para marcar como "Lancada"
-        cursor.execute("""
-            SELECT id, referencia, status
-            FROM PrestacaoContas
-            WHERE contrato_id = ? AND mes = ? AND ano = ? AND ativo = 1
-        """, (contrato_id, f"{mes:02d}", str(ano)))
-
-        faturas_relacionadas = cursor.fetchall()
-
-        # Configurar estrutura da tabela para histórico completo (sempre criar nova prestação)
-        try:
-            cursor.execute("SELECT contrato_id FROM PrestacaoContas WHERE 1=0")
-            tem_contrato_id = True
-            print("Campo contrato_id já existe")
-            print(f"FORÇANDO DEBUG AQUI - Arquivo foi recarregado corretamente!")
-        except:
-            # print("AVISO: Campo contrato_id nao existe na tabela PrestacaoContas - adicionando...")
-            try:
-                cursor.execute("ALTER TABLE PrestacaoContas ADD contrato_id INT")
-                print("Campo contrato_id adicionado")
-                conn.commit()
-                tem_contrato_id = True
-            except Exception as alter_error:
-                print(f"Erro ao adicionar campo contrato_id: {alter_error}")
-                tem_contrato_id = False
-
-        # Verificar/criar campo para dados_financeiros_json
-        try:
-            cursor.execute("SELECT dados_financeiros_json FROM PrestacaoContas WHERE 1=0")
-            print("Campo dados_financeiros_json já existe")
-        except:
-            try:
-                cursor.execute("ALTER TABLE PrestacaoContas ADD dados_financeiros_json NVARCHAR(MAX)")
-                print("Campo dados_financeiros_json adicionado para salvar descontos")
-                conn.commit()
-            except Exception as alter_error:
-                print(f"Erro ao adicionar campo dados_financeiros_json: {alter_error}")
-        
-        # Remover qualquer constraint UNIQUE que impeça histórico completo
-        try:
-            # Remover constraint antiga se existir
-            cursor.execute("ALTER TABLE PrestacaoContas DROP CONSTRAINT UK_PrestacaoContas_Cliente_Periodo")
-            print("Constraint UNIQUE antiga removida - histórico completo habilitado")
-        except:
-            pass  # Constraint já foi removida ou não existia
-            
-        try:
-            # Remover constraint nova também (não queremos UNIQUE para histórico completo)
-            cursor.execute("ALTER TABLE PrestacaoContas DROP CONSTRAINT UK_PrestacaoContas_Contrato_Periodo")
-            print("Constraint UNIQUE por contrato removida - histórico completo habilitado")
-        except:
-            pass  # Constraint não existia
-        
-        conn.commit()
-        
-        # LÓGICA CONDICIONAL: Atualizar existente OU criar nova baseado no tipo_prestacao
-        prestacao_id = None
-
-        # SE for fatura_existente, tenta atualizar uma prestação existente primeiro
-        if tipo_prestacao == 'fatura_existente' and faturas_relacionadas:
-            # Buscar prestação existente não lançada para atualizar
-            cursor.execute("""
-                SELECT id FROM PrestacaoContas
-                WHERE contrato_id = ? AND mes = ? AND ano = ? AND ativo = 1
-                AND status IN ('pendente', 'paga') AND status != 'lancada'
-                ORDER BY data_criacao DESC
-            """, (contrato_id, f"{mes:02d}", str(ano)))
-
-            prestacao_existente = cursor.fetchone()
-            if prestacao_existente:
-                prestacao_id = prestacao_existente[0]
-                # Atualizar prestação existente
-                cursor.execute("""
-                    UPDATE PrestacaoContas
-                    SET valor_pago = ?, valor_vencido = ?, encargos = ?, deducoes = ?,
-                        total_bruto = ?, total_liquido = ?, status = ?,
-                        pagamento_atrasado = ?, observacoes_manuais = ?, data_atualizacao = GETDATE()
-                    WHERE id = ?
-                """, (
-                    dados_financeiros.get('valor_pago', 0),
-                    dados_financeiros.get('valor_vencido', 0),
-                    dados_financeiros.get('encargos', 0),
-                    dados_financeiros.get('deducoes', 0),
-                    dados_financeiros.get('total_bruto', 0),
-                    dados_financeiros.get('total_liquido', 0),
-                    status,
-                    status == 'atrasado',
-                    observacoes,
-                    prestacao_id
-                ))
-                print(f"Prestação existente atualizada - ID: {prestacao_id}")
-
-        # SE não foi atualizada uma existente, criar nova (comportamento original preservado)
-        if prestacao_id is None:
-            # print(f"HISTORICO COMPLETO: Criando nova prestacao para contrato {contrato_id} em {mes:02d}/{ano}")
-            # Inserir nova prestação com contrato_id
-            if tem_contrato_id:
-                # print(f"Criando nova prestacao para contrato {contrato_id}")
-                #  EXPANDIDO: Incluir novos campos se existirem
-                campos_insert = [
-                    'locador_id', 'contrato_id', 'mes', 'ano', 'referencia', 'valor_pago', 'valor_vencido',
-                    'encargos', 'deducoes', 'total_bruto', 'total_liquido', 'status',
-                    'pagamento_atrasado', 'observacoes_manuais', 'data_criacao', 'data_atualizacao', 'ativo'
-                ]
-                valores_insert = [
-                    locador_id,
-                    contrato_id,
-                    f"{mes:02d}",
-                    str(ano),
-                    referencia,
-                    dados_financeiros.get('valor_pago', 0),
-                    dados_financeiros.get('valor_vencido', 0),
-                    dados_financeiros.get('encargos', 0),
-                    dados_financeiros.get('deducoes', 0),
-                    dados_financeiros.get('total_bruto', 0),
-                    dados_financeiros.get('total_liquido', 0),
-                    status,
-                    status == 'atrasado',
-                    observacoes,
-                    data_vencimento_calculada,
-                    1  # ativo
-                ]
-
-                #  ADICIONAR NOVOS CAMPOS (se fornecidos)
-                if valor_boleto is not None:
-                    campos_insert.append('valor_boleto')
-                    valores_insert.append(valor_boleto)
-
-                if total_retido is not None:
-                    campos_insert.append('total_retido')
-                    valores_insert.append(total_retido)
-
-                if valor_repasse is not None:
-                    campos_insert.append('valor_repasse')
-                    valores_insert.append(valor_repasse)
-
-                if tipo_calculo is not None:
-                    campos_insert.append('tipo_calculo')
-                    valores_insert.append(tipo_calculo)
-
-                if multa_rescisoria is not None:
-                    campos_insert.append('multa_rescisoria')
-                    valores_insert.append(multa_rescisoria)
-
-                if detalhamento_completo is not None:
-                    import json
-                    campos_insert.append('detalhamento_json')
-                    valores_insert.append(json.dumps(detalhamento_completo, ensure_ascii=False))
-
-                #  ADICIONAR dados_financeiros completos em JSON (incluindo descontos)
-                if dados_financeiros is not None:
-                    import json
-                    campos_insert.append('dados_financeiros_json')
-                    valores_insert.append(json.dumps(dados_financeiros, ensure_ascii=False))
-
-                # Os campos data_criacao, data_atualizacao, ativo já estão na lista inicial
-
-                # Montar SQL dinamicamente
-                placeholders = []
-                valores_final = []
-                print(f"DEBUG FINAL: campos_insert({len(campos_insert)}): {campos_insert}")
-                print(f"DEBUG FINAL: valores_insert({len(valores_insert)}): {valores_insert}")
-
-                valor_index = 0  # Contador separado para valores
-                for i, campo in enumerate(campos_insert):
-                    if campo in ['data_atualizacao']:
-                        placeholders.append('GETDATE()')
-                        print(f"   Campo {i} '{campo}' -> GETDATE() (no consome valor)")
-                    else:
-                        placeholders.append('?')
-                        if valor_index < len(valores_insert):
-                            valores_final.append(valores_insert[valor_index])
-                            print(f"   Campo {i} '{campo}' -> valor '{valores_insert[valor_index]}'")
-                            valor_index += 1
-                        else:
-                            print(f"   ERRO: Campo {i} '{campo}' -> NDICE VALOR {valor_index} FORA DE RANGE! (max={len(valores_insert)-1})")
-                            raise IndexError(f"Campo '{campo}' índice valor {valor_index} fora de range. campos={len(campos_insert)}, valores={len(valores_insert)}")
-
-                sql_insert = f"""
-                    INSERT INTO PrestacaoContas ({', '.join(campos_insert)})
-                    VALUES ({', '.join(placeholders)})
-                """
-
-                cursor.execute(sql_insert, valores_final)
-            else:
-                # Fallback para versão sem contrato_id
-                # print(f"Criando nova prestacao (fallback - sem contrato_id)")
-                cursor.execute("""
-                INSERT INTO PrestacaoContas (
-                    locador_id, mes, ano, referencia, valor_pago, valor_vencido,
-                    encargos, deducoes, total_bruto, total_liquido, status,
-                    pagamento_atrasado, observacoes_manuais, data_criacao, data_atualizacao, ativo
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, GETDATE(), 1)
-                """, (
-                    locador_id,
-                    f"{mes:02d}",
-                    str(ano),
-                    referencia,
-                    dados_financeiros.get('valor_pago', 0),
-                    dados_financeiros.get('valor_vencido', 0),
-                    dados_financeiros.get('encargos', 0),
-                    dados_financeiros.get('deducoes', 0),
-                    dados_financeiros.get('total_bruto', 0),
-                    dados_financeiros.get('total_liquido', 0),
-                    status,
-                    status == 'atrasado',
-                    observacoes,
-                    data_vencimento_calculada
-                ))
-
-            # Obter ID da prestação recém criada (apenas se foi criada nova)
-            cursor.execute("SELECT @@IDENTITY")
-            prestacao_id = cursor.fetchone()[0]
-        
-        # Inserir lançamentos extras se houver
-        if lancamentos_extras:
-            ordem = 1000  # Começar lançamentos extras após os automáticos
-            for lancamento in lancamentos_extras:
-                cursor.execute("""
-                    INSERT INTO LancamentosPrestacaoContas (
-                        prestacao_id, tipo, descricao, valor, categoria, origem, ordem_exibicao, data_lancamento, data_criacao, ativo
-                    ) VALUES (?, ?, ?, ?, 'extra', 'usuario', ?, GETDATE(), GETDATE(), 1)
-                """, (
-                    prestacao_id,
-                    f"extra_{lancamento.get('tipo', 'indefinido')}",
-                    lancamento.get('descricao', 'Lançamento extra'),
-                    lancamento.get('valor', 0),
-                    ordem
-                ))
-                ordem += 1
-        
-        #  LANÇAMENTOS AUTOMÁTICOS REMOVIDOS
-        # Agora todos os lançamentos são gerados pelo frontend e salvos via salvar_lancamentos_detalhados_completos()
-        # Isso garante que apenas os itens que o usuário NÃO deletou sejam salvos no banco
-        if False:  # BLOCO AUTOMATICO COMPLETAMENTE DESABILITADO
-            # Preparar informações de mês/ano para descrições
-            nomes_meses = {
-                1: 'Janeiro', 2: 'Fevereiro', 3: 'Março', 4: 'Abril',
-                5: 'Maio', 6: 'Junho', 7: 'Julho', 8: 'Agosto',
-                9: 'Setembro', 10: 'Outubro', 11: 'Novembro', 12: 'Dezembro'
-            }
-            nome_mes = nomes_meses.get(mes, str(mes))
-            ordem = 1
-
-            # Aluguel
-            if contrato_dados.get('valor_aluguel', 0) > 0:
-                cursor.execute("""
-                    INSERT INTO LancamentosPrestacaoContas (
-                        prestacao_id, tipo, descricao, valor, categoria, origem, ordem_exibicao, data_lancamento, data_criacao, ativo
-                    ) VALUES (?, 'termo_aluguel', ?, ?, 'termo', 'sistema_automatico', ?, GETDATE(), GETDATE(), 1)
-                """, (prestacao_id, f'Aluguel - {mes:02d}/{ano}', contrato_dados.get('valor_aluguel', 0), ordem))
-                ordem += 1
-            
-            # Primeiro adicionar valores do termo (boleto)
-            if contrato_dados.get('valor_condominio', 0) > 0:
-                cursor.execute("""
-                    INSERT INTO LancamentosPrestacaoContas (
-                        prestacao_id, tipo, descricao, valor, categoria, origem, ordem_exibicao, data_lancamento, data_criacao, ativo
-                    ) VALUES (?, 'termo_condominio', ?, ?, 'termo', 'sistema_automatico', ?, GETDATE(), GETDATE(), 1)
-                """, (prestacao_id, f'Condomínio - {mes:02d}/{ano}', contrato_dados.get('valor_condominio', 0), ordem))
-                ordem += 1
-
-            if contrato_dados.get('valor_fci', 0) > 0:
-                cursor.execute("""
-                    INSERT INTO LancamentosPrestacaoContas (
-                        prestacao_id, tipo, descricao, valor, categoria, origem, ordem_exibicao, data_lancamento, data_criacao, ativo
-                    ) VALUES (?, 'termo_fci', ?, ?, 'termo', 'sistema_automatico', ?, GETDATE(), GETDATE(), 1)
-                """, (prestacao_id, f'FCI - {mes:02d}/{ano}', contrato_dados.get('valor_fci', 0), ordem))
-                ordem += 1
-
-            if contrato_dados.get('valor_iptu', 0) > 0:
-                # Calcular parcela de IPTU se houver informações
-                desc_iptu = f'IPTU - {nome_mes}/{ano}'
-                if contrato_dados.get('data_inicio_iptu') and contrato_dados.get('parcelas_iptu'):
-                    try:
-                        from datetime import datetime
-                        inicio_iptu = datetime.strptime(contrato_dados['data_inicio_iptu'], '%Y-%m-%d')
-                        mes_atual = datetime(ano, mes, 1)
-                        meses_diff = (mes_atual.year - inicio_iptu.year) * 12 + (mes_atual.month - inicio_iptu.month)
-                        parcela_atual = meses_diff + 1
-                        total_parcelas = contrato_dados['parcelas_iptu']
-                        if 1 <= parcela_atual <= total_parcelas:
-                            desc_iptu = f'IPTU - {nome_mes}/{ano} (Parcela {parcela_atual}/{total_parcelas})'
-                    except:
-                        pass
-
-                cursor.execute("""
-                    INSERT INTO LancamentosPrestacaoContas (
-                        prestacao_id, tipo, descricao, valor, categoria, origem, ordem_exibicao, data_lancamento, data_criacao, ativo
-                    ) VALUES (?, 'termo_iptu', ?, ?, 'termo', 'sistema_automatico', ?, GETDATE(), GETDATE(), 1)
-                """, (prestacao_id, desc_iptu, contrato_dados.get('valor_iptu', 0), ordem))
-                ordem += 1
-
-            # Seguros (valores do termo)
-            if contrato_dados.get('valor_seguro_fianca', 0) > 0:
-                # Calcular parcela de Seguro Fiança
-                desc_seguro = f'Seguro Fiança - {nome_mes}/{ano}'
-                if contrato_dados.get('seguro_fianca_inicio') and contrato_dados.get('parcelas_seguro_fianca'):
-                    try:
-                        from datetime import datetime
-                        inicio_seguro = datetime.strptime(contrato_dados['seguro_fianca_inicio'], '%Y-%m-%d')
-                        mes_atual = datetime(ano, mes, 1)
-                        meses_diff = (mes_atual.year - inicio_seguro.year) * 12 + (mes_atual.month - inicio_seguro.month)
-                        parcela_atual = meses_diff + 1
-                        total_parcelas = contrato_dados['parcelas_seguro_fianca']
-                        if 1 <= parcela_atual <= total_parcelas:
-                            desc_seguro = f'Seguro Fiança - {nome_mes}/{ano} (Parcela {parcela_atual}/{total_parcelas})'
-                    except:
-                        pass
-
-                cursor.execute("""
-                    INSERT INTO LancamentosPrestacaoContas (
-                        prestacao_id, tipo, descricao, valor, categoria, origem, ordem_exibicao, data_lancamento, data_criacao, ativo
-                    ) VALUES (?, 'termo_seguro_fianca', ?, ?, 'termo', 'sistema_automatico', ?, GETDATE(), GETDATE(), 1)
-                """, (prestacao_id, desc_seguro, contrato_dados.get('valor_seguro_fianca', 0), ordem))
-                ordem += 1
-
-            valor_seguro_incendio = contrato_dados.get('valor_seguro_incendio')
-            if valor_seguro_incendio is not None and valor_seguro_incendio > 0:
-                # Calcular parcela de Seguro Incêndio
-                desc_incendio = f'Seguro Incêndio - {nome_mes}/{ano}'
-                if contrato_dados.get('seguro_incendio_inicio') and contrato_dados.get('parcelas_seguro_incendio'):
-                    try:
-                        from datetime import datetime
-                        inicio_incendio = datetime.strptime(contrato_dados['seguro_incendio_inicio'], '%Y-%m-%d')
-                        mes_atual = datetime(ano, mes, 1)
-                        meses_diff = (mes_atual.year - inicio_incendio.year) * 12 + (mes_atual.month - inicio_incendio.month)
-                        parcela_atual = meses_diff + 1
-                        total_parcelas = contrato_dados['parcelas_seguro_incendio']
-                        if 1 <= parcela_atual <= total_parcelas:
-                            desc_incendio = f'Seguro Incêndio - {nome_mes}/{ano} (Parcela {parcela_atual}/{total_parcelas})'
-                    except:
-                        pass
-
-                cursor.execute("""
-                    INSERT INTO LancamentosPrestacaoContas (
-                        prestacao_id, tipo, descricao, valor, categoria, origem, ordem_exibicao, data_lancamento, data_criacao, ativo
-                    ) VALUES (?, 'termo_seguro_incendio', ?, ?, 'termo', 'sistema_automatico', ?, GETDATE(), GETDATE(), 1)
-                """, (prestacao_id, desc_incendio, valor_seguro_incendio, ordem))
-                ordem += 1
-
-            # Valores retidos (deduzidos do repasse)
-            if contrato_dados.get('retido_condominio') and contrato_dados.get('valor_condominio', 0) > 0:
-                cursor.execute("""
-                    INSERT INTO LancamentosPrestacaoContas (
-                        prestacao_id, tipo, descricao, valor, categoria, origem, ordem_exibicao, data_lancamento, data_criacao, ativo
-                    ) VALUES (?, 'retido_condominio', ?, ?, 'retido', 'sistema_automatico', ?, GETDATE(), GETDATE(), 1)
-                """, (prestacao_id, f'Condomínio (Retido) - {nome_mes}/{ano}', -contrato_dados.get('valor_condominio', 0), ordem))
-                ordem += 1
-
-            if contrato_dados.get('retido_fci') and contrato_dados.get('valor_fci', 0) > 0:
-                cursor.execute("""
-                    INSERT INTO LancamentosPrestacaoContas (
-                        prestacao_id, tipo, descricao, valor, categoria, origem, ordem_exibicao, data_lancamento, data_criacao, ativo
-                    ) VALUES (?, 'retido_fci', ?, ?, 'retido', 'sistema_automatico', ?, GETDATE(), GETDATE(), 1)
-                """, (prestacao_id, f'FCI (Retido) - {nome_mes}/{ano}', -contrato_dados.get('valor_fci', 0), ordem))
-                ordem += 1
-
-            if contrato_dados.get('retido_iptu') and contrato_dados.get('valor_iptu', 0) > 0:
-                cursor.execute("""
-                    INSERT INTO LancamentosPrestacaoContas (
-                        prestacao_id, tipo, descricao, valor, categoria, origem, ordem_exibicao, data_lancamento, data_criacao, ativo
-                    ) VALUES (?, 'retido_iptu', ?, ?, 'retido', 'sistema_automatico', ?, GETDATE(), GETDATE(), 1)
-                """, (prestacao_id, f'IPTU (Retido) - {nome_mes}/{ano}', -contrato_dados.get('valor_iptu', 0), ordem))
-                ordem += 1
-
-            if contrato_dados.get('retido_seguro_fianca') and contrato_dados.get('valor_seguro_fianca', 0) > 0:
-                cursor.execute("""
-                    INSERT INTO LancamentosPrestacaoContas (
-                        prestacao_id, tipo, descricao, valor, categoria, origem, ordem_exibicao, data_lancamento, data_criacao, ativo
-                    ) VALUES (?, 'retido_seguro_fianca', ?, ?, 'retido', 'sistema_automatico', ?, GETDATE(), GETDATE(), 1)
-                """, (prestacao_id, f'Seguro Fiança (Retido) - {nome_mes}/{ano}', -contrato_dados.get('valor_seguro_fianca', 0), ordem))
-                ordem += 1
-
-            if contrato_dados.get('retido_seguro_incendio') and valor_seguro_incendio is not None and valor_seguro_incendio > 0:
-                cursor.execute("""
-                    INSERT INTO LancamentosPrestacaoContas (
-                        prestacao_id, tipo, descricao, valor, categoria, origem, ordem_exibicao, data_lancamento, data_criacao, ativo
-                    ) VALUES (?, 'retido_seguro_incendio', ?, ?, 'retido', 'sistema_automatico', ?, GETDATE(), GETDATE(), 1)
-                """, (prestacao_id, f'Seguro Incêndio (Retido) - {nome_mes}/{ano}', -valor_seguro_incendio, ordem))
-                ordem += 1
-            
-            # Antecipações (5% de taxa)
-            if contrato_dados.get('antecipa_condominio') and contrato_dados.get('valor_condominio', 0) > 0:
-                taxa = contrato_dados.get('valor_condominio', 0) * 0.05
-                cursor.execute("""
-                    INSERT INTO LancamentosPrestacaoContas (
-                        prestacao_id, tipo, descricao, valor, categoria, origem, ordem_exibicao, data_lancamento, data_criacao, ativo
-                    ) VALUES (?, 'taxa_antecipacao_condominio', ?, ?, 'taxa', 'sistema_automatico', ?, GETDATE(), GETDATE(), 1)
-                """, (prestacao_id, f'Taxa Antecipação Condomínio (5%) - {nome_mes}/{ano}', -taxa, ordem))
-                ordem += 1
-
-            if contrato_dados.get('antecipa_seguro_fianca') and contrato_dados.get('valor_seguro_fianca', 0) > 0:
-                taxa = contrato_dados.get('valor_seguro_fianca', 0) * 0.05
-                cursor.execute("""
-                    INSERT INTO LancamentosPrestacaoContas (
-                        prestacao_id, tipo, descricao, valor, categoria, origem, ordem_exibicao, data_lancamento, data_criacao, ativo
-                    ) VALUES (?, 'taxa_antecipacao_seguro_fianca', ?, ?, 'taxa', 'sistema_automatico', ?, GETDATE(), GETDATE(), 1)
-                """, (prestacao_id, f'Taxa Antecipação Seguro Fiança (5%) - {nome_mes}/{ano}', -taxa, ordem))
-                ordem += 1
-
-            if contrato_dados.get('antecipa_iptu') and contrato_dados.get('valor_iptu', 0) > 0:
-                taxa = contrato_dados.get('valor_iptu', 0) * 0.05
-                cursor.execute("""
-                    INSERT INTO LancamentosPrestacaoContas (
-                        prestacao_id, tipo, descricao, valor, categoria, origem, ordem_exibicao, data_lancamento, data_criacao, ativo
-                    ) VALUES (?, 'taxa_antecipacao_iptu', ?, ?, 'taxa', 'sistema_automatico', ?, GETDATE(), GETDATE(), 1)
-                """, (prestacao_id, f'Taxa Antecipação IPTU (5%) - {nome_mes}/{ano}', -taxa, ordem))
-                ordem += 1
-
-            if contrato_dados.get('antecipa_seguro_incendio') and valor_seguro_incendio is not None and valor_seguro_incendio > 0:
-                taxa = valor_seguro_incendio * 0.05
-                cursor.execute("""
-                    INSERT INTO LancamentosPrestacaoContas (
-                        prestacao_id, tipo, descricao, valor, categoria, origem, ordem_exibicao, data_lancamento, data_criacao, ativo
-                    ) VALUES (?, 'taxa_antecipacao_seguro_incendio', ?, ?, 'taxa', 'sistema_automatico', ?, GETDATE(), GETDATE(), 1)
-                """, (prestacao_id, f'Taxa Antecipação Seguro Incêndio (5%) - {nome_mes}/{ano}', -taxa, ordem))
-                ordem += 1
-
-            # Taxa de administração
-            if contrato_dados.get('taxa_administracao', 0) > 0 and contrato_dados.get('valor_aluguel', 0) > 0:
-                aluguel = contrato_dados.get('valor_aluguel', 0)
-                desconto = contrato_dados.get('bonificacao', 0)
-                base_calculo = aluguel - desconto
-                taxa_admin = base_calculo * (contrato_dados.get('taxa_administracao', 0) / 100)
-
-                cursor.execute("""
-                    INSERT INTO LancamentosPrestacaoContas (
-                        prestacao_id, tipo, descricao, valor, categoria, origem, ordem_exibicao, data_lancamento, data_criacao, ativo
-                    ) VALUES (?, 'taxa_administracao', ?, ?, 'taxa', 'sistema_automatico', ?, GETDATE(), GETDATE(), 1)
-                """, (prestacao_id, f'Taxa de Administração ({contrato_dados["taxa_administracao"]}%) - {nome_mes}/{ano}', -taxa_admin, ordem))
-                ordem += 1
-
-            # Atualizar totais calculados na prestação principal
-            cursor.execute("""
-                SELECT
-                    SUM(CASE WHEN valor > 0 THEN valor ELSE 0 END) as total_positivo,
-                    SUM(CASE WHEN valor < 0 THEN ABS(valor) ELSE 0 END) as total_negativo
-                FROM LancamentosPrestacaoContas
-                WHERE prestacao_id = ? AND ativo = 1
-            """, (prestacao_id,))
-
-            totais = cursor.fetchone()
-            if totais:
-                total_pos = float(totais[0] or 0)
-                total_neg = float(totais[1] or 0)
-                valor_repasse = total_pos - total_neg
-
-                cursor.execute("""
-                    UPDATE PrestacaoContas
-                    SET valor_boleto = ?, total_retido = ?, valor_repasse = ?, data_atualizacao = GETDATE()
-                    WHERE id = ?
-                """, (total_pos, total_neg, valor_repasse, prestacao_id))
-
-                print(f"Totais atualizados: Boleto=R$ {total_pos:.2f}, Retido=R$ {total_neg:.2f}, Repasse=R$ {valor_repasse:.2f}")
-
-        # FUNCIONALIDADE 1: Marcar APENAS faturas PAGAS como "Lancada"
-        if faturas_relacionadas:
-            fatura_ids = [str(fatura[0]) for fatura in faturas_relacionadas]
-            if fatura_ids:
-                cursor.execute(f"""
-                    UPDATE PrestacaoContas
-                    SET status = 'lancada', data_atualizacao = GETDATE()
-                    WHERE id IN ({','.join(['?' for _ in fatura_ids])}) AND status = 'paga'
-                """, fatura_ids)
-
-                faturas_atualizadas = cursor.rowcount
-                if faturas_atualizadas > 0:
-                    print(f"Faturas marcadas como 'Lancada': {faturas_atualizadas}")
-        else:
-            print(f"Nenhuma fatura encontrada para marcar como 'Lancada' para contrato {contrato_id} no mes {mes:02d}/{ano}")
-
-        # FUNCIONALIDADE 2: Marcar prestação como lançada (sempre quando for fatura_existente)
-        if tipo_prestacao == 'fatura_existente' or status == 'lancada':
-            cursor.execute("""
-                UPDATE PrestacaoContas
-                SET status = 'lancada', data_atualizacao = GETDATE()
-                WHERE id = ?
-            """, (prestacao_id,))
-
-        conn.commit()
-        conn.close()
-        
-        print(f"Prestação de contas salva com sucesso - ID: {prestacao_id}")
-        return {
-            "success": True,
-            "prestacao_id": prestacao_id,
-            "locador_id": locador_id,
-            "referencia": referencia
-        }
-        
-    except Exception as e:
-        print(f"Erro ao salvar prestação de contas: {e}")
-        if conn:
-            conn.rollback()
-            conn.close()
-        raise e
+                          total_retido=None, valor_repasse=None, tipo_calculo=None, multa_rescisoria=None,
+                          descontos_ajustes=None, lancamentos_completos=None, repasse_por_locador=None):
+    """
+    Salva uma nova prestação de contas e, se informados, seus descontos,
+    lançamentos detalhados e distribuição por locador na mesma transação
+    (gravacao_prestacoes.gravar_prestacoes)
+    """
+    resultado = gravar_prestacoes([{
+        'contrato_id': contrato_id,
+        'tipo_prestacao': tipo_prestacao,
+        'dados_financeiros': dados_financeiros,
+        'status': status,
+        'observacoes': observacoes,
+        'lancamentos_extras': lancamentos_extras,
+        'configuracao_fatura': configuracao_fatura,
+        'detalhamento_completo': detalhamento_completo,
+        'valor_boleto': valor_boleto,
+        'total_retido': total_retido,
+        'valor_repasse': valor_repasse,
+        'tipo_calculo': tipo_calculo,
+        'multa_rescisoria': multa_rescisoria,
+        'descontos_ajustes': descontos_ajustes,
+        'lancamentos_completos': lancamentos_completos,
+        'repasse_por_locador': repasse_por_locador
+    }])
+    if resultado['erros']:
+        erro = resultado['erros'][0]['erro']
+        print(f"Erro ao salvar prestação de contas: {erro}")
+        raise Exception(erro)
+
+    invalidar_cache_faturas()
+    gravada = resultado['gravadas'][0]
+    invalidar_pdfs_prestacoes([gravada['prestacao_id']])
+    print(f"Prestação de contas salva com sucesso - ID: {gravada['prestacao_id']}")
+    return {
+        "success": True,
+        "prestacao_id": gravada['prestacao_id'],
+        "locador_id": gravada['locador_id'],
+        "referencia": gravada['referencia'],
+        "lancamentos_salvos": gravada['lancamentos_salvos'],
+        "descontos_salvos": gravada['descontos_salvos'],
+        "locadores_distribuidos": gravada['locadores_distribuidos']
+    }
+
+def salvar_prestacoes_contas_lote(prestacoes):
+    """
+    Salva várias prestações novas (mesmos campos de salvar_prestacao_contas)
+    em uma transação. Itens inválidos voltam em 'erros' sem impedir os demais.
+    """
+    resultado = gravar_prestacoes(prestacoes)
+    if resultado['gravadas']:
+        invalidar_cache_faturas()
+        invalidar_pdfs_prestacoes(gravada['prestacao_id'] for gravada in resultado['gravadas'])
+    return resultado
 
 def buscar_prestacao_detalhada(prestacao_id):
     """Busca prestação de contas com todos os detalhes incluindo novos campos"""
     try:
-        conn = get_conexao()
-        cursor = conn.cursor()
-
-        # Buscar prestação com todos os campos
-        cursor.execute("""
-            SELECT
-                id, contrato_id, mes, ano, status, valor_pago, valor_vencido,
-                encargos, deducoes, total_bruto, total_liquido, observacoes_manuais,
-                data_criacao, data_atualizacao,
-                -- Novos campos
-                valor_boleto, total_retido, valor_repasse, tipo_calculo,
-                multa_rescisoria, detalhamento_json,
-                -- Campos de acréscimos
-                valor_acrescimos, valor_total_com_acrescimos, data_calculo_acrescimos,
-                -- Campo de pagamento
-                data_pagamento
-            FROM PrestacaoContas
-            WHERE id = ? AND ativo = 1
-        """, (prestacao_id,))
-
-        prestacao = cursor.fetchone()
-        if not prestacao:
-            return None
-
-        # Converter para dicionário
-        prestacao_dict = {
-            'id': prestacao[0],
-            'contrato_id': prestacao[1],
-            'mes': prestacao[2],
-            'ano': prestacao[3],
-            'status': prestacao[4],
-            'valor_pago': prestacao[5],
-            'valor_vencido': prestacao[6],
-            'encargos': prestacao[7],
-            'deducoes': prestacao[8],
-            'total_bruto': prestacao[9],
-            'total_liquido': prestacao[10],
-            'observacoes_manuais': prestacao[11],
-            'data_criacao': prestacao[12].isoformat() if prestacao[12] else None,
-            'data_atualizacao': prestacao[13].isoformat() if prestacao[13] else None,
-            # Novos campos
-            'valor_boleto': prestacao[14],
-            'total_retido': prestacao[15],
-            'valor_repasse': prestacao[16],
-            'tipo_calculo': prestacao[17],
-            'multa_rescisoria': prestacao[18],
-            'detalhamento_json': prestacao[19],
-            # Campos de acréscimos
-            'valor_acrescimos': prestacao[20] if len(prestacao) > 20 else 0,
-            'valor_total_com_acrescimos': prestacao[21] if len(prestacao) > 21 else None,
-            'data_calculo_acrescimos': prestacao[22] if len(prestacao) > 22 else None,
-            # Campo de pagamento - DEBUG DETALHADO
-            'data_pagamento': prestacao[23].isoformat() if len(prestacao) > 23 and prestacao[23] else None
-        }
-
-
-        # Calcular data_vencimento usando vencimento_dia do contrato
-        cursor.execute("SELECT vencimento_dia FROM Contratos WHERE id = ?", (prestacao_dict['contrato_id'],))
-        contrato_result = cursor.fetchone()
-        dia_vencimento = contrato_result[0] if contrato_result and contrato_result[0] else 10
-
-        # Construir data_vencimento completa
-        try:
-            import calendar
-            from datetime import datetime
-            mes = int(prestacao_dict['mes'])
-            ano = int(prestacao_dict['ano'])
-            max_dia = calendar.monthrange(ano, mes)[1]
-            dia_vencimento = min(dia_vencimento, max_dia)
-            data_vencimento = datetime(ano, mes, dia_vencimento).strftime('%Y-%m-%d')
-            prestacao_dict['data_vencimento'] = data_vencimento
-        except:
-            prestacao_dict['data_vencimento'] = None
-
-        # Parse do JSON se existir
-        if prestacao_dict['detalhamento_json']:
-            import json
-            try:
-                prestacao_dict['detalhamento_json'] = json.loads(prestacao_dict['detalhamento_json'])
-            except:
-                prestacao_dict['detalhamento_json'] = None
-
-        # Buscar dados do contrato incluindo dia de vencimento
-        print(f"DEBUG - Buscando dados do contrato_id: {prestacao_dict['contrato_id']}")
-        cursor.execute("""
-            SELECT c.id, c.valor_aluguel, c.taxa_administracao, c.vencimento_dia,
-                   c.id_imovel, cl.locatario_id,
-                   i.endereco as imovel_endereco, i.tipo as imovel_tipo,
-                   l.nome as locatario_nome, l.telefone as locatario_telefone,
-                   l.email as locatario_email, l.cpf_cnpj as locatario_cpf,
-                   c.percentual_multa_atraso
-            FROM Contratos c
-            LEFT JOIN Imoveis i ON c.id_imovel = i.id
-            LEFT JOIN ContratoLocatarios cl ON c.id = cl.contrato_id AND cl.responsabilidade_principal = 1
-            LEFT JOIN Locatarios l ON cl.locatario_id = l.id
-            WHERE c.id = ?
-        """, (prestacao_dict['contrato_id'],))
-
-        contrato = cursor.fetchone()
-        print(f"DEBUG - Dados do contrato encontrados: {contrato}")
-        if contrato:
-            prestacao_dict['contrato'] = {
-                'id': contrato[0],
-                'valor_aluguel': contrato[1],
-                'taxa_administracao': contrato[2],
-                'vencimento_dia': contrato[3],
-                'id_imovel': contrato[4],
-                'id_locatario': contrato[5],
-                'imovel_endereco': contrato[6],
-                'imovel_tipo': contrato[7],
-                'locatario_nome': contrato[8],
-                'locatario_telefone': contrato[9],
-                'locatario_email': contrato[10],
-                'locatario_cpf': contrato[11],
-                'percentual_multa_atraso': contrato[12]
-            }
-            print(f"DEBUG - Dados do contrato processados: {prestacao_dict['contrato']}")
-
-            # Calcular data de vencimento baseada no mês/ano da prestação e dia do contrato
-            import calendar
-            from datetime import datetime
-
-            # Garantir que mes e ano são inteiros
-            mes = int(prestacao_dict.get('mes', 1))
-            ano = int(prestacao_dict.get('ano', datetime.now().year))
-            dia_vencimento = int(contrato[3]) if contrato[3] else 10  # Default dia 10
-
-            # Ajustar dia se for maior que os dias do mês
-            max_dia = calendar.monthrange(ano, mes)[1]
-            dia_vencimento = min(dia_vencimento, max_dia)
-
-            data_vencimento = datetime(ano, mes, dia_vencimento).strftime('%Y-%m-%d')
-
-            # Adicionar as datas calculadas
-            prestacao_dict['data_vencimento'] = data_vencimento
-            # data_pagamento já foi definido corretamente na linha 4542
-
-            # Calcular acréscimos automaticamente se vencido
-            from datetime import datetime
-            data_venc_obj = datetime.strptime(data_vencimento, '%Y-%m-%d')
-            hoje = datetime.now()
-
-            if hoje > data_venc_obj and not prestacao_dict.get('data_pagamento'):
-                dias_atraso = (hoje - data_venc_obj).days
-                valor_boleto = float(prestacao_dict.get('valor_boleto', 0) or prestacao_dict.get('total_bruto', 0))
-
-                if dias_atraso > 0 and valor_boleto > 0:
-                    # Usar a mesma fórmula que o endpoint buscar_faturas
-                    # percentual_multa_atraso do contrato (padrão 2%) + juros de 0.033% ao dia
-                    percentual_multa = float(prestacao_dict['contrato'].get('percentual_multa_atraso', 2.0) or 2.0)
-                    valor_acrescimos = valor_boleto * (
-                        # Multa: percentual do contrato
-                        (percentual_multa / 100) +
-                        # Juros: 1% ao mês = 0.033% ao dia
-                        (dias_atraso * 0.00033)
-                    )
-
-                    prestacao_dict['dias_atraso'] = dias_atraso
-                    prestacao_dict['valor_acrescimos'] = valor_acrescimos
-                    prestacao_dict['valor_total_com_acrescimos'] = valor_boleto + valor_acrescimos
-
-                    print(f"ACRESCIMOS CALCULADOS: {dias_atraso} dias de atraso = R$ {valor_acrescimos:.2f}")
-            else:
-                prestacao_dict['dias_atraso'] = 0
-                if not prestacao_dict.get('valor_acrescimos'):
-                    prestacao_dict['valor_acrescimos'] = 0
-                    prestacao_dict['valor_total_com_acrescimos'] = float(prestacao_dict.get('valor_boleto', 0) or prestacao_dict.get('total_bruto', 0))
-        else:
-            print("DEBUG - Nenhum contrato encontrado!")
-
-        # BUSCAR LANÇAMENTOS DETALHADOS DA NOVA TABELA
-        cursor.execute("""
-            SELECT tipo, descricao, valor, categoria, origem, ordem_exibicao
-            FROM LancamentosPrestacaoContas
-            WHERE prestacao_id = ? AND ativo = 1
-            ORDER BY ordem_exibicao, id
-        """, (prestacao_id,))
-
-        lancamentos_detalhados = []
-        for row in cursor.fetchall():
-            lancamentos_detalhados.append({
-                'tipo': row[0],
-                'descricao': row[1],
-                'valor': float(row[2]) if row[2] else 0,
-                'categoria': row[3],
-                'origem': row[4],
-                'ordem': row[5]
-            })
-
-        # Adicionar acréscimos como lançamento se houver
-        if prestacao_dict.get('valor_acrescimos', 0) > 0:
-            lancamentos_detalhados.append({
-                'tipo': 'acrescimo_atraso',
-                'descricao': f'Acréscimos por atraso ({prestacao_dict.get("dias_atraso", 0)} dias)',
-                'valor': prestacao_dict['valor_acrescimos'],
-                'categoria': 'acrescimo',
-                'origem': 'sistema_automatico',
-                'ordem': len(lancamentos_detalhados) + 1
-            })
-
-        prestacao_dict['lancamentos_detalhados'] = lancamentos_detalhados
-        prestacao_dict['total_lancamentos'] = len(lancamentos_detalhados)
-
-        # 🆕 BUSCAR LOCADORES DO CONTRATO COM DADOS BANCÁRIOS DA CONTA SELECIONADA NO TERMO
-        print(f"DEBUG: Buscando locadores do contrato {prestacao_dict['contrato_id']}")
-        cursor.execute("""
-            SELECT loc.id, loc.nome, loc.telefone, loc.email, loc.cpf_cnpj,
-                   cl.porcentagem, cl.responsabilidade_principal, cl.conta_bancaria_id,
-                   cb.tipo_recebimento, cb.chave_pix, cb.banco, cb.agencia, cb.conta,
-                   cb.titular, cb.cpf_titular
-            FROM ContratoLocadores cl
-            INNER JOIN Locadores loc ON cl.locador_id = loc.id
-            LEFT JOIN ContasBancariasLocador cb ON cl.conta_bancaria_id = cb.id
-            WHERE cl.contrato_id = ? AND cl.ativo = 1
-            ORDER BY cl.responsabilidade_principal DESC, loc.nome
-        """, (prestacao_dict['contrato_id'],))
-
-        locadores = []
-        for row in cursor.fetchall():
-            locador_data = {
-                'locador_id': row[0],  # Usar locador_id para compatibilidade com frontend
-                'locador_nome': row[1],  # Usar locador_nome para compatibilidade
-                'telefone': row[2],
-                'email': row[3],
-                'cpf_cnpj': row[4],
-                'porcentagem': float(row[5]) if row[5] else 100.0,
-                'responsabilidade_principal': bool(row[6]),
-                'conta_bancaria_id': row[7]
-            }
-
-            # Adicionar dados bancários da conta selecionada no termo (se existir)
-            if row[7]:  # Se tem conta_bancaria_id
-                locador_data['conta_bancaria'] = {
-                    'tipo_recebimento': row[8],
-                    'pix_chave': row[9],
-                    'banco': row[10],
-                    'agencia': row[11],
-                    'conta': row[12],
-                    'titular': row[13],
-                    'cpf_titular': row[14]
-                }
-            else:
-                locador_data['conta_bancaria'] = None
-
-            locadores.append(locador_data)
-
-        prestacao_dict['locadores'] = locadores
-
-        # 🆕 BUSCAR DISTRIBUIÇÃO DE REPASSE SALVA
-        cursor.execute("""
-            SELECT locador_id, locador_nome, percentual_participacao,
-                   valor_repasse, responsabilidade_principal
-            FROM DistribuicaoRepasseLocadores
-            WHERE prestacao_id = ? AND ativo = 1
-            ORDER BY responsabilidade_principal DESC, locador_nome
-        """, (prestacao_id,))
-
-        distribuicao_repasse = []
-        for row in cursor.fetchall():
-            distribuicao_repasse.append({
-                'locador_id': row[0],
-                'locador_nome': row[1],
-                'percentual_participacao': float(row[2]) if row[2] else 100.0,
-                'valor_repasse': float(row[3]) if row[3] else 0.0,
-                'responsabilidade_principal': bool(row[4])
-            })
-
-        prestacao_dict['distribuicao_repasse'] = distribuicao_repasse
-
-        conn.close()
-        return prestacao_dict
-
+        prestacoes = buscar_prestacoes_detalhadas("p.id = ?", [prestacao_id])
+        return prestacoes[0] if prestacoes else None
     except Exception as e:
         print(f"Erro ao buscar prestação detalhada: {e}")
         return None
@@ -6552,6 +5621,7 @@ def inserir_contrato_completo(**kwargs):
         conn.close()
         
         print(f"SUCCESS: Contrato criado com ID {contrato_id}")
+        _notificar_escrita('contratos', contrato_id)
         return {"success": True, "id": int(contrato_id), "message": "Contrato criado com sucesso"}
         
     except Exception as e:
@@ -6570,76 +5640,20 @@ def inserir_contrato_completo(**kwargs):
 def salvar_descontos_ajustes(prestacao_id, descontos_ajustes):
     """Salva descontos e ajustes na tabela LancamentosPrestacaoContas"""
     try:
-        print(f"INICIO salvar_descontos_ajustes")
-        print(f"   prestacao_id={prestacao_id}")
-        print(f"   descontos: {len(descontos_ajustes) if descontos_ajustes else 0}")
-
-        conn = get_conexao()
-        cursor = conn.cursor()
-
-        # Garantir que prestacao_id é int
-        if hasattr(prestacao_id, '__int__'):
-            prestacao_id = int(prestacao_id)
-
-        ordem = 1000  # Começar após outros lançamentos
-        for desconto in descontos_ajustes:
-            tipo_desconto = desconto.get('tipo', 'desconto_generico')
-            descricao = desconto.get('label', desconto.get('descricao', 'Desconto'))
-            valor = float(desconto.get('valor', 0))
-
-            # Pular valores zerados
-            if valor == 0:
-                continue
-
-            # Descontos são valores negativos
-            if valor > 0:
-                valor = -valor
-
-            print(f"   Inserindo desconto: {tipo_desconto} - {descricao} - {valor}")
-            cursor.execute("""
-                INSERT INTO LancamentosPrestacaoContas (
-                    prestacao_id, tipo, descricao, valor, categoria, origem,
-                    ordem_exibicao, data_lancamento, data_criacao, ativo
-                ) VALUES (?, ?, ?, ?, 'desconto', 'frontend_desconto', ?, GETDATE(), GETDATE(), 1)
-            """, (prestacao_id, tipo_desconto, descricao, valor, ordem))
+        prestacao_id = int(prestacao_id)
+        filhos = preparar_filhos({'descontos_ajustes': descontos_ajustes})
 
-            ordem += 1
-
-        # Recalcular totais após salvar descontos - CORRIGIDO para separar descontos de retidos
-        print(f" Recalculando totais aps salvar descontos...")
-        cursor.execute("""
-            SELECT
-                SUM(CASE WHEN valor > 0 THEN valor ELSE 0 END) as total_positivo,
-                SUM(CASE WHEN valor < 0 AND categoria IN ('retido', 'taxa') THEN ABS(valor) ELSE 0 END) as total_retido,
-                SUM(CASE WHEN valor < 0 AND categoria = 'desconto' THEN ABS(valor) ELSE 0 END) as total_descontos
-            FROM LancamentosPrestacaoContas
-            WHERE prestacao_id = ? AND ativo = 1
-        """, (prestacao_id,))
-
-        resultado = cursor.fetchone()
-        total_positivo_real = float(resultado[0] or 0)
-        total_retido_real = float(resultado[1] or 0)
-        total_descontos_real = float(resultado[2] or 0)
-
-        # Valor do boleto = soma de positivos - descontos (NÃO inclui retidos)
-        valor_boleto_final = total_positivo_real - total_descontos_real
-
-        print(f" Aps salvar descontos:")
-        print(f"   Total positivo: R$ {total_positivo_real:.2f}")
-        print(f"   Total retido: R$ {total_retido_real:.2f}")
-        print(f"   Total descontos: R$ {total_descontos_real:.2f}")
-        print(f"   Valor boleto final: R$ {valor_boleto_final:.2f}")
-
-        cursor.execute("""
-            UPDATE PrestacaoContas
-            SET valor_boleto = ?,
-                total_retido = ?
-            WHERE id = ?
-        """, (valor_boleto_final, total_retido_real, prestacao_id))
+        with get_conexao() as conn:
+            cursor = conn.cursor()
+            gravar_filhos(cursor, [(prestacao_id, filhos)])
+            try:
+                atualizar_agregados_prestacoes(cursor, [prestacao_id])
+            except ErroAgregados as e:
+                print(f"AVISO: Não foi possível atualizar agregados financeiros da prestação {prestacao_id}: {e}")
 
-        conn.commit()
-        print(f" Descontos/ajustes salvos com sucesso")
-        return {"success": True, "descontos_salvos": len(descontos_ajustes)}
+        invalidar_cache_faturas()
+        invalidar_pdfs_prestacoes([prestacao_id])
+        return {"success": True, "descontos_salvos": filhos['resumo']['descontos_salvos']}
 
     except Exception as e:
         print(f" Erro em salvar_descontos_ajustes: {str(e)}")
@@ -6648,197 +5662,38 @@ def salvar_descontos_ajustes(prestacao_id, descontos_ajustes):
         raise
 
 def salvar_lancamentos_detalhados_completos(prestacao_id, lancamentos_completos, mes_referencia=None, repasse_por_locador=None):
-    """Salva TODOS os lançamentos calculados no frontend"""
+    """Salva TODOS os lançamentos calculados no frontend (substitui os anteriores) e a distribuição por locador"""
     try:
-        print(f"INICIO salvar_lancamentos_detalhados_completos")
-        print(f"   prestacao_id={prestacao_id} (tipo: {type(prestacao_id)})")
-        print(f"   lancamentos: {len(lancamentos_completos) if lancamentos_completos else 0}")
-        print(f"   repasse_por_locador: {len(repasse_por_locador) if repasse_por_locador else 0}")
-
-        # Garantir que prestacao_id é int
-        if hasattr(prestacao_id, '__int__'):
-            prestacao_id = int(prestacao_id)
-            print(f"   prestacao_id convertido para int: {prestacao_id}")
+        prestacao_id = int(prestacao_id)
+        filhos = preparar_filhos({
+            'lancamentos_completos': lancamentos_completos,
+            'repasse_por_locador': repasse_por_locador
+        })
 
-        conn = get_conexao()
-        cursor = conn.cursor()
-
-        print(f"Salvando {len(lancamentos_completos)} lançamentos detalhados para prestação {prestacao_id}")
-
-        # Marcar TODOS os lançamentos anteriores como inativos para evitar duplicações
-        cursor.execute("""
-            UPDATE LancamentosPrestacaoContas
-            SET ativo = 0
-            WHERE prestacao_id = ? AND origem = 'frontend_calculado'
-        """, (prestacao_id,))
-
-        ordem = 1
-        total_positivo = 0
-        total_negativo = 0
-        lancamentos_salvos = 0
-        tipos_processados = set()  # Para evitar duplicação de tipos
-
-        # Inserir cada lançamento individual
-        for lancamento in lancamentos_completos:
-            tipo = lancamento.get('tipo', 'extra')
-            descricao = lancamento.get('descricao', 'Sem descrição')
-            valor = float(lancamento.get('valor', 0))
-            categoria = lancamento.get('categoria', 'indefinido')
-
-            # Skip valores zerados
-            if valor == 0:
-                continue
-
-            # Evitar duplicação de tipos específicos
-            # Para tipos críticos como seguro, iptu, etc., permitir apenas uma entrada
-            tipos_unicos = ['termo_seguro_incendio', 'retido_seguro_incendio',
-                           'termo_iptu', 'retido_iptu',
-                           'termo_seguro_fianca', 'retido_seguro_fianca',
-                           'termo_condominio', 'retido_condominio',
-                           'termo_fci', 'retido_fci',
-                           'taxa_administracao', 'taxa_transferencia']
-
-            if tipo in tipos_unicos:
-                if tipo in tipos_processados:
-                    print(f"    Ignorando duplicata: {tipo}")
-                    continue
-                tipos_processados.add(tipo)
-
-            # Categorizar automaticamente se não fornecido
-            if categoria == 'indefinido':
-                if tipo.startswith('termo_'):
-                    categoria = 'termo'
-                elif tipo.startswith('retido_'):
-                    categoria = 'retido'
-                elif tipo.startswith('taxa_'):
-                    categoria = 'taxa'
-                else:
-                    categoria = 'extra'
-
-            # Inserir lançamento
-            print(f"   Inserindo lançamento {ordem}: {tipo} - {valor}")
-            cursor.execute("""
-                INSERT INTO LancamentosPrestacaoContas (
-                    prestacao_id, tipo, descricao, valor, categoria, origem,
-                    ordem_exibicao, data_lancamento, data_criacao, ativo
-                ) VALUES (?, ?, ?, ?, ?, 'frontend_calculado', ?, GETDATE(), GETDATE(), 1)
-            """, (prestacao_id, tipo, descricao, valor, categoria, ordem))
-            print(f"    Lanamento {ordem} inserido")
-
-            # Contabilizar totais para validação
-            if valor > 0:
-                total_positivo += valor
-            else:
-                total_negativo += abs(valor)
-
-            ordem += 1
-            lancamentos_salvos += 1
-
-        # Atualizar totais calculados incluindo descontos
-        print(f" Atualizando totais na PrestacaoContas incluindo todos os lanamentos...")
-        try:
-            # Recalcular totais separando descontos de valores retidos
-            cursor.execute("""
-                SELECT
-                    SUM(CASE WHEN valor > 0 THEN valor ELSE 0 END) as total_positivo,
-                    SUM(CASE WHEN valor < 0 AND categoria IN ('retido', 'taxa') THEN ABS(valor) ELSE 0 END) as total_retido,
-                    SUM(CASE WHEN valor < 0 AND categoria = 'desconto' THEN ABS(valor) ELSE 0 END) as total_descontos
-                FROM LancamentosPrestacaoContas
-                WHERE prestacao_id = ? AND ativo = 1
-            """, (prestacao_id,))
-
-            resultado = cursor.fetchone()
-            total_positivo_real = float(resultado[0] or 0)
-            total_retido_real = float(resultado[1] or 0)
-            total_descontos_real = float(resultado[2] or 0)
-
-            # Valor do boleto = soma de positivos - descontos (mas NÃO retidos)
-            valor_boleto_final = total_positivo_real - total_descontos_real
-
-            print(f" Totais recalculados corretamente:")
-            print(f"   Total positivo: R$ {total_positivo_real:.2f}")
-            print(f"   Total retido: R$ {total_retido_real:.2f}")
-            print(f"   Total descontos: R$ {total_descontos_real:.2f}")
-            print(f"   Valor boleto final: R$ {valor_boleto_final:.2f}")
-
-            cursor.execute("""
-                UPDATE PrestacaoContas
-                SET valor_boleto = ?,
-                    total_retido = ?,
-                    valor_repasse = ?
-                WHERE id = ?
-            """, (valor_boleto_final, total_retido_real, valor_boleto_final - total_retido_real, prestacao_id))
-            print(f" Totais atualizados com todos os lanamentos")
-        except Exception as e:
-            print(f" Erro ao atualizar totais: {e}")
-            # Continuar mesmo com erro
-
-        # Fazer commit parcial para garantir que lançamentos foram salvos
-        print(f" Fazendo commit parcial dos lanamentos...")
-        try:
-            conn.commit()
-            print(f" Commit parcial realizado")
-        except Exception as e:
-            print(f" Erro no commit parcial: {e}")
-
-        # Salvar distribuição de locadores se fornecida
-        print(f" Salvando distribuio de {len(repasse_por_locador) if repasse_por_locador else 0} locadores...")
-        if repasse_por_locador and len(repasse_por_locador) > 0:
+        with get_conexao() as conn:
+            cursor = conn.cursor()
+            gravar_filhos(cursor, [(prestacao_id, filhos)])
+            # Totais e distribuição por locador mudaram: recalcular o grupo da prestação
             try:
-                # Usar conexão separada para evitar travamento
-                conn2 = get_conexao()
-                cursor2 = conn2.cursor()
-
-                # Marcar distribuições anteriores como inativas
-                cursor2.execute("""
-                    UPDATE DistribuicaoRepasseLocadores
-                    SET ativo = 0
-                    WHERE prestacao_id = ?
-                """, (prestacao_id,))
-
-                # Inserir novas distribuições
-                for i, distribuicao in enumerate(repasse_por_locador, 1):
-                    print(f"   Inserindo distribuição {i}: locador_id={distribuicao.get('locador_id')}")
-                    cursor2.execute("""
-                        INSERT INTO DistribuicaoRepasseLocadores (
-                            prestacao_id, locador_id, locador_nome, percentual_participacao,
-                            valor_repasse, responsabilidade_principal, data_criacao, ativo
-                        ) VALUES (?, ?, ?, ?, ?, ?, GETDATE(), 1)
-                    """, (
-                        prestacao_id,
-                        distribuicao.get('locador_id'),
-                        distribuicao.get('locador_nome'),
-                        distribuicao.get('porcentagem', 100),
-                        distribuicao.get('valor_repasse', 0),
-                        distribuicao.get('responsabilidade_principal', False)
-                    ))
-
-                conn2.commit()
-                conn2.close()
-                print(f" Distribuio de {len(repasse_por_locador)} locadores salva")
-            except Exception as e:
-                print(f" Erro ao salvar distribuio de locadores: {e}")
-                import traceback
-                traceback.print_exc()
-
-        print(f" Fechando conexo principal...")
-        conn.close()
-        print(f" Conexo fechada")
-
-        print(f"{lancamentos_salvos} lançamentos salvos para prestação {prestacao_id}")
-        print(f"Total boleto: {total_positivo}, Total retido: {total_negativo}, Repasse: {total_positivo - total_negativo}")
-
+                atualizar_agregados_prestacoes(cursor, [prestacao_id])
+            except ErroAgregados as e:
+                print(f"AVISO: Não foi possível atualizar agregados financeiros da prestação {prestacao_id}: {e}")
+
+        invalidar_cache_faturas()
+        invalidar_pdfs_prestacoes([prestacao_id])
+        resumo = filhos['resumo']
+        print(f"{resumo['lancamentos_salvos']} lançamentos salvos para prestação {prestacao_id}")
         return {
             "success": True,
-            "lancamentos_salvos": lancamentos_salvos,
-            "total_boleto": total_positivo,
-            "total_retido": total_negativo,
-            "valor_repasse": total_positivo - total_negativo,
-            "locadores_distribuidos": len(repasse_por_locador) if repasse_por_locador else 0
+            "lancamentos_salvos": resumo['lancamentos_salvos'],
+            "total_boleto": resumo['total_boleto'],
+            "total_retido": resumo['total_retido'],
+            "valor_repasse": resumo['valor_repasse'],
+            "locadores_distribuidos": resumo['locadores_distribuidos']
         }
 
     except Exception as e:
         print(f"Erro ao salvar lançamentos detalhados: {str(e)}")
         import traceback
         traceback.print_exc()
-        return {"success": False, "message": f"Erro: {str(e)}"}
\ No newline at end of file
+        return {"success": False, "message": f"Erro: {str(e)}"}
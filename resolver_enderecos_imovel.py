@@ -0,0 +1,278 @@
+"""
+Resolução de Endereços Legados de Imóveis
+================================================================
+
+Imóveis antigos têm apenas o texto livre Imoveis.endereco (sem endereco_id).
+Este módulo casa esse texto com um EnderecoImovel estruturado usando um
+índice em memória com logradouros normalizados (sem acento, minúsculo,
+abreviações expandidas: "R." -> "rua", "Av." -> "avenida"...) e grava o
+resultado em ImovelEnderecoResolvido. A listagem de imóveis só lê essa tabela.
+
+Imóvel casado com o índice (origem 'indice') guarda só endereco_imovel_id:
+a listagem faz JOIN no EnderecoImovel atual, então um CEP ou rua corrigido
+lá aparece na hora. Rua/CEP/bairro copiados só existem para 'extracao'
+(endereço tirado do próprio texto, sem EnderecoImovel correspondente).
+
+A resolução é incremental: só processa imóveis sem resolução, cujo texto de
+endereço mudou, que não casaram com a versão atual do índice, ou cujo
+EnderecoImovel casado foi apagado.
+
+Execução manual (carga inicial):
+    python resolver_enderecos_imovel.py
+"""
+
+import re
+import threading
+import unicodedata
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pool_conexoes import obter_conexao
+
+logger = logging.getLogger(__name__)
+
+ABREVIACOES_LOGRADOURO = {
+    'r': 'rua',
+    'av': 'avenida',
+    'avn': 'avenida',
+    'al': 'alameda',
+    'tv': 'travessa',
+    'trav': 'travessa',
+    'pc': 'praca',
+    'pca': 'praca',
+    'pq': 'parque',
+    'rod': 'rodovia',
+    'est': 'estrada',
+    'estr': 'estrada',
+    'lg': 'largo',
+    'vl': 'vila',
+    'dr': 'doutor',
+    'prof': 'professor',
+    'pres': 'presidente',
+    'gov': 'governador',
+    'cel': 'coronel',
+    'gal': 'general',
+    'gen': 'general',
+    'sto': 'santo',
+    'sta': 'santa',
+}
+
+
+def normalizar_logradouro(texto: Optional[str]) -> str:
+    """'R. João de Alencar' -> 'rua joao de alencar'"""
+    if not texto:
+        return ''
+    sem_acento = unicodedata.normalize('NFKD', texto)
+    sem_acento = ''.join(c for c in sem_acento if not unicodedata.combining(c))
+    tokens = re.findall(r'[a-z0-9]+', sem_acento.casefold())
+    return ' '.join(ABREVIACOES_LOGRADOURO.get(t, t) for t in tokens)
+
+
+def extrair_rua_numero(endereco_string: str) -> Tuple[str, str]:
+    """Rua (antes da primeira vírgula) e número (primeiro inteiro após ela)"""
+    rua_match = re.search(r'^([^,]+)', endereco_string or '')
+    numero_match = re.search(r',\s*(\d+)', endereco_string or '')
+    rua = rua_match.group(1).strip() if rua_match else (endereco_string or '')[:30]
+    numero = numero_match.group(1) if numero_match else ''
+    return rua, numero
+
+
+class IndiceEnderecos:
+    """Índice logradouro normalizado -> EnderecoImovel (com CEP), montado uma vez"""
+
+    def __init__(self, linhas: Iterable[tuple], versao: str = ''):
+        self.versao = versao
+        self._por_rua: Dict[str, List[Dict[str, Any]]] = {}
+        for id_, rua, numero, complemento, bairro, cidade, uf, cep in linhas:
+            chave = normalizar_logradouro(rua)
+            if not chave:
+                continue
+            self._por_rua.setdefault(chave, []).append({
+                'id': id_,
+                'numero': (numero or '').strip(),
+                'dados': {
+                    'rua': rua or '',
+                    'numero': numero or '',
+                    'complemento': complemento or '',
+                    'bairro': bairro or '',
+                    'cidade': cidade or '',
+                    'estado': uf or '',
+                    'cep': cep or ''
+                }
+            })
+        # Chaves mais longas primeiro para o casamento por contenção
+        self._chaves_ordenadas = sorted(self._por_rua, key=len, reverse=True)
+
+    def __len__(self):
+        return sum(len(v) for v in self._por_rua.values())
+
+    def buscar(self, endereco_string: str) -> Optional[Dict[str, Any]]:
+        """Retorna {'id', 'dados'} do melhor EnderecoImovel ou None"""
+        rua, numero = extrair_rua_numero(endereco_string)
+        chave = normalizar_logradouro(rua)
+        if not chave:
+            return None
+
+        candidatos = self._por_rua.get(chave)
+        if candidatos is None:
+            # Sem igualdade exata: logradouro que contém (ou está contido em) o procurado
+            for outra in self._chaves_ordenadas:
+                if chave in outra or outra in chave:
+                    candidatos = self._por_rua[outra]
+                    break
+        if not candidatos:
+            return None
+
+        if numero:
+            for candidato in candidatos:
+                if candidato['numero'] == numero:
+                    return candidato
+        return candidatos[0]
+
+
+# ==================== PERSISTÊNCIA ====================
+
+def garantir_tabela_enderecos_resolvidos(cursor):
+    """
+    Cria ImovelEnderecoResolvido se a migração 005_imovel_endereco_resolvido.sql
+    ainda não foi aplicada. Não faz commit.
+    """
+    cursor.execute("""
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='ImovelEnderecoResolvido' AND xtype='U')
+        BEGIN
+            CREATE TABLE ImovelEnderecoResolvido (
+                imovel_id int NOT NULL PRIMARY KEY,
+                endereco_origem nvarchar(255) NULL,
+                endereco_imovel_id int NULL,
+                rua nvarchar(200) NULL,
+                numero nvarchar(10) NULL,
+                complemento nvarchar(100) NULL,
+                bairro nvarchar(100) NULL,
+                cidade nvarchar(100) NULL,
+                uf nvarchar(2) NULL,
+                cep nvarchar(10) NULL,
+                origem varchar(20) NOT NULL,
+                indice_versao varchar(40) NULL,
+                data_resolucao datetime DEFAULT GETDATE()
+            )
+        END
+    """)
+
+
+_indice_cache: Optional[IndiceEnderecos] = None
+_indice_lock = threading.Lock()
+
+
+def obter_indice(cursor) -> IndiceEnderecos:
+    """
+    Índice em cache, reconstruído só quando EnderecoImovel muda
+    (COUNT/MAX(id) e checksum de rua/número/CEP, que pega edições)
+    """
+    global _indice_cache
+    cursor.execute("""
+        SELECT COUNT(*), MAX(id), CHECKSUM_AGG(BINARY_CHECKSUM(id, rua, numero, cep))
+        FROM EnderecoImovel WHERE cep IS NOT NULL AND cep != ''
+    """)
+    total, max_id, checksum = cursor.fetchone()
+    versao = f"{total or 0}:{max_id or 0}:{checksum or 0}"
+
+    with _indice_lock:
+        if _indice_cache is not None and _indice_cache.versao == versao:
+            return _indice_cache
+
+    cursor.execute("""
+        SELECT id, rua, numero, complemento, bairro, cidade, uf, cep
+        FROM EnderecoImovel
+        WHERE cep IS NOT NULL AND cep != ''
+        ORDER BY id
+    """)
+    indice = IndiceEnderecos(cursor.fetchall(), versao)
+    with _indice_lock:
+        _indice_cache = indice
+    logger.info(f"Índice de endereços reconstruído: {len(indice)} endereços (versão {versao})")
+    return indice
+
+
+def resolver_enderecos_pendentes(imovel_ids: Optional[List[int]] = None) -> Dict[str, int]:
+    """
+    Resolve e grava o endereço estruturado dos imóveis antigos pendentes.
+
+    Pendentes: sem linha em ImovelEnderecoResolvido, com Imoveis.endereco
+    alterado desde a resolução, não casados com a versão atual do índice ou
+    casados com um EnderecoImovel que não existe mais.
+    imovel_ids restringe o processamento (usado nos hooks de insert/update).
+    """
+    # Import tardio: evita importação circular com repositories_adapter
+    from repositories_adapter import extrair_endereco_estruturado
+
+    estatisticas = {'pendentes': 0, 'indice': 0, 'extracao': 0, 'nao_resolvido': 0}
+
+    with obter_conexao() as conn:
+        cursor = conn.cursor()
+        garantir_tabela_enderecos_resolvidos(cursor)
+        indice = obter_indice(cursor)
+
+        filtro_ids = ""
+        params: List[Any] = [indice.versao]
+        if imovel_ids:
+            filtro_ids = f" AND i.id IN ({','.join('?' for _ in imovel_ids)})"
+            params.extend(imovel_ids)
+
+        cursor.execute(f"""
+            SELECT i.id, i.endereco
+            FROM Imoveis i
+            LEFT JOIN ImovelEnderecoResolvido r ON r.imovel_id = i.id
+            WHERE i.endereco_id IS NULL
+              AND i.endereco IS NOT NULL AND i.endereco != ''
+              AND (
+                  r.imovel_id IS NULL
+                  OR r.endereco_origem IS NULL OR r.endereco_origem != i.endereco
+                  OR (r.origem != 'indice' AND ISNULL(r.indice_versao, '') != ?)
+                  OR (r.origem = 'indice' AND NOT EXISTS (
+                      SELECT 1 FROM EnderecoImovel e WHERE e.id = r.endereco_imovel_id))
+              ){filtro_ids}
+        """, params)
+        pendentes = cursor.fetchall()
+        estatisticas['pendentes'] = len(pendentes)
+        if not pendentes:
+            return estatisticas
+
+        linhas = []
+        for imovel_id, endereco_string in pendentes:
+            encontrado = indice.buscar(endereco_string)
+            if encontrado:
+                # Sem cópia: a leitura faz JOIN no EnderecoImovel pelo id
+                origem, endereco_imovel_id, dados = 'indice', encontrado['id'], {}
+            else:
+                dados = extrair_endereco_estruturado(endereco_string)
+                origem = 'extracao' if dados and dados.get('rua') else 'nao_resolvido'
+                endereco_imovel_id = None
+                dados = dados or {}
+            estatisticas[origem] += 1
+            linhas.append((
+                imovel_id, endereco_string, endereco_imovel_id,
+                (dados.get('rua') or '')[:200] or None, (dados.get('numero') or '')[:10] or None,
+                (dados.get('complemento') or '')[:100] or None, (dados.get('bairro') or '')[:100] or None,
+                (dados.get('cidade') or '')[:100] or None, (dados.get('estado') or '')[:2] or None,
+                (dados.get('cep') or '')[:10] or None, origem, indice.versao
+            ))
+
+        cursor.fast_executemany = True
+        cursor.executemany(
+            "DELETE FROM ImovelEnderecoResolvido WHERE imovel_id = ?",
+            [(linha[0],) for linha in linhas]
+        )
+        cursor.executemany("""
+            INSERT INTO ImovelEnderecoResolvido
+            (imovel_id, endereco_origem, endereco_imovel_id, rua, numero, complemento,
+             bairro, cidade, uf, cep, origem, indice_versao, data_resolucao)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, GETDATE())
+        """, linhas)
+
+    logger.info(f"Endereços de imóveis resolvidos: {estatisticas}")
+    return estatisticas
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    print(resolver_enderecos_pendentes())
@@ -3,14 +3,21 @@ Scheduler Automático para Cálculo de Acréscimos
 ================================================================
 Executa automaticamente todos os dias à meia-noite (00:00)
 Roda em thread separada para não bloquear o servidor principal
+
+O job roda pelo executor paralelo (executor_acrescimos): lotes por faixa de
+contrato, checkpoint por lote e lease no banco, então com vários workers do
+uvicorn apenas um executa. Ao iniciar, o scheduler só retoma uma execução do
+dia que ficou incompleta (ex.: processo caiu no meio); não roda o job inteiro
+a cada start. ACRESCIMOS_EXECUTAR_AO_INICIAR=1 restaura a execução na subida.
 """
 
+import os
 import threading
 import schedule
 import time
 import logging
 from datetime import datetime
-from job_acrescimos_diario import executar_job_acrescimos
+from executor_acrescimos import executar_job_paralelo, execucao_do_dia_pendente, status_execucao
 
 # Configurar logging específico para o scheduler sem emojis
 logging.basicConfig(
@@ -36,10 +43,19 @@ class SchedulerAcrescimos:
             logger.info(f"Horário: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
             logger.info("=" * 60)
 
-            # Executar o job de acréscimos
-            executar_job_acrescimos()
+            # Executar o job de acréscimos (paralelo, com checkpoint e lease)
+            resultado = executar_job_paralelo()
 
-            logger.info("Job automático concluído com sucesso")
+            if resultado.get('status') == 'lease_ocupado':
+                logger.info("Job já em execução em outro worker")
+            elif resultado.get('status') == 'ja_executado':
+                logger.info("Job de hoje já concluído por outro worker")
+            else:
+                logger.info(
+                    f"Job automático finalizado ({resultado.get('status')}): "
+                    f"{resultado.get('processadas', 0)} prestações, "
+                    f"{resultado.get('linhas_por_segundo', 0)} linhas/s"
+                )
             logger.info("=" * 60 + "\n")
 
         except Exception as e:
@@ -55,9 +71,16 @@ class SchedulerAcrescimos:
         # Agendar para meia-noite todos os dias
         schedule.every().day.at("00:00").do(self.job_wrapper)
 
-        # Também executar uma vez ao iniciar (opcional - remover se não quiser)
-        logger.info("Executando job inicial ao iniciar o scheduler...")
-        self.job_wrapper()
+        # Ao iniciar: só retomar a execução de hoje se ela ficou pela metade
+        try:
+            if os.getenv('ACRESCIMOS_EXECUTAR_AO_INICIAR') == '1':
+                logger.info("Executando job inicial ao iniciar o scheduler...")
+                self.job_wrapper()
+            elif execucao_do_dia_pendente():
+                logger.info("Execução de hoje incompleta - retomando a partir do checkpoint...")
+                self.job_wrapper()
+        except Exception as e:
+            logger.error(f"Erro ao verificar execução pendente: {e}")
 
         while self.running:
             try:
@@ -107,19 +130,22 @@ class SchedulerAcrescimos:
                 return {
                     "status": "running",
                     "proximo_job": next_run.strftime('%Y-%m-%d %H:%M:%S'),
-                    "tempo_restante": f"{horas}h {minutos}min"
+                    "tempo_restante": f"{horas}h {minutos}min",
+                    "execucao": status_execucao()
                 }
             else:
                 return {
                     "status": "running",
                     "proximo_job": "Aguardando agendamento",
-                    "tempo_restante": "N/A"
+                    "tempo_restante": "N/A",
+                    "execucao": status_execucao()
                 }
         else:
             return {
                 "status": "stopped",
                 "proximo_job": None,
-                "tempo_restante": None
+                "tempo_restante": None,
+                "execucao": status_execucao()
             }
 
 # Instância global do scheduler
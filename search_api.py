@@ -6,23 +6,54 @@ import os
 from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
 from datetime import datetime
+from pool_conexoes import obter_conexao
+from indice_busca import buscar_ids, indice_ativo
+from cache_busca import chave_consulta, em_cache, TTL_SUGESTOES
 
 load_dotenv()
 
 def get_connection():
-    """Conecta ao SQL Server"""
-    connection_string = (
-        f"DRIVER={{{os.getenv('DB_DRIVER')}}};"
-        f"SERVER={os.getenv('DB_SERVER')};"
-        f"DATABASE={os.getenv('DB_DATABASE')};"
-        f"UID={os.getenv('DB_USER')};"
-        f"PWD={os.getenv('DB_PASSWORD')}"
-    )
-    return pyodbc.connect(connection_string)
+    """Empresta uma conexão do pool compartilhado (conn.close() devolve ao pool)"""
+    return obter_conexao()
+
+TIPOS_BUSCA = ('locadores', 'locatarios', 'imoveis', 'contratos')
 
 def buscar_global(query: str, tipo: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
     """
-    Busca global em todas as tabelas ou em um tipo específico
+    Busca global em todas as tabelas ou em um tipo específico.
+
+    Termos de busca usam o índice em memória (indice_busca) e retornam em
+    ordem de relevância; '*' ou vazio lista os primeiros registros.
+    Cada seção fica em cache (cache_busca) pela consulta normalizada.
+    """
+    resultado = {nome: [] for nome in TIPOS_BUSCA}
+    chave = '*' if query in ('*', '') else chave_consulta(query)
+    for nome in TIPOS_BUSCA:
+        if not tipo or tipo == nome:
+            try:
+                resultado[nome] = em_cache(f'busca:{nome}', chave,
+                                           lambda nome=nome: _buscar_secao(query, nome))
+            except Exception as e:
+                # Falha não entra no cache: a próxima busca consulta de novo
+                print(f"Erro na busca ({nome}): {e}")
+    return resultado
+
+def _buscar_secao(query: str, tipo: str) -> List[Dict[str, Any]]:
+    """Resultados de um tipo: índice em memória ou, para '*'/vazio e como fallback, SQL"""
+    buscar_todos = query == '*' or query == ''
+    if not buscar_todos and indice_ativo():
+        try:
+            return _buscar_global_indice(query, tipo)[tipo]
+        except Exception as e:
+            print(f"AVISO: Índice de busca indisponível, usando LIKE: {e}")
+    return _buscar_global_sql(query, tipo, propagar_erros=True)[tipo]
+
+def _buscar_global_sql(query: str, tipo: Optional[str] = None,
+                       propagar_erros: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Busca global direto no SQL Server (LIKE); usada para listar todos e
+    como fallback quando o índice de busca está desativado ou indisponível.
+    Com propagar_erros=False, erros retornam o resultado parcial.
     """
     conn = get_connection()
     cursor = conn.cursor()
@@ -73,15 +104,7 @@ def buscar_global(query: str, tipo: Optional[str] = None) -> Dict[str, List[Dict
                 
                 for row in rows:
                     locador = dict(zip(columns, row))
-                    # Converter campo ativo para boolean, mantendo null como true por padrão
-                    if 'ativo' in locador:
-                        if locador['ativo'] is None:
-                            locador['ativo'] = True  # Default para registros antigos
-                        else:
-                            locador['ativo'] = bool(locador['ativo'])
-                    else:
-                        locador['ativo'] = True  # Fallback se não encontrar a coluna
-                    resultado['locadores'].append(locador)
+                    resultado['locadores'].append(_formatar_locador(locador))
                     
             else:
                 # Consulta simplificada primeiro para pegar os locadores
@@ -110,16 +133,7 @@ def buscar_global(query: str, tipo: Optional[str] = None) -> Dict[str, List[Dict
                     locador['contratos_ativos'] = 0
                     locador['receita_mensal_bruta'] = 0.0
                     
-                    # Converter campo ativo para boolean, mantendo null como true por padrão
-                    if 'ativo' in locador:
-                        if locador['ativo'] is None:
-                            locador['ativo'] = True  # Default para registros antigos
-                        else:
-                            locador['ativo'] = bool(locador['ativo'])
-                    else:
-                        locador['ativo'] = True  # Fallback se não encontrar a coluna
-                    
-                    resultado['locadores'].append(locador)
+                    resultado['locadores'].append(_formatar_locador(locador))
         
         # Buscar Locatários
         if not tipo or tipo == 'locatarios':
@@ -217,13 +231,7 @@ def buscar_global(query: str, tipo: Optional[str] = None) -> Dict[str, List[Dict
             print(f"DEBUG imoveis: found {len(rows) if rows else 0} rows")
             
             for row in rows:
-                imovel = dict(zip(columns, row))
-                # Converter Decimal para float
-                if imovel.get('valor_aluguel'):
-                    imovel['valor_aluguel'] = float(imovel['valor_aluguel'])
-                if imovel.get('metragem_total'):
-                    imovel['metragem_total'] = float(imovel['metragem_total'])
-                resultado['imoveis'].append(imovel)
+                resultado['imoveis'].append(_formatar_imovel(dict(zip(columns, row))))
         
         # Buscar Contratos
         if not tipo or tipo == 'contratos':
@@ -281,32 +289,149 @@ def buscar_global(query: str, tipo: Optional[str] = None) -> Dict[str, List[Dict
             print(f"DEBUG contratos: found {len(rows) if rows else 0} rows")
             
             for row in rows:
-                contrato = dict(zip(columns, row))
-                # Converter datas para string
-                if contrato.get('data_inicio'):
-                    contrato['data_inicio'] = str(contrato['data_inicio'])
-                if contrato.get('data_fim'):
-                    contrato['data_fim'] = str(contrato['data_fim'])
-                # Adicionar campos adicionais
-                contrato['numero_contrato'] = f"CT-{contrato['id']:04d}"
-                # Usar status do banco se existir, senão calcular
-                if not contrato.get('status'):
-                    contrato['status'] = 'ATIVO' if contrato.get('data_fim') and contrato['data_fim'] >= str(datetime.now().date()) else 'VENCIDO'
-                # Converter valor_aluguel para float se existir
-                if contrato.get('valor_aluguel'):
-                    contrato['valor_aluguel'] = float(contrato['valor_aluguel'])
-                else:
-                    contrato['valor_aluguel'] = 0
-                resultado['contratos'].append(contrato)
+                resultado['contratos'].append(_formatar_contrato(dict(zip(columns, row))))
         
         return resultado
         
     except Exception as e:
         print(f"Erro na busca: {e}")
+        if propagar_erros:
+            raise
+        return resultado
+    finally:
+        conn.close()
+
+def _formatar_locador(locador: Dict[str, Any]) -> Dict[str, Any]:
+    # Converter campo ativo para boolean, mantendo null como true por padrão
+    if locador.get('ativo') is None:
+        locador['ativo'] = True  # Default para registros antigos (ou coluna ausente)
+    else:
+        locador['ativo'] = bool(locador['ativo'])
+    return locador
+
+def _formatar_imovel(imovel: Dict[str, Any]) -> Dict[str, Any]:
+    # Converter Decimal para float
+    if imovel.get('valor_aluguel'):
+        imovel['valor_aluguel'] = float(imovel['valor_aluguel'])
+    if imovel.get('metragem_total'):
+        imovel['metragem_total'] = float(imovel['metragem_total'])
+    return imovel
+
+def _formatar_contrato(contrato: Dict[str, Any]) -> Dict[str, Any]:
+    # Converter datas para string
+    if contrato.get('data_inicio'):
+        contrato['data_inicio'] = str(contrato['data_inicio'])
+    if contrato.get('data_fim'):
+        contrato['data_fim'] = str(contrato['data_fim'])
+    # Adicionar campos adicionais
+    contrato['numero_contrato'] = f"CT-{contrato['id']:04d}"
+    # Usar status do banco se existir, senão calcular
+    if not contrato.get('status'):
+        contrato['status'] = 'ATIVO' if contrato.get('data_fim') and contrato['data_fim'] >= str(datetime.now().date()) else 'VENCIDO'
+    # Converter valor_aluguel para float se existir
+    if contrato.get('valor_aluguel'):
+        contrato['valor_aluguel'] = float(contrato['valor_aluguel'])
+    else:
+        contrato['valor_aluguel'] = 0
+    return contrato
+
+# Linhas exibidas por tipo, buscadas pela chave primária dos ids vindos do índice
+SQL_POR_IDS = {
+    'locadores': ("""
+        SELECT
+            l.id, l.nome, l.cpf_cnpj, l.telefone, l.email, l.endereco,
+            l.tipo_recebimento, l.rg, l.nacionalidade, l.estado_civil, l.profissao,
+            COALESCE(l.ativo, 1) as ativo,
+            COUNT(DISTINCT i.id) as qtd_imoveis,
+            COUNT(DISTINCT CASE WHEN c.data_fim >= GETDATE() THEN c.id END) as contratos_ativos,
+            ISNULL(SUM(CASE WHEN c.data_fim >= GETDATE() THEN c.valor_aluguel END), 0) as receita_mensal_bruta
+        FROM Locadores l
+        LEFT JOIN Imoveis i ON l.id = i.id_locador
+        LEFT JOIN Contratos c ON i.id = c.id_imovel
+        WHERE l.id IN ({ids})
+        GROUP BY l.id, l.nome, l.cpf_cnpj, l.telefone, l.email, l.endereco,
+                 l.tipo_recebimento, l.rg, l.nacionalidade, l.estado_civil, l.profissao, l.ativo
+    """, _formatar_locador),
+    'locatarios': ("""
+        SELECT
+            l.id, l.nome, l.cpf_cnpj, l.telefone, l.email,
+            l.tipo_garantia, l.rg, l.nacionalidade, l.estado_civil, l.profissao,
+            COUNT(DISTINCT CASE WHEN c.data_fim >= GETDATE() THEN c.id END) as contratos_ativos,
+            COUNT(DISTINCT CASE WHEN c.data_fim >= GETDATE() THEN i.id END) as imoveis_alugados
+        FROM Locatarios l
+        LEFT JOIN Contratos c ON l.id = c.id_locatario
+        LEFT JOIN Imoveis i ON c.id_imovel = i.id
+        WHERE l.id IN ({ids})
+        GROUP BY l.id, l.nome, l.cpf_cnpj, l.telefone, l.email,
+                 l.tipo_garantia, l.rg, l.nacionalidade, l.estado_civil, l.profissao
+    """, None),
+    'imoveis': ("""
+        SELECT
+            i.id, i.tipo, i.endereco, i.valor_aluguel,
+            i.status, i.quartos, i.banheiros,
+            i.vagas_garagem, i.metragem_total, i.andar,
+            l.nome as locador_nome
+        FROM Imoveis i
+        LEFT JOIN Locadores l ON i.id_locador = l.id
+        WHERE i.id IN ({ids})
+    """, _formatar_imovel),
+    'contratos': ("""
+        SELECT
+            c.id, c.data_inicio, c.data_fim, c.valor_aluguel, c.status,
+            c.vencimento_dia, c.tipo_garantia,
+            c.id_locatario, c.id_imovel,
+            i.endereco as imovel_endereco, i.tipo as imovel_tipo,
+            i.id_locador as locador_id,
+            loc.nome as locatario_nome, loc.cpf_cnpj as locatario_cpf_cnpj,
+            ldr.nome as locador_nome, ldr.cpf_cnpj as locador_cpf_cnpj
+        FROM Contratos c
+        LEFT JOIN Imoveis i ON c.id_imovel = i.id
+        LEFT JOIN Locatarios loc ON c.id_locatario = loc.id
+        LEFT JOIN Locadores ldr ON i.id_locador = ldr.id
+        WHERE c.id IN ({ids})
+    """, _formatar_contrato),
+}
+
+def _buscar_global_indice(query: str, tipo: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Busca pelo índice em memória: ids em ordem de relevância (até 50 por tipo)
+    e depois as linhas completas por chave primária, mantendo essa ordem
+    """
+    resultado = {
+        'locadores': [],
+        'locatarios': [],
+        'imoveis': [],
+        'contratos': []
+    }
+    ids_por_tipo = {
+        nome: buscar_ids(nome, query, 50)
+        for nome in resultado
+        if not tipo or tipo == nome
+    }
+    if not any(ids_por_tipo.values()):
         return resultado
+
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        for nome, ids in ids_por_tipo.items():
+            if not ids:
+                continue
+            sql, formatar = SQL_POR_IDS[nome]
+            cursor.execute(sql.format(ids=', '.join('?' for _ in ids)), ids)
+            columns = [column[0] for column in cursor.description]
+            linhas = {row[0]: dict(zip(columns, row)) for row in cursor.fetchall()}
+            for entidade_id in ids:
+                linha = linhas.get(entidade_id)
+                if linha is not None:
+                    resultado[nome].append(formatar(linha) if formatar else linha)
     finally:
         conn.close()
 
+    print(f"DEBUG: busca indexada query='{query}', tipo='{tipo}': "
+          f"{ {nome: len(itens) for nome, itens in resultado.items()} }")
+    return resultado
+
 def obter_estatisticas_busca(query: str) -> Dict[str, int]:
     """
     Retorna estatísticas da busca
@@ -322,8 +447,21 @@ def obter_estatisticas_busca(query: str) -> Dict[str, int]:
 
 def buscar_sugestoes() -> Dict[str, Any]:
     """
-    Retorna sugestões de busca baseadas em dados recentes
+    Retorna sugestões de busca baseadas em dados recentes (em cache até a
+    próxima escrita ou por BUSCA_SUGESTOES_TTL_SEGUNDOS)
     """
+    try:
+        return em_cache('busca:sugestoes', 'categorias', _consultar_sugestoes, ttl=TTL_SUGESTOES)
+    except Exception as e:
+        # Falha não entra no cache: a próxima chamada consulta de novo
+        print(f"Erro ao buscar sugestões: {e}")
+        return {
+            'recentes': [],
+            'populares': [],
+            'categorias': {}
+        }
+
+def _consultar_sugestoes() -> Dict[str, Any]:
     conn = get_connection()
     cursor = conn.cursor()
     
@@ -361,9 +499,6 @@ def buscar_sugestoes() -> Dict[str, Any]:
         
         return sugestoes
         
-    except Exception as e:
-        print(f"Erro ao buscar sugestões: {e}")
-        return sugestoes
     finally:
         conn.close()
 
@@ -0,0 +1,115 @@
+"""
+Serviço de Busca Global (em processo)
+================================================================
+
+Busca resumida por locadores, imóveis e contratos usada por
+/api/search/global (perfil_locador_api) e /api/search/advanced/global
+(advanced_search_api). As duas rotas chamam buscar_global_resumida()
+diretamente; antes a busca avançada fazia um requests.get para o próprio
+servidor, ocupando um worker com um round trip HTTP extra (e travando
+servidores com um único worker).
+
+Resultados ficam em cache (namespace 'busca:resumida' de cache_busca),
+compartilhados entre as duas rotas e invalidados pelas escritas.
+"""
+
+from typing import Any, Dict
+
+from pool_conexoes import obter_conexao
+from cache_busca import em_cache
+
+
+def _consultar_busca_global(termo: str, limite: int) -> Dict[str, Any]:
+    """Consulta o banco (sem cache)"""
+    with obter_conexao() as conn:
+        cursor = conn.cursor()
+
+        # Buscar locadores
+        cursor.execute("""
+            SELECT TOP (?) id, nome, cpf_cnpj, telefone, email, ativo
+            FROM Clientes
+            WHERE tipo_cliente = 'Locador'
+            AND (nome LIKE ? OR cpf_cnpj LIKE ? OR telefone LIKE ? OR email LIKE ?)
+            ORDER BY nome
+        """, (limite, f"%{termo}%", f"%{termo}%", f"%{termo}%", f"%{termo}%"))
+
+        locadores = []
+        for row in cursor.fetchall():
+            locadores.append({
+                "id": row[0],
+                "nome": row[1],
+                "cpf_cnpj": row[2],
+                "telefone": row[3],
+                "email": row[4],
+                "ativo": row[5]
+            })
+
+        # Buscar imóveis
+        cursor.execute("""
+            SELECT TOP (?) i.id, i.endereco, i.tipo, i.valor_aluguel, i.status, c.nome as locador_nome
+            FROM Imoveis i
+            LEFT JOIN Clientes c ON i.id_locador = c.id
+            WHERE i.ativo = 1
+            AND (i.endereco LIKE ? OR i.tipo LIKE ?)
+            ORDER BY i.endereco
+        """, (limite, f"%{termo}%", f"%{termo}%"))
+
+        imoveis = []
+        for row in cursor.fetchall():
+            imoveis.append({
+                "id": row[0],
+                "endereco": row[1],
+                "endereco_completo": row[1],
+                "tipo": row[2],
+                "valor_aluguel": float(row[3]) if row[3] else 0,
+                "status": row[4] or "DISPONIVEL",
+                "locador": {"nome": row[5]} if row[5] else {"nome": "Não informado"}
+            })
+
+        # Buscar contratos
+        cursor.execute("""
+            SELECT TOP (?) c.id, c.valor_aluguel, i.endereco, cl.nome as locatario_nome,
+                   c.data_inicio, c.data_fim
+            FROM Contratos c
+            INNER JOIN Imoveis i ON c.id_imovel = i.id
+            LEFT JOIN Clientes cl ON c.id_locatario = cl.id
+            WHERE c.data_fim >= GETDATE()
+            AND (cl.nome LIKE ? OR i.endereco LIKE ?)
+            ORDER BY c.data_inicio DESC
+        """, (limite, f"%{termo}%", f"%{termo}%"))
+
+        contratos = []
+        for row in cursor.fetchall():
+            contratos.append({
+                "id": row[0],
+                "valor_aluguel": float(row[1]) if row[1] else 0,
+                "imovel_endereco": row[2],
+                "locatario": row[3] or "Não informado",
+                "data_inicio": row[4].isoformat() if row[4] else None,
+                "data_fim": row[5].isoformat() if row[5] else None,
+                "status": "ATIVO"
+            })
+
+    return {
+        "termo_busca": termo,
+        "total_resultados": len(locadores) + len(imoveis) + len(contratos),
+        "resultados_por_tipo": {
+            "locadores": {"dados": locadores},
+            "locatarios": {"dados": []},  # Implementar se necessário
+            "imoveis": {"dados": imoveis},
+            "contratos": {"dados": contratos}
+        }
+    }
+
+
+def buscar_global_resumida(termo: str, limite: int = 10) -> Dict[str, Any]:
+    """
+    Busca global resumida com cache compartilhado.
+
+    Returns:
+        {'termo_busca', 'total_resultados', 'resultados_por_tipo'}; cada tipo
+        tem {'dados': [...]} com até `limite` itens
+    """
+    # LIKE no SQL Server não diferencia maiúsculas: 'Silva' e 'silva' dividem a entrada
+    return em_cache('busca:resumida', (termo.casefold(), limite),
+                    lambda: _consultar_busca_global(termo, limite))